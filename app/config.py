@@ -23,6 +23,28 @@ class Settings:
     SMTP_USERNAME: str = os.getenv("SMTP_USERNAME", "")
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
     EMAIL_FROM: str = os.getenv("EMAIL_FROM", "noreply@muniica.gob.pe")
+    SMTP_SIMULADO: bool = os.getenv("SMTP_SIMULADO", "true").lower() == "true"
+    SMTP_MAX_CONEXIONES: int = int(os.getenv("SMTP_MAX_CONEXIONES", "5"))
+    SMTP_MENSAJES_POR_CONEXION: int = int(os.getenv("SMTP_MENSAJES_POR_CONEXION", "100"))
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "1"))
+    # Segundos que se retiene un email de una solicitud para agruparlo con los siguientes (0 = sin agrupar)
+    NOTIFICACIONES_VENTANA_AGRUPACION: int = int(os.getenv("NOTIFICACIONES_VENTANA_AGRUPACION", "120"))
+    
+    # Días que se guardan las notificaciones enviadas (0 = sin límite; con un valor, se borran cada noche)
+    NOTIFICACIONES_RETENCION_DIAS: int = int(os.getenv("NOTIFICACIONES_RETENCION_DIAS", "0"))
+    
+    # Recordatorios de vencimiento (días de anticipación y horario cron de la campaña)
+    RECORDATORIO_VENTANAS: str = os.getenv("RECORDATORIO_VENTANAS", "90,30,7")
+    RECORDATORIO_CRON: str = os.getenv("RECORDATORIO_CRON", "0 8 * * *")
+    
+    # Tareas periódicas de mantenimiento
+    PLANIFICADOR_ACTIVO: bool = os.getenv("PLANIFICADOR_ACTIVO", "true").lower() == "true"
+    
+    # Inspecciones ITSE: jornada de los inspectores (para armar las rutas diarias)
+    INSPECCION_JORNADA: str = os.getenv("INSPECCION_JORNADA", "08:00-17:00")
+    # Fiscalización: días hasta la siguiente re-inspección y niveles de riesgo que entran en la campaña anual
+    FISCALIZACION_PERIODICIDAD_DIAS: int = int(os.getenv("FISCALIZACION_PERIODICIDAD_DIAS", "365"))
+    FISCALIZACION_NIVELES: str = os.getenv("FISCALIZACION_NIVELES", "alto,muy_alto")
     
     # Pagos
     CULQI_PUBLIC_KEY: str = os.getenv("CULQI_PUBLIC_KEY", "")
@@ -36,6 +58,18 @@ class Settings:
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE_MB", "10")) * 1024 * 1024
     ALLOWED_EXTENSIONS: list = os.getenv("ALLOWED_EXTENSIONS", "pdf,jpg,jpeg,png,doc,docx").split(",")
     UPLOAD_FOLDER: str = os.getenv("UPLOAD_FOLDER", "app/static/uploads")
+    IMAGENES_WORKERS: int = int(os.getenv("IMAGENES_WORKERS", "2"))
+    # Formulario multipaso: horas sin actividad tras las que se descarta la sesión en memoria
+    FORMULARIO_SESION_HORAS: float = float(os.getenv("FORMULARIO_SESION_HORAS", "12"))
+    
+    # Zonificación: polígonos de zonas (GeoJSON, lon/lat) para ubicar el local por coordenadas.
+    # Sin el plano oficial (PDU) configurado la zona se deduce de la dirección
+    # (benchmarks/datos/zonificacion_ejemplo.geojson es solo de prueba)
+    ZONIFICACION_GEOJSON: str = os.getenv("ZONIFICACION_GEOJSON", "")
+    # Geocodificación local: gazetteer de vías y cuadras (CSV) y caché en disco de direcciones resueltas.
+    # Sin gazetteer oficial configurado no se geocodifica (benchmarks/datos/gazetteer_ejemplo.csv es solo de prueba)
+    GEOCODIFICACION_GAZETTEER: str = os.getenv("GEOCODIFICACION_GAZETTEER", "")
+    GEOCODIFICACION_CACHE: str = os.getenv("GEOCODIFICACION_CACHE", "app/data/geocodificacion_cache.sqlite3")
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,107 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import Column, Table
+from app.models.config import VersionCatalogo, Zona
+from app.models.documento import Documento
+from app.models.inspeccion import Inspeccion, SincronizacionCampo
+from app.models.notificacion import RecordatorioVencimiento
+from app.models.solicitud import Solicitud
+
+# create_all (scripts de inicialización) no modifica tablas que ya existen: lo que
+# cada cambio de modelo agregue a una tabla anterior se lleva aquí. Todo se puede
+# ejecutar en cada arranque.
+
+
+# ============ AYUDAS ============
+
+def _literal(valor) -> str:
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+def _definicion(engine: Engine, columna: Column) -> str:
+    """Definición para ADD COLUMN; NOT NULL solo si hay un valor por defecto para las filas existentes"""
+    definicion = f"{columna.name} {columna.type.compile(engine.dialect)}"
+    valor = None
+    if columna.default is not None and columna.default.is_scalar:
+        valor = columna.default.arg
+    elif columna.server_default is not None and isinstance(getattr(columna.server_default, "arg", None), str):
+        valor = columna.server_default.arg
+    if valor is not None:
+        definicion += f" DEFAULT {_literal(valor)}"
+        if not columna.nullable:
+            definicion += " NOT NULL"
+    return definicion
+
+
+def crear_tablas(engine: Engine, *tablas: Table):
+    """Crea las tablas que todavía no existan"""
+    existentes = set(inspect(engine).get_table_names())
+    for tabla in tablas:
+        if tabla.name in existentes:
+            continue
+        tabla.create(engine, checkfirst=True)
+        print(f"🛠️ Tabla {tabla.name} creada")
+
+
+def agregar_columnas(engine: Engine, tabla: Table, nombres: list = None) -> list:
+    """
+    Agrega a una tabla existente las columnas del modelo que le falten
+    (nombres: solo esas; por defecto todas). Retorna las agregadas
+    """
+    if not inspect(engine).has_table(tabla.name):
+        return []
+    existentes = {columna["name"] for columna in inspect(engine).get_columns(tabla.name)}
+    agregadas = []
+    with engine.begin() as conexion:
+        for columna in tabla.columns:
+            if columna.name in existentes or (nombres is not None and columna.name not in nombres):
+                continue
+            conexion.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {_definicion(engine, columna)}"))
+            agregadas.append(columna.name)
+            print(f"🛠️ {tabla.name}: columna {columna.name} agregada")
+    return agregadas
+
+
+def crear_indices(engine: Engine, tabla: Table, nombres: list = None):
+    """Crea los índices del modelo que falten (nombres: solo esos; por defecto todos)"""
+    for indice in tabla.indexes:
+        if nombres is not None and indice.name not in nombres:
+            continue
+        try:
+            indice.create(engine, checkfirst=True)
+        except Exception as e:
+            print(f"⚠️ No se pudo crear el índice {indice.name}: {e}")
+
+
+# ============ ARRANQUE ============
+
+def preparar(engine: Engine):
+    """Lleva una base creada con una versión anterior al esquema actual de los modelos"""
+    # Documentos: hash del contenido (deduplicación) y búsqueda por ruta del blob
+    agregar_columnas(engine, Documento.__table__, ["hash_sha256"])
+    crear_indices(engine, Documento.__table__)
+
+    # Recordatorios de vencimiento: los ya encolados y el recorrido por fecha de vencimiento
+    crear_tablas(engine, RecordatorioVencimiento.__table__)
+    crear_indices(engine, Solicitud.__table__, ["ix_solicitudes_vencimiento", "ix_solicitudes_vencimiento_itse"])
+
+    # Versión de las tablas maestras (invalida las cachés del catálogo en todos los workers)
+    crear_tablas(engine, VersionCatalogo.__table__)
+
+    # Zonas: rubros permitidos (compatibilidad de zonificación)
+    agregar_columnas(engine, Zona.__table__, ["rubros_permitidos"])
+
+    # Inspecciones: horario de atención del local (rutas diarias)
+    agregar_columnas(engine, Inspeccion.__table__, ["ventana_desde", "ventana_hasta"])
+
+    # Modo de campo: versión de cada inspección (bloqueo optimista) y reenvíos ya aplicados
+    agregar_columnas(engine, Inspeccion.__table__, ["version"])
+    crear_tablas(engine, SincronizacionCampo.__table__)
+
+    # Campañas de re-inspección: negocios por próxima inspección e inspección pendiente de cada solicitud
+    crear_indices(engine, Solicitud.__table__, ["ix_solicitudes_proxima_inspeccion"])
+    crear_indices(engine, Inspeccion.__table__, ["ix_inspecciones_solicitud_estado"])
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -80,6 +80,21 @@ async def health_check():
         "database": "SQLite"
     }
 
+@app.get("/verificar/{clave}")
+async def verificar_licencia(clave: str, db: Session = Depends(get_db)):
+    """Verificación pública de una licencia por código verificador (el del PDF) o número de licencia"""
+    from app.services.consulta_service import ConsultaService
+    try:
+        tipo, _ = ConsultaService.clasificar(clave)
+        if tipo == "expediente":
+            raise ValueError("Use el código verificador o el número de licencia")
+        resultado = ConsultaService.buscar(db, clave, tipo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resultado is None or not resultado["numero_licencia"]:
+        raise HTTPException(status_code=404, detail="No existe una licencia con ese código")
+    return {campo: resultado[campo] for campo in ConsultaService.CAMPOS_PUBLICOS}
+
 # ============ RUTAS PROTEGIDAS ============
 
 @app.get("/portal/dashboard")
@@ -236,6 +251,53 @@ async def startup_event():
     print("✅ Routers cargados: auth, solicitud")
     print(f"🌐 Servidor: http://localhost:8000")
     print("=" * 60 + "\n")
+    
+    # Columnas e índices que create_all no agrega a las bases existentes
+    from app.database.connection import engine
+    from app.database import migraciones
+    migraciones.preparar(engine)
+    
+    # Worker que entrega las notificaciones encoladas (outbox)
+    from app.services.outbox_service import OutboxService
+    from app.services.smtp_service import SMTPService
+    from app.services.plantilla_service import PlantillaService
+    PlantillaService.compilar()
+    SMTPService.registrar()
+    OutboxService.preparar(engine)
+    OutboxService.iniciar()
+    
+    # Índice de texto completo de las solicitudes
+    from app.services.busqueda_service import BusquedaService
+    BusquedaService.preparar(engine)
+    
+    # Sugerencias del buscador (los cambios de nombre invalidan el índice en memoria)
+    from app.services.autocompletado_service import AutocompletadoService
+    AutocompletadoService.registrar()
+    
+    # Reportes PDF en caché (guardar solicitudes los invalida en todos los workers)
+    from app.services.reporte_pdf_service import ReportePDFService
+    ReportePDFService.registrar()
+    
+    # Consulta por expediente / licencia / código verificador (índice único y filtro de claves)
+    from app.services.consulta_service import ConsultaService
+    ConsultaService.preparar(engine)
+    
+    # Tareas periódicas (recordatorios, limpieza, outbox, cachés)
+    from app.services.planificador_service import PlanificadorService
+    PlanificadorService.preparar(engine)
+    PlanificadorService.registrar_predeterminadas()
+    PlanificadorService.iniciar()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.services.imagen_service import ImagenService
+    from app.services.outbox_service import OutboxService
+    from app.services.smtp_service import SMTPService
+    from app.services.planificador_service import PlanificadorService
+    ImagenService.cerrar()
+    await PlanificadorService.detener()
+    await OutboxService.detener()
+    await SMTPService.cerrar()
 
 # ============ PUNTO DE ENTRADA ============
 
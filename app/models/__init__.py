@@ -1,19 +1,21 @@
 from .user import User
-from .config import Rubro, Tarifa, Zona
+from .config import Rubro, Tarifa, Zona, VersionCatalogo
 from .solicitud import Solicitud, EstadoSolicitud  
 from .documento import Documento
 from .pago import Pago
 from .auditoria import Auditoria
-from .notificacion import Notificacion, TipoNotificacion, EstadoNotificacion  
-from .inspeccion import Inspeccion, EstadoInspeccion
+from .notificacion import Notificacion, TipoNotificacion, EstadoNotificacion, RecordatorioVencimiento
+from .inspeccion import Inspeccion, EstadoInspeccion, SincronizacionCampo
+from .tarea import TareaProgramada
 
 __all__ = [
-    "Inspeccion", "EstadoInspeccion",
+    "Inspeccion", "EstadoInspeccion", "SincronizacionCampo",
     "User",
-    "Rubro", "Tarifa", "Zona",
+    "Rubro", "Tarifa", "Zona", "VersionCatalogo",
     "Solicitud",
     "Documento",
     "Pago",
     "Auditoria",
-    "Notificacion", "TipoNotificacion", "EstadoNotificacion"  
+    "Notificacion", "TipoNotificacion", "EstadoNotificacion", "RecordatorioVencimiento",
+    "TareaProgramada"
 ]
\ No newline at end of file
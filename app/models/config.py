@@ -46,8 +46,18 @@ class Zona(Base):
     codigo = Column(String(10), unique=True, nullable=False)
     nombre = Column(String(100), nullable=False)
     descripcion = Column(Text, nullable=True)
+    rubros_permitidos = Column(Text, nullable=True)  # Rubros separados por coma (ej: "bodega, farmacia")
     
     # Auditoría
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    is_active = Column(Boolean, default=True)
\ No newline at end of file
+    is_active = Column(Boolean, default=True)
+
+class VersionCatalogo(Base):
+    """Versión de cada tabla maestra: se incrementa en cada cambio para invalidar las cachés de todos los workers"""
+    
+    __tablename__ = "versiones_catalogo"
+    
+    nombre = Column(String(50), primary_key=True)  # rubros, tarifas, zonas
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
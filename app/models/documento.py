@@ -16,10 +16,11 @@ class Documento(Base):
     tipo = Column(String(50), nullable=False)
     nombre = Column(String(255), nullable=False)
     descripcion = Column(Text, nullable=True)
-    ruta_archivo = Column(String(500), nullable=False)
+    ruta_archivo = Column(String(500), nullable=False, index=True)
     nombre_original = Column(String(255), nullable=False)
     mime_type = Column(String(100), nullable=False)
     tamaño_bytes = Column(Integer, nullable=False)
+    hash_sha256 = Column(String(64), nullable=True, index=True)
     
     es_obligatorio = Column(Boolean, default=True)
     esta_validado = Column(Boolean, default=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Float, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -16,6 +16,10 @@ class Inspeccion(Base):
     """Modelo para programación y realización de inspecciones ITSE"""
     
     __tablename__ = "inspecciones"
+    __table_args__ = (
+        # Inspección pendiente de una solicitud (evita programar dos veces en las campañas)
+        Index("ix_inspecciones_solicitud_estado", "solicitud_id", "estado"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     solicitud_id = Column(Integer, ForeignKey("solicitudes.id"), nullable=False)
@@ -28,6 +32,10 @@ class Inspeccion(Base):
     fecha_programada = Column(DateTime, nullable=False)
     fecha_realizada = Column(DateTime, nullable=True)
     
+    # Horario en que el local puede recibir la inspección (solo cuenta la hora)
+    ventana_desde = Column(DateTime, nullable=True)
+    ventana_hasta = Column(DateTime, nullable=True)
+    
     # Estado y resultado
     estado = Column(String(50), default=EstadoInspeccion.PROGRAMADA.value)
     resultado = Column(String(50), nullable=True)  # aprobado, observado, rechazado
@@ -53,5 +61,27 @@ class Inspeccion(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     fecha_vencimiento = Column(DateTime, nullable=True)  # Para cuando aprueba
     
+    # Control de concurrencia: cada UPDATE del ORM la incrementa y falla si otro la cambió antes.
+    # Los dispositivos de campo la devuelven al sincronizar para detectar conflictos.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    __mapper_args__ = {"version_id_col": version}
+    
     def __repr__(self):
-        return f"<Inspeccion {self.id} - Solicitud {self.solicitud_id}>"
\ No newline at end of file
+        return f"<Inspeccion {self.id} - Solicitud {self.solicitud_id}>"
+
+
+class SincronizacionCampo(Base):
+    """Resultado de inspección aplicado desde un dispositivo de campo (hace idempotente el reenvío)"""
+    
+    __tablename__ = "sincronizaciones_campo"
+    __table_args__ = (
+        UniqueConstraint("inspector_id", "clave", name="uq_sincronizacion_inspector_clave"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    inspector_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    clave = Column(String(64), nullable=False)  # Identificador que genera el dispositivo para cada resultado
+    inspeccion_id = Column(Integer, ForeignKey("inspecciones.id"), nullable=False)
+    respuesta = Column(Text, nullable=True)  # JSON devuelto la primera vez
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
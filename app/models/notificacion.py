@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -10,6 +10,7 @@ class TipoNotificacion(str, enum.Enum):
 
 class EstadoNotificacion(str, enum.Enum):
     PENDIENTE = "pendiente"
+    ENVIANDO = "enviando"
     ENVIADO = "enviado"
     FALLIDO = "fallido"
     LEIDO = "leido"
@@ -18,6 +19,10 @@ class Notificacion(Base):
     """Registro de notificaciones enviadas"""
     
     __tablename__ = "notificaciones"
+    __table_args__ = (
+        # Para que el worker encuentre rápido las pendientes que ya toca enviar
+        Index("ix_notificaciones_estado_proximo", "estado", "proximo_intento"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -29,13 +34,21 @@ class Notificacion(Base):
     # Contenido
     asunto = Column(String(255), nullable=True)
     mensaje = Column(Text, nullable=False)
+    mensaje_texto = Column(Text, nullable=True)  # parte de texto plano del email
     plantilla = Column(String(100), nullable=True)
+    eventos = Column(Text, nullable=True)  # JSON con los eventos agrupados en este email (resumen)
     
     # Estado
     estado = Column(Enum(EstadoNotificacion), default=EstadoNotificacion.PENDIENTE)
     fecha_envio = Column(DateTime, nullable=True)
     error = Column(Text, nullable=True)
     
+    # Outbox: reintentos y reserva por el worker de envío
+    intentos = Column(Integer, default=0, nullable=False)
+    proximo_intento = Column(DateTime, nullable=True)
+    reservado_por = Column(String(64), nullable=True)
+    reservado_hasta = Column(DateTime, nullable=True)
+    
     # Relación con solicitud (opcional)
     solicitud_id = Column(Integer, ForeignKey("solicitudes.id"), nullable=True)
     
@@ -43,4 +56,25 @@ class Notificacion(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     def __repr__(self):
-        return f"<Notificacion {self.tipo}: {self.destinatario}>"
\ No newline at end of file
+        return f"<Notificacion {self.tipo}: {self.destinatario}>"
+
+class RecordatorioVencimiento(Base):
+    """Recordatorios de vencimiento ya encolados (uno por solicitud, tipo, ventana y fecha)"""
+    
+    __tablename__ = "recordatorios_vencimiento"
+    __table_args__ = (
+        # Si la licencia se renueva cambia la fecha y vuelven a corresponder recordatorios
+        UniqueConstraint("solicitud_id", "tipo", "ventana_dias", "fecha_vencimiento",
+                         name="uq_recordatorio_vencimiento"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    solicitud_id = Column(Integer, ForeignKey("solicitudes.id"), nullable=False)
+    tipo = Column(String(20), nullable=False)  # licencia, itse
+    ventana_dias = Column(Integer, nullable=False)  # 90, 30, 7
+    fecha_vencimiento = Column(DateTime, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<RecordatorioVencimiento {self.tipo} {self.ventana_dias}d - Solicitud {self.solicitud_id}>"
\ No newline at end of file
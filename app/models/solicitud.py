@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -23,7 +23,17 @@ class Solicitud(Base):
     """Solicitudes de licencia de funcionamiento"""
     
     __tablename__ = "solicitudes"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Recordatorios de vencimiento: recorren rangos de fechas en orden (fecha, id)
+        Index("ix_solicitudes_vencimiento", "fecha_vencimiento", "id"),
+        Index("ix_solicitudes_vencimiento_itse", "vencimiento_itse", "id"),
+        # Campaña de re-inspección: negocios con la próxima inspección vencida, en orden
+        Index("ix_solicitudes_proxima_inspeccion", "proxima_inspeccion", "id"),
+        # Consulta por código verificador (ConsultaService) y solicitudes modificadas desde una fecha
+        Index("ux_solicitudes_codigo_verificador", "codigo_verificador", unique=True),
+        Index("ix_solicitudes_updated_at", "updated_at"),
+        {'extend_existing': True}
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     numero_expediente = Column(String(50), unique=True, index=True)
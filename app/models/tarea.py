@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float
+from app.database.connection import Base
+
+class TareaProgramada(Base):
+    """Estado compartido de cada tarea periódica: lease del ejecutor, próxima ejecución y métricas"""
+    
+    __tablename__ = "tareas_programadas"
+    
+    nombre = Column(String(100), primary_key=True)
+    
+    # Lease: solo el proceso que lo tiene vigente ejecuta la tarea
+    bloqueado_por = Column(String(100), nullable=True)
+    bloqueado_hasta = Column(DateTime, nullable=True)
+    
+    proxima_ejecucion = Column(DateTime, nullable=True)
+    
+    # Métricas
+    ejecuciones = Column(Integer, default=0, nullable=False)
+    fallos = Column(Integer, default=0, nullable=False)
+    ultima_ejecucion = Column(DateTime, nullable=True)
+    ultima_duracion = Column(Float, nullable=True)  # segundos
+    duracion_total = Column(Float, default=0, nullable=False)
+    ultimo_error = Column(Text, nullable=True)
+    ultimo_resultado = Column(Text, nullable=True)
+    
+    def __repr__(self):
+        return f"<TareaProgramada {self.nombre}>"
@@ -108,8 +108,9 @@ async def registro(
             )
         
         # Notificación de bienvenida
-        print(f"📧 Enviando email de bienvenida a: {user.email}")
+        print(f"📧 Encolando email de bienvenida a: {user.email}")
         await NotificacionService.notificar_bienvenida(db, user)
+        db.commit()
         
         # Login automático después de registro
         result, _ = AuthService.login_user(db, user_data["email"], user_data["password"])
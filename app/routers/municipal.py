@@ -1,22 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-import uuid
+from io import BytesIO
+import asyncio
+import gzip
+import hashlib
 import json
+import os
 from app.utils.security import create_access_token, get_password_hash
 from app.database.connection import get_db
-from app.utils.dependencies import get_current_funcionario
+from app.utils.dependencies import get_current_funcionario, get_current_inspector
 from app.models.user import User
 from app.models.solicitud import Solicitud, EstadoSolicitud
 from app.models.config import Rubro, Tarifa, Zona
 from app.models.pago import Pago
 from app.models.inspeccion import Inspeccion, EstadoInspeccion
 from app.services.notificacion_service import NotificacionService
+from app.services.outbox_service import OutboxService
+from app.services.recordatorio_service import RecordatorioService
+from app.services.planificador_service import PlanificadorService
 from app.services.auth_service import AuthService
 from app.services.inspeccion_service import InspeccionService
+from app.services.ruta_service import RutaService
+from app.services.calendario_service import CalendarioService, ConflictoHorario
+from app.services.fiscalizacion_service import FiscalizacionService
+from app.services.campo_service import CampoService
+from app.services.busqueda_service import BusquedaService
+from app.services.autocompletado_service import AutocompletadoService
+from app.services.consulta_service import ConsultaService
+from app.services.catalogo_service import CatalogoService
 from app.services.reporte_service import ReporteService
+from app.services.reporte_pdf_service import ReportePDFService
+from app.services.exportacion_service import ExportacionService
+from app.services.preevaluacion_service import PreevaluacionService
+from app.services.geocodificacion_service import GeocodificacionService
+from app.services.almacenamiento_service import AlmacenamientoService
+from app.services.archivo_service import ArchivoService
+from app.services.imagen_service import ImagenService
+from app.services.documento_service import DocumentoService, ArchivoRechazado
 
 router = APIRouter(prefix="/municipal", tags=["Back-Office Municipal"])
 templates = Jinja2Templates(directory="app/templates")
@@ -149,8 +172,8 @@ async def dashboard(
             Inspeccion.estado.in_(["programada", "en_curso"])
         ).order_by(Inspeccion.fecha_programada).limit(5).all()
         
-        # Tarifas vigentes
-        tarifas = db.query(Tarifa).filter(Tarifa.is_active == True).all()
+        # Tarifas vigentes (copia en memoria del catálogo)
+        tarifas = CatalogoService.tarifas()
         
         print(f"✅ Dashboard cargado - Total solicitudes: {total_solicitudes}")
         
@@ -202,11 +225,18 @@ async def lista_solicitudes(
                 query = query.filter(Solicitud.nivel_riesgo == riesgo)
         if distrito:
             query = query.filter(Solicitud.distrito == distrito)
+        orden = [Solicitud.created_at.desc()]
         if buscar:
-            query = query.filter(
-                (Solicitud.numero_expediente.contains(buscar)) |
-                (Solicitud.nombre_negocio.contains(buscar))
-            )
+            # Índice de texto completo (expediente, DNI/RUC, negocio, titular, rubro, dirección)
+            coincidencias = BusquedaService.coincidencias(buscar)
+            if coincidencias is not None:
+                query = query.join(coincidencias, coincidencias.c.id == Solicitud.id)
+                orden = [coincidencias.c.rango, Solicitud.id.desc()]
+            else:
+                query = query.filter(
+                    (Solicitud.numero_expediente.contains(buscar)) |
+                    (Solicitud.nombre_negocio.contains(buscar))
+                )
         
         # Total de registros (para paginación)
         total = query.count()
@@ -214,12 +244,11 @@ async def lista_solicitudes(
         # Paginación (20 por página)
         items_por_pagina = 20
         offset = (page - 1) * items_por_pagina
-        solicitudes = query.order_by(Solicitud.created_at.desc()).offset(offset).limit(items_por_pagina).all()
+        solicitudes = query.order_by(*orden).offset(offset).limit(items_por_pagina).all()
         
-        # Cargar relaciones para evitar N+1 queries
+        # Cargar relaciones para evitar N+1 queries (los rubros salen del catálogo en memoria)
         for s in solicitudes:
             db.query(User).filter(User.id == s.usuario_id).first()
-            db.query(Rubro).filter(Rubro.id == s.rubro_id).first()
         
         paginas = (total + items_por_pagina - 1) // items_por_pagina
         
@@ -229,6 +258,7 @@ async def lista_solicitudes(
                 "request": request,
                 "user": current_user,
                 "solicitudes": solicitudes,
+                "rubros": CatalogoService.rubros_por_id(),
                 "total_solicitudes": total,
                 "pagina_actual": page,
                 "paginas": paginas,
@@ -247,6 +277,61 @@ async def lista_solicitudes(
         traceback.print_exc()
         return RedirectResponse(url="/municipal/dashboard", status_code=302)
 
+@router.get("/api/solicitudes/buscar")
+async def api_buscar_solicitudes(
+    q: str,
+    limite: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Solicitudes más relevantes para el texto, por expediente, DNI/RUC, negocio, titular, rubro o dirección"""
+    if not 1 <= limite <= 100:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 100")
+    rubros = CatalogoService.rubros_por_id()
+    return {
+        "motor": BusquedaService.estadisticas()["motor"] or "like",
+        "resultados": [
+            {
+                "id": s.id,
+                "numero_expediente": s.numero_expediente,
+                "numero_licencia": s.numero_licencia,
+                "nombre_negocio": s.nombre_negocio,
+                "titular": s.usuario.nombre_completo() if s.usuario else None,
+                "rubro": rubros[s.rubro_id].nombre if s.rubro_id in rubros else None,
+                "direccion": s.direccion_negocio,
+                "estado": s.estado
+            }
+            for s in BusquedaService.buscar(db, q, limite)
+        ]
+    }
+
+@router.get("/api/autocompletar")
+async def api_autocompletar(
+    q: str,
+    limite: int = 8,
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Nombres de negocio y de titulares parecidos a lo escrito (tolera errores de tipeo y tildes)"""
+    if not 1 <= limite <= 20:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 20")
+    return AutocompletadoService.sugerir(q, limite)
+
+@router.get("/api/consulta")
+async def api_consulta(
+    clave: str,
+    tipo: str = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Solicitud por número de expediente, número de licencia o código verificador (tipo se deduce del formato)"""
+    try:
+        resultado = ConsultaService.buscar(db, clave, tipo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="No se encontró ninguna solicitud con esa clave")
+    return resultado
+
 @router.get("/solicitud/{solicitud_id}", response_class=HTMLResponse)
 async def detalle_solicitud(
     solicitud_id: int,
@@ -263,7 +348,7 @@ async def detalle_solicitud(
         
         # Cargar relaciones
         usuario = db.query(User).filter(User.id == solicitud.usuario_id).first()
-        rubro = db.query(Rubro).filter(Rubro.id == solicitud.rubro_id).first()
+        rubro = CatalogoService.rubro(solicitud.rubro_id)
         
         # Verificar si tiene inspecciones
         inspecciones = db.query(Inspeccion).filter(Inspeccion.solicitud_id == solicitud_id).all()
@@ -303,23 +388,24 @@ async def emitir_licencia(
         
         # Generar número de licencia
         numero_licencia = f"LIC-{datetime.now().strftime('%Y%m%d')}-{solicitud_id:06d}"
-        codigo_verificador = str(uuid.uuid4())[:8].upper()
+        codigo_verificador = ConsultaService.nuevo_codigo(db)
         
         solicitud.estado = "licencia_emitida"
         solicitud.numero_licencia = numero_licencia
         solicitud.fecha_emision = datetime.now()
         solicitud.fecha_vencimiento = datetime.now().replace(year=datetime.now().year + 2)
         solicitud.codigo_verificador = codigo_verificador
-        db.commit()
-        
-        print(f"✅ Licencia emitida: {numero_licencia}")
         
-        # Notificar al ciudadano
+        # Notificar al ciudadano (se encola en la misma transacción)
         try:
             await NotificacionService.notificar_licencia_emitida(db, solicitud.usuario, solicitud)
         except Exception as e:
             print(f"⚠️ Error en notificación: {e}")
         
+        db.commit()
+        
+        print(f"✅ Licencia emitida: {numero_licencia}")
+        
         return RedirectResponse(url=f"/municipal/solicitud/{solicitud_id}", status_code=302)
         
     except Exception as e:
@@ -340,7 +426,6 @@ async def iniciar_revision(
     solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
     if solicitud:
         solicitud.estado = "en_revision"
-        db.commit()
         
         # Notificar al ciudadano
         await NotificacionService.notificar_cambio_estado(
@@ -350,6 +435,7 @@ async def iniciar_revision(
             "en_revision",
             "Su solicitud está siendo revisada por nuestros funcionarios."
         )
+        db.commit()
     
     return RedirectResponse(url=f"/municipal/solicitud/{solicitud_id}", status_code=302)
 
@@ -368,7 +454,6 @@ async def aprobar_solicitud(
     solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
     if solicitud:
         solicitud.estado = "aprobado"
-        db.commit()
         
         # Notificar al ciudadano
         mensaje = f"Su solicitud ha sido APROBADA. {comentarios}"
@@ -379,6 +464,7 @@ async def aprobar_solicitud(
             "aprobado",
             mensaje
         )
+        db.commit()
     
     return RedirectResponse(url="/municipal/solicitudes", status_code=302)
 
@@ -398,7 +484,6 @@ async def rechazar_solicitud(
     if solicitud:
         solicitud.estado = "rechazado"
         solicitud.observaciones_zonificacion = motivo  # Usamos este campo para guardar el motivo
-        db.commit()
         
         # Notificar al ciudadano
         mensaje = f"Su solicitud ha sido RECHAZADA. Motivo: {motivo}"
@@ -409,6 +494,7 @@ async def rechazar_solicitud(
             "rechazado",
             mensaje
         )
+        db.commit()
     
     return RedirectResponse(url="/municipal/solicitudes", status_code=302)
 
@@ -441,10 +527,28 @@ async def lista_inspecciones(
         }
     )
 
+def _form_programacion(request: Request, db: Session, current_user: User, solicitud: Solicitud,
+                       fecha: datetime, error: str = None, status_code: int = 200):
+    """Formulario de programación con los inspectores ordenados por disponibilidad y carga"""
+    return templates.TemplateResponse(
+        "municipal/programar_inspeccion.html",
+        {
+            "request": request,
+            "user": current_user,
+            "solicitud": solicitud,
+            "disponibilidad": CalendarioService.disponibilidad(db, fecha, solicitud.nivel_riesgo),
+            "fecha": fecha.strftime("%Y-%m-%dT%H:%M"),
+            "fecha_minima": datetime.now().strftime("%Y-%m-%dT%H:%M"),
+            "error": error
+        },
+        status_code=status_code
+    )
+
 @router.get("/inspecciones/programar/{solicitud_id}", response_class=HTMLResponse)
 async def programar_inspeccion_form(
     solicitud_id: int,
     request: Request,
+    fecha: str = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_funcionario)
 ):
@@ -454,19 +558,12 @@ async def programar_inspeccion_form(
     if not solicitud:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
     
-    # Obtener inspectores disponibles
-    inspectores = db.query(User).filter(User.tipo_usuario == "inspector").all()
+    try:
+        fecha = datetime.fromisoformat(fecha) if fecha else datetime.now().replace(second=0, microsecond=0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
     
-    return templates.TemplateResponse(
-        "municipal/programar_inspeccion.html",
-        {
-            "request": request,
-            "user": current_user,
-            "solicitud": solicitud,
-            "inspectores": inspectores,
-            "fecha_minima": datetime.now().strftime("%Y-%m-%dT%H:%M")
-        }
-    )
+    return _form_programacion(request, db, current_user, solicitud, fecha)
 
 @router.post("/inspecciones/programar/{solicitud_id}")
 async def programar_inspeccion(
@@ -483,15 +580,226 @@ async def programar_inspeccion(
     
     fecha = datetime.fromisoformat(fecha_str)
     
-    inspeccion = InspeccionService.programar_inspeccion(
-        db, 
-        solicitud_id, 
-        fecha, 
-        int(inspector_id) if inspector_id else None
-    )
+    # Horario de atención del local (opcional): lo usa el optimizador de rutas
+    try:
+        ventana_desde, ventana_hasta = (
+            datetime.combine(fecha.date(), datetime.strptime(form.get(campo), "%H:%M").time())
+            if form.get(campo) else None
+            for campo in ("hora_desde", "hora_hasta")
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Horario de atención inválido (use HH:MM)")
+    
+    def conflicto(solicitud, inspecciones):
+        return _form_programacion(
+            request, db, current_user, solicitud, fecha,
+            error=f"El inspector ya tiene {len(inspecciones)} inspección(es) en ese horario "
+                  f"(#{', #'.join(str(i) for i in inspecciones)}). Elija otro inspector u otra hora.",
+            status_code=409
+        )
+    
+    # El inspector elegido no puede tener otra inspección en ese horario (primero la
+    # agenda en memoria; programar_inspeccion lo vuelve a verificar en la base)
+    if inspector_id:
+        solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
+        if not solicitud:
+            raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+        conflictos = CalendarioService.conflictos(int(inspector_id), fecha, solicitud.nivel_riesgo)
+        if conflictos:
+            return conflicto(solicitud, conflictos)
+    
+    try:
+        inspeccion = InspeccionService.programar_inspeccion(
+            db, 
+            solicitud_id, 
+            fecha, 
+            int(inspector_id) if inspector_id else None,
+            ventana_desde=ventana_desde,
+            ventana_hasta=ventana_hasta
+        )
+    except ConflictoHorario as e:
+        db.rollback()
+        return conflicto(solicitud, e.inspecciones)
     
     return RedirectResponse(url=f"/municipal/inspeccion/{inspeccion.id}", status_code=302)
 
+@router.get("/api/inspecciones/disponibilidad")
+async def disponibilidad_inspectores(
+    inicio: str,
+    solicitud_id: int = None,
+    nivel_riesgo: str = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """
+    Inspectores para una inspección que empieza en `inicio` (ISO, ej. 2026-10-20T09:30):
+    conflictos de horario de cada uno, carga del día y de la semana, y el sugerido.
+    La duración sale del nivel de riesgo (de la solicitud o el indicado).
+    """
+    try:
+        fecha = datetime.fromisoformat(inicio)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida")
+    
+    if solicitud_id is not None:
+        solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
+        if not solicitud:
+            raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+        nivel_riesgo = solicitud.nivel_riesgo
+    
+    return CalendarioService.disponibilidad(db, fecha, nivel_riesgo)
+
+@router.post("/api/inspecciones/rutas")
+async def planificar_rutas(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """
+    Rutas diarias de los inspectores para las inspecciones programadas pendientes.
+    Cuerpo JSON (todo opcional): {"desde": "2026-10-20", "dias": 1, "aplicar": false,
+    "inspectores": [{"id": 5, "desde": "09:00", "hasta": "13:00"}]}
+    """
+    try:
+        datos = await request.json() if await request.body() else {}
+        desde = datetime.strptime(datos["desde"], "%Y-%m-%d").date() if datos.get("desde") else datetime.now().date()
+        dias = int(datos.get("dias", 1))
+        if not 1 <= dias <= 30:
+            raise ValueError("dias debe estar entre 1 y 30")
+        return await asyncio.to_thread(
+            RutaService.planificar, db, desde, dias,
+            inspectores=datos.get("inspectores"),
+            aplicar=bool(datos.get("aplicar", False))
+        )
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/api/fiscalizacion/campania")
+async def programar_campania_itse(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """
+    Campaña de re-inspección: programa en bloque las inspecciones de los negocios con
+    proxima_inspeccion vencida o por vencer. Cuerpo JSON (todo opcional):
+    {"desde": "2026-11-02", "dias": 20, "inspectores": [5, 6], "niveles": ["alto", "muy_alto"], "aplicar": false}
+    """
+    try:
+        datos = await request.json() if await request.body() else {}
+        desde = datetime.strptime(datos["desde"], "%Y-%m-%d").date() if datos.get("desde") else datetime.now().date()
+        dias = int(datos.get("dias", 20))
+        if not 1 <= dias <= 250:
+            raise ValueError("dias debe estar entre 1 y 250")
+        return await asyncio.to_thread(
+            FiscalizacionService.programar_campania, db, desde, dias,
+            inspectores=datos.get("inspectores"),
+            niveles=datos.get("niveles"),
+            aplicar=bool(datos.get("aplicar", False))
+        )
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ============ MODO DE CAMPO (INSPECTORES SIN CONEXIÓN) ============
+
+def _inspector_de_campo(db: Session, current_user: User, inspector_id: int = None) -> User:
+    """El inspector conectado; un funcionario puede indicar otro inspector"""
+    if current_user.tipo_usuario == "inspector" or inspector_id is None or inspector_id == current_user.id:
+        return current_user
+    inspector = db.query(User).filter(User.id == inspector_id, User.tipo_usuario == "inspector").first()
+    if not inspector:
+        raise HTTPException(status_code=404, detail="Inspector no encontrado")
+    return inspector
+
+@router.get("/api/campo/paquete")
+async def paquete_campo(
+    request: Request,
+    dias: int = None,
+    inspector_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_inspector)
+):
+    """
+    Inspecciones asignadas para trabajar sin conexión (filas compactas, ver "campos").
+    Con If-None-Match responde 304 si el paquete no cambió; se comprime con gzip si el
+    dispositivo lo acepta.
+    """
+    if dias is not None and not 1 <= dias <= 14:
+        raise HTTPException(status_code=400, detail="dias debe estar entre 1 y 14")
+    
+    inspector = _inspector_de_campo(db, current_user, inspector_id)
+    cuerpo = json.dumps(
+        CampoService.paquete(db, inspector, dias), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    etag = f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"'
+    cabeceras = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=cabeceras)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        cuerpo = gzip.compress(cuerpo)
+        cabeceras["Content-Encoding"] = "gzip"
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+@router.post("/api/campo/fotos/faltantes")
+async def fotos_faltantes_campo(
+    request: Request,
+    current_user: User = Depends(get_current_inspector)
+):
+    """Cuerpo: {"sha256": [...]}. Retorna las fotos que el servidor todavía no tiene"""
+    try:
+        hashes = (await request.json())["sha256"]
+        if not isinstance(hashes, list) or not all(isinstance(h, str) and CampoService.PATRON_SHA256.match(h) for h in hashes):
+            raise ValueError("sha256 debe ser una lista de hashes SHA-256 en hexadecimal")
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"faltantes": CampoService.fotos_faltantes(hashes)}
+
+@router.post("/api/campo/fotos")
+async def subir_fotos_campo(
+    request: Request,
+    current_user: User = Depends(get_current_inspector)
+):
+    """
+    Fotos tomadas sin conexión (multipart, varias por envío). Se guardan en el almacén
+    por contenido; la sincronización las referencia por su SHA-256.
+    """
+    try:
+        _, archivos = await DocumentoService.recibir_multipart(request, extensiones=ImagenService.EXTENSIONES)
+    except ArchivoRechazado as e:
+        print(f"⚠️ Fotos de campo rechazadas - Usuario {current_user.id}: {e.mensaje}")
+        raise HTTPException(status_code=e.status_code, detail=e.mensaje)
+    if not archivos:
+        raise HTTPException(status_code=400, detail="No se recibió ninguna foto")
+    
+    guardadas = []
+    for archivo in archivos:
+        sha256 = archivo.sha256.hexdigest()
+        AlmacenamientoService.guardar(archivo.ruta_temporal, sha256)
+        guardadas.append(sha256)
+    
+    return {"sha256": guardadas}
+
+@router.post("/api/campo/sincronizar")
+async def sincronizar_campo(
+    request: Request,
+    inspector_id: int = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_inspector)
+):
+    """
+    Resultados registrados sin conexión, aplicados en una sola transacción.
+    Cuerpo: {"resultados": [...]} (formato en CampoService.sincronizar). Reenviar el mismo
+    lote es seguro: lo ya aplicado vuelve como "duplicado".
+    """
+    inspector = _inspector_de_campo(db, current_user, inspector_id)
+    try:
+        datos = await request.json()
+        return CampoService.sincronizar(db, inspector, datos["resultados"])
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/inspeccion/{inspeccion_id}", response_class=HTMLResponse)
 async def detalle_inspeccion(
     inspeccion_id: int,
@@ -510,10 +818,99 @@ async def detalle_inspeccion(
         {
             "request": request,
             "user": current_user,
-            "inspeccion": inspeccion
+            "inspeccion": inspeccion,
+            "fotos": {
+                "antes": ArchivoService.fotos_inspeccion(inspeccion, "antes"),
+                "despues": ArchivoService.fotos_inspeccion(inspeccion, "despues")
+            }
         }
     )
 
+@router.get("/inspeccion/{inspeccion_id}/foto/{momento}/{indice}")
+async def ver_foto_inspeccion(
+    inspeccion_id: int,
+    momento: str,
+    indice: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario),
+    tamaño: str = "original"
+):
+    """Servir una foto de la inspección (momento: antes | despues; tamaño: mini | media | grande | original)"""
+    
+    if momento not in ["antes", "despues"]:
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    if tamaño != "original" and tamaño not in ImagenService.TAMAÑOS:
+        raise HTTPException(status_code=400, detail=f"Tamaño no válido: {tamaño}")
+    
+    inspeccion = db.query(Inspeccion).filter(Inspeccion.id == inspeccion_id).first()
+    if not inspeccion:
+        raise HTTPException(status_code=404, detail="Inspección no encontrada")
+    
+    fotos = ArchivoService.fotos_inspeccion(inspeccion, momento)
+    if indice < 0 or indice >= len(fotos):
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    
+    original = ArchivoService.resolver_ruta(fotos[indice])
+    if not original or not os.path.exists(original):
+        raise HTTPException(status_code=404, detail="Archivo no disponible")
+    
+    if tamaño == "original":
+        respuesta = ArchivoService.responder(request, original, media_type=ImagenService.tipo_mime(original))
+    else:
+        try:
+            derivado = await ImagenService.obtener_derivado(original, tamaño)
+        except Exception as e:
+            print(f"❌ Error generando miniatura de {original}: {e}")
+            raise HTTPException(status_code=415, detail="No se pudo procesar la imagen")
+        respuesta = ArchivoService.responder(request, derivado, media_type="image/jpeg")
+    
+    if respuesta is None:
+        raise HTTPException(status_code=404, detail="Archivo no disponible")
+    
+    return respuesta
+
+@router.post("/inspeccion/{inspeccion_id}/fotos")
+async def subir_fotos_inspeccion(
+    inspeccion_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Subir fotos de la inspección; las miniaturas se generan en segundo plano"""
+    
+    inspeccion = db.query(Inspeccion).filter(Inspeccion.id == inspeccion_id).first()
+    if not inspeccion:
+        raise HTTPException(status_code=404, detail="Inspección no encontrada")
+    
+    try:
+        campos, archivos = await DocumentoService.recibir_multipart(request, extensiones=ImagenService.EXTENSIONES)
+    except ArchivoRechazado as e:
+        print(f"⚠️ Fotos rechazadas - Inspección {inspeccion_id}: {e.mensaje}")
+        raise HTTPException(status_code=e.status_code, detail=e.mensaje)
+    
+    momento = campos.get("momento", "antes")
+    if momento not in ["antes", "despues"]:
+        for archivo in archivos:
+            archivo.descartar()
+        raise HTTPException(status_code=400, detail="momento debe ser 'antes' o 'despues'")
+    if not archivos:
+        raise HTTPException(status_code=400, detail="No se recibió ninguna foto")
+    
+    rutas = []
+    for archivo in archivos:
+        ruta, _ = AlmacenamientoService.guardar(archivo.ruta_temporal, archivo.sha256.hexdigest())
+        rutas.append(ruta)
+    
+    fotos = ArchivoService.fotos_inspeccion(inspeccion, momento) + rutas
+    setattr(inspeccion, f"fotos_{momento}", json.dumps(fotos))
+    db.commit()
+    
+    ImagenService.programar(rutas)
+    print(f"📷 {len(rutas)} foto(s) subida(s) - Inspección {inspeccion_id} ({momento})")
+    
+    return RedirectResponse(url=f"/municipal/inspeccion/{inspeccion_id}/realizar", status_code=302)
+
 @router.get("/inspeccion/{inspeccion_id}/realizar", response_class=HTMLResponse)
 async def realizar_inspeccion_form(
     inspeccion_id: int,
@@ -531,6 +928,7 @@ async def realizar_inspeccion_form(
     if not inspeccion.inspector_id:
         inspeccion.inspector_id = current_user.id
         inspeccion.estado = "en_curso"
+        CalendarioService.invalidar(db, inspeccion)
         db.commit()
     
     return templates.TemplateResponse(
@@ -584,13 +982,15 @@ async def aprobar_inspeccion(
     # Cambiar estado
     inspeccion.estado = "aprobada"
     inspeccion.resultado = "aprobado"
+    CalendarioService.invalidar(db, inspeccion)
     db.commit()
     
     # Actualizar solicitud
     solicitud = inspeccion.solicitud
     solicitud.itse_aprobado = True
     solicitud.estado = "itse_aprobado"
-    db.commit()
+    solicitud.fecha_ultima_inspeccion = datetime.now()
+    solicitud.proxima_inspeccion = FiscalizacionService.proxima_inspeccion(solicitud.fecha_ultima_inspeccion)
     
     # Notificar al ciudadano
     await NotificacionService.notificar_cambio_estado(
@@ -600,6 +1000,7 @@ async def aprobar_inspeccion(
         "itse_aprobado",
         "¡Felicitaciones! Su inspección ITSE ha sido APROBADA. Puede continuar con el trámite de su licencia."
     )
+    db.commit()
     
     return RedirectResponse(url=f"/municipal/inspeccion/{inspeccion_id}", status_code=302)
 
@@ -623,13 +1024,13 @@ async def rechazar_inspeccion(
     inspeccion.estado = "rechazada"
     inspeccion.resultado = "rechazado"
     inspeccion.observaciones = motivo
+    CalendarioService.invalidar(db, inspeccion)
     db.commit()
     
     # Actualizar solicitud
     solicitud = inspeccion.solicitud
     solicitud.estado = "rechazado"
     solicitud.observaciones_zonificacion = f"INSPECCIÓN RECHAZADA: {motivo}"
-    db.commit()
     
     # Notificar al ciudadano
     await NotificacionService.notificar_cambio_estado(
@@ -639,11 +1040,21 @@ async def rechazar_inspeccion(
         "rechazado",
         f"Su inspección ITSE ha sido RECHAZADA. Motivo: {motivo}"
     )
+    db.commit()
     
     return RedirectResponse(url=f"/municipal/inspeccion/{inspeccion_id}", status_code=302)
 
 # ============ REPORTES Y ESTADÍSTICAS ============
 
+def _fecha_parametro(valor: str, nombre: str):
+    """Fecha AAAA-MM-DD de un parámetro de consulta (None si no vino); 400 si no es válida"""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{nombre} debe tener el formato AAAA-MM-DD")
+
 @router.get("/reportes", response_class=HTMLResponse)
 async def reportes(
     request: Request,
@@ -656,8 +1067,8 @@ async def reportes(
     """Página de reportes y estadísticas"""
     
     # Procesar fechas
-    fecha_desde = datetime.strptime(desde, "%Y-%m-%d") if desde else None
-    fecha_hasta = datetime.strptime(hasta, "%Y-%m-%d") if hasta else None
+    fecha_desde = _fecha_parametro(desde, "desde")
+    fecha_hasta = _fecha_parametro(hasta, "hasta")
     
     # Obtener estadísticas
     stats = ReporteService.get_estadisticas_generales(db, fecha_desde, fecha_hasta)
@@ -718,22 +1129,248 @@ async def reportes(
 @router.get("/reportes/pdf")
 async def reportes_pdf(
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_funcionario)
+    current_user: User = Depends(get_current_funcionario),
+    desde: str = None,
+    hasta: str = None,
+    periodo: str = "mensual"
 ):
-    """Exportar reportes a PDF"""
-    # Implementar con ReportLab
-    return {"mensaje": "Exportar a PDF - En desarrollo"}
+    """Exportar reportes a PDF (con caché por rango de fechas y período)"""
+    
+    fecha_desde = _fecha_parametro(desde, "desde")
+    fecha_hasta = _fecha_parametro(hasta, "hasta")
+    
+    pdf = await ReportePDFService.obtener_reporte(fecha_desde, fecha_hasta, periodo)
+    
+    filename = f"reporte_licencias_{datetime.now().strftime('%Y%m%d')}.pdf"
+    
+    return StreamingResponse(
+        BytesIO(pdf),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 @router.get("/reportes/excel")
 async def reportes_excel(
     request: Request,
+    current_user: User = Depends(get_current_funcionario),
+    formato: str = "xlsx",
+    dataset: str = "solicitudes",
+    columnas: str = None,
+    desde: str = None,
+    hasta: str = None,
+    estado: str = None,
+    riesgo: str = None,
+    distrito: str = None,
+    metodo_pago: str = None
+):
+    """Exportar solicitudes o pagos a Excel/CSV en streaming"""
+    
+    fecha_hasta = _fecha_parametro(hasta, "hasta")
+    filtros = {
+        "desde": _fecha_parametro(desde, "desde"),
+        "hasta": fecha_hasta + timedelta(days=1) if fecha_hasta else None,
+        "estado": estado,
+        "riesgo": riesgo,
+        "distrito": distrito,
+        "metodo_pago": metodo_pago
+    }
+    lista_columnas = [c.strip() for c in columnas.split(",") if c.strip()] if columnas else None
+    
+    try:
+        contenido, media_type, extension = ExportacionService.exportar(
+            dataset, formato, lista_columnas, filtros
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}"
+    
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ============ PRE-EVALUACIÓN POR LOTE ============
+
+@router.post("/api/preevaluacion")
+async def preevaluacion_lote(
+    request: Request,
+    current_user: User = Depends(get_current_funcionario),
+    formato: str = "json"
+):
+    """
+    Riesgo y zonificación de una planilla de negocios (gremios, Cámara de Comercio).
+    Entrada: JSON ([{...}] o {"negocios": [...]}), CSV en el cuerpo o archivo CSV en
+    el campo "archivo" de un formulario. Salida: JSON o CSV (?formato=csv) en streaming.
+    """
+    tipo = request.headers.get("content-type", "")
+    try:
+        if tipo.startswith("application/json"):
+            try:
+                datos = await request.json()
+            except ValueError:
+                raise ValueError("JSON inválido")
+            filas = PreevaluacionService.leer_json(datos)
+        elif tipo.startswith("multipart/form-data"):
+            form = await request.form()
+            archivo = form.get("archivo")
+            if archivo is None or not hasattr(archivo, "read"):
+                raise ValueError("Falta el archivo CSV en el campo 'archivo'")
+            filas = await asyncio.to_thread(PreevaluacionService.leer_csv, await archivo.read())
+        else:
+            filas = await asyncio.to_thread(PreevaluacionService.leer_csv, await request.body())
+        
+        contenido, media_type, extension = PreevaluacionService.preevaluar(filas, formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    print(f"📋 Pre-evaluación por lote: {len(filas)} negocio(s) - {current_user.email}")
+    filename = f"preevaluacion_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}"
+    
+    return StreamingResponse(
+        contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ============ GEOCODIFICACIÓN DE DIRECCIONES ============
+
+@router.get("/api/geocodificacion")
+async def probar_geocodificacion(
+    current_user: User = Depends(get_current_funcionario),
+    direccion: str = None,
+    distrito: str = None
+):
+    """Coordenadas de una dirección según el gazetteer local, y estado de la caché"""
+    return {
+        "resultado": GeocodificacionService.geocodificar(direccion, distrito) if direccion else None,
+        "estadisticas": GeocodificacionService.estadisticas()
+    }
+
+@router.post("/api/geocodificacion/gazetteer")
+async def importar_gazetteer(
+    request: Request,
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Importar un gazetteer nuevo (CSV: via, distrito, cuadra, latitud, longitud)"""
+    
+    form = await request.form()
+    archivo = form.get("archivo")
+    if archivo is None or not hasattr(archivo, "read"):
+        raise HTTPException(status_code=400, detail="Falta el archivo CSV en el campo 'archivo'")
+    
+    try:
+        resultado = await asyncio.to_thread(GeocodificacionService.importar, await archivo.read())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    print(f"🧭 Gazetteer importado por {current_user.email}: {resultado['vias']} vía(s)")
+    return resultado
+
+# ============ ALMACENAMIENTO DE DOCUMENTOS ============
+
+@router.get("/api/almacenamiento")
+async def estadisticas_almacenamiento(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Deduplicación de documentos: tasa y espacio ahorrado"""
+    return AlmacenamientoService.estadisticas(db)
+
+@router.post("/api/almacenamiento/recolectar")
+async def recolectar_almacenamiento(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario),
+    simular: bool = False
+):
+    """Eliminar blobs que ya no referencia ningún documento"""
+    return AlmacenamientoService.recolectar_huerfanos(db, simular=simular)
+
+@router.get("/api/imagenes")
+async def estadisticas_imagenes(
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Miniaturas de fotos: tasa de procesamiento y bytes ahorrados"""
+    return ImagenService.estadisticas()
+
+@router.post("/api/imagenes/procesar")
+async def procesar_imagenes(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Generar las miniaturas que falten para todas las fotos de inspección"""
+    
+    rutas = []
+    for inspeccion in db.query(Inspeccion).filter(
+        (Inspeccion.fotos_antes.isnot(None)) | (Inspeccion.fotos_despues.isnot(None))
+    ).all():
+        for momento in ["antes", "despues"]:
+            for foto in ArchivoService.fotos_inspeccion(inspeccion, momento):
+                ruta = ArchivoService.resolver_ruta(foto)
+                if ruta:
+                    rutas.append(ruta)
+    
+    resumen = await ImagenService.procesar(rutas)
+    print(f"🖼️ Miniaturas: {resumen['procesadas']} foto(s) en {resumen['segundos']} s")
+    return {"lote": resumen, "acumulado": ImagenService.estadisticas()}
+
+# ============ NOTIFICACIONES (OUTBOX) ============
+
+@router.get("/api/notificaciones/outbox")
+async def estado_outbox(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Notificaciones por estado, pendiente más antigua y descartadas (dead letter)"""
+    return OutboxService.estadisticas(db)
+
+@router.post("/api/notificaciones/{notificacion_id}/reintentar")
+async def reintentar_notificacion(
+    notificacion_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_funcionario)
 ):
-    """Exportar reportes a Excel"""
-    # Implementar con openpyxl
-    return {"mensaje": "Exportar a Excel - En desarrollo"}
+    """Volver a encolar una notificación descartada"""
+    if not OutboxService.reintentar(db, notificacion_id):
+        raise HTTPException(status_code=404, detail="No hay una notificación descartada con ese ID")
+    return {"message": "Notificación encolada nuevamente", "id": notificacion_id}
+
+@router.get("/api/recordatorios")
+async def estado_recordatorios(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Recordatorios de vencimiento pendientes por ventana y ya enviados"""
+    return RecordatorioService.estadisticas(db)
+
+@router.post("/api/recordatorios/ejecutar")
+async def ejecutar_recordatorios(
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Correr ahora la campaña de recordatorios de vencimiento"""
+    return await asyncio.to_thread(RecordatorioService.ejecutar)
+
+# ============ TAREAS PROGRAMADAS ============
+
+@router.get("/api/tareas")
+async def estado_tareas(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Tareas periódicas: disparador, próxima ejecución, duración y fallos"""
+    return PlanificadorService.estado(db)
+
+@router.post("/api/tareas/{nombre}/ejecutar")
+async def ejecutar_tarea(
+    nombre: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Adelantar una tarea: la ejecuta el primer worker que la vea (en segundos)"""
+    if not PlanificadorService.forzar(db, nombre):
+        raise HTTPException(status_code=404, detail="Tarea no registrada o planificador desactivado")
+    return {"message": "Tarea programada para ahora", "nombre": nombre}
 
 # ============ CONFIGURACIÓN Y TABLAS MAESTRAS ============
 
@@ -782,6 +1419,7 @@ async def crear_rubro(
     )
     
     db.add(nuevo_rubro)
+    CatalogoService.invalidar(db, "rubros")
     db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
@@ -804,6 +1442,7 @@ async def editar_rubro(
         rubro.descripcion = form.get("descripcion")
         rubro.nivel_riesgo = form.get("nivel_riesgo")
         rubro.requiere_itse_previa = form.get("requiere_itse_previa") == "on"
+        CatalogoService.invalidar(db, "rubros")
         db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
@@ -819,6 +1458,7 @@ async def eliminar_rubro(
     rubro = db.query(Rubro).filter(Rubro.id == rubro_id).first()
     if rubro:
         rubro.is_active = False
+        CatalogoService.invalidar(db, "rubros")
         db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
@@ -843,6 +1483,7 @@ async def crear_tarifa(
     )
     
     db.add(nueva_tarifa)
+    CatalogoService.invalidar(db, "tarifas")
     db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
@@ -862,6 +1503,7 @@ async def editar_tarifa(
     if tarifa:
         tarifa.monto = float(form.get("monto"))
         tarifa.descripcion = form.get("descripcion")
+        CatalogoService.invalidar(db, "tarifas")
         db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
@@ -881,13 +1523,44 @@ async def crear_zona(
     nueva_zona = Zona(
         codigo=form.get("codigo"),
         nombre=form.get("nombre"),
-        descripcion=form.get("descripcion")
+        descripcion=form.get("descripcion"),
+        rubros_permitidos=form.get("rubros_permitidos")
     )
     
     db.add(nueva_zona)
+    CatalogoService.invalidar(db, "zonas")
     db.commit()
     
     return RedirectResponse(url="/municipal/configuracion", status_code=302)
+
+@router.post("/configuracion/zonas/{zona_id}/editar")
+async def editar_zona(
+    zona_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Editar una zona existente (los cambios de rubros permitidos se aplican sin reiniciar)"""
+    
+    form = await request.form()
+    
+    zona = db.query(Zona).filter(Zona.id == zona_id).first()
+    if zona:
+        zona.codigo = form.get("codigo")
+        zona.nombre = form.get("nombre")
+        zona.descripcion = form.get("descripcion")
+        zona.rubros_permitidos = form.get("rubros_permitidos")
+        CatalogoService.invalidar(db, "zonas")
+        db.commit()
+    
+    return RedirectResponse(url="/municipal/configuracion", status_code=302)
+
+@router.get("/api/catalogo")
+async def estado_catalogo(
+    current_user: User = Depends(get_current_funcionario)
+):
+    """Versiones y tamaño de la copia en memoria de las tablas maestras en este worker"""
+    return CatalogoService.estadisticas()
 # ============ DEMO - ACCESO RÁPIDO ============
 
 @router.get("/demo-login")
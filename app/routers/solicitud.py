@@ -6,23 +6,57 @@ from datetime import datetime, timedelta
 import uuid
 import os
 import json
+import time
 
+from app.config import settings
 from app.database.connection import get_db
 from app.utils.dependencies import get_current_user, get_current_funcionario
 from app.models.user import User
 from app.models.solicitud import Solicitud
 from app.models.config import Rubro, Tarifa, Zona
 from app.services.riesgo_service import RiesgoService
+from app.services.catalogo_service import CatalogoService
 from app.services.zonificacion_service import ZonificacionService
+from app.services.geocodificacion_service import GeocodificacionService
 from app.services.notificacion_service import NotificacionService
 from app.services.pdf_service import PDFService
+from app.services.consulta_service import ConsultaService
+from app.services.documento_service import DocumentoService, ArchivoRechazado
+from app.services.archivo_service import ArchivoService
 
 router = APIRouter(prefix="/solicitud", tags=["Solicitud de Licencia"])
 templates = Jinja2Templates(directory="app/templates")
 
-# Almacenamiento temporal para el formulario multipaso
+# Almacenamiento temporal para el formulario multipaso (cada entrada guarda
+# "actualizado"; barrer_sesiones quita las abandonadas)
 temp_storage = {}
 
+def barrer_sesiones(horas: float = None) -> int:
+    """Elimina las sesiones del formulario sin actividad hace más de `horas` (tarea por proceso)"""
+    limite = time.time() - (horas or settings.FORMULARIO_SESION_HORAS) * 3600
+    vencidas = [clave for clave, datos in list(temp_storage.items()) if datos.get("actualizado", 0) < limite]
+    for clave in vencidas:
+        temp_storage.pop(clave, None)
+    if vencidas:
+        print(f"🧹 Sesiones de formulario vencidas: {len(vencidas)}")
+    return len(vencidas)
+
+def _coordenada(valor, limite: float):
+    """Latitud/longitud del formulario como float, o None si falta o no es válida"""
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if -limite <= numero <= limite else None
+
+def _geocodificar(data: dict):
+    """Completa latitud/longitud de la sesión del asistente a partir de la dirección"""
+    ubicacion = GeocodificacionService.geocodificar(data.get("direccion_negocio"), data.get("distrito"))
+    if ubicacion:
+        data["latitud"] = ubicacion["latitud"]
+        data["longitud"] = ubicacion["longitud"]
+        print(f"🧭 Dirección geocodificada ({ubicacion['precision']}): {ubicacion['via']}, {ubicacion['distrito']}")
+
 # ============ PASO 1: CLASIFICACIÓN DE RIESGO ============
 
 @router.get("/paso1", response_class=HTMLResponse)
@@ -35,14 +69,15 @@ async def paso1_form(
     
     print(f"📋 Accediendo a paso 1 - Usuario: {current_user.email}")
     
-    # Obtener lista de rubros
-    rubros = db.query(Rubro).filter(Rubro.is_active == True).all()
+    # Obtener lista de rubros (copia en memoria del catálogo)
+    rubros = CatalogoService.rubros()
     
     # Inicializar sesión temporal
     session_id = str(uuid.uuid4())
     temp_storage[session_id] = {
         "user_id": current_user.id,
-        "paso": 1
+        "paso": 1,
+        "actualizado": time.time()
     }
     
     response = templates.TemplateResponse(
@@ -78,13 +113,13 @@ async def paso1_procesar(
         # Validar sesión
         if not session_id:
             session_id = str(uuid.uuid4())
-            temp_storage[session_id] = {"user_id": current_user.id, "paso": 1}
+            temp_storage[session_id] = {"user_id": current_user.id, "paso": 1, "actualizado": time.time()}
         
         if session_id not in temp_storage:
-            temp_storage[session_id] = {"user_id": current_user.id, "paso": 1}
+            temp_storage[session_id] = {"user_id": current_user.id, "paso": 1, "actualizado": time.time()}
         
         # Obtener rubro
-        rubro = db.query(Rubro).filter(Rubro.id == rubro_id).first()
+        rubro = CatalogoService.rubro(rubro_id)
         if not rubro:
             print("❌ Rubro no encontrado")
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
@@ -137,6 +172,7 @@ async def paso2_form(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar que el usuario sea el mismo
         if data.get("user_id") != current_user.id:
@@ -174,6 +210,7 @@ async def paso2_procesar(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -188,9 +225,15 @@ async def paso2_procesar(
             "referencia": form.get("referencia"),
             "distrito": form.get("distrito"),
             "area_local": form.get("area_local"),
-            "telefono_contacto": form.get("telefono_contacto")
+            "telefono_contacto": form.get("telefono_contacto"),
+            "latitud": _coordenada(form.get("latitud"), 90),
+            "longitud": _coordenada(form.get("longitud"), 180)
         })
         
+        # Sin ubicación del navegador: coordenadas desde la dirección (gazetteer local)
+        if temp_storage[session_id]["latitud"] is None or temp_storage[session_id]["longitud"] is None:
+            _geocodificar(temp_storage[session_id])
+        
         print(f"✅ Paso 2 completado - Negocio: {form.get('nombre_negocio')}")
         print(f"➡️ Redirigiendo a paso 3")
         
@@ -225,6 +268,7 @@ async def paso3_form(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar que el usuario sea el mismo
         if data.get("user_id") != current_user.id:
@@ -240,7 +284,9 @@ async def paso3_form(
         evaluacion = ZonificacionService.evaluar_compatibilidad(
             rubro=data["rubro_nombre"],
             distrito=data.get("distrito", "Ica"),
-            direccion=data.get("direccion_negocio", "")
+            direccion=data.get("direccion_negocio", ""),
+            latitud=data.get("latitud"),
+            longitud=data.get("longitud")
         )
         
         temp_storage[session_id]["evaluacion_zonificacion"] = evaluacion
@@ -284,6 +330,7 @@ async def paso3_procesar(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -332,6 +379,7 @@ async def paso4_revision(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -379,12 +427,16 @@ async def paso4_confirmar(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
             print("❌ Usuario no coincide con la sesión")
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
+        if data.get("latitud") is None or data.get("longitud") is None:
+            _geocodificar(data)
+        
         # Crear número de expediente
         numero_expediente = f"EXP-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
         
@@ -451,6 +503,7 @@ async def paso5_pago(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -500,6 +553,7 @@ async def procesar_pago(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -514,16 +568,17 @@ async def procesar_pago(
             solicitud.fecha_pago = datetime.now()
             solicitud.metodo_pago = metodo_pago
             solicitud.comprobante_pago = f"PAGO-{datetime.now().strftime('%Y%m%d')}-{session_id[:8].upper()}"
-            db.commit()
-            
-            print(f"✅ Pago registrado - Solicitud ID: {solicitud.id}")
             
-            # Enviar notificación de pago
+            # Notificación de pago (se encola en la misma transacción)
             try:
                 await NotificacionService.notificar_pago_confirmado(db, current_user, solicitud)
-                print(f"📧 Notificación de pago enviada")
+                print(f"📧 Notificación de pago encolada")
             except Exception as e:
                 print(f"⚠️ Error en notificación: {e}")
+            
+            db.commit()
+            
+            print(f"✅ Pago registrado - Solicitud ID: {solicitud.id}")
         
         # Actualizar sesión
         temp_storage[session_id].update({
@@ -567,6 +622,7 @@ async def paso6_confirmacion(
             return RedirectResponse(url="/solicitud/paso1", status_code=302)
         
         data = temp_storage[session_id]
+        data["actualizado"] = time.time()
         
         # Verificar usuario
         if data.get("user_id") != current_user.id:
@@ -616,7 +672,7 @@ async def descargar_licencia(
         
         # Obtener datos relacionados
         usuario = db.query(User).filter(User.id == solicitud.usuario_id).first()
-        rubro = db.query(Rubro).filter(Rubro.id == solicitud.rubro_id).first()
+        rubro = CatalogoService.rubro(solicitud.rubro_id)
         
         # Generar PDF
         pdf_buffer = PDFService.generar_licencia(solicitud, usuario, rubro)
@@ -656,7 +712,7 @@ async def emitir_licencia(
         numero_licencia = f"LIC-{datetime.now().strftime('%Y%m%d')}-{solicitud_id:06d}"
         
         # Generar código verificador
-        codigo_verificador = str(uuid.uuid4())[:8].upper()
+        codigo_verificador = ConsultaService.nuevo_codigo(db)
         
         # Actualizar solicitud
         solicitud.estado = "licencia_emitida"
@@ -665,18 +721,18 @@ async def emitir_licencia(
         solicitud.fecha_vencimiento = datetime.now() + timedelta(days=365*2)  # 2 años
         solicitud.codigo_verificador = codigo_verificador
         
-        db.commit()
-        
-        print(f"✅ Licencia emitida - N°: {numero_licencia}")
-        
-        # Enviar notificación
+        # Notificación (se encola en la misma transacción)
         try:
             user = db.query(User).filter(User.id == solicitud.usuario_id).first()
             await NotificacionService.notificar_licencia_emitida(db, user, solicitud)
-            print(f"📧 Notificación de licencia enviada")
+            print(f"📧 Notificación de licencia encolada")
         except Exception as e:
             print(f"⚠️ Error en notificación: {e}")
         
+        db.commit()
+        
+        print(f"✅ Licencia emitida - N°: {numero_licencia}")
+        
         return {
             "message": "Licencia emitida exitosamente",
             "numero_licencia": numero_licencia,
@@ -724,7 +780,7 @@ async def ver_estado_solicitud(
     if solicitud.usuario_id != current_user.id and current_user.tipo_usuario not in ["funcionario", "administrador"]:
         raise HTTPException(status_code=403, detail="No autorizado")
     
-    rubro = db.query(Rubro).filter(Rubro.id == solicitud.rubro_id).first()
+    rubro = CatalogoService.rubro(solicitud.rubro_id)
     
     return templates.TemplateResponse(
         "solicitud/estado_solicitud.html",
@@ -832,6 +888,7 @@ async def listar_documentos(
     """Listar todos los documentos de una solicitud"""
     
     from app.models.documento import Documento
+    from app.models.pago import Pago
     
     solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
     if not solicitud:
@@ -851,6 +908,8 @@ async def listar_documentos(
                 "tipo": d.tipo,
                 "nombre": d.nombre_original,
                 "fecha": d.created_at,
+                "tamaño_bytes": d.tamaño_bytes,
+                "sha256": d.hash_sha256,
                 "validado": d.esta_validado
             } for d in documentos
         ],
@@ -863,4 +922,83 @@ async def listar_documentos(
                 "comprobante": p.comprobante_numero
             } for p in pagos if p.estado == "completado"
         ]
-    }
\ No newline at end of file
+    }
+
+# ============ SUBIR DOCUMENTOS DE SOLICITUD ============
+
+@router.post("/solicitud/{solicitud_id}/documentos")
+async def subir_documentos(
+    solicitud_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Subir documentos (anexos, fotos del local) leyendo el multipart en streaming"""
+    
+    solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    
+    if solicitud.usuario_id != current_user.id and current_user.tipo_usuario not in ["funcionario", "administrador"]:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    try:
+        campos, archivos = await DocumentoService.recibir_multipart(request)
+    except ArchivoRechazado as e:
+        print(f"⚠️ Upload rechazado - Solicitud {solicitud_id}: {e.mensaje}")
+        raise HTTPException(status_code=e.status_code, detail=e.mensaje)
+    
+    if not archivos:
+        raise HTTPException(status_code=400, detail="No se recibió ningún archivo")
+    
+    documentos = DocumentoService.registrar_documentos(
+        db, solicitud_id, current_user.id, campos, archivos
+    )
+    
+    print(f"📎 {len(documentos)} documento(s) subido(s) - Solicitud {solicitud.numero_expediente}")
+    
+    return {
+        "solicitud": solicitud.numero_expediente,
+        "documentos": [
+            {
+                "id": d.id,
+                "tipo": d.tipo,
+                "nombre": d.nombre_original,
+                "tamaño_bytes": d.tamaño_bytes,
+                "sha256": d.hash_sha256
+            } for d in documentos
+        ]
+    }
+
+# ============ VER / DESCARGAR DOCUMENTO ============
+
+@router.get("/documento/{documento_id}/archivo")
+async def ver_documento(
+    documento_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Servir el archivo de un documento (soporta Range, ETag y 304)"""
+    
+    from app.models.documento import Documento
+    
+    documento = db.query(Documento).filter(Documento.id == documento_id).first()
+    if not documento:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    
+    solicitud = db.query(Solicitud).filter(Solicitud.id == documento.solicitud_id).first()
+    if solicitud.usuario_id != current_user.id and current_user.tipo_usuario not in ["funcionario", "administrador"]:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    respuesta = ArchivoService.responder(
+        request,
+        documento.ruta_archivo,
+        media_type=documento.mime_type,
+        nombre_descarga=documento.nombre_original,
+        sha256=documento.hash_sha256
+    )
+    if respuesta is None:
+        raise HTTPException(status_code=404, detail="Archivo no disponible")
+    
+    return respuesta
@@ -0,0 +1,187 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.config import settings
+from app.models.documento import Documento
+from app.models.inspeccion import Inspeccion
+import hashlib
+import json
+import os
+import time
+
+
+class AlmacenamientoService:
+    """
+    Almacén de archivos direccionado por contenido (SHA-256).
+    Cada contenido se guarda una sola vez en UPLOAD_FOLDER/blobs/ab/cd/<hash>;
+    las referencias son las filas de Documento que apuntan a esa ruta.
+    """
+
+    CARPETA_BLOBS = "blobs"
+
+    # Un blob sin referencias no se borra hasta que pase este tiempo
+    # (cubre la ventana entre guardar el archivo y hacer commit del Documento)
+    GRACIA_SEGUNDOS = 3600
+
+    @staticmethod
+    def carpeta_blobs() -> str:
+        return os.path.join(settings.UPLOAD_FOLDER, AlmacenamientoService.CARPETA_BLOBS)
+
+    @staticmethod
+    def ruta_blob(sha256: str) -> str:
+        """Ruta del blob, repartida en dos niveles de subcarpetas por prefijo del hash"""
+        return os.path.join(AlmacenamientoService.carpeta_blobs(), sha256[:2], sha256[2:4], sha256)
+
+    @staticmethod
+    def es_blob(ruta: str) -> bool:
+        carpeta = os.path.abspath(AlmacenamientoService.carpeta_blobs())
+        return os.path.abspath(ruta).startswith(carpeta + os.sep)
+
+    @staticmethod
+    def guardar(ruta_temporal: str, sha256: str):
+        """
+        Mueve un archivo temporal al almacén
+        Retorna: (ruta del blob, True si el contenido es nuevo)
+        """
+        ruta = AlmacenamientoService.ruta_blob(sha256)
+
+        if os.path.exists(ruta):
+            os.remove(ruta_temporal)
+            # Renovar la fecha para que el recolector no lo tome por huérfano
+            os.utime(ruta, None)
+            return ruta, False
+
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # os.replace es atómico: dos envíos simultáneos del mismo contenido dejan un solo blob
+        os.replace(ruta_temporal, ruta)
+        return ruta, True
+
+    @staticmethod
+    def calcular_sha256(ruta: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(bloque)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def contar_referencias(db: Session) -> dict:
+        """Número de documentos y fotos de inspección que apuntan a cada ruta"""
+        filas = db.query(Documento.ruta_archivo, func.count(Documento.id)).group_by(Documento.ruta_archivo).all()
+        referencias = {ruta: total for ruta, total in filas}
+
+        fotos = db.query(Inspeccion.fotos_antes, Inspeccion.fotos_despues).filter(
+            (Inspeccion.fotos_antes.isnot(None)) | (Inspeccion.fotos_despues.isnot(None))
+        )
+        for valores in fotos.yield_per(1000):
+            for valor in valores:
+                try:
+                    rutas = json.loads(valor) if valor else []
+                except ValueError:
+                    continue
+                for ruta in rutas if isinstance(rutas, list) else []:
+                    referencias[ruta] = referencias.get(ruta, 0) + 1
+        return referencias
+
+    @staticmethod
+    def iterar_blobs():
+        """Recorre los blobs en disco: (ruta, tamaño, fecha de modificación)"""
+        carpeta = AlmacenamientoService.carpeta_blobs()
+        if not os.path.isdir(carpeta):
+            return
+        for raiz, _, archivos in os.walk(carpeta):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                yield ruta, info.st_size, info.st_mtime
+
+    @staticmethod
+    def recolectar_huerfanos(db: Session, gracia_segundos: int = None, simular: bool = False) -> dict:
+        """Elimina los blobs que ya no referencia ningún Documento"""
+        if gracia_segundos is None:
+            gracia_segundos = AlmacenamientoService.GRACIA_SEGUNDOS
+
+        referenciados = {os.path.abspath(r) for r in AlmacenamientoService.contar_referencias(db)}
+        limite = time.time() - gracia_segundos
+
+        eliminados = 0
+        bytes_liberados = 0
+        for ruta, tamaño, modificado in AlmacenamientoService.iterar_blobs():
+            if os.path.abspath(ruta) in referenciados or modificado > limite:
+                continue
+            if not simular:
+                os.remove(ruta)
+                AlmacenamientoService._limpiar_carpetas_vacias(os.path.dirname(ruta))
+            eliminados += 1
+            bytes_liberados += tamaño
+
+        print(f"🧹 Recolector de blobs: {eliminados} huérfano(s), {bytes_liberados / 1024 / 1024:.2f} MB"
+              f"{' (simulación)' if simular else ''}")
+
+        return {
+            "eliminados": eliminados,
+            "bytes_liberados": bytes_liberados,
+            "simulacion": simular
+        }
+
+    @staticmethod
+    def _limpiar_carpetas_vacias(carpeta: str):
+        """Borra las subcarpetas de prefijo que quedaron vacías"""
+        raiz = os.path.abspath(AlmacenamientoService.carpeta_blobs())
+        carpeta = os.path.abspath(carpeta)
+        while carpeta != raiz and carpeta.startswith(raiz):
+            try:
+                os.rmdir(carpeta)
+            except OSError:
+                return
+            carpeta = os.path.dirname(carpeta)
+
+    @staticmethod
+    def migrar_existentes(db: Session) -> dict:
+        """Pasa al almacén los documentos guardados con rutas antiguas (una por upload)"""
+        migrados = 0
+        documentos = db.query(Documento).all()
+        for documento in documentos:
+            if AlmacenamientoService.es_blob(documento.ruta_archivo) or not os.path.exists(documento.ruta_archivo):
+                continue
+            sha256 = documento.hash_sha256 or AlmacenamientoService.calcular_sha256(documento.ruta_archivo)
+            ruta, _ = AlmacenamientoService.guardar(documento.ruta_archivo, sha256)
+            documento.ruta_archivo = ruta
+            documento.hash_sha256 = sha256
+            migrados += 1
+        db.commit()
+        return {"migrados": migrados}
+
+    @staticmethod
+    def estadisticas(db: Session) -> dict:
+        """Tasa de deduplicación y espacio ahorrado"""
+        documentos, bytes_logicos = db.query(
+            func.count(Documento.id), func.coalesce(func.sum(Documento.tamaño_bytes), 0)
+        ).one()
+
+        # Bytes físicos: cada ruta distinta cuenta una sola vez
+        por_ruta = db.query(
+            Documento.ruta_archivo, func.max(Documento.tamaño_bytes).label("bytes")
+        ).group_by(Documento.ruta_archivo).subquery()
+        blobs, bytes_fisicos = db.query(
+            func.count(), func.coalesce(func.sum(por_ruta.c.bytes), 0)
+        ).select_from(por_ruta).one()
+
+        en_disco = 0
+        archivos_en_disco = 0
+        for _, tamaño, _ in AlmacenamientoService.iterar_blobs():
+            en_disco += tamaño
+            archivos_en_disco += 1
+
+        return {
+            "documentos": documentos,
+            "blobs_referenciados": blobs,
+            "blobs_en_disco": archivos_en_disco,
+            "bytes_logicos": int(bytes_logicos),
+            "bytes_fisicos": int(bytes_fisicos),
+            "bytes_en_disco": en_disco,
+            "bytes_ahorrados": int(bytes_logicos - bytes_fisicos),
+            "tasa_deduplicacion": round(bytes_logicos / bytes_fisicos, 2) if bytes_fisicos else 1.0
+        }
@@ -0,0 +1,112 @@
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from email.utils import formatdate, parsedate_to_datetime
+from app.config import settings
+import hashlib
+import json
+import os
+
+
+class ArchivoService:
+    """
+    Entrega de archivos guardados en UPLOAD_FOLDER (documentos y fotos de inspección).
+    El cuerpo lo envía FileResponse: con servidores ASGI que ofrecen la extensión
+    http.response.pathsend el archivo sale por sendfile sin pasar por Python;
+    en el resto se lee por bloques de 64 KB, nunca completo en memoria.
+    Range / If-Range los resuelve FileResponse; aquí se agregan las respuestas 304.
+    """
+
+    # El navegador guarda la copia pero revalida siempre (la autorización puede cambiar)
+    CACHE_CONTROL = "private, no-cache"
+
+    @staticmethod
+    def resolver_ruta(ruta: str):
+        """
+        Ruta absoluta del archivo, solo si está dentro de UPLOAD_FOLDER.
+        Acepta rutas en disco o URLs /static/... guardadas por versiones anteriores.
+        """
+        if not ruta:
+            return None
+        if ruta.startswith("/static/"):
+            ruta = os.path.join("app", ruta.lstrip("/"))
+
+        carpeta = os.path.realpath(settings.UPLOAD_FOLDER)
+        absoluta = os.path.realpath(ruta)
+        if not absoluta.startswith(carpeta + os.sep):
+            return None
+        return absoluta
+
+    @staticmethod
+    def fotos_inspeccion(inspeccion, momento: str) -> list:
+        """Lista de rutas guardada como JSON en fotos_antes / fotos_despues"""
+        valor = getattr(inspeccion, f"fotos_{momento}", None)
+        if not valor:
+            return []
+        try:
+            fotos = json.loads(valor)
+        except (TypeError, ValueError):
+            return []
+        return [f for f in fotos if isinstance(f, str)] if isinstance(fotos, list) else []
+
+    @staticmethod
+    def calcular_etag(info: os.stat_result, sha256: str = None) -> str:
+        """ETag fuerte: el hash del contenido si se conoce, si no mtime + tamaño"""
+        if sha256:
+            return f'"{sha256}"'
+        return '"' + hashlib.md5(f"{info.st_mtime}-{info.st_size}".encode(), usedforsecurity=False).hexdigest() + '"'
+
+    @staticmethod
+    def no_modificado(request: Request, etag: str, modificado: float) -> bool:
+        """Evalúa If-None-Match y, si no viene, If-Modified-Since (RFC 9110 §13.2.2)"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            # Comparación débil: W/"x" equivale a "x"
+            etiquetas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+            return etag in etiquetas
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                fecha = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            # Last-Modified tiene resolución de segundos
+            return int(modificado) <= fecha.timestamp()
+        return False
+
+    @staticmethod
+    def responder(request: Request, ruta: str, media_type: str = None,
+                  nombre_descarga: str = None, sha256: str = None) -> Response:
+        """
+        Respuesta para servir un archivo: 304 si la copia del cliente sigue vigente,
+        si no FileResponse (200 o 206 según Range)
+        Retorna None si el archivo no existe o está fuera de UPLOAD_FOLDER
+        """
+        absoluta = ArchivoService.resolver_ruta(ruta)
+        if not absoluta:
+            return None
+        try:
+            info = os.stat(absoluta)
+        except FileNotFoundError:
+            return None
+
+        etag = ArchivoService.calcular_etag(info, sha256)
+        cabeceras = {
+            "etag": etag,
+            "last-modified": formatdate(info.st_mtime, usegmt=True),
+            "cache-control": ArchivoService.CACHE_CONTROL,
+        }
+
+        if ArchivoService.no_modificado(request, etag, info.st_mtime):
+            return Response(status_code=304, headers=cabeceras)
+
+        return FileResponse(
+            absoluta,
+            media_type=media_type,
+            filename=nombre_descarga,
+            content_disposition_type="inline",
+            headers=cabeceras,
+            stat_result=info
+        )
@@ -0,0 +1,202 @@
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.config import VersionCatalogo
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.utils.trigramas import IndiceTrigramas
+import threading
+import time
+
+
+class AutocompletadoService:
+    """
+    Sugerencias tolerantes a errores de tipeo para el buscador de la oficina
+    ("cebicheria" -> "Cevichería El Pulpo"): nombres de negocio y de titulares
+    (nombre y apellidos, razón social, nombre comercial) en dos índices de
+    trigramas en memoria, sin tildes.
+    Las altas se agregan solas: al verificar se leen las filas con id mayor al
+    último cargado. Un cambio de nombre o una baja incrementa la versión
+    "nombres" en versiones_catalogo en la misma transacción, y cada proceso
+    reconstruye sus índices en la siguiente consulta.
+    """
+
+    VERSION = "nombres"
+    VERIFICAR_CADA = 2.0
+    TAMAÑO_LOTE = 20000
+
+    # Tiempo máximo evaluando candidatas por consulta
+    PRESUPUESTO_MS = 5.0
+
+    CAMPOS_USUARIO = ("nombres", "apellido_paterno", "apellido_materno", "razon_social", "nombre_comercial",
+                      "tipo_usuario")
+
+    _negocios = None
+    _titulares = None
+    _version = None
+    _ultima_solicitud = 0
+    _ultimo_usuario = 0
+    _verificado = 0.0
+    _lock = threading.Lock()
+
+    # Métricas
+    reconstrucciones = 0
+    consultas = 0
+    incompletas = 0
+
+    # ============ ÍNDICES ============
+
+    @classmethod
+    def _cargar(cls, db: Session, negocios: IndiceTrigramas, titulares: IndiceTrigramas):
+        """Agrega las solicitudes y titulares con id mayor al último cargado"""
+        while True:
+            filas = (
+                db.query(Solicitud.id, Solicitud.nombre_negocio)
+                .filter(Solicitud.id > cls._ultima_solicitud)
+                .order_by(Solicitud.id)
+                .limit(cls.TAMAÑO_LOTE)
+                .all()
+            )
+            for solicitud_id, nombre in filas:
+                negocios.agregar(nombre or "", solicitud_id)
+            if len(filas) < cls.TAMAÑO_LOTE:
+                if filas:
+                    cls._ultima_solicitud = filas[-1][0]
+                break
+            cls._ultima_solicitud = filas[-1][0]
+
+        while True:
+            filas = (
+                db.query(User.id, User.tipo_usuario, User.nombres, User.apellido_paterno, User.apellido_materno,
+                         User.razon_social, User.nombre_comercial)
+                .filter(User.id > cls._ultimo_usuario)
+                .order_by(User.id)
+                .limit(cls.TAMAÑO_LOTE)
+                .all()
+            )
+            for usuario_id, tipo, nombres, paterno, materno, razon_social, nombre_comercial in filas:
+                if tipo not in (None, "ciudadano"):
+                    continue
+                titulares.agregar(f"{nombres or ''} {paterno or ''} {materno or ''}", usuario_id)
+                titulares.agregar(razon_social or "", usuario_id)
+                titulares.agregar(nombre_comercial or "", usuario_id)
+            if len(filas) < cls.TAMAÑO_LOTE:
+                if filas:
+                    cls._ultimo_usuario = filas[-1][0]
+                break
+            cls._ultimo_usuario = filas[-1][0]
+
+    @classmethod
+    def _actualizar(cls):
+        db = SessionLocal()
+        try:
+            version = db.query(VersionCatalogo.version).filter(VersionCatalogo.nombre == cls.VERSION).scalar() or 0
+            if cls._negocios is None or version != cls._version:
+                inicio = time.perf_counter()
+                negocios, titulares = IndiceTrigramas(), IndiceTrigramas()
+                cls._ultima_solicitud = cls._ultimo_usuario = 0
+                cls._cargar(db, negocios, titulares)
+                cls._negocios, cls._titulares = negocios, titulares
+                cls.reconstrucciones += 1
+                print(f"🔤 Autocompletado: {len(negocios)} nombres de negocio y {len(titulares)} de titulares "
+                      f"({time.perf_counter() - inicio:.1f} s)")
+            else:
+                cls._cargar(db, cls._negocios, cls._titulares)
+            cls._version = version
+        finally:
+            db.close()
+
+    @classmethod
+    def indices(cls) -> tuple:
+        """(negocios, titulares) vigentes; la versión y las altas se revisan como mucho cada VERIFICAR_CADA segundos"""
+        ahora = time.monotonic()
+        if cls._negocios is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+            with cls._lock:
+                if cls._negocios is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+                    cls._actualizar()
+                    cls._verificado = time.monotonic()
+        return cls._negocios, cls._titulares
+
+    @classmethod
+    def refrescar(cls):
+        """Descarta los índices de este proceso (se reconstruyen en la próxima consulta)"""
+        with cls._lock:
+            cls._negocios = cls._titulares = None
+
+    # ============ SINCRONIZACIÓN ============
+
+    @classmethod
+    def registrar(cls):
+        """Incrementa la versión al guardar cambios de nombre o bajas (una vez por proceso)"""
+        if not event.contains(Session, "after_flush", cls._al_guardar):
+            event.listen(Session, "after_flush", cls._al_guardar)
+
+    @staticmethod
+    def _cambio(objeto, campos: tuple) -> bool:
+        estado = inspect(objeto)
+        return any(estado.attrs[campo].history.has_changes() for campo in campos)
+
+    @classmethod
+    def _al_guardar(cls, session: Session, contexto):
+        cambio = any(isinstance(o, (Solicitud, User)) for o in session.deleted) or any(
+            (isinstance(o, Solicitud) and cls._cambio(o, ("nombre_negocio",)))
+            or (isinstance(o, User) and cls._cambio(o, cls.CAMPOS_USUARIO))
+            for o in session.dirty
+        )
+        if not cambio:
+            return
+
+        conexion = session.connection()
+        resultado = conexion.execute(
+            update(VersionCatalogo)
+            .where(VersionCatalogo.nombre == cls.VERSION)
+            .values(version=VersionCatalogo.version + 1)
+        )
+        if resultado.rowcount == 0:
+            conexion.execute(VersionCatalogo.__table__.insert().values(nombre=cls.VERSION, version=1))
+
+        def al_confirmar(_):
+            # Este proceso ve el cambio en la próxima consulta, sin esperar VERIFICAR_CADA
+            cls._verificado = 0.0
+
+        event.listen(session, "after_commit", al_confirmar, once=True)
+
+    # ============ CONSULTAS ============
+
+    @classmethod
+    def sugerir(cls, texto: str, limite: int = 8) -> dict:
+        """Negocios y titulares más parecidos al texto, con las claves de cada nombre"""
+        inicio = time.perf_counter()
+        negocios, titulares = cls.indices()
+        presupuesto = cls.PRESUPUESTO_MS / 2
+        encontrados_negocios, completo_negocios = negocios.buscar(texto, limite, presupuesto_ms=presupuesto)
+        encontrados_titulares, completo_titulares = titulares.buscar(texto, limite, presupuesto_ms=presupuesto)
+
+        sugerencias = [
+            {"texto": nombre, "tipo": "negocio", "similitud": similitud, "solicitudes": claves[:10], "total": len(claves)}
+            for similitud, nombre, claves in encontrados_negocios
+        ] + [
+            {"texto": nombre, "tipo": "titular", "similitud": similitud, "usuarios": claves[:10], "total": len(claves)}
+            for similitud, nombre, claves in encontrados_titulares
+        ]
+        sugerencias.sort(key=lambda s: -s["similitud"])
+        completo = completo_negocios and completo_titulares
+        cls.consultas += 1
+        if not completo:
+            cls.incompletas += 1
+        return {
+            "sugerencias": sugerencias[:limite],
+            "completo": completo,
+            "ms": round((time.perf_counter() - inicio) * 1000, 2)
+        }
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        return {
+            "version": cls._version,
+            "negocios": len(cls._negocios) if cls._negocios is not None else None,
+            "titulares": len(cls._titulares) if cls._titulares is not None else None,
+            "reconstrucciones": cls.reconstrucciones,
+            "consultas": cls.consultas,
+            "incompletas": cls.incompletas
+        }
@@ -0,0 +1,308 @@
+from sqlalchemy import Float, Integer, and_, bindparam, event, inspect, or_, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, joinedload
+from app.models.config import Rubro
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.utils.texto import tokens, normalizar_texto
+import time
+
+
+class BusquedaService:
+    """
+    Índice de texto completo de las solicitudes: expediente y licencia, DNI/RUC
+    del titular, negocio, titular, rubro y dirección.
+    En SQLite es una tabla virtual FTS5 (rowid = id de la solicitud) y en
+    PostgreSQL una tabla con un tsvector por solicitud y un índice GIN. El texto
+    se guarda ya normalizado (sin tildes, minúsculas) para que las dos bases
+    busquen igual sin depender de la extensión unaccent.
+    El índice se mantiene al guardar: después de cada flush se reindexan las
+    solicitudes nuevas o con algún campo indexado modificado (y las de un
+    titular o rubro que cambió de nombre), en la misma transacción.
+    """
+
+    TABLA_FTS = "solicitudes_fts"
+    TABLA_PG = "solicitudes_busqueda"
+
+    # Columnas del índice con su peso (bm25 en FTS5, setweight en PostgreSQL)
+    COLUMNAS = {
+        "expediente": (10.0, "A"),
+        "documento": (10.0, "A"),
+        "negocio": (5.0, "B"),
+        "titular": (3.0, "B"),
+        "rubro": (2.0, "C"),
+        "direccion": (1.0, "D"),
+    }
+
+    CAMPOS_SOLICITUD = ("numero_expediente", "numero_licencia", "nombre_negocio", "direccion_negocio",
+                        "distrito", "usuario_id", "rubro_id")
+    CAMPOS_USUARIO = ("nombres", "apellido_paterno", "apellido_materno", "razon_social",
+                      "nombre_comercial", "dni", "ruc")
+
+    # Términos por consulta (el resto se ignora)
+    MAX_TERMINOS = 8
+    TAMAÑO_LOTE = 5000
+
+    # "fts5", "tsvector" o None (sin índice: la lista usa LIKE)
+    _motor = None
+
+    # Métricas
+    indexadas = 0
+    consultas = 0
+
+    # ============ ÍNDICE ============
+
+    @classmethod
+    def preparar(cls, engine: Engine):
+        """Crea el índice si no existe, lo completa y activa la sincronización al guardar"""
+        dialecto = engine.dialect.name
+        with engine.begin() as conexion:
+            if dialecto == "sqlite":
+                try:
+                    columnas = ", ".join(cls.COLUMNAS)
+                    conexion.execute(text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {cls.TABLA_FTS} USING fts5("
+                        f"{columnas}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                    ))
+                except Exception as e:
+                    print(f"⚠️ Búsqueda: SQLite sin FTS5 ({e}), se usa LIKE")
+                    return
+                cls._motor = "fts5"
+            elif dialecto == "postgresql":
+                conexion.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {cls.TABLA_PG} ("
+                    "solicitud_id INTEGER PRIMARY KEY REFERENCES solicitudes(id) ON DELETE CASCADE, "
+                    "documento TSVECTOR NOT NULL)"
+                ))
+                conexion.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{cls.TABLA_PG}_documento ON {cls.TABLA_PG} USING GIN (documento)"
+                ))
+                cls._motor = "tsvector"
+            else:
+                print(f"⚠️ Búsqueda: {dialecto} sin índice de texto, se usa LIKE")
+                return
+
+        if not event.contains(Session, "after_flush", cls._al_guardar):
+            event.listen(Session, "after_flush", cls._al_guardar)
+        cls.verificar(engine)
+
+    @classmethod
+    def _documentos(cls, conexion: Connection, filtro, limite: int = None) -> list:
+        """[(id, {columna: texto normalizado})] de las solicitudes que cumplen el filtro (en orden de id)"""
+        filas = conexion.execute(
+            select(
+                Solicitud.id, Solicitud.numero_expediente, Solicitud.numero_licencia, Solicitud.nombre_negocio,
+                Solicitud.direccion_negocio, Solicitud.distrito,
+                User.nombres, User.apellido_paterno, User.apellido_materno, User.razon_social,
+                User.nombre_comercial, User.dni, User.ruc, Rubro.nombre
+            )
+            .select_from(Solicitud)
+            .outerjoin(User, User.id == Solicitud.usuario_id)
+            .outerjoin(Rubro, Rubro.id == Solicitud.rubro_id)
+            .where(filtro)
+            .order_by(Solicitud.id)
+            .limit(limite)
+        )
+        documentos = []
+        for (id_, expediente, licencia, negocio, direccion, distrito, nombres, paterno, materno,
+             razon_social, nombre_comercial, dni, ruc, rubro) in filas:
+            documentos.append((id_, {
+                "expediente": normalizar_texto(f"{expediente or ''} {licencia or ''}"),
+                "documento": f"{dni or ''} {ruc or ''}".strip(),
+                "negocio": normalizar_texto(negocio),
+                "titular": normalizar_texto(
+                    f"{nombres or ''} {paterno or ''} {materno or ''} {razon_social or ''} {nombre_comercial or ''}"
+                ),
+                "rubro": normalizar_texto(rubro),
+                "direccion": normalizar_texto(f"{direccion or ''} {distrito or ''}"),
+            }))
+        return documentos
+
+    @classmethod
+    def _escribir(cls, conexion: Connection, documentos: list, nuevas: bool = False):
+        """Guarda los documentos; nuevas=True si se sabe que no están en el índice"""
+        if not documentos:
+            return
+        filas = [{"id": id_, **columnas} for id_, columnas in documentos]
+        if cls._motor == "fts5":
+            if not nuevas:
+                conexion.execute(
+                    text(f"DELETE FROM {cls.TABLA_FTS} WHERE rowid = :id"), [{"id": f["id"]} for f in filas]
+                )
+            columnas = ", ".join(cls.COLUMNAS)
+            valores = ", ".join(f":{c}" for c in cls.COLUMNAS)
+            conexion.execute(text(f"INSERT INTO {cls.TABLA_FTS} (rowid, {columnas}) VALUES (:id, {valores})"), filas)
+        else:
+            vector = " || ".join(
+                f"setweight(to_tsvector('simple', :{c}), '{peso}')" for c, (_, peso) in cls.COLUMNAS.items()
+            )
+            conexion.execute(text(
+                f"INSERT INTO {cls.TABLA_PG} (solicitud_id, documento) VALUES (:id, {vector}) "
+                "ON CONFLICT (solicitud_id) DO UPDATE SET documento = EXCLUDED.documento"
+            ), filas)
+        cls.indexadas += len(filas)
+
+    @classmethod
+    def _borrar(cls, conexion: Connection, ids: list):
+        if not ids:
+            return
+        if cls._motor == "fts5":
+            conexion.execute(text(f"DELETE FROM {cls.TABLA_FTS} WHERE rowid = :id"), [{"id": i} for i in ids])
+        else:
+            conexion.execute(text(f"DELETE FROM {cls.TABLA_PG} WHERE solicitud_id = :id"), [{"id": i} for i in ids])
+
+    @classmethod
+    def indexar(cls, conexion: Connection, ids=(), usuarios=(), rubros=()) -> int:
+        """Reindexa las solicitudes indicadas y las de esos titulares o rubros"""
+        filtros = []
+        if ids:
+            filtros.append(Solicitud.id.in_(list(ids)))
+        if usuarios:
+            filtros.append(Solicitud.usuario_id.in_(list(usuarios)))
+        if rubros:
+            filtros.append(Solicitud.rubro_id.in_(list(rubros)))
+        if not filtros or cls._motor is None:
+            return 0
+        documentos = cls._documentos(conexion, or_(*filtros))
+        cls._escribir(conexion, documentos)
+        return len(documentos)
+
+    @staticmethod
+    def _cambio(objeto, campos: tuple) -> bool:
+        estado = inspect(objeto)
+        return any(estado.attrs[campo].history.has_changes() for campo in campos)
+
+    @classmethod
+    def _al_guardar(cls, session: Session, contexto):
+        """after_flush: reindexa lo que este flush agregó o cambió"""
+        if cls._motor is None:
+            return
+        ids, usuarios, rubros, borradas = set(), set(), set(), []
+        for objeto in session.new:
+            if isinstance(objeto, Solicitud):
+                ids.add(objeto.id)
+        for objeto in session.dirty:
+            if isinstance(objeto, Solicitud) and cls._cambio(objeto, cls.CAMPOS_SOLICITUD):
+                ids.add(objeto.id)
+            elif isinstance(objeto, User) and cls._cambio(objeto, cls.CAMPOS_USUARIO):
+                usuarios.add(objeto.id)
+            elif isinstance(objeto, Rubro) and cls._cambio(objeto, ("nombre",)):
+                rubros.add(objeto.id)
+        for objeto in session.deleted:
+            if isinstance(objeto, Solicitud):
+                borradas.append(objeto.id)
+
+        if ids or usuarios or rubros or borradas:
+            conexion = session.connection()
+            cls._borrar(conexion, borradas)
+            cls.indexar(conexion, ids, usuarios, rubros)
+
+    @classmethod
+    def _tabla_e_id(cls) -> tuple:
+        return (cls.TABLA_FTS, "rowid") if cls._motor == "fts5" else (cls.TABLA_PG, "solicitud_id")
+
+    @classmethod
+    def verificar(cls, engine: Engine) -> dict:
+        """
+        Indexa las solicitudes que faltan en el índice y quita las que ya no existen
+        (altas por SQL directo, scripts de carga o una base anterior al índice)
+        """
+        if cls._motor is None:
+            return {"indexadas": 0, "quitadas": 0}
+        tabla, columna_id = cls._tabla_e_id()
+        inicio = time.perf_counter()
+        with engine.begin() as conexion:
+            huerfanas = [i for i, in conexion.execute(text(
+                f"SELECT {columna_id} FROM {tabla} WHERE {columna_id} NOT IN (SELECT id FROM solicitudes)"
+            ))]
+            cls._borrar(conexion, huerfanas)
+
+        no_indexada = text(f"NOT EXISTS (SELECT 1 FROM {tabla} b WHERE b.{columna_id} = solicitudes.id)")
+        indexadas = 0
+        ultimo = 0
+        while True:
+            with engine.begin() as conexion:
+                documentos = cls._documentos(conexion, and_(Solicitud.id > ultimo, no_indexada), cls.TAMAÑO_LOTE)
+                if not documentos:
+                    break
+                cls._escribir(conexion, documentos, nuevas=True)
+                indexadas += len(documentos)
+                ultimo = documentos[-1][0]
+
+        if indexadas or huerfanas:
+            if cls._motor == "fts5":
+                with engine.begin() as conexion:
+                    conexion.execute(text(f"INSERT INTO {cls.TABLA_FTS} ({cls.TABLA_FTS}) VALUES ('optimize')"))
+            print(f"🔎 Índice de búsqueda: {indexadas} solicitudes indexadas, {len(huerfanas)} quitadas "
+                  f"({time.perf_counter() - inicio:.1f} s)")
+        return {"indexadas": indexadas, "quitadas": len(huerfanas)}
+
+    # ============ CONSULTAS ============
+
+    @classmethod
+    def activo(cls) -> bool:
+        return cls._motor is not None
+
+    @classmethod
+    def consulta(cls, texto: str) -> str:
+        """
+        Términos del usuario en la sintaxis del motor, todos obligatorios y por
+        prefijo ("san mart" encuentra "Av. San Martín"); los de una letra, exactos.
+        """
+        terminos = tokens(texto)[:cls.MAX_TERMINOS]
+        if cls._motor == "fts5":
+            return " ".join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in terminos)
+        return " & ".join(f"{t}:*" if len(t) > 1 else t for t in terminos)
+
+    @classmethod
+    def coincidencias(cls, texto: str):
+        """
+        Subconsulta (id, rango) de las solicitudes que coinciden con el texto, para
+        unir con Solicitud; menor rango = más relevante. None si no hay índice o
+        el texto no tiene términos.
+        """
+        consulta = cls.consulta(texto) if cls._motor else ""
+        if not consulta:
+            return None
+        cls.consultas += 1
+        if cls._motor == "fts5":
+            pesos = ", ".join(str(peso) for peso, _ in cls.COLUMNAS.values())
+            sql = (f"SELECT rowid AS id, bm25({cls.TABLA_FTS}, {pesos}) AS rango "
+                   f"FROM {cls.TABLA_FTS} WHERE {cls.TABLA_FTS} MATCH :consulta")
+        else:
+            sql = (f"SELECT solicitud_id AS id, -ts_rank_cd(documento, q) AS rango "
+                   f"FROM {cls.TABLA_PG}, to_tsquery('simple', :consulta) q WHERE documento @@ q")
+        return (
+            text(sql)
+            .bindparams(bindparam("consulta", consulta))
+            .columns(id=Integer, rango=Float)
+            .subquery("busqueda")
+        )
+
+    @classmethod
+    def buscar(cls, db: Session, texto: str, limite: int = 20) -> list:
+        """Solicitudes más relevantes para el texto (LIKE sobre expediente y negocio si no hay índice)"""
+        coincidencias = cls.coincidencias(texto)
+        if coincidencias is None:
+            texto = (texto or "").strip()
+            if not texto:
+                return []
+            return (
+                db.query(Solicitud)
+                .filter(Solicitud.numero_expediente.contains(texto) | Solicitud.nombre_negocio.contains(texto))
+                .order_by(Solicitud.created_at.desc())
+                .limit(limite)
+                .all()
+            )
+        return (
+            db.query(Solicitud)
+            .options(joinedload(Solicitud.usuario))
+            .join(coincidencias, coincidencias.c.id == Solicitud.id)
+            .order_by(coincidencias.c.rango, Solicitud.id.desc())
+            .limit(limite)
+            .all()
+        )
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        return {"motor": cls._motor, "indexadas": cls.indexadas, "consultas": cls.consultas}
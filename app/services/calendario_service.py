@@ -0,0 +1,277 @@
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.config import VersionCatalogo
+from app.models.inspeccion import Inspeccion, EstadoInspeccion
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.services.ruta_service import RutaService
+from app.utils.intervalos import AgendaIntervalos
+from datetime import date, datetime, timedelta
+import threading
+import time
+
+
+class ConflictoHorario(Exception):
+    """El inspector ya tiene inspecciones que se cruzan con la nueva (verificado en la base)"""
+
+    def __init__(self, inspecciones: list):
+        super().__init__(f"Cruce con las inspecciones {inspecciones}")
+        self.inspecciones = inspecciones
+
+
+class CalendarioService:
+    """
+    Agenda en memoria de los inspectores: un AgendaIntervalos por inspector con
+    sus inspecciones programadas o en curso desde hoy. Cada inspección ocupa la
+    duración de su nivel de riesgo más un margen de traslado.
+    Igual que el catálogo, quien cambia una inspección llama a invalidar() antes
+    del commit: se incrementa la versión "agenda" en versiones_catalogo y, al
+    confirmar, este proceso aplica solo esas inspecciones a su agenda. Los demás
+    workers ven la versión nueva en segundos y reconstruyen la suya.
+    """
+
+    VERSION = "agenda"
+    VERIFICAR_CADA = 2.0
+
+    # Minutos entre el fin de una inspección y la siguiente (traslado entre locales)
+    MARGEN_TRASLADO = 15
+
+    ESTADOS = (EstadoInspeccion.PROGRAMADA.value, EstadoInspeccion.EN_CURSO.value)
+
+    _agendas = None
+    _version = None      # versión que refleja _agendas
+    _dia = None          # las agendas arrancan en este día
+    _version_bd = None
+    _verificado = 0.0
+    _lock = threading.Lock()
+
+    # Métricas
+    reconstrucciones = 0
+    actualizaciones = 0
+
+    # ============ INTERVALOS ============
+
+    @classmethod
+    def duracion(cls, nivel_riesgo: str) -> int:
+        return RutaService.DURACION_POR_RIESGO.get(nivel_riesgo, 45) + cls.MARGEN_TRASLADO
+
+    @classmethod
+    def intervalo(cls, inicio: datetime, nivel_riesgo: str) -> tuple:
+        return inicio, inicio + timedelta(minutes=cls.duracion(nivel_riesgo))
+
+    # ============ AGENDAS ============
+
+    @classmethod
+    def _leer_version(cls) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(VersionCatalogo.version).filter(VersionCatalogo.nombre == cls.VERSION).scalar() or 0
+        finally:
+            db.close()
+
+    @classmethod
+    def _construir(cls, dia: date) -> dict:
+        db = SessionLocal()
+        try:
+            filas = (
+                db.query(Inspeccion.id, Inspeccion.inspector_id, Inspeccion.fecha_programada, Solicitud.nivel_riesgo)
+                .join(Solicitud, Solicitud.id == Inspeccion.solicitud_id)
+                .filter(
+                    Inspeccion.estado.in_(cls.ESTADOS),
+                    Inspeccion.inspector_id.isnot(None),
+                    Inspeccion.fecha_programada >= datetime.combine(dia, datetime.min.time())
+                )
+                .all()
+            )
+        finally:
+            db.close()
+
+        por_inspector = {}
+        for inspeccion_id, inspector_id, fecha, nivel_riesgo in filas:
+            por_inspector.setdefault(inspector_id, []).append((*cls.intervalo(fecha, nivel_riesgo), inspeccion_id))
+        agendas = {inspector_id: AgendaIntervalos.desde(intervalos) for inspector_id, intervalos in por_inspector.items()}
+        cls.reconstrucciones += 1
+        print(f"📅 Agenda de inspectores: {len(filas)} inspecciones de {len(agendas)} inspectores")
+        return agendas
+
+    @classmethod
+    def agendas(cls) -> dict:
+        """{inspector_id: AgendaIntervalos} vigente (la versión se relee como mucho cada VERIFICAR_CADA segundos)"""
+        ahora = time.monotonic()
+        if cls._version_bd is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+            cls._version_bd = cls._leer_version()
+            cls._verificado = ahora
+        hoy = date.today()
+        if cls._agendas is None or cls._version != cls._version_bd or cls._dia != hoy:
+            with cls._lock:
+                if cls._agendas is None or cls._version != cls._version_bd or cls._dia != hoy:
+                    version = cls._version_bd
+                    cls._agendas = cls._construir(hoy)
+                    cls._version = version
+                    cls._dia = hoy
+        return cls._agendas
+
+    @classmethod
+    def invalidar(cls, db: Session, *inspecciones: Inspeccion):
+        """
+        Registra el cambio de estas inspecciones en la transacción del llamador
+        (llamar antes de db.commit(), con los valores ya asignados). Sin
+        inspecciones (altas masivas) la agenda se reconstruye al confirmar.
+        """
+        db.flush()
+        cambios = [
+            (i.id, i.inspector_id if i.estado in cls.ESTADOS else None, i.fecha_programada,
+             i.solicitud.nivel_riesgo if i.solicitud else None)
+            for i in inspecciones
+        ]
+
+        resultado = db.execute(
+            update(VersionCatalogo)
+            .where(VersionCatalogo.nombre == cls.VERSION)
+            .values(version=VersionCatalogo.version + 1)
+        )
+        if resultado.rowcount == 0:
+            db.add(VersionCatalogo(nombre=cls.VERSION, version=1))
+            db.flush()
+        nueva = db.query(VersionCatalogo.version).filter(VersionCatalogo.nombre == cls.VERSION).scalar()
+
+        def al_confirmar(_):
+            with cls._lock:
+                if not cambios or cls._agendas is None or cls._version != nueva - 1:
+                    # Alta masiva u otro proceso también cambió la agenda: se reconstruye en la próxima consulta
+                    cls._agendas = None
+                    cls._version_bd = None
+                    return
+                inicio_agenda = datetime.combine(cls._dia, datetime.min.time())
+                for inspeccion_id, inspector_id, fecha, nivel_riesgo in cambios:
+                    for agenda in cls._agendas.values():
+                        if agenda.quitar(inspeccion_id):
+                            break
+                    if inspector_id is not None and fecha is not None and fecha >= inicio_agenda:
+                        cls._agendas.setdefault(inspector_id, AgendaIntervalos()).agregar(
+                            *cls.intervalo(fecha, nivel_riesgo), inspeccion_id
+                        )
+                cls._version = cls._version_bd = nueva
+                cls.actualizaciones += 1
+
+        event.listen(db, "after_commit", al_confirmar, once=True)
+
+    # ============ CONSULTAS ============
+
+    @classmethod
+    def conflictos(cls, inspector_id: int, inicio: datetime, nivel_riesgo: str) -> list:
+        """Ids de las inspecciones del inspector que se cruzan con una nueva en `inicio`"""
+        agenda = cls.agendas().get(inspector_id)
+        if agenda is None:
+            return []
+        return agenda.cruces(*cls.intervalo(inicio, nivel_riesgo))
+
+    @classmethod
+    def _bloquear_agenda(cls, db: Session, inspector_id: int):
+        """
+        Incrementa la fila "agenda:<inspector>" de versiones_catalogo como primera
+        escritura de la transacción. En PostgreSQL deja esa fila bloqueada hasta
+        el commit; en SQLite (donde FOR UPDATE no existe) toma el lock de
+        escritura de la base, y la otra transacción espera antes de leer.
+        """
+        nombre = f"{cls.VERSION}:{inspector_id}"
+        insertar = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        db.execute(
+            insertar(VersionCatalogo)
+            .values(nombre=nombre, version=0)
+            .on_conflict_do_nothing(index_elements=["nombre"])
+        )
+        db.execute(
+            update(VersionCatalogo)
+            .where(VersionCatalogo.nombre == nombre)
+            .values(version=VersionCatalogo.version + 1)
+        )
+
+    @classmethod
+    def verificar_cruces(cls, db: Session, inspector_id: int, inicio: datetime, nivel_riesgo: str,
+                         excluir: int = None):
+        """
+        Vuelve a buscar cruces en la base, dentro de la transacción que guarda la
+        inspección (la agenda en memoria puede estar unos segundos atrasada en
+        otro worker). Antes de leer toma el lock de la agenda del inspector, así
+        dos programaciones simultáneas para el mismo inspector se hacen de a una
+        y la segunda ve la primera ya confirmada. Lanza ConflictoHorario si hay cruces.
+        """
+        cls._bloquear_agenda(db, inspector_id)
+        desde, hasta = cls.intervalo(inicio, nivel_riesgo)
+        mas_larga = max([*RutaService.DURACION_POR_RIESGO.values(), 45]) + cls.MARGEN_TRASLADO
+        consulta = (
+            db.query(Inspeccion.id, Inspeccion.fecha_programada, Solicitud.nivel_riesgo)
+            .outerjoin(Solicitud, Solicitud.id == Inspeccion.solicitud_id)
+            .filter(
+                Inspeccion.inspector_id == inspector_id,
+                Inspeccion.estado.in_(cls.ESTADOS),
+                Inspeccion.fecha_programada > desde - timedelta(minutes=mas_larga),
+                Inspeccion.fecha_programada < hasta
+            )
+        )
+        if excluir is not None:
+            consulta = consulta.filter(Inspeccion.id != excluir)
+        cruces = [
+            inspeccion_id for inspeccion_id, fecha, nivel in consulta
+            if cls.intervalo(fecha, nivel)[1] > desde
+        ]
+        if cruces:
+            raise ConflictoHorario(sorted(cruces))
+
+    @classmethod
+    def disponibilidad(cls, db: Session, inicio: datetime, nivel_riesgo: str) -> dict:
+        """
+        Inspectores activos para una inspección en `inicio`: primero los libres en ese
+        horario, de menor a mayor carga del día (y de la semana para desempatar).
+        El primero libre queda como sugerido.
+        """
+        desde, hasta = cls.intervalo(inicio, nivel_riesgo)
+        dia = datetime.combine(inicio.date(), datetime.min.time())
+        semana = dia - timedelta(days=inicio.weekday())
+        agendas = cls.agendas()
+        vacia = AgendaIntervalos()
+
+        inspectores = []
+        for inspector in db.query(User).filter(User.tipo_usuario == "inspector", User.is_active.isnot(False)):
+            agenda = agendas.get(inspector.id, vacia)
+            conflictos = agenda.cruces(desde, hasta)
+            inspectores.append({
+                "id": inspector.id,
+                "nombre": inspector.nombre_completo() or inspector.email,
+                "area": inspector.area,
+                "disponible": not conflictos,
+                "conflictos": conflictos,
+                "inspecciones_dia": agenda.cantidad(dia, dia + timedelta(days=1)),
+                "minutos_dia": round(agenda.minutos(dia, dia + timedelta(days=1))),
+                "minutos_semana": round(agenda.minutos(semana, semana + timedelta(days=7))),
+                "sugerido": False
+            })
+        inspectores.sort(key=lambda i: (not i["disponible"], i["minutos_dia"], i["minutos_semana"], i["id"]))
+        if inspectores and inspectores[0]["disponible"]:
+            inspectores[0]["sugerido"] = True
+
+        jornada = RutaService.jornada()
+        return {
+            "inicio": desde.isoformat(timespec="minutes"),
+            "fin": hasta.isoformat(timespec="minutes"),
+            "dentro_de_jornada": (
+                inicio.weekday() < 5
+                and jornada[0] <= inicio.hour * 60 + inicio.minute
+                and hasta - dia <= timedelta(minutes=jornada[1])
+            ),
+            "inspectores": inspectores
+        }
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        agendas = cls.agendas()
+        return {
+            "version": cls._version,
+            "inspectores": len(agendas),
+            "inspecciones": sum(len(a) for a in agendas.values()),
+            "reconstrucciones": cls.reconstrucciones,
+            "actualizaciones": cls.actualizaciones
+        }
@@ -0,0 +1,293 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from app.models.inspeccion import Inspeccion, SincronizacionCampo
+from app.models.user import User
+from app.services.almacenamiento_service import AlmacenamientoService
+from app.services.archivo_service import ArchivoService
+from app.services.calendario_service import CalendarioService
+from app.services.geocodificacion_service import GeocodificacionService
+from app.services.imagen_service import ImagenService
+from app.services.inspeccion_service import InspeccionService
+from datetime import date, datetime, timedelta
+import json
+import os
+import re
+
+
+class CampoService:
+    """
+    Modo de campo de los inspectores (celular con poca cobertura).
+    El dispositivo baja un paquete compacto con sus inspecciones asignadas,
+    llena checklists y toma fotos sin conexión y después sube todo en una sola
+    sincronización: las fotos primero (almacén por contenido, solo las que el
+    servidor no tiene) y luego los resultados, que se aplican en una transacción.
+    Cada resultado lleva una clave generada en el dispositivo: reenviar el mismo
+    lote (porque se cortó la respuesta) devuelve lo ya aplicado sin repetirlo.
+    Los conflictos (inspección reasignada, ya finalizada o modificada en el
+    servidor desde que se bajó el paquete) se informan y no se aplican.
+    """
+
+    VERSION_PAQUETE = 1
+    DIAS_PAQUETE = 3
+    MAX_RESULTADOS = 200
+
+    # Columnas de cada fila del paquete (las filas van como listas para que pese menos)
+    CAMPOS = [
+        "id", "version", "solicitud_id", "expediente", "negocio", "direccion", "referencia",
+        "distrito", "latitud", "longitud", "nivel_riesgo", "itse_previa", "fecha", "ventana", "estado"
+    ]
+
+    PATRON_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+    # ============ PAQUETE ============
+
+    @staticmethod
+    def _ubicacion(solicitud) -> tuple:
+        if solicitud.latitud is not None and solicitud.longitud is not None:
+            return round(solicitud.latitud, 6), round(solicitud.longitud, 6)
+        ubicacion = GeocodificacionService.geocodificar(solicitud.direccion_negocio, solicitud.distrito)
+        return (ubicacion["latitud"], ubicacion["longitud"]) if ubicacion else (None, None)
+
+    @classmethod
+    def paquete(cls, db: Session, inspector: User, dias: int = None) -> dict:
+        """Inspecciones programadas o en curso del inspector hasta dentro de `dias` días (incluye las atrasadas)"""
+        hasta = datetime.combine(date.today() + timedelta(days=dias or cls.DIAS_PAQUETE), datetime.min.time())
+        inspecciones = (
+            db.query(Inspeccion)
+            .options(joinedload(Inspeccion.solicitud))
+            .filter(
+                Inspeccion.inspector_id == inspector.id,
+                Inspeccion.estado.in_(CalendarioService.ESTADOS),
+                Inspeccion.fecha_programada < hasta
+            )
+            .order_by(Inspeccion.fecha_programada, Inspeccion.id)
+            .all()
+        )
+
+        filas = []
+        for inspeccion in inspecciones:
+            solicitud = inspeccion.solicitud
+            ventana = None
+            if inspeccion.ventana_desde or inspeccion.ventana_hasta:
+                ventana = "-".join(
+                    v.strftime("%H:%M") if v else ""
+                    for v in (inspeccion.ventana_desde, inspeccion.ventana_hasta)
+                )
+            filas.append([
+                inspeccion.id,
+                inspeccion.version,
+                solicitud.id,
+                solicitud.numero_expediente,
+                solicitud.nombre_negocio,
+                solicitud.direccion_negocio,
+                solicitud.referencia,
+                solicitud.distrito,
+                *cls._ubicacion(solicitud),
+                solicitud.nivel_riesgo,
+                bool(solicitud.requiere_itse_previa),
+                inspeccion.fecha_programada.isoformat(timespec="minutes"),
+                ventana,
+                inspeccion.estado
+            ])
+
+        return {
+            "v": cls.VERSION_PAQUETE,
+            "inspector_id": inspector.id,
+            "hasta": hasta.date().isoformat(),
+            "checklist": InspeccionService.CHECKLIST,
+            "campos": cls.CAMPOS,
+            "inspecciones": filas
+        }
+
+    # ============ FOTOS ============
+
+    @classmethod
+    def fotos_faltantes(cls, hashes: list) -> list:
+        """SHA-256 (hex) que el almacén todavía no tiene: el dispositivo sube solo esas"""
+        return [h for h in dict.fromkeys(hashes) if not os.path.exists(AlmacenamientoService.ruta_blob(h))]
+
+    # ============ SINCRONIZACIÓN ============
+
+    @classmethod
+    def _validar(cls, resultado: dict) -> dict:
+        """Normaliza un resultado del dispositivo; lanza ValueError si está mal formado"""
+        if not isinstance(resultado, dict):
+            raise ValueError("Cada resultado debe ser un objeto")
+        clave = str(resultado.get("clave") or "").strip()
+        if not clave or len(clave) > 64:
+            raise ValueError("Cada resultado necesita una clave de 1 a 64 caracteres")
+
+        realizada = resultado.get("realizada")
+        realizada = datetime.fromisoformat(realizada) if realizada else None
+        if realizada and realizada.tzinfo:
+            realizada = realizada.astimezone().replace(tzinfo=None)
+        if realizada and realizada > datetime.now() + timedelta(minutes=10):
+            raise ValueError(f"Resultado {clave}: la fecha de realización está en el futuro")
+
+        fotos = {}
+        for momento in ("antes", "despues"):
+            lista = resultado.get(f"fotos_{momento}") or []
+            if not isinstance(lista, list) or not all(isinstance(h, str) and cls.PATRON_SHA256.match(h) for h in lista):
+                raise ValueError(f"Resultado {clave}: fotos_{momento} debe ser una lista de SHA-256")
+            fotos[momento] = lista
+
+        checklist = resultado.get("checklist") or {}
+        if not isinstance(checklist, dict):
+            raise ValueError(f"Resultado {clave}: checklist debe ser un objeto")
+
+        return {
+            "clave": clave,
+            "inspeccion_id": int(resultado["inspeccion_id"]),
+            "version": int(resultado["version"]) if resultado.get("version") is not None else None,
+            "forzar": bool(resultado.get("forzar", False)),
+            "realizada": realizada,
+            "datos": {
+                "observaciones": resultado.get("observaciones"),
+                "recomendaciones": resultado.get("recomendaciones"),
+                **{item: bool(checklist.get(item, False)) for item in InspeccionService.CHECKLIST}
+            },
+            "fotos": fotos
+        }
+
+    @staticmethod
+    def _servidor(inspeccion: Inspeccion) -> dict:
+        """Estado actual en el servidor, para que el dispositivo resuelva el conflicto"""
+        return {
+            "version": inspeccion.version,
+            "estado": inspeccion.estado,
+            "inspector_id": inspeccion.inspector_id,
+            "fecha": inspeccion.fecha_programada.isoformat(timespec="minutes") if inspeccion.fecha_programada else None,
+            "resultado": inspeccion.resultado
+        }
+
+    @classmethod
+    def _conflicto(cls, resultado: dict, inspeccion, inspector: User):
+        if inspeccion is None:
+            return "no_encontrada"
+        if inspeccion.inspector_id != inspector.id:
+            return "reasignada"
+        if inspeccion.estado not in CalendarioService.ESTADOS:
+            return "ya_finalizada"
+        if resultado["version"] is not None and resultado["version"] != inspeccion.version and not resultado["forzar"]:
+            return "modificada"
+        faltantes = cls.fotos_faltantes(resultado["fotos"]["antes"] + resultado["fotos"]["despues"])
+        if faltantes:
+            return "fotos_faltantes"
+        return None
+
+    @classmethod
+    def _aplicar_lote(cls, db: Session, inspector: User, resultados: list) -> tuple:
+        """Un intento de aplicar todo el lote en una transacción. Retorna (respuestas, rutas de fotos nuevas)"""
+        claves = [r["clave"] for r in resultados]
+        ya_aplicados = {
+            s.clave: s
+            for s in db.query(SincronizacionCampo).filter(
+                SincronizacionCampo.inspector_id == inspector.id,
+                SincronizacionCampo.clave.in_(claves)
+            )
+        }
+        inspecciones = {
+            i.id: i
+            for i in db.query(Inspeccion)
+            .options(joinedload(Inspeccion.solicitud))
+            .filter(Inspeccion.id.in_({r["inspeccion_id"] for r in resultados}))
+        }
+
+        respuestas = []
+        aplicadas = []
+        fotos_nuevas = []
+        for resultado in resultados:
+            previo = ya_aplicados.get(resultado["clave"])
+            if previo is not None:
+                respuesta = json.loads(previo.respuesta)
+                respuesta["estado"] = "duplicado"
+                respuestas.append(respuesta)
+                continue
+
+            inspeccion = inspecciones.get(resultado["inspeccion_id"])
+            motivo = cls._conflicto(resultado, inspeccion, inspector)
+            if motivo:
+                respuesta = {
+                    "clave": resultado["clave"],
+                    "inspeccion_id": resultado["inspeccion_id"],
+                    "estado": "conflicto",
+                    "motivo": motivo
+                }
+                if motivo == "fotos_faltantes":
+                    respuesta["fotos_faltantes"] = cls.fotos_faltantes(
+                        resultado["fotos"]["antes"] + resultado["fotos"]["despues"]
+                    )
+                if inspeccion is not None and motivo != "reasignada":
+                    respuesta["servidor"] = cls._servidor(inspeccion)
+                respuestas.append(respuesta)
+                continue
+
+            InspeccionService.registrar_resultado(inspeccion, resultado["datos"], resultado["realizada"])
+            for momento, hashes in resultado["fotos"].items():
+                actuales = ArchivoService.fotos_inspeccion(inspeccion, momento)
+                nuevas = [AlmacenamientoService.ruta_blob(h) for h in hashes]
+                nuevas = [r for r in nuevas if r not in actuales]
+                if nuevas:
+                    setattr(inspeccion, f"fotos_{momento}", json.dumps(actuales + nuevas))
+                    fotos_nuevas += nuevas
+
+            respuesta = {
+                "clave": resultado["clave"],
+                "inspeccion_id": inspeccion.id,
+                "estado": "aplicado",
+                "resultado": inspeccion.resultado
+            }
+            respuestas.append(respuesta)
+            aplicadas.append((respuesta, inspeccion))
+
+        # Un solo flush para todo el lote; recién ahí cada inspección tiene su versión nueva
+        db.flush()
+        for respuesta, inspeccion in aplicadas:
+            respuesta["version"] = inspeccion.version
+            db.add(SincronizacionCampo(
+                inspector_id=inspector.id,
+                clave=respuesta["clave"],
+                inspeccion_id=inspeccion.id,
+                respuesta=json.dumps(respuesta, ensure_ascii=False)
+            ))
+
+        if aplicadas:
+            CalendarioService.invalidar(db, *[inspeccion for _, inspeccion in aplicadas])
+        db.commit()
+        return respuestas, fotos_nuevas
+
+    @classmethod
+    def sincronizar(cls, db: Session, inspector: User, resultados: list) -> dict:
+        """
+        Aplica los resultados del dispositivo en una sola transacción.
+        resultados: [{"clave": "uuid", "inspeccion_id": 5, "version": 2, "realizada": "2026-10-20T09:40",
+                      "checklist": {"extintores": true, ...}, "observaciones": "...", "recomendaciones": "...",
+                      "fotos_antes": [sha256], "fotos_despues": [sha256], "forzar": false}]
+        """
+        if not isinstance(resultados, list) or not resultados:
+            raise ValueError("Se esperaba una lista de resultados")
+        if len(resultados) > cls.MAX_RESULTADOS:
+            raise ValueError(f"Máximo {cls.MAX_RESULTADOS} resultados por sincronización")
+        resultados = [cls._validar(r) for r in resultados]
+        if len({r["clave"] for r in resultados}) != len(resultados):
+            raise ValueError("Hay claves repetidas en el lote")
+
+        try:
+            respuestas, fotos_nuevas = cls._aplicar_lote(db, inspector, resultados)
+        except (IntegrityError, StaleDataError):
+            # Otro envío del mismo lote (u otro cambio) se aplicó en paralelo: al reintentar
+            # lo ya aplicado queda como duplicado y lo demás se vuelve a evaluar
+            db.rollback()
+            respuestas, fotos_nuevas = cls._aplicar_lote(db, inspector, resultados)
+
+        if fotos_nuevas:
+            ImagenService.programar(fotos_nuevas)
+
+        resumen = {
+            estado: sum(1 for r in respuestas if r["estado"] == estado)
+            for estado in ("aplicado", "duplicado", "conflicto")
+        }
+        print(f"📲 Sincronización de campo - Inspector {inspector.id}: {resumen['aplicado']} aplicado(s), "
+              f"{resumen['duplicado']} duplicado(s), {resumen['conflicto']} conflicto(s)")
+        return {"resumen": resumen, "resultados": respuestas}
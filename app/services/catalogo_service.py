@@ -0,0 +1,159 @@
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.config import Rubro, Tarifa, Zona, VersionCatalogo
+from types import SimpleNamespace
+import threading
+import time
+
+
+class CatalogoService:
+    """
+    Copia en memoria de las tablas maestras (rubros, tarifas, zonas).
+    Cada tabla tiene un número de versión en versiones_catalogo que los CRUD de
+    /municipal/configuracion incrementan en la misma transacción del cambio.
+    Cada proceso relee solo las versiones (una fila por tabla) como mucho cada
+    VERIFICAR_CADA segundos y recarga la copia cuando alguna cambió; así los
+    demás workers de gunicorn ven el cambio en segundos y el asistente y los
+    dashboards nunca consultan estas tablas.
+    """
+
+    TABLAS = {"rubros": Rubro, "tarifas": Tarifa, "zonas": Zona}
+    VERIFICAR_CADA = 2.0
+
+    _snapshot = None
+    _versiones = None
+    _verificado = 0.0
+    _lock = threading.Lock()
+
+    # Métricas
+    recargas = 0
+    consultas_version = 0
+
+    # ============ VERSIONES ============
+
+    @classmethod
+    def _leer_versiones(cls) -> dict:
+        db = SessionLocal()
+        try:
+            filas = dict(db.query(VersionCatalogo.nombre, VersionCatalogo.version).all())
+        finally:
+            db.close()
+        cls.consultas_version += 1
+        return {tabla: filas.get(tabla, 0) for tabla in cls.TABLAS}
+
+    @classmethod
+    def versiones(cls) -> dict:
+        """Versión vigente de cada tabla (leída de la BD como mucho cada VERIFICAR_CADA segundos)"""
+        ahora = time.monotonic()
+        if cls._versiones is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+            cls._versiones = cls._leer_versiones()
+            cls._verificado = ahora
+        return cls._versiones
+
+    @classmethod
+    def invalidar(cls, db: Session, *tablas: str):
+        """
+        Incrementa la versión de las tablas modificadas, en la transacción del llamador
+        (llamar antes de db.commit()). Al confirmar, este proceso recarga de inmediato.
+        """
+        for tabla in tablas:
+            resultado = db.execute(
+                update(VersionCatalogo)
+                .where(VersionCatalogo.nombre == tabla)
+                .values(version=VersionCatalogo.version + 1)
+            )
+            if resultado.rowcount == 0:
+                db.add(VersionCatalogo(nombre=tabla, version=1))
+
+        def al_confirmar(_):
+            cls._versiones = None
+            cls._snapshot = None
+
+        event.listen(db, "after_commit", al_confirmar, once=True)
+
+    # ============ COPIA EN MEMORIA ============
+
+    @staticmethod
+    def _fila(objeto) -> SimpleNamespace:
+        """Copia de solo lectura de una fila (no queda ligada a ninguna sesión)"""
+        return SimpleNamespace(**{
+            columna.key: getattr(objeto, columna.key)
+            for columna in objeto.__table__.columns
+        })
+
+    @classmethod
+    def _cargar(cls, versiones: dict) -> dict:
+        db = SessionLocal()
+        try:
+            rubros = [cls._fila(r) for r in db.query(Rubro).order_by(Rubro.codigo)]
+            tarifas = [cls._fila(t) for t in db.query(Tarifa).order_by(Tarifa.nivel_riesgo, Tarifa.vigente_desde)]
+            zonas = [cls._fila(z) for z in db.query(Zona).order_by(Zona.codigo)]
+        finally:
+            db.close()
+
+        cls.recargas += 1
+        return {
+            "versiones": dict(versiones),
+            "rubros": rubros,
+            "rubros_activos": [r for r in rubros if r.is_active is not False],
+            "rubros_por_id": {r.id: r for r in rubros},
+            "tarifas": tarifas,
+            "tarifas_activas": [t for t in tarifas if t.is_active is not False],
+            "zonas": zonas,
+            "zonas_activas": [z for z in zonas if z.is_active is not False],
+            "zonas_por_codigo": {z.codigo: z for z in zonas},
+        }
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        versiones = cls.versiones()
+        snapshot = cls._snapshot
+        if snapshot is not None and snapshot["versiones"] == versiones:
+            return snapshot
+        with cls._lock:
+            if cls._snapshot is None or cls._snapshot["versiones"] != versiones:
+                cls._snapshot = cls._cargar(versiones)
+            return cls._snapshot
+
+    # ============ CONSULTAS ============
+
+    @classmethod
+    def rubros(cls, activos: bool = True) -> list:
+        return cls.snapshot()["rubros_activos" if activos else "rubros"]
+
+    @classmethod
+    def rubros_por_id(cls) -> dict:
+        """Todos los rubros por id (incluye los desactivados: los usan solicitudes antiguas)"""
+        return cls.snapshot()["rubros_por_id"]
+
+    @classmethod
+    def rubro(cls, rubro_id):
+        try:
+            return cls.snapshot()["rubros_por_id"].get(int(rubro_id))
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def tarifas(cls, activas: bool = True) -> list:
+        return cls.snapshot()["tarifas_activas" if activas else "tarifas"]
+
+    @classmethod
+    def zonas(cls, activas: bool = True) -> list:
+        return cls.snapshot()["zonas_activas" if activas else "zonas"]
+
+    @classmethod
+    def zona(cls, codigo: str):
+        return cls.snapshot()["zonas_por_codigo"].get(codigo)
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        snapshot = cls.snapshot()
+        return {
+            "versiones": snapshot["versiones"],
+            "rubros": len(snapshot["rubros"]),
+            "tarifas": len(snapshot["tarifas"]),
+            "zonas": len(snapshot["zonas"]),
+            "recargas": cls.recargas,
+            "consultas_version": cls.consultas_version
+        }
@@ -0,0 +1,306 @@
+from cachetools import TTLCache
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal
+from app.models.solicitud import Solicitud, EstadoSolicitud
+from app.utils.bloom import FiltroBloom
+from datetime import datetime, timedelta
+import re
+import secrets
+import threading
+import time
+
+
+class ConsultaService:
+    """
+    Consulta exacta por número de expediente, número de licencia o código
+    verificador (mesa de ayuda y verificación pública de licencias).
+    Cada clave tiene índice único en solicitudes. Delante de la base hay:
+    - una caché en memoria de las claves consultadas hace poco (también las
+      que no existen), con vencimiento corto;
+    - un filtro de Bloom con todas las claves existentes: una clave inventada
+      se responde "no existe" sin consultar la base.
+    El filtro se completa al verificar (como mucho cada VERIFICAR_CADA segundos)
+    con las solicitudes nuevas y las modificadas (índice por updated_at); las
+    claves guardadas por este proceso entran al confirmar la transacción.
+    Las nuevas se releen desde MARGEN_IDS antes del último id visto: con varios
+    workers un id bajo puede confirmarse después de uno alto. Lo que quede
+    fuera de esa ventana lo cubre la reconstrucción diaria (tarea
+    consulta_filtro_reconstruir).
+    """
+
+    VERIFICAR_CADA = 2.0
+
+    # Las modificaciones y los últimos ids se releen con este margen (transacciones que confirman tarde)
+    MARGEN_MODIFICADAS = timedelta(seconds=60)
+    MARGEN_IDS = 1000
+
+    TASA_FALSOS_POSITIVOS = 0.001
+    CAPACIDAD_MINIMA = 100000
+    TAMAÑO_LOTE = 20000
+
+    COLUMNAS = {
+        "expediente": Solicitud.numero_expediente,
+        "licencia": Solicitud.numero_licencia,
+        "codigo": Solicitud.codigo_verificador,
+    }
+    FORMATOS = {
+        "expediente": re.compile(r"EXP-[A-Z0-9-]{1,46}"),
+        "licencia": re.compile(r"LIC-[A-Z0-9-]{1,46}"),
+        "codigo": re.compile(r"[A-Z0-9]{6,20}"),
+    }
+
+    # Lo que ve cualquiera en /verificar (sin expediente, código ni datos internos)
+    CAMPOS_PUBLICOS = ("numero_licencia", "nombre_negocio", "direccion", "estado", "fecha_emision",
+                       "fecha_vencimiento", "vigente")
+
+    _cache = TTLCache(maxsize=5000, ttl=30)
+    _lock_cache = threading.Lock()
+
+    _filtro = None
+    _ultimo_id = 0
+    _marca = None       # updated_at más reciente leído
+    _verificado = 0.0
+    _lock = threading.Lock()
+
+    # Métricas
+    reconstrucciones = 0
+    consultas = 0
+    aciertos_cache = 0
+    descartadas_filtro = 0
+    consultas_bd = 0
+    falsos_positivos = 0
+
+    # ============ ÍNDICES Y CÓDIGOS ============
+
+    @classmethod
+    def preparar(cls, engine: Engine):
+        """Crea en bases anteriores los índices que usa (código verificador único, updated_at) y activa la sincronización"""
+        for indice in Solicitud.__table__.indexes:
+            if indice.name not in ("ux_solicitudes_codigo_verificador", "ix_solicitudes_updated_at"):
+                continue
+            try:
+                indice.create(engine, checkfirst=True)
+            except Exception as e:
+                print(f"⚠️ No se pudo crear el índice {indice.name} (¿códigos verificadores repetidos?): {e}")
+        if not event.contains(Session, "after_flush", cls._al_guardar):
+            event.listen(Session, "after_flush", cls._al_guardar)
+
+    @classmethod
+    def nuevo_codigo(cls, db: Session) -> str:
+        """Código verificador de 8 caracteres que no usa ninguna otra licencia"""
+        filtro = cls.filtro()
+        for _ in range(10):
+            codigo = secrets.token_hex(4).upper()
+            # Si el filtro no lo tiene, seguro que está libre
+            if codigo not in filtro:
+                return codigo
+            if not db.query(Solicitud.id).filter(Solicitud.codigo_verificador == codigo).first():
+                return codigo
+        raise RuntimeError("No se pudo generar un código verificador libre")
+
+    # ============ FILTRO DE BLOOM ============
+
+    @classmethod
+    def _agregar(cls, filtro: FiltroBloom, filas, marcas: tuple) -> tuple:
+        """
+        Agrega las claves de las filas (id, expediente, licencia, código, updated_at).
+        marcas: (último id, updated_at más reciente) vistos; retorna las marcas actualizadas
+        """
+        ultimo_id, marca = marcas
+        for solicitud_id, expediente, licencia, codigo, modificada in filas:
+            for clave in (expediente, licencia, codigo):
+                # Las ventanas de relectura traen filas ya vistas: no cuentan para la capacidad
+                if clave and clave.upper() not in filtro:
+                    filtro.agregar(clave.upper())
+            if solicitud_id > ultimo_id:
+                ultimo_id = solicitud_id
+            if modificada is not None and (marca is None or modificada > marca):
+                marca = modificada
+        return ultimo_id, marca
+
+    @classmethod
+    def _consulta(cls, db: Session):
+        return db.query(
+            Solicitud.id, Solicitud.numero_expediente, Solicitud.numero_licencia,
+            Solicitud.codigo_verificador, Solicitud.updated_at
+        )
+
+    @classmethod
+    def _construir(cls, db: Session) -> tuple:
+        """(filtro, último id, updated_at más reciente) con todas las solicitudes"""
+        inicio = time.perf_counter()
+        total = db.query(Solicitud.id).count()
+        filtro = FiltroBloom(max(cls.CAPACIDAD_MINIMA, total * 3 * 2), cls.TASA_FALSOS_POSITIVOS)
+        marcas = (0, None)
+        while True:
+            filas = (
+                cls._consulta(db)
+                .filter(Solicitud.id > marcas[0])
+                .order_by(Solicitud.id)
+                .limit(cls.TAMAÑO_LOTE)
+                .all()
+            )
+            if not filas:
+                break
+            marcas = cls._agregar(filtro, filas, marcas)
+        print(f"🔑 Filtro de claves: {filtro.cantidad} claves de {total} solicitudes, "
+              f"{filtro.tamaño_bytes() / 1024:.0f} KB ({time.perf_counter() - inicio:.1f} s)")
+        return (filtro, *marcas)
+
+    @classmethod
+    def _actualizar(cls, db: Session):
+        """Agrega al filtro las solicitudes nuevas (con MARGEN_IDS hacia atrás) y las modificadas"""
+        nuevas = cls._consulta(db).filter(Solicitud.id > cls._ultimo_id - cls.MARGEN_IDS).all()
+        consulta = cls._consulta(db).filter(Solicitud.updated_at.isnot(None))
+        if cls._marca is not None:
+            consulta = consulta.filter(Solicitud.updated_at >= cls._marca - cls.MARGEN_MODIFICADAS)
+        cls._ultimo_id, cls._marca = cls._agregar(
+            cls._filtro, nuevas + consulta.all(), (cls._ultimo_id, cls._marca)
+        )
+
+    @classmethod
+    def filtro(cls) -> FiltroBloom:
+        ahora = time.monotonic()
+        if cls._filtro is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+            with cls._lock:
+                if cls._filtro is None or ahora - cls._verificado >= cls.VERIFICAR_CADA:
+                    db = SessionLocal()
+                    try:
+                        if cls._filtro is None or cls._filtro.saturado():
+                            cls._filtro, cls._ultimo_id, cls._marca = cls._construir(db)
+                        else:
+                            cls._actualizar(db)
+                    finally:
+                        db.close()
+                    cls._verificado = time.monotonic()
+        return cls._filtro
+
+    @classmethod
+    def reconstruir(cls):
+        """
+        Arma un filtro nuevo desde cero y lo reemplaza (tarea diaria por proceso).
+        Se construye sin bloquear las consultas; lo confirmado mientras tanto entra
+        en la siguiente verificación por id o por updated_at.
+        """
+        if cls._filtro is None:
+            return
+        db = SessionLocal()
+        try:
+            nuevo = cls._construir(db)
+        finally:
+            db.close()
+        with cls._lock:
+            cls._filtro, cls._ultimo_id, cls._marca = nuevo
+            cls._verificado = 0.0
+        cls.reconstrucciones += 1
+
+    # ============ SINCRONIZACIÓN ============
+
+    @classmethod
+    def _al_guardar(cls, session: Session, contexto):
+        """after_flush: claves nuevas al filtro y fuera de la caché al confirmar"""
+        nuevas = []
+        viejas = []
+        for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+            if not isinstance(objeto, Solicitud):
+                continue
+            estado = inspect(objeto)
+            for tipo, columna in cls.COLUMNAS.items():
+                historia = estado.attrs[columna.key].history
+                nuevas += [(tipo, v) for v in historia.added if v]
+                viejas += [(tipo, v) for v in historia.deleted if v]
+                # Cualquier cambio (estado, fechas, negocio) deja vieja la respuesta en caché
+                viejas.append((tipo, getattr(objeto, columna.key)))
+        if not nuevas and not viejas:
+            return
+
+        def al_confirmar(_):
+            if cls._filtro is not None:
+                with cls._lock:
+                    for _, clave in nuevas:
+                        cls._filtro.agregar(clave.upper())
+            with cls._lock_cache:
+                for tipo, clave in nuevas + viejas:
+                    if clave:
+                        cls._cache.pop((tipo, clave.upper()), None)
+
+        event.listen(session, "after_commit", al_confirmar, once=True)
+
+    # ============ CONSULTAS ============
+
+    @classmethod
+    def clasificar(cls, clave: str, tipo: str = None) -> tuple:
+        """(tipo, clave normalizada); sin tipo se deduce del formato"""
+        valor = re.sub(r"\s+", "", clave or "").upper()
+        if tipo is not None:
+            if tipo not in cls.FORMATOS:
+                raise ValueError(f"Tipo de clave no válido: {tipo}")
+            if not cls.FORMATOS[tipo].fullmatch(valor):
+                raise ValueError(f"Formato no válido para {tipo}")
+            return tipo, valor
+        for tipo, formato in cls.FORMATOS.items():
+            if formato.fullmatch(valor):
+                return tipo, valor
+        raise ValueError("Formato de clave no reconocido (expediente EXP-..., licencia LIC-... o código verificador)")
+
+    @staticmethod
+    def _resultado(solicitud: Solicitud, tipo: str) -> dict:
+        vencimiento = solicitud.fecha_vencimiento
+        return {
+            "tipo": tipo,
+            "id": solicitud.id,
+            "numero_expediente": solicitud.numero_expediente,
+            "numero_licencia": solicitud.numero_licencia,
+            "codigo_verificador": solicitud.codigo_verificador,
+            "nombre_negocio": solicitud.nombre_negocio,
+            "direccion": f"{solicitud.direccion_negocio}, {solicitud.distrito}",
+            "nivel_riesgo": solicitud.nivel_riesgo,
+            "estado": solicitud.estado,
+            "fecha_emision": solicitud.fecha_emision.isoformat() if solicitud.fecha_emision else None,
+            "fecha_vencimiento": vencimiento.isoformat() if vencimiento else None,
+            "vigente": (
+                solicitud.estado == EstadoSolicitud.LICENCIA_EMITIDA.value
+                and (vencimiento is None or vencimiento >= datetime.now())
+            )
+        }
+
+    @classmethod
+    def buscar(cls, db: Session, clave: str, tipo: str = None) -> dict:
+        """Solicitud con esa clave (None si no existe). ValueError si la clave no tiene un formato válido."""
+        tipo, valor = cls.clasificar(clave, tipo)
+        cls.consultas += 1
+
+        with cls._lock_cache:
+            en_cache = cls._cache.get((tipo, valor), False)
+        if en_cache is not False:
+            cls.aciertos_cache += 1
+            return en_cache
+
+        if valor not in cls.filtro():
+            cls.descartadas_filtro += 1
+            return None
+
+        cls.consultas_bd += 1
+        solicitud = db.query(Solicitud).filter(cls.COLUMNAS[tipo] == valor).first()
+        resultado = cls._resultado(solicitud, tipo) if solicitud else None
+        if resultado is None:
+            cls.falsos_positivos += 1
+        with cls._lock_cache:
+            cls._cache[(tipo, valor)] = resultado
+        return resultado
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        filtro = cls._filtro
+        return {
+            "consultas": cls.consultas,
+            "aciertos_cache": cls.aciertos_cache,
+            "descartadas_filtro": cls.descartadas_filtro,
+            "consultas_bd": cls.consultas_bd,
+            "falsos_positivos": cls.falsos_positivos,
+            "reconstrucciones": cls.reconstrucciones,
+            "claves_filtro": filtro.cantidad if filtro else None,
+            "kb_filtro": round(filtro.tamaño_bytes() / 1024) if filtro else None
+        }
@@ -0,0 +1,294 @@
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.documento import Documento
+from app.services.almacenamiento_service import AlmacenamientoService
+import hashlib
+import mimetypes
+import os
+import time
+import uuid
+
+
+class ArchivoRechazado(Exception):
+    """El upload no cumple los límites de tamaño o tipo"""
+
+    def __init__(self, mensaje: str, status_code: int = 400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status_code = status_code
+
+
+class ArchivoRecibido:
+    """Archivo ya escrito en disco temporal, con su hash calculado al vuelo"""
+
+    def __init__(self, campo: str, nombre_original: str, extension: str, ruta_temporal: str):
+        self.campo = campo
+        self.nombre_original = nombre_original
+        self.extension = extension
+        self.ruta_temporal = ruta_temporal
+        self.tamaño_bytes = 0
+        self.sha256 = hashlib.sha256()
+        self.cabecera = b""
+        self.archivo = open(ruta_temporal, "wb")
+
+    @property
+    def mime_type(self) -> str:
+        return mimetypes.guess_type(f"x.{self.extension}")[0] or "application/octet-stream"
+
+    def descartar(self):
+        if not self.archivo.closed:
+            self.archivo.close()
+        if os.path.exists(self.ruta_temporal):
+            os.remove(self.ruta_temporal)
+
+
+class _ReceptorMultipart:
+    """Callbacks del parser multipart: escribe cada parte a disco mientras llega"""
+
+    def __init__(self, carpeta_temporal: str, extensiones: list):
+        self.carpeta_temporal = carpeta_temporal
+        self.extensiones = extensiones
+        self.campos = {}
+        self.archivos = []
+        self._cabeceras = {}
+        self._campo_actual = b""
+        self._valor_actual = b""
+        self._nombre = None
+        self._valor_campo = None
+        self._archivo = None
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._cabeceras = {}
+        self._nombre = None
+        self._valor_campo = None
+        self._archivo = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._campo_actual += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._valor_actual += data[start:end]
+
+    def on_header_end(self):
+        self._cabeceras[self._campo_actual.lower()] = self._valor_actual
+        self._campo_actual = b""
+        self._valor_actual = b""
+
+    def on_headers_finished(self):
+        _, opciones = parse_options_header(self._cabeceras.get(b"content-disposition", b""))
+        self._nombre = opciones.get(b"name", b"").decode("utf-8", "replace")
+        nombre_archivo = opciones.get(b"filename")
+
+        if nombre_archivo is None:
+            self._valor_campo = bytearray()
+            return
+        if not nombre_archivo:
+            # Input de archivo enviado vacío: se ignora la parte
+            return
+
+        nombre_original = os.path.basename(nombre_archivo.decode("utf-8", "replace").replace("\\", "/"))
+        extension = nombre_original.rsplit(".", 1)[-1].lower() if "." in nombre_original else ""
+        if extension not in self.extensiones:
+            raise ArchivoRechazado(
+                f"Tipo de archivo no permitido: .{extension or '?'} "
+                f"(permitidos: {', '.join(self.extensiones)})",
+                status_code=415
+            )
+        if len(self.archivos) >= DocumentoService.MAX_ARCHIVOS_POR_ENVIO:
+            raise ArchivoRechazado(
+                f"Máximo {DocumentoService.MAX_ARCHIVOS_POR_ENVIO} archivos por envío",
+                status_code=413
+            )
+
+        ruta_temporal = os.path.join(self.carpeta_temporal, f"{uuid.uuid4().hex}.part")
+        self._archivo = ArchivoRecibido(self._nombre, nombre_original, extension, ruta_temporal)
+        self.archivos.append(self._archivo)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        trozo = data[start:end]
+
+        if self._archivo is None:
+            if self._valor_campo is not None:
+                self._valor_campo += trozo
+                if len(self._valor_campo) > DocumentoService.MAX_TAMAÑO_CAMPO:
+                    raise ArchivoRechazado(f"Campo demasiado largo: {self._nombre}", status_code=413)
+            return
+
+        archivo = self._archivo
+        archivo.tamaño_bytes += len(trozo)
+        if archivo.tamaño_bytes > settings.MAX_FILE_SIZE:
+            raise ArchivoRechazado(
+                f"{archivo.nombre_original} supera el máximo de "
+                f"{settings.MAX_FILE_SIZE // (1024 * 1024)} MB",
+                status_code=413
+            )
+
+        # Verificar la firma del archivo apenas llegan los primeros bytes
+        if len(archivo.cabecera) < DocumentoService.BYTES_FIRMA:
+            archivo.cabecera += trozo[:DocumentoService.BYTES_FIRMA - len(archivo.cabecera)]
+            if len(archivo.cabecera) >= DocumentoService.BYTES_FIRMA:
+                DocumentoService.verificar_firma(archivo)
+
+        archivo.sha256.update(trozo)
+        archivo.archivo.write(trozo)
+
+    def on_part_end(self):
+        if self._archivo is not None:
+            if len(self._archivo.cabecera) < DocumentoService.BYTES_FIRMA:
+                DocumentoService.verificar_firma(self._archivo)
+            self._archivo.archivo.close()
+        elif self._valor_campo is not None:
+            self.campos[self._nombre] = self._valor_campo.decode("utf-8", "replace")
+
+
+class DocumentoService:
+    """Recepción de documentos en streaming y registro en la tabla documentos"""
+
+    MAX_ARCHIVOS_POR_ENVIO = 5
+    MAX_TAMAÑO_CAMPO = 4096
+    BYTES_FIRMA = 8
+
+    # Firmas (magic bytes) esperadas según la extensión declarada
+    FIRMAS = {
+        "pdf": [b"%PDF-"],
+        "jpg": [b"\xff\xd8\xff"],
+        "jpeg": [b"\xff\xd8\xff"],
+        "png": [b"\x89PNG\r\n\x1a\n"],
+        "doc": [b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"],
+        "docx": [b"PK\x03\x04"],
+    }
+
+    @staticmethod
+    def extensiones_permitidas() -> list:
+        return [e.strip().lower() for e in settings.ALLOWED_EXTENSIONS if e.strip()]
+
+    @staticmethod
+    def verificar_firma(archivo: ArchivoRecibido):
+        """Rechaza archivos cuyo contenido no corresponde a la extensión"""
+        firmas = DocumentoService.FIRMAS.get(archivo.extension)
+        if firmas and not any(archivo.cabecera.startswith(f) for f in firmas):
+            raise ArchivoRechazado(
+                f"El contenido de {archivo.nombre_original} no corresponde a un archivo .{archivo.extension}",
+                status_code=415
+            )
+
+    @staticmethod
+    def carpeta_temporal() -> str:
+        carpeta = os.path.join(settings.UPLOAD_FOLDER, "tmp")
+        os.makedirs(carpeta, exist_ok=True)
+        return carpeta
+
+    @staticmethod
+    def limpiar_temporales(antiguedad_segundos: int = 3600) -> dict:
+        """Elimina los .part que dejaron subidas interrumpidas (proceso caído a mitad de un envío)"""
+        carpeta = DocumentoService.carpeta_temporal()
+        limite = time.time() - antiguedad_segundos
+        eliminados = 0
+        for entrada in os.scandir(carpeta):
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    eliminados += 1
+            except FileNotFoundError:
+                continue
+        if eliminados:
+            print(f"🧹 Temporales de subida eliminados: {eliminados}")
+        return {"eliminados": eliminados}
+
+    @staticmethod
+    async def recibir_multipart(request, extensiones: list = None):
+        """
+        Lee el cuerpo multipart directamente del stream de la petición.
+        Cada trozo se escribe a disco y se suma al SHA-256 en cuanto llega,
+        así la memoria usada no depende del tamaño de los archivos.
+        extensiones: restringe los tipos aceptados (por defecto ALLOWED_EXTENSIONS)
+        Retorna: (campos, archivos) - lanza ArchivoRechazado al superar un límite
+        """
+        tipo_contenido, opciones = parse_options_header(request.headers.get("content-type", ""))
+        if tipo_contenido != b"multipart/form-data" or b"boundary" not in opciones:
+            raise ArchivoRechazado("Se esperaba multipart/form-data", status_code=400)
+
+        limite_total = (
+            settings.MAX_FILE_SIZE * DocumentoService.MAX_ARCHIVOS_POR_ENVIO
+            + DocumentoService.MAX_TAMAÑO_CAMPO * 16
+        )
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limite_total:
+            raise ArchivoRechazado("El envío supera el tamaño máximo permitido", status_code=413)
+
+        receptor = _ReceptorMultipart(
+            DocumentoService.carpeta_temporal(),
+            extensiones or DocumentoService.extensiones_permitidas()
+        )
+        parser = MultipartParser(opciones[b"boundary"], receptor.callbacks())
+
+        recibidos = 0
+        try:
+            async for trozo in request.stream():
+                recibidos += len(trozo)
+                if recibidos > limite_total:
+                    raise ArchivoRechazado("El envío supera el tamaño máximo permitido", status_code=413)
+                parser.write(trozo)
+            parser.finalize()
+        except Exception as e:
+            for archivo in receptor.archivos:
+                archivo.descartar()
+            if isinstance(e, ArchivoRechazado):
+                raise
+            raise ArchivoRechazado(f"Cuerpo multipart inválido: {e}", status_code=400)
+
+        return receptor.campos, receptor.archivos
+
+    @staticmethod
+    def registrar_documentos(db: Session, solicitud_id: int, usuario_id: int,
+                             campos: dict, archivos: list) -> list:
+        """
+        Guarda los archivos en el almacén por contenido y crea las filas
+        Documento de un envío en una sola transacción
+        """
+        documentos = []
+        try:
+            for archivo in archivos:
+                sha256 = archivo.sha256.hexdigest()
+                ruta, nuevo = AlmacenamientoService.guardar(archivo.ruta_temporal, sha256)
+                if not nuevo:
+                    print(f"♻️ Contenido ya almacenado, se reutiliza: {archivo.nombre_original}")
+
+                documento = Documento(
+                    solicitud_id=solicitud_id,
+                    tipo=campos.get("tipo") or archivo.campo or "otro",
+                    nombre=campos.get("nombre") or archivo.nombre_original,
+                    descripcion=campos.get("descripcion"),
+                    ruta_archivo=ruta,
+                    nombre_original=archivo.nombre_original,
+                    mime_type=archivo.mime_type,
+                    tamaño_bytes=archivo.tamaño_bytes,
+                    hash_sha256=sha256,
+                    uploaded_by=usuario_id
+                )
+                db.add(documento)
+                documentos.append(documento)
+
+            db.commit()
+        except Exception:
+            # Los blobs ya movidos pueden estar compartidos: los limpia el recolector
+            db.rollback()
+            for archivo in archivos:
+                archivo.descartar()
+            raise
+
+        for documento in documentos:
+            db.refresh(documento)
+        return documentos
@@ -0,0 +1,343 @@
+from sqlalchemy import func, select
+from app.database.connection import SessionLocal
+from app.models.solicitud import Solicitud
+from app.models.pago import Pago
+from app.models.user import User
+from app.models.config import Rubro
+from xml.sax.saxutils import escape
+from datetime import datetime, date
+from decimal import Decimal
+import csv
+import io
+import math
+import re
+import zipfile
+
+
+class _SalidaStream:
+    """Archivo de solo escritura que acumula bytes hasta que el generador los entrega"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self.partes)
+        self.partes = []
+        return datos
+
+
+class ExportacionService:
+    """Exportación masiva de solicitudes y pagos a CSV / XLSX en streaming"""
+
+    # Filas que se leen del cursor y se escriben antes de entregar un bloque al cliente
+    TAMAÑO_LOTE = 2000
+
+    # Límite de filas de una hoja de Excel (sin contar el encabezado)
+    MAX_FILAS_XLSX = 1048575
+
+    COLUMNAS = {
+        "solicitudes": {
+            "numero_expediente": Solicitud.numero_expediente,
+            "nombre_negocio": Solicitud.nombre_negocio,
+            "rubro": Rubro.nombre,
+            "direccion_negocio": Solicitud.direccion_negocio,
+            "distrito": Solicitud.distrito,
+            "nivel_riesgo": Solicitud.nivel_riesgo,
+            "estado": Solicitud.estado,
+            "requiere_itse_previa": Solicitud.requiere_itse_previa,
+            "monto_pago": Solicitud.monto_pago,
+            "metodo_pago": Solicitud.metodo_pago,
+            "fecha_pago": Solicitud.fecha_pago,
+            "numero_licencia": Solicitud.numero_licencia,
+            "fecha_emision": Solicitud.fecha_emision,
+            "fecha_vencimiento": Solicitud.fecha_vencimiento,
+            "titular_email": User.email,
+            "titular_dni": User.dni,
+            "titular_ruc": User.ruc,
+            "created_at": Solicitud.created_at,
+        },
+        "pagos": {
+            "codigo_pago": Pago.codigo_pago,
+            "numero_expediente": Solicitud.numero_expediente,
+            "monto": Pago.monto,
+            "moneda": Pago.moneda,
+            "metodo_pago": Pago.metodo_pago,
+            "estado": Pago.estado,
+            "codigo_transaccion": Pago.codigo_transaccion,
+            "fecha_transaccion": Pago.fecha_transaccion,
+            "comprobante_numero": Pago.comprobante_numero,
+            "created_at": Pago.created_at,
+        }
+    }
+
+    # Caracteres no permitidos en XML 1.0
+    _XML_INVALIDO = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+    @classmethod
+    def validar_columnas(cls, dataset: str, columnas: list = None) -> list:
+        """
+        Valida el dataset y las columnas pedidas
+        Retorna: lista de columnas (todas si no se indica ninguna)
+        """
+        if dataset not in cls.COLUMNAS:
+            raise ValueError(f"Dataset no válido: {dataset}")
+
+        disponibles = cls.COLUMNAS[dataset]
+        if not columnas:
+            return list(disponibles.keys())
+
+        invalidas = [c for c in columnas if c not in disponibles]
+        if invalidas:
+            raise ValueError(f"Columnas no válidas para {dataset}: {', '.join(invalidas)}")
+        return columnas
+
+    @classmethod
+    def construir_consulta(cls, dataset: str, columnas: list, filtros: dict = None):
+        """Arma el SELECT solo con las columnas pedidas y los filtros indicados"""
+        filtros = filtros or {}
+        campos = [cls.COLUMNAS[dataset][c].label(c) for c in columnas]
+
+        if dataset == "solicitudes":
+            stmt = select(*campos).select_from(Solicitud)
+            if "rubro" in columnas:
+                stmt = stmt.outerjoin(Rubro, Rubro.id == Solicitud.rubro_id)
+            if any(c.startswith("titular_") for c in columnas):
+                stmt = stmt.outerjoin(User, User.id == Solicitud.usuario_id)
+
+            if filtros.get("desde"):
+                stmt = stmt.where(Solicitud.created_at >= filtros["desde"])
+            if filtros.get("hasta"):
+                stmt = stmt.where(Solicitud.created_at <= filtros["hasta"])
+            if filtros.get("estado"):
+                stmt = stmt.where(Solicitud.estado == filtros["estado"])
+            if filtros.get("riesgo"):
+                stmt = stmt.where(Solicitud.nivel_riesgo == filtros["riesgo"])
+            if filtros.get("distrito"):
+                stmt = stmt.where(Solicitud.distrito == filtros["distrito"])
+            if filtros.get("metodo_pago"):
+                stmt = stmt.where(Solicitud.metodo_pago == filtros["metodo_pago"])
+            return stmt.order_by(Solicitud.id)
+
+        stmt = select(*campos).select_from(Pago)
+        if "numero_expediente" in columnas:
+            stmt = stmt.outerjoin(Solicitud, Solicitud.id == Pago.solicitud_id)
+
+        if filtros.get("desde"):
+            stmt = stmt.where(Pago.created_at >= filtros["desde"])
+        if filtros.get("hasta"):
+            stmt = stmt.where(Pago.created_at <= filtros["hasta"])
+        if filtros.get("estado"):
+            stmt = stmt.where(Pago.estado == filtros["estado"])
+        if filtros.get("metodo_pago"):
+            stmt = stmt.where(Pago.metodo_pago == filtros["metodo_pago"])
+        return stmt.order_by(Pago.id)
+
+    @staticmethod
+    def contar(stmt) -> int:
+        db = SessionLocal()
+        try:
+            return db.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar()
+        finally:
+            db.close()
+
+    @classmethod
+    def iterar_filas(cls, stmt):
+        """
+        Recorre el resultado con un cursor del lado del servidor (stream_results),
+        trayendo TAMAÑO_LOTE filas a la vez. Usa su propia sesión porque el
+        generador sigue corriendo después de que termina el endpoint.
+        """
+        db = SessionLocal()
+        try:
+            resultado = db.execute(
+                stmt,
+                execution_options={"stream_results": True, "yield_per": cls.TAMAÑO_LOTE}
+            )
+            for fila in resultado:
+                yield fila
+        finally:
+            db.close()
+
+    @staticmethod
+    def _formatear(valor):
+        """Convierte fechas a texto legible; el resto queda igual"""
+        if isinstance(valor, datetime):
+            return valor.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(valor, date):
+            return valor.strftime("%Y-%m-%d")
+        return valor
+
+    @classmethod
+    def generar_csv(cls, filas, encabezados: list):
+        """Genera el CSV por bloques (con BOM para que Excel respete las tildes)"""
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+
+        buffer.write("\ufeff")
+        escritor.writerow(encabezados)
+
+        pendientes = 0
+        for fila in filas:
+            escritor.writerow(["" if v is None else cls._formatear(v) for v in fila])
+            pendientes += 1
+            if pendientes >= cls.TAMAÑO_LOTE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+                pendientes = 0
+
+        yield buffer.getvalue().encode("utf-8")
+
+    @classmethod
+    def _celda_xml(cls, valor) -> str:
+        if valor is None:
+            return "<c/>"
+        if isinstance(valor, bool):
+            return f'<c t="b"><v>{int(valor)}</v></c>'
+        if isinstance(valor, int) or (isinstance(valor, float) and math.isfinite(valor)):
+            return f"<c><v>{valor}</v></c>"
+        if isinstance(valor, Decimal) and valor.is_finite():
+            # Montos de columnas NUMERIC (PostgreSQL los entrega como Decimal): celda numérica, Excel puede sumarlos
+            return f"<c><v>{valor:f}</v></c>"
+        texto = cls._XML_INVALIDO.sub("", str(cls._formatear(valor)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+    @classmethod
+    def _fila_xml(cls, valores) -> str:
+        return "<row>" + "".join(cls._celda_xml(v) for v in valores) + "</row>"
+
+    @classmethod
+    def generar_xlsx(cls, filas, encabezados: list, nombre_hoja: str = "Datos"):
+        """
+        Genera un XLSX mínimo (SpreadsheetML con cadenas en línea) escribiendo la
+        hoja directamente dentro del ZIP, sin armar el libro en memoria
+        """
+        salida = _SalidaStream()
+        with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("[Content_Types].xml", cls._XLSX_CONTENT_TYPES)
+            zf.writestr("_rels/.rels", cls._XLSX_RELS)
+            zf.writestr("xl/workbook.xml", cls._XLSX_WORKBOOK.format(hoja=escape(nombre_hoja)))
+            zf.writestr("xl/_rels/workbook.xml.rels", cls._XLSX_WORKBOOK_RELS)
+            zf.writestr("xl/styles.xml", cls._XLSX_STYLES)
+            yield salida.vaciar()
+
+            with zf.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as hoja:
+                hoja.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b'<sheetData>'
+                )
+                hoja.write(cls._fila_xml(encabezados).encode("utf-8"))
+
+                bloque = []
+                total = 0
+                for fila in filas:
+                    if total >= cls.MAX_FILAS_XLSX:
+                        # Se agregaron filas después de contarlas: se corta la descarga (queda
+                        # incompleta y el cliente lo ve como error) en vez de entregar un libro truncado
+                        raise RuntimeError(f"La exportación superó {cls.MAX_FILAS_XLSX} filas - usar formato CSV")
+                    bloque.append(cls._fila_xml(fila))
+                    total += 1
+                    if len(bloque) >= cls.TAMAÑO_LOTE:
+                        hoja.write("".join(bloque).encode("utf-8"))
+                        bloque = []
+                        yield salida.vaciar()
+
+                if bloque:
+                    hoja.write("".join(bloque).encode("utf-8"))
+                hoja.write(b"</sheetData></worksheet>")
+
+        yield salida.vaciar()
+
+    @classmethod
+    def exportar(cls, dataset: str, formato: str, columnas: list = None, filtros: dict = None):
+        """
+        Prepara la exportación completa
+        Retorna: (generador de bytes, media_type, extensión)
+        """
+        if formato not in ("csv", "xlsx"):
+            raise ValueError(f"Formato no válido: {formato}")
+
+        columnas = cls.validar_columnas(dataset, columnas)
+        stmt = cls.construir_consulta(dataset, columnas, filtros)
+        filas = cls.iterar_filas(stmt)
+
+        if formato == "csv":
+            return cls.generar_csv(filas, columnas), "text/csv; charset=utf-8", "csv"
+
+        # Una hoja de Excel no admite más filas: se avisa antes de empezar a enviar
+        total = cls.contar(stmt)
+        if total > cls.MAX_FILAS_XLSX:
+            raise ValueError(f"La exportación tiene {total} filas y una hoja XLSX admite "
+                             f"{cls.MAX_FILAS_XLSX}: use formato=csv o agregue filtros")
+
+        return (
+            cls.generar_xlsx(filas, columnas, nombre_hoja=dataset.capitalize()),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "xlsx"
+        )
+
+    # ========== PARTES FIJAS DEL XLSX ==========
+
+    _XLSX_CONTENT_TYPES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    )
+
+    _XLSX_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )
+
+    _XLSX_WORKBOOK = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+    _XLSX_WORKBOOK_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    )
+
+    _XLSX_STYLES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
@@ -0,0 +1,184 @@
+from sqlalchemy import and_, exists, insert, or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.inspeccion import Inspeccion, EstadoInspeccion
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.services.calendario_service import CalendarioService
+from app.services.ruta_service import RutaService
+from app.utils.intervalos import AgendaIntervalos
+from datetime import date, datetime, timedelta
+import heapq
+import math
+import time
+
+
+class FiscalizacionService:
+    """
+    Campaña anual de re-inspección ITSE. Selecciona los negocios con licencia
+    cuya proxima_inspeccion vence dentro del plan (índice (proxima_inspeccion, id),
+    los más atrasados primero), les asigna horario e inspector y los da de alta
+    por lotes: un INSERT de inspecciones por lote, en vez de dos commits por
+    solicitud como programar_inspeccion. La re-inspección no toca el estado de
+    la solicitud: el negocio conserva su licencia (número y código verificador).
+    El inspector de cada inspección es el que queda libre más temprano, sin
+    cruzarse con su agenda; el orden de visitas del día lo arma después el
+    optimizador de rutas.
+    """
+
+    TAMAÑO_LOTE = 1000
+
+    # Los horarios se redondean a estos minutos
+    GRANULARIDAD = 5
+
+    @staticmethod
+    def niveles() -> list:
+        return [n.strip() for n in settings.FISCALIZACION_NIVELES.split(",") if n.strip()]
+
+    @staticmethod
+    def proxima_inspeccion(desde: datetime = None) -> datetime:
+        """Fecha de la siguiente re-inspección a partir de una inspección aprobada"""
+        return (desde or datetime.now()) + timedelta(days=settings.FISCALIZACION_PERIODICIDAD_DIAS)
+
+    @classmethod
+    def _filtros(cls, hasta: datetime, niveles: list) -> list:
+        return [
+            Solicitud.proxima_inspeccion < hasta,
+            Solicitud.nivel_riesgo.in_(niveles),
+            Solicitud.numero_licencia.isnot(None),
+            Solicitud.estado != "cancelado",
+            # Sin otra inspección pendiente (una campaña anterior o programada a mano)
+            ~exists().where(
+                Inspeccion.solicitud_id == Solicitud.id,
+                Inspeccion.estado.in_(CalendarioService.ESTADOS)
+            )
+        ]
+
+    @classmethod
+    def _lotes(cls, db: Session, filtros: list):
+        """(id, nivel_riesgo) de a TAMAÑO_LOTE, paginando por (proxima_inspeccion, id)"""
+        ultimo = None
+        while True:
+            consulta = db.query(Solicitud.id, Solicitud.nivel_riesgo, Solicitud.proxima_inspeccion).filter(*filtros)
+            if ultimo is not None:
+                consulta = consulta.filter(or_(
+                    Solicitud.proxima_inspeccion > ultimo[0],
+                    and_(Solicitud.proxima_inspeccion == ultimo[0], Solicitud.id > ultimo[1])
+                ))
+            lote = consulta.order_by(Solicitud.proxima_inspeccion, Solicitud.id).limit(cls.TAMAÑO_LOTE).all()
+            if not lote:
+                return
+            ultimo = (lote[-1].proxima_inspeccion, lote[-1].id)
+            yield lote
+
+    @classmethod
+    def _asignar(cls, lote: list, libres: list, dias: list, jornadas: dict, agendas: dict) -> tuple:
+        """
+        Horario e inspector para cada solicitud del lote. `libres` es un heap de
+        (día, minuto, inspector) con el momento en que cada inspector queda libre;
+        se consume y se actualiza entre lotes.
+        Retorna: (filas para el INSERT, solicitudes que no entraron en el plan)
+        """
+        vacia = AgendaIntervalos()
+        filas = []
+        sin_cupo = []
+        for solicitud_id, nivel_riesgo, _ in lote:
+            duracion = CalendarioService.duracion(nivel_riesgo)
+            while libres:
+                d, minuto, inspector_id = heapq.heappop(libres)
+                inicio_jornada, fin_jornada = jornadas[inspector_id]
+                minuto = math.ceil(minuto / cls.GRANULARIDAD) * cls.GRANULARIDAD
+                if minuto + duracion > fin_jornada:
+                    if d + 1 < len(dias):
+                        heapq.heappush(libres, (d + 1, inicio_jornada, inspector_id))
+                    continue
+
+                dia = datetime.combine(dias[d], datetime.min.time())
+                inicio = dia + timedelta(minutes=minuto)
+                hueco = agendas.get(inspector_id, vacia).primer_hueco(inicio, timedelta(minutes=duracion))
+                if hueco != inicio:
+                    # Ya tiene otra inspección: vuelve a la cola desde el fin de esa
+                    heapq.heappush(libres, (d, (hueco - dia).total_seconds() / 60, inspector_id))
+                    continue
+
+                filas.append({
+                    "solicitud_id": solicitud_id,
+                    "inspector_id": inspector_id,
+                    "fecha_programada": inicio,
+                    "estado": EstadoInspeccion.PROGRAMADA.value
+                })
+                heapq.heappush(libres, (d, minuto + duracion, inspector_id))
+                break
+            else:
+                sin_cupo.append(solicitud_id)
+        return filas, sin_cupo
+
+    @classmethod
+    def programar_campania(cls, db: Session, desde: date, dias: int = 20, inspectores: list = None,
+                           niveles: list = None, aplicar: bool = False) -> dict:
+        """
+        Re-inspecciones vencidas o que vencen antes del último día del plan, repartidas
+        en `dias` días hábiles desde `desde`.
+        inspectores: ids (por defecto todos los inspectores activos); niveles: niveles de
+        riesgo (por defecto FISCALIZACION_NIVELES).
+        Con aplicar=True guarda las inspecciones (las solicitudes conservan su estado).
+        """
+        inicio_calculo = time.perf_counter()
+        dias_plan = RutaService.dias_habiles(desde, dias)
+        hasta = datetime.combine(dias_plan[-1] + timedelta(days=1), datetime.min.time())
+        niveles = niveles or cls.niveles()
+
+        consulta = db.query(User.id).filter(User.tipo_usuario == "inspector", User.is_active.isnot(False))
+        if inspectores is not None:
+            consulta = consulta.filter(User.id.in_([int(i) for i in inspectores]))
+        ids_inspectores = [i for i, in consulta.order_by(User.id)]
+        if not ids_inspectores:
+            raise ValueError("No hay inspectores disponibles")
+
+        jornada = RutaService.jornada()
+        jornadas = {i: jornada for i in ids_inspectores}
+        libres = [(0, jornada[0], i) for i in ids_inspectores]
+        heapq.heapify(libres)
+        agendas = CalendarioService.agendas()
+
+        seleccionadas = 0
+        programadas = 0
+        sin_cupo = []
+        por_dia = {}
+        por_inspector = {}
+        for lote in cls._lotes(db, cls._filtros(hasta, niveles)):
+            seleccionadas += len(lote)
+            filas, faltan = cls._asignar(lote, libres, dias_plan, jornadas, agendas)
+            sin_cupo += faltan
+
+            if filas and aplicar:
+                # Solo las inspecciones: la licencia sigue vigente mientras tanto (el estado no cambia)
+                db.execute(insert(Inspeccion), filas)
+                CalendarioService.invalidar(db)
+                db.commit()
+
+            programadas += len(filas)
+            for fila in filas:
+                dia = fila["fecha_programada"].date().isoformat()
+                por_dia[dia] = por_dia.get(dia, 0) + 1
+                por_inspector[fila["inspector_id"]] = por_inspector.get(fila["inspector_id"], 0) + 1
+
+        segundos = time.perf_counter() - inicio_calculo
+        resumen = {
+            "seleccionadas": seleccionadas,
+            "programadas": programadas,
+            "sin_cupo": len(sin_cupo),
+            "dias": len(dias_plan),
+            "inspectores": len(ids_inspectores),
+            "segundos": round(segundos, 2),
+            "filas_por_segundo": round(seleccionadas / segundos) if segundos > 0 else None,
+            "aplicado": aplicar
+        }
+        print(f"🏷️ Campaña ITSE: {programadas}/{seleccionadas} programadas en {len(dias_plan)} día(s) "
+              f"({resumen['filas_por_segundo']} filas/s)")
+        return {
+            "resumen": resumen,
+            "por_dia": dict(sorted(por_dia.items())),
+            "por_inspector": por_inspector,
+            "sin_cupo": sin_cupo[:100]
+        }
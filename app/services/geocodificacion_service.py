@@ -0,0 +1,323 @@
+from cachetools import LRUCache
+from app.config import settings
+from app.utils.texto import AutomataFrases, normalizar_texto
+import codecs
+import csv
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+class _Via:
+    """Una vía de un distrito con las coordenadas conocidas de sus cuadras"""
+
+    __slots__ = ("nombre", "distrito", "cuadras", "centro")
+
+    def __init__(self, nombre: str, distrito: str):
+        self.nombre = nombre
+        self.distrito = distrito
+        self.cuadras = {}
+        self.centro = None
+
+    def cerrar(self):
+        puntos = list(self.cuadras.values())
+        self.centro = (sum(p[0] for p in puntos) / len(puntos), sum(p[1] for p in puntos) / len(puntos))
+
+    def ubicar(self, cuadra: int = None) -> tuple:
+        """(latitud, longitud, precisión) de la cuadra; interpola entre cuadras conocidas"""
+        if cuadra is None:
+            return (*self.centro, "via")
+        if cuadra in self.cuadras:
+            return (*self.cuadras[cuadra], "cuadra")
+
+        anterior = max((c for c in self.cuadras if c < cuadra), default=None)
+        siguiente = min((c for c in self.cuadras if c > cuadra), default=None)
+        if anterior is None or siguiente is None:
+            return (*self.centro, "via")
+        a, b = self.cuadras[anterior], self.cuadras[siguiente]
+        t = (cuadra - anterior) / (siguiente - anterior)
+        return (a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t, "interpolada")
+
+
+class GeocodificacionService:
+    """
+    Geocodificación de direcciones sin servicios externos, con un gazetteer local
+    de vías y cuadras de Ica (CSV: via, distrito, cuadra, latitud, longitud).
+    La dirección se normaliza (tildes, abreviaturas como "Av." o "Jr."), se busca
+    la vía más larga que aparece en ella y el número de puerta da la cuadra.
+    Los resultados quedan en una caché en disco (SQLite) compartida por los
+    workers y que sobrevive a los reinicios, con una caché en memoria delante.
+    Mientras GEOCODIFICACION_GAZETTEER no apunte al gazetteer oficial no se
+    geocodifica nada: las coordenadas terminan en solicitudes reales y de ahí
+    en rutas de inspección y zonificación.
+    """
+
+    # Segundos entre revisiones del archivo del gazetteer (para ver importaciones de otro worker)
+    VERIFICAR_CADA = 30
+
+    TIPOS_VIA = {
+        "av": "avenida", "avda": "avenida", "avenida": "avenida",
+        "jr": "jiron", "jiron": "jiron",
+        "ca": "calle", "cl": "calle", "calle": "calle",
+        "pje": "pasaje", "psje": "pasaje", "pasaje": "pasaje",
+        "prol": "prolongacion", "prolongacion": "prolongacion",
+        "carr": "carretera", "carretera": "carretera",
+        "mlc": "malecon", "malecon": "malecon",
+    }
+
+    # Números que no son de puerta (manzana, lote, kilómetro, departamento...)
+    _NO_PUERTA = {"mz", "manzana", "lt", "lote", "km", "dpto", "dpt", "departamento", "int", "interior", "piso", "of"}
+
+    _CUADRA = re.compile(r"(?:^| )(?:cuadra|cdra|cda) (\d{1,3})(?: |$)")
+
+    _gazetteer = None
+    _verificado = 0.0
+    _lock = threading.Lock()
+
+    _memoria = LRUCache(maxsize=5000)
+    _disco = None
+    _lock_disco = threading.Lock()
+
+    # Métricas
+    consultas = 0
+    aciertos_memoria = 0
+    aciertos_disco = 0
+    no_resueltas = 0
+
+    # ============ GAZETTEER ============
+
+    @classmethod
+    def _normalizar_direccion(cls, texto: str) -> str:
+        return " ".join(cls.TIPOS_VIA.get(t, t) for t in normalizar_texto(texto).split())
+
+    @classmethod
+    def construir_gazetteer(cls, contenido: bytes) -> dict:
+        """Vías por frase normalizada ("avenida grau" y "grau") y distrito"""
+        texto = codecs.decode(contenido, "utf-8-sig", errors="replace")
+        lector = csv.DictReader(io.StringIO(texto))
+        faltantes = {"via", "distrito", "latitud", "longitud"} - set(lector.fieldnames or [])
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el gazetteer: {', '.join(sorted(faltantes))}")
+
+        vias = {}
+        for numero, fila in enumerate(lector, start=2):
+            try:
+                punto = (float(fila["latitud"]), float(fila["longitud"]))
+                cuadra = int(fila["cuadra"]) if (fila.get("cuadra") or "").strip() else 0
+            except ValueError:
+                raise ValueError(f"Fila {numero}: coordenadas o cuadra no válidas")
+            clave = (cls._normalizar_direccion(fila["via"]), normalizar_texto(fila["distrito"]))
+            if not clave[0]:
+                continue
+            via = vias.setdefault(clave, _Via(fila["via"].strip(), fila["distrito"].strip()))
+            via.cuadras[cuadra] = punto
+
+        # Cada vía se reconoce con su tipo ("avenida grau") y sin él ("grau")
+        frases = {}
+        for (nombre, distrito), via in vias.items():
+            via.cerrar()
+            tokens = nombre.split()
+            variantes = [nombre]
+            if len(tokens) > 1 and tokens[0] in cls.TIPOS_VIA.values():
+                variantes.append(" ".join(tokens[1:]))
+            for variante in variantes:
+                frases.setdefault(variante, {}).setdefault(distrito, via)
+
+        return {
+            "version": hashlib.sha1(contenido).hexdigest()[:16],
+            "automata": AutomataFrases({frase: frase for frase in frases}),
+            "frases": frases,
+            "vias": len(vias)
+        }
+
+    @classmethod
+    def gazetteer(cls):
+        """Gazetteer cargado (se relee si el archivo cambió), o None si no está configurado o no hay archivo"""
+        ahora = time.monotonic()
+        if cls._gazetteer is not None and ahora - cls._verificado < cls.VERIFICAR_CADA:
+            return cls._gazetteer
+        with cls._lock:
+            if cls._gazetteer is not None and ahora - cls._verificado < cls.VERIFICAR_CADA:
+                return cls._gazetteer
+            cls._verificado = ahora
+            ruta = settings.GEOCODIFICACION_GAZETTEER
+            if not ruta:
+                cls._gazetteer = None
+                return None
+            try:
+                modificado = os.path.getmtime(ruta)
+            except OSError:
+                cls._gazetteer = None
+                return None
+            if cls._gazetteer is None or cls._gazetteer["modificado"] != modificado:
+                with open(ruta, "rb") as f:
+                    gazetteer = cls.construir_gazetteer(f.read())
+                gazetteer["modificado"] = modificado
+                cls._gazetteer = gazetteer
+                cls._memoria.clear()
+                print(f"🧭 Gazetteer de direcciones: {gazetteer['vias']} vía(s) (versión {gazetteer['version']})")
+            return cls._gazetteer
+
+    @classmethod
+    def importar(cls, contenido: bytes) -> dict:
+        """Reemplaza el gazetteer por un CSV nuevo (se valida antes de escribirlo)"""
+        ruta = settings.GEOCODIFICACION_GAZETTEER
+        if not ruta:
+            raise ValueError("Configure GEOCODIFICACION_GAZETTEER con la ruta del gazetteer oficial antes de importarlo")
+        nuevo = cls.construir_gazetteer(contenido)
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+        cls._verificado = 0.0
+        cls.gazetteer()
+        # Lo resuelto con el gazetteer anterior ya no sirve
+        with cls._lock_disco:
+            conexion = cls._conexion()
+            borradas = conexion.execute(
+                "DELETE FROM geocodificaciones WHERE gazetteer != ?", (nuevo["version"],)
+            ).rowcount
+            conexion.commit()
+        return {"vias": nuevo["vias"], "version": nuevo["version"], "cache_descartada": borradas}
+
+    # ============ CACHÉ EN DISCO ============
+
+    @classmethod
+    def _conexion(cls) -> sqlite3.Connection:
+        if cls._disco is None:
+            ruta = settings.GEOCODIFICACION_CACHE
+            os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+            conexion = sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS geocodificaciones ("
+                " clave TEXT PRIMARY KEY, gazetteer TEXT NOT NULL,"
+                " latitud REAL, longitud REAL, precision TEXT, via TEXT, distrito TEXT, creado REAL)"
+            )
+            conexion.commit()
+            cls._disco = conexion
+        return cls._disco
+
+    @classmethod
+    def _leer_disco(cls, clave: str, version: str):
+        with cls._lock_disco:
+            return cls._conexion().execute(
+                "SELECT latitud, longitud, precision, via, distrito FROM geocodificaciones"
+                " WHERE clave = ? AND gazetteer = ?", (clave, version)
+            ).fetchone()
+
+    @classmethod
+    def _guardar_disco(cls, clave: str, version: str, resultado):
+        valores = (
+            (resultado["latitud"], resultado["longitud"], resultado["precision"], resultado["via"], resultado["distrito"])
+            if resultado else (None, None, None, None, None)
+        )
+        with cls._lock_disco:
+            conexion = cls._conexion()
+            conexion.execute(
+                "INSERT OR REPLACE INTO geocodificaciones VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (clave, version, *valores, time.time())
+            )
+            conexion.commit()
+
+    # ============ GEOCODIFICACIÓN ============
+
+    @classmethod
+    def _numero_cuadra(cls, resto: str):
+        """Cuadra explícita ("cdra 4") o deducida del número de puerta (456 -> cuadra 4)"""
+        explicita = cls._CUADRA.search(resto)
+        if explicita:
+            return int(explicita.group(1))
+        anterior = ""
+        for token in resto.split():
+            if token.isdigit() and anterior not in cls._NO_PUERTA:
+                return max(1, int(token) // 100)
+            anterior = token
+        return None
+
+    @classmethod
+    def resolver(cls, gazetteer: dict, texto: str, distrito: str):
+        """Geocodifica una dirección ya normalizada contra el gazetteer (sin cachés)"""
+        mejor = None
+        for inicio, frase in gazetteer["automata"].buscar(texto):
+            fin = inicio + len(frase)
+            if fin < len(texto) and texto[fin] != " ":
+                continue
+            if mejor is None or len(frase) > len(mejor[1]):
+                mejor = (inicio, frase)
+        if mejor is None:
+            return None
+
+        por_distrito = gazetteer["frases"][mejor[1]]
+        via = por_distrito.get(distrito)
+        if via is None:
+            if len(por_distrito) != 1:
+                return None  # La misma vía en varios distritos y no se sabe cuál
+            via = next(iter(por_distrito.values()))
+
+        latitud, longitud, precision = via.ubicar(cls._numero_cuadra(texto[mejor[0] + len(mejor[1]):]))
+        return {
+            "latitud": round(latitud, 6),
+            "longitud": round(longitud, 6),
+            "precision": precision,
+            "via": via.nombre,
+            "distrito": via.distrito
+        }
+
+    @classmethod
+    def geocodificar(cls, direccion: str, distrito: str = None):
+        """
+        Coordenadas de una dirección
+        Retorna: dict con latitud, longitud, precision (cuadra, interpolada, via), via, distrito; o None
+        """
+        cls.consultas += 1
+        gazetteer = cls.gazetteer()
+        texto = cls._normalizar_direccion(direccion or "")
+        if gazetteer is None or not texto:
+            cls.no_resueltas += 1
+            return None
+
+        distrito = normalizar_texto(distrito or "")
+        clave = f"{distrito}|{texto}"
+        version = gazetteer["version"]
+
+        en_memoria = cls._memoria.get(clave, False)
+        if en_memoria is not False:
+            cls.aciertos_memoria += 1
+            resultado = en_memoria
+        else:
+            fila = cls._leer_disco(clave, version)
+            if fila is not None:
+                cls.aciertos_disco += 1
+                resultado = dict(zip(("latitud", "longitud", "precision", "via", "distrito"), fila))
+                resultado = resultado if resultado["latitud"] is not None else None
+            else:
+                resultado = cls.resolver(gazetteer, texto, distrito)
+                cls._guardar_disco(clave, version, resultado)
+            cls._memoria[clave] = resultado
+
+        if resultado is None:
+            cls.no_resueltas += 1
+            return None
+        return dict(resultado)
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        gazetteer = cls.gazetteer()
+        with cls._lock_disco:
+            en_disco = cls._conexion().execute("SELECT COUNT(*) FROM geocodificaciones").fetchone()[0]
+        return {
+            "vias": gazetteer["vias"] if gazetteer else 0,
+            "version_gazetteer": gazetteer["version"] if gazetteer else None,
+            "direcciones_en_cache": en_disco,
+            "consultas": cls.consultas,
+            "aciertos_memoria": cls.aciertos_memoria,
+            "aciertos_disco": cls.aciertos_disco,
+            "no_resueltas": cls.no_resueltas
+        }
@@ -0,0 +1,207 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from app.config import settings
+from app.services.almacenamiento_service import AlmacenamientoService
+from app.utils.imagenes import generar_derivados
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+
+
+class ImagenService:
+    """
+    Miniaturas de las fotos de inspección.
+    Las fotos originales (5-10 MB desde el celular) se procesan en un pool de procesos:
+    se generan varios tamaños en JPEG recomprimido y sin EXIF, guardados en
+    UPLOAD_FOLDER/derivados. Las páginas de detalle muestran los derivados.
+    """
+
+    # Lado mayor en píxeles de cada derivado
+    TAMAÑOS = {"mini": 320, "media": 800, "grande": 1600}
+    CALIDAD_JPEG = 80
+    CARPETA_DERIVADOS = "derivados"
+    EXTENSIONES = ["jpg", "jpeg", "png"]
+
+    _pool = None
+
+    # Fotos en proceso: las peticiones simultáneas de la misma foto esperan el mismo trabajo
+    _en_curso = {}
+
+    # Tareas lanzadas en segundo plano (se guarda la referencia para que no las recolecte el GC)
+    _tareas = set()
+
+    _estadisticas = {
+        "procesadas": 0,
+        "errores": 0,
+        "bytes_originales": 0,
+        "bytes_derivados": {nombre: 0 for nombre in TAMAÑOS},
+        "segundos_cpu": 0.0,
+        "segundos_activo": 0.0,
+    }
+    _activas = 0
+    _inicio_actividad = 0.0
+
+    @classmethod
+    def pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            # spawn: los workers no heredan los hilos ni las conexiones del servidor
+            cls._pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGENES_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return cls._pool
+
+    @classmethod
+    def cerrar(cls):
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    @staticmethod
+    def clave(ruta_original: str) -> str:
+        """Los blobs ya se llaman por su SHA-256; para otras rutas se usa el hash de la ruta"""
+        if AlmacenamientoService.es_blob(ruta_original):
+            return os.path.basename(ruta_original)
+        return hashlib.sha256(os.path.realpath(ruta_original).encode()).hexdigest()
+
+    @staticmethod
+    def ruta_derivado(ruta_original: str, tamaño: str) -> str:
+        clave = ImagenService.clave(ruta_original)
+        return os.path.join(
+            settings.UPLOAD_FOLDER, ImagenService.CARPETA_DERIVADOS, clave[:2], f"{clave}_{tamaño}.jpg"
+        )
+
+    @staticmethod
+    def tipo_mime(ruta: str) -> str:
+        """Tipo de la foto original (los blobs no tienen extensión); solo lee la cabecera"""
+        try:
+            with Image.open(ruta) as imagen:
+                return imagen.get_format_mimetype() or "application/octet-stream"
+        except (OSError, ValueError):
+            return "application/octet-stream"
+
+    @staticmethod
+    def tiene_derivados(ruta_original: str) -> bool:
+        return all(
+            os.path.exists(ImagenService.ruta_derivado(ruta_original, tamaño))
+            for tamaño in ImagenService.TAMAÑOS
+        )
+
+    @classmethod
+    async def procesar(cls, rutas: list) -> dict:
+        """
+        Genera los derivados que falten para una lista de fotos, en paralelo en el pool
+        Retorna: resumen del lote (procesadas, errores, segundos, bytes ahorrados)
+        """
+        pendientes = [r for r in dict.fromkeys(rutas) if os.path.exists(r) and not cls.tiene_derivados(r)]
+        if not pendientes:
+            return {"procesadas": 0, "errores": 0, "segundos": 0.0, "bytes_ahorrados": 0}
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(
+            *[cls._procesar_una(ruta) for ruta in pendientes], return_exceptions=True
+        )
+
+        procesadas = [r for r in resultados if isinstance(r, dict)]
+        errores = len(resultados) - len(procesadas)
+        return {
+            "procesadas": len(procesadas),
+            "errores": errores,
+            "segundos": round(time.perf_counter() - inicio, 3),
+            "bytes_ahorrados": sum(
+                r["bytes_original"] - r["bytes_derivados"][cls.TAMAÑOS["mini"]] for r in procesadas
+            )
+        }
+
+    @classmethod
+    def programar(cls, rutas: list):
+        """Lanza el procesamiento en segundo plano sin esperar el resultado"""
+        tarea = asyncio.ensure_future(cls.procesar(rutas))
+        cls._tareas.add(tarea)
+        tarea.add_done_callback(cls._tareas.discard)
+
+    @classmethod
+    async def obtener_derivado(cls, ruta_original: str, tamaño: str) -> str:
+        """Ruta del derivado; si todavía no existe se genera en ese momento"""
+        ruta = cls.ruta_derivado(ruta_original, tamaño)
+        if not os.path.exists(ruta):
+            await cls._procesar_una(ruta_original)
+        return ruta
+
+    @classmethod
+    async def _procesar_una(cls, ruta_original: str) -> dict:
+        clave = cls.clave(ruta_original)
+        futuro = cls._en_curso.get(clave)
+        if futuro is None:
+            destinos = {
+                lado: cls.ruta_derivado(ruta_original, nombre)
+                for nombre, lado in cls.TAMAÑOS.items()
+            }
+            loop = asyncio.get_running_loop()
+            cls._marcar_actividad(+1)
+            futuro = loop.run_in_executor(
+                cls.pool(), generar_derivados, ruta_original, destinos, cls.CALIDAD_JPEG
+            )
+            cls._en_curso[clave] = futuro
+            futuro.add_done_callback(lambda f: cls._registrar(clave, ruta_original, f))
+
+        # shield: si el cliente se desconecta, la foto se termina igual
+        return await asyncio.shield(futuro)
+
+    @classmethod
+    def _marcar_actividad(cls, delta: int):
+        """Acumula el tiempo en que hubo al menos una foto en proceso (para la tasa real)"""
+        ahora = time.perf_counter()
+        if cls._activas == 0 and delta > 0:
+            cls._inicio_actividad = ahora
+        cls._activas += delta
+        if cls._activas == 0:
+            cls._estadisticas["segundos_activo"] += ahora - cls._inicio_actividad
+
+    @classmethod
+    def _registrar(cls, clave: str, ruta_original: str, futuro):
+        cls._en_curso.pop(clave, None)
+        cls._marcar_actividad(-1)
+
+        if futuro.cancelled() or futuro.exception() is not None:
+            cls._estadisticas["errores"] += 1
+            motivo = "cancelado" if futuro.cancelled() else futuro.exception()
+            print(f"❌ Error procesando foto {ruta_original}: {motivo}")
+            if isinstance(motivo, BrokenProcessPool):
+                # Un worker murió (p. ej. sin memoria): el pool queda inutilizable, se crea otro
+                cls._pool = None
+            return
+
+        resultado = futuro.result()
+        estadisticas = cls._estadisticas
+        estadisticas["procesadas"] += 1
+        estadisticas["bytes_originales"] += resultado["bytes_original"]
+        estadisticas["segundos_cpu"] += resultado["segundos_cpu"]
+        for nombre, lado in cls.TAMAÑOS.items():
+            estadisticas["bytes_derivados"][nombre] += resultado["bytes_derivados"][lado]
+
+    @classmethod
+    def estadisticas(cls) -> dict:
+        """Tasa de procesamiento y bytes ahorrados desde que arrancó el proceso"""
+        e = cls._estadisticas
+        segundos = e["segundos_activo"]
+        if cls._activas:
+            segundos += time.perf_counter() - cls._inicio_actividad
+
+        # Ahorro por vista: la página de detalle baja la miniatura en lugar del original
+        ahorro = e["bytes_originales"] - e["bytes_derivados"]["mini"]
+        return {
+            "procesadas": e["procesadas"],
+            "errores": e["errores"],
+            "en_curso": cls._activas,
+            "workers": settings.IMAGENES_WORKERS,
+            "fotos_por_segundo": round(e["procesadas"] / segundos, 2) if segundos else 0.0,
+            "segundos_cpu_por_foto": round(e["segundos_cpu"] / e["procesadas"], 3) if e["procesadas"] else 0.0,
+            "bytes_originales": e["bytes_originales"],
+            "bytes_derivados": dict(e["bytes_derivados"]),
+            "bytes_ahorrados": ahorro,
+            "reduccion_porcentaje": round(100 * ahorro / e["bytes_originales"], 1) if e["bytes_originales"] else 0.0
+        }
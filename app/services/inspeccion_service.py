@@ -2,29 +2,42 @@ from sqlalchemy.orm import Session
 from app.models.inspeccion import Inspeccion, EstadoInspeccion
 from app.models.solicitud import Solicitud
 from app.models.user import User
+from app.services.calendario_service import CalendarioService
+from app.services.fiscalizacion_service import FiscalizacionService
 from datetime import datetime, timedelta
 import json
 
 class InspeccionService:
     
     @staticmethod
-    def programar_inspeccion(db: Session, solicitud_id: int, fecha_programada: datetime, inspector_id: int = None):
-        """Programar una nueva inspección"""
+    def programar_inspeccion(db: Session, solicitud_id: int, fecha_programada: datetime, inspector_id: int = None,
+                             ventana_desde: datetime = None, ventana_hasta: datetime = None):
+        """Programar una nueva inspección (ConflictoHorario si el inspector ya está ocupado en ese horario)"""
+        
+        if inspector_id is not None:
+            solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
+            CalendarioService.verificar_cruces(
+                db, inspector_id, fecha_programada, solicitud.nivel_riesgo if solicitud else None
+            )
         
         inspeccion = Inspeccion(
             solicitud_id=solicitud_id,
             inspector_id=inspector_id,
             fecha_programada=fecha_programada,
+            ventana_desde=ventana_desde,
+            ventana_hasta=ventana_hasta,
             estado=EstadoInspeccion.PROGRAMADA.value
         )
         
         db.add(inspeccion)
+        CalendarioService.invalidar(db, inspeccion)
         db.commit()
         db.refresh(inspeccion)
         
         # Actualizar estado de la solicitud
         solicitud = db.query(Solicitud).filter(Solicitud.id == solicitud_id).first()
-        if solicitud:
+        if solicitud and solicitud.estado != "licencia_emitida":
+            # Una re-inspección no quita la licencia ya emitida
             solicitud.estado = "pendiente_itse"
             db.commit()
         
@@ -41,48 +54,55 @@ class InspeccionService:
         
         return inspeccion
     
+    # Ítems del checklist de seguridad (columnas booleanas de Inspeccion)
+    CHECKLIST = ["extintores", "luces_emergencia", "señalizacion", "sistema_electrico", "via_evacuacion"]
+    
     @staticmethod
-    def finalizar_inspeccion(db: Session, inspeccion_id: int, datos: dict):
-        """Finalizar inspección y guardar resultados"""
-        
-        inspeccion = db.query(Inspeccion).filter(Inspeccion.id == inspeccion_id).first()
-        if not inspeccion:
-            return None
+    def registrar_resultado(inspeccion: Inspeccion, datos: dict, fecha_realizada: datetime = None):
+        """Resultados y checklist en la inspección y su solicitud (sin commit)"""
         
         # Actualizar datos de la inspección
         inspeccion.estado = EstadoInspeccion.REALIZADA.value
-        inspeccion.fecha_realizada = datetime.now()
+        inspeccion.fecha_realizada = fecha_realizada or datetime.now()
         inspeccion.observaciones = datos.get("observaciones")
         inspeccion.recomendaciones = datos.get("recomendaciones")
         
         # Checklist
-        inspeccion.extintores = datos.get("extintores", False)
-        inspeccion.luces_emergencia = datos.get("luces_emergencia", False)
-        inspeccion.señalizacion = datos.get("señalizacion", False)
-        inspeccion.sistema_electrico = datos.get("sistema_electrico", False)
-        inspeccion.via_evacuacion = datos.get("via_evacuacion", False)
+        for item in InspeccionService.CHECKLIST:
+            setattr(inspeccion, item, bool(datos.get(item, False)))
         
         # Determinar resultado
-        items_ok = sum([
-            inspeccion.extintores,
-            inspeccion.luces_emergencia,
-            inspeccion.señalizacion,
-            inspeccion.sistema_electrico,
-            inspeccion.via_evacuacion
-        ])
+        items_ok = sum(getattr(inspeccion, item) for item in InspeccionService.CHECKLIST)
         
         if items_ok >= 4:
             inspeccion.resultado = "aprobado"
             # Actualizar solicitud
             solicitud = inspeccion.solicitud
-            solicitud.itse_aprobado = True
-            solicitud.fecha_itse = datetime.now()
-            solicitud.estado = "itse_aprobado"
+            if solicitud.estado != "licencia_emitida":
+                # Re-inspección periódica: solo fechas, la licencia sigue igual
+                solicitud.itse_aprobado = True
+                solicitud.estado = "itse_aprobado"
+            solicitud.fecha_itse = inspeccion.fecha_realizada
+            solicitud.fecha_ultima_inspeccion = solicitud.fecha_itse
+            solicitud.proxima_inspeccion = FiscalizacionService.proxima_inspeccion(solicitud.fecha_itse)
         elif items_ok >= 2:
             inspeccion.resultado = "observado"
         else:
             inspeccion.resultado = "rechazado"
         
+        return inspeccion
+    
+    @staticmethod
+    def finalizar_inspeccion(db: Session, inspeccion_id: int, datos: dict):
+        """Finalizar inspección y guardar resultados"""
+        
+        inspeccion = db.query(Inspeccion).filter(Inspeccion.id == inspeccion_id).first()
+        if not inspeccion:
+            return None
+        
+        InspeccionService.registrar_resultado(inspeccion, datos)
+        
+        CalendarioService.invalidar(db, inspeccion)
         db.commit()
         
         return inspeccion
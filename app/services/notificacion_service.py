@@ -1,127 +1,229 @@
 from sqlalchemy.orm import Session
 from app.models.notificacion import Notificacion, TipoNotificacion, EstadoNotificacion
 from app.models.user import User
-from datetime import datetime
+from app.services.outbox_service import OutboxService
+from app.services.plantilla_service import PlantillaService
+from app.config import settings
+from datetime import datetime, timedelta
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class NotificacionService:
-    """Servicio de notificaciones - VERSIÓN ULTRA SIMPLE SIN CARACTERES ESPECIALES"""
-    
+    """Servicio de notificaciones: arma el contenido con PlantillaService y lo encola (outbox)"""
+
+    # Plantillas que se agrupan en un resumen si llegan varias de la misma solicitud seguidas
+    AGRUPABLES = {"cambio_estado", "pago_confirmado", "licencia_emitida"}
+
     @classmethod
-    async def enviar_email(cls, db: Session, destinatario: str, asunto: str, mensaje: str, 
-                          usuario_id: int = None, solicitud_id: int = None):
-        """Solo simulación - Sin errores de codificación"""
-        
-        # Registrar notificación
+    async def enviar_email(cls, db: Session, destinatario: str, asunto: str, mensaje: str,
+                          usuario_id: int = None, solicitud_id: int = None,
+                          mensaje_texto: str = None, plantilla: str = None):
+        """
+        Encola el email en la tabla notificaciones (outbox).
+        No hace commit: la fila se guarda junto con el cambio de estado del llamador
+        y la envía OutboxService en segundo plano.
+        """
+
         notificacion = Notificacion(
             usuario_id=usuario_id,
             destinatario=destinatario,
-            tipo="email",
+            tipo=TipoNotificacion.EMAIL,
             asunto=asunto,
             mensaje=mensaje,
+            mensaje_texto=mensaje_texto,
+            plantilla=plantilla,
             solicitud_id=solicitud_id,
-            estado="enviado"
+            estado=EstadoNotificacion.PENDIENTE
         )
         db.add(notificacion)
-        db.commit()
-        
-        # SOLO SIMULACIÓN - SIN INTENTAR ENVIAR EMAIL REAL
-        print(f"\n{'='*60}")
-        print(f"📧 NOTIFICACIÓN SIMULADA")
-        print(f"{'='*60}")
-        print(f"   Para: {destinatario}")
-        print(f"   Asunto: {asunto}")
-        print(f"   Mensaje: [HTML omitido - {len(mensaje)} caracteres]")
-        print(f"{'='*60}\n")
-        
-        return True, "Email simulado exitosamente"
-    
+        OutboxService.avisar_al_confirmar(db)
+
+        print(f"📥 Email encolado para {destinatario}: {asunto}")
+
+        return True, "Email encolado"
+
     @classmethod
     async def enviar_sms(cls, db: Session, telefono: str, mensaje: str,
                         usuario_id: int = None, solicitud_id: int = None):
-        """Simulación de SMS"""
-        
+        """Encola un SMS (outbox) - se confirma con el commit del llamador"""
+
         notificacion = Notificacion(
             usuario_id=usuario_id,
             destinatario=telefono,
-            tipo="sms",
+            tipo=TipoNotificacion.SMS,
             mensaje=mensaje,
             solicitud_id=solicitud_id,
-            estado="enviado"
+            estado=EstadoNotificacion.PENDIENTE
         )
         db.add(notificacion)
-        db.commit()
-        
-        print(f"\n📱 SMS SIMULADO")
-        print(f"   Teléfono: {telefono}")
-        print(f"   Mensaje: {mensaje}\n")
-        
-        return True, "SMS simulado exitosamente"
-    
+        OutboxService.avisar_al_confirmar(db)
+
+        print(f"📥 SMS encolado para {telefono}")
+
+        return True, "SMS encolado"
+
+    # ============ NOTIFICACIONES CON PLANTILLA ============
+
     @classmethod
-    async def notificar_bienvenida(cls, db: Session, user: User):
-        """Email de bienvenida - VERSIÓN SIN HTML COMPLEJO"""
-        
-        nombre = user.email.split('@')[0]  # Usar solo la parte local del email
-        
-        mensaje = f"""
-        Hola {nombre},
-        
-        Tu cuenta ha sido creada exitosamente.
-        
-        Ya puedes iniciar el tramite de tu licencia de funcionamiento en:
-        http://localhost:8000/solicitud/paso1
-        
-        Saludos,
-        Municipalidad de Ica
-        """
-        
-        await cls.enviar_email(
-            db=db,
-            destinatario=user.email,
-            asunto="Bienvenido al Sistema de Licencias - Ica",
-            mensaje=mensaje,
-            usuario_id=user.id
-        )
-@classmethod
-async def notificar_cambio_estado(cls, db: Session, user: User, solicitud, nuevo_estado: str, mensaje: str):
-    """Notificar cambio de estado en la solicitud - VERSIÓN SIMPLIFICADA"""
-    
-    try:
-        nombre = user.nombre_completo() or user.email
-        
-        # Mensaje simple para email
-        email_mensaje = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background: #0B3B5C; padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="color: white; margin: 0;">Municipalidad de Ica</h1>
-            </div>
-            <div style="background: white; padding: 30px; border: 1px solid #e0e0e0;">
-                <h2>Estimado/a {nombre},</h2>
-                <p>Le informamos que su solicitud ha cambiado de estado:</p>
-                <div style="background: #f5f5f5; padding: 20px; border-radius: 10px; margin: 20px 0;">
-                    <p><strong>Expediente:</strong> {solicitud.numero_expediente}</p>
-                    <p><strong>Nuevo estado:</strong> {nuevo_estado.upper()}</p>
-                    <p><strong>Mensaje:</strong> {mensaje}</p>
-                </div>
-                <p>Puede ver el detalle en su dashboard.</p>
-            </div>
-        </div>
-        """
-        
-        await cls.enviar_email(
+    async def enviar_plantilla(cls, db: Session, tipo: str, user: User, solicitud=None, **contexto):
+        """Renderiza la plantilla registrada y encola el email (HTML + texto)"""
+
+        contexto = {
+            "nombre": PlantillaService.nombre_destinatario(user),
+            "usuario": user,
+            "solicitud": solicitud,
+            **contexto
+        }
+        if (tipo in cls.AGRUPABLES and solicitud is not None
+                and settings.NOTIFICACIONES_VENTANA_AGRUPACION > 0):
+            return cls.agrupar(db, tipo, user, solicitud, contexto)
+
+        asunto, html, texto = PlantillaService.renderizar(tipo, contexto)
+
+        return await cls.enviar_email(
             db=db,
             destinatario=user.email,
-            asunto=f"Actualización de solicitud - {solicitud.numero_expediente}",
-            mensaje=email_mensaje,
+            asunto=asunto,
+            mensaje=html,
+            mensaje_texto=texto,
+            plantilla=tipo,
             usuario_id=user.id,
-            solicitud_id=solicitud.id
+            solicitud_id=solicitud.id if solicitud is not None else None
         )
-        
-        print(f"📧 Notificación de cambio de estado enviada a {user.email}")
-        
-    except Exception as e:
-        print(f"❌ Error en notificar_cambio_estado: {e}")
\ No newline at end of file
+
+    @classmethod
+    def agrupar(cls, db: Session, tipo: str, user: User, solicitud, contexto: dict):
+        """
+        El primer evento de una solicitud se encola retenido NOTIFICACIONES_VENTANA_AGRUPACION
+        segundos; los que lleguen mientras siga retenido se suman a ese mismo email, que
+        pasa a ser un resumen. Así una solicitud que va de revisión a licencia emitida
+        en pocos minutos genera un solo email en vez de uno por cambio.
+        """
+        ahora = datetime.now()
+        asunto, html, texto = PlantillaService.renderizar_bloque(tipo, contexto)
+        evento = {
+            "plantilla": tipo,
+            "asunto": asunto,
+            "html": html,
+            "texto": texto,
+            "fecha": ahora.strftime("%d/%m/%Y %H:%M")
+        }
+
+        # Solo uno todavía retenido: si el worker ya lo puede tomar, se encola otro
+        retenida = db.query(Notificacion).filter(
+            Notificacion.usuario_id == user.id,
+            Notificacion.solicitud_id == solicitud.id,
+            Notificacion.tipo == TipoNotificacion.EMAIL,
+            Notificacion.estado == EstadoNotificacion.PENDIENTE,
+            Notificacion.eventos.isnot(None),
+            Notificacion.proximo_intento > ahora
+        ).order_by(Notificacion.id.desc()).with_for_update().first()
+
+        if retenida is None:
+            asunto, html, texto = PlantillaService.renderizar(tipo, contexto)
+            db.add(Notificacion(
+                usuario_id=user.id,
+                destinatario=user.email,
+                tipo=TipoNotificacion.EMAIL,
+                asunto=asunto,
+                mensaje=html,
+                mensaje_texto=texto,
+                plantilla=tipo,
+                eventos=json.dumps([evento]),
+                solicitud_id=solicitud.id,
+                estado=EstadoNotificacion.PENDIENTE,
+                proximo_intento=ahora + timedelta(seconds=settings.NOTIFICACIONES_VENTANA_AGRUPACION)
+            ))
+            # Para que otro evento en la misma transacción la encuentre
+            db.flush()
+            OutboxService.avisar_al_confirmar(db)
+            print(f"📥 Email encolado para {user.email}: {asunto} "
+                  f"(se agrupa durante {settings.NOTIFICACIONES_VENTANA_AGRUPACION} s)")
+            return True, "Email encolado"
+
+        eventos = json.loads(retenida.eventos) + [evento]
+        asunto, html, texto = PlantillaService.renderizar("resumen", {**contexto, "eventos": eventos})
+        retenida.asunto = asunto
+        retenida.mensaje = html
+        retenida.mensaje_texto = texto
+        retenida.plantilla = "resumen"
+        retenida.eventos = json.dumps(eventos)
+        db.flush()
+
+        print(f"🧩 Email agrupado para {user.email}: {len(eventos)} eventos de {solicitud.numero_expediente}")
+        return True, "Email agrupado"
+
+    @classmethod
+    async def enviar_plantilla_lote(cls, db: Session, tipo: str, destinatarios: list, comun: dict = None) -> int:
+        """
+        Encola la misma notificación para muchos destinatarios.
+        destinatarios: lista de (user, solicitud, contexto propio)
+        """
+        return cls.encolar_plantilla_lote(db, tipo, destinatarios, comun)
+
+    @staticmethod
+    def encolar_plantilla_lote(db: Session, tipo: str, destinatarios: list, comun: dict = None) -> int:
+        """Versión síncrona de enviar_plantilla_lote (para jobs que corren fuera del event loop)"""
+
+        contextos = [
+            {
+                "nombre": PlantillaService.nombre_destinatario(user),
+                "usuario": user,
+                "solicitud": solicitud,
+                **(contexto or {})
+            }
+            for user, solicitud, contexto in destinatarios
+        ]
+        renderizados = PlantillaService.renderizar_lote(tipo, contextos, comun)
+
+        db.add_all([
+            Notificacion(
+                usuario_id=user.id,
+                destinatario=user.email,
+                tipo=TipoNotificacion.EMAIL,
+                asunto=asunto,
+                mensaje=html,
+                mensaje_texto=texto,
+                plantilla=tipo,
+                solicitud_id=solicitud.id if solicitud is not None else None,
+                estado=EstadoNotificacion.PENDIENTE
+            )
+            for (user, solicitud, _), (asunto, html, texto) in zip(destinatarios, renderizados)
+        ])
+        OutboxService.avisar_al_confirmar(db)
+
+        print(f"📥 {len(renderizados)} email(s) '{tipo}' encolados")
+        return len(renderizados)
+
+    @classmethod
+    async def notificar_bienvenida(cls, db: Session, user: User):
+        """Email de bienvenida al registrarse"""
+        await cls.enviar_plantilla(db, "bienvenida", user)
+
+    @classmethod
+    async def notificar_cambio_estado(cls, db: Session, user: User, solicitud, nuevo_estado: str, mensaje: str):
+        """Notificar cambio de estado en la solicitud"""
+
+        try:
+            await cls.enviar_plantilla(
+                db, "cambio_estado", user, solicitud,
+                nuevo_estado=nuevo_estado,
+                mensaje=mensaje
+            )
+            print(f"📧 Notificación de cambio de estado encolada para {user.email}")
+
+        except Exception as e:
+            print(f"❌ Error en notificar_cambio_estado: {e}")
+
+    @classmethod
+    async def notificar_pago_confirmado(cls, db: Session, user: User, solicitud):
+        """Confirmación del pago del trámite"""
+        await cls.enviar_plantilla(db, "pago_confirmado", user, solicitud)
+
+    @classmethod
+    async def notificar_licencia_emitida(cls, db: Session, user: User, solicitud):
+        """Aviso de licencia emitida con el enlace de descarga"""
+        await cls.enviar_plantilla(db, "licencia_emitida", user, solicitud)
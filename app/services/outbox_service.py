@@ -0,0 +1,373 @@
+from sqlalchemy import and_, case, event, func, inspect, or_, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database.connection import SessionLocal
+from app.database.migraciones import agregar_columnas, crear_indices
+from app.models.notificacion import Notificacion, EstadoNotificacion
+from datetime import datetime, timedelta
+import asyncio
+import os
+import random
+import socket
+
+
+class OutboxService:
+    """
+    Entrega de notificaciones en segundo plano (patrón outbox).
+    Los routers solo agregan la Notificacion con estado=pendiente en la misma
+    transacción que el cambio de estado; los workers de este servicio la reservan
+    por lotes, la envían y reintentan con espera exponencial. Tras MAX_INTENTOS
+    queda como 'fallido' (dead letter) hasta que se reintente a mano.
+    """
+
+    TAMAÑO_LOTE = 50
+    MAX_INTENTOS = 6
+    ESPERA_BASE = 30           # segundos antes del primer reintento
+    ESPERA_MAXIMA = 3600
+    RESERVA_SEGUNDOS = 300     # si un worker muere con un lote, otro lo retoma después de esto
+    INTERVALO = 2.0            # segundos entre consultas cuando no hay nada pendiente
+    ENVIOS_SIMULTANEOS = 10
+
+    # Función de envío por tipo ("email", "sms"): async (notificacion) -> None, lanza excepción si falla
+    remitentes = {}
+
+    _tareas = []
+    _despertar = None
+    _loop = None
+
+    # ============ ESQUEMA ============
+
+    @classmethod
+    def preparar(cls, engine: Engine):
+        """
+        Lleva a las bases anteriores lo que necesita el outbox (create_all no
+        modifica tablas existentes): el valor 'enviando' del tipo enum de
+        PostgreSQL, las columnas de reintentos y reserva, y su índice.
+        Se puede ejecutar en cada arranque.
+        """
+        tabla = Notificacion.__table__
+        if not inspect(engine).has_table(tabla.name):
+            return
+        if engine.dialect.name == "postgresql":
+            # ADD VALUE no puede usarse dentro de la transacción que lo agrega
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+                tipo = tabla.c.estado.type.name
+                for estado in EstadoNotificacion:
+                    conexion.execute(text(f"ALTER TYPE {tipo} ADD VALUE IF NOT EXISTS '{estado.name}'"))
+
+        agregar_columnas(engine, tabla)
+        crear_indices(engine, tabla)
+
+    # ============ ENCOLADO ============
+
+    @classmethod
+    def avisar(cls):
+        """Despierta a los workers (se puede llamar desde cualquier hilo)"""
+        if cls._loop is not None and cls._despertar is not None and not cls._loop.is_closed():
+            cls._loop.call_soon_threadsafe(cls._despertar.set)
+
+    @classmethod
+    def avisar_al_confirmar(cls, db: Session):
+        """Despierta a los workers cuando la transacción del llamador haga commit"""
+        event.listen(db, "after_commit", lambda _: cls.avisar(), once=True)
+
+    # ============ RESERVA Y RESULTADO DE LOTES ============
+
+    @classmethod
+    def reservar_lote(cls, trabajador: str, limite: int = None) -> list:
+        """
+        Marca como 'enviando' un lote de notificaciones listas para enviar.
+        El UPDATE repite la condición, así dos workers nunca reservan la misma fila
+        (en PostgreSQL además se saltan las filas bloqueadas con SKIP LOCKED)
+        """
+        ahora = datetime.now()
+        # Reservas vencidas de un worker que se cayó (o al que el envío lo tumbó)
+        vencida = and_(Notificacion.estado == EstadoNotificacion.ENVIANDO, Notificacion.reservado_hasta < ahora)
+        disponible = or_(
+            and_(
+                Notificacion.estado == EstadoNotificacion.PENDIENTE,
+                or_(Notificacion.proximo_intento.is_(None), Notificacion.proximo_intento <= ahora)
+            ),
+            vencida
+        )
+
+        db = SessionLocal()
+        try:
+            ids = [
+                id_ for (id_,) in db.query(Notificacion.id).filter(disponible)
+                .order_by(Notificacion.id).limit(limite or cls.TAMAÑO_LOTE)
+                .with_for_update(skip_locked=True)
+            ]
+            if not ids:
+                db.rollback()
+                return []
+
+            # Una reserva vencida cuenta como intento fallido: si ya no quedan, dead letter
+            # (un mensaje que tumba al worker no se reintenta para siempre)
+            descartadas = db.execute(
+                update(Notificacion)
+                .where(Notificacion.id.in_(ids), vencida,
+                       func.coalesce(Notificacion.intentos, 0) + 1 >= cls.MAX_INTENTOS)
+                .values(
+                    estado=EstadoNotificacion.FALLIDO,
+                    intentos=func.coalesce(Notificacion.intentos, 0) + 1,
+                    error="Reserva vencida sin resultado (el worker se detuvo durante el envío)",
+                    proximo_intento=None,
+                    reservado_por=None,
+                    reservado_hasta=None
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if descartadas:
+                print(f"☠️ {descartadas} notificación(es) descartada(s): reservas vencidas tras "
+                      f"{cls.MAX_INTENTOS} intentos")
+
+            db.execute(
+                update(Notificacion)
+                .where(Notificacion.id.in_(ids), disponible)
+                .values(
+                    estado=EstadoNotificacion.ENVIANDO,
+                    intentos=case(
+                        (vencida, func.coalesce(Notificacion.intentos, 0) + 1),
+                        else_=Notificacion.intentos
+                    ),
+                    reservado_por=trabajador,
+                    reservado_hasta=ahora + timedelta(seconds=cls.RESERVA_SEGUNDOS)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+
+            # Los objetos quedan cargados y se pueden leer con la sesión cerrada
+            return db.query(Notificacion).filter(
+                Notificacion.id.in_(ids),
+                Notificacion.estado == EstadoNotificacion.ENVIANDO,
+                Notificacion.reservado_por == trabajador
+            ).all()
+        finally:
+            db.close()
+
+    @classmethod
+    def calcular_espera(cls, intentos: int) -> float:
+        """Espera exponencial con jitter: 30 s, 1 min, 2 min... hasta 1 hora"""
+        espera = min(cls.ESPERA_MAXIMA, cls.ESPERA_BASE * 2 ** (intentos - 1))
+        return espera * random.uniform(0.5, 1.0)
+
+    @classmethod
+    def registrar_resultados(cls, trabajador: str, resultados: list):
+        """resultados: lista de (id, error) - error None si se envió"""
+        ahora = datetime.now()
+        errores = dict(resultados)
+
+        db = SessionLocal()
+        try:
+            notificaciones = db.query(Notificacion).filter(
+                Notificacion.id.in_(errores.keys()),
+                # Si la reserva venció y la tomó otro worker, ese registra el resultado
+                Notificacion.reservado_por == trabajador
+            ).all()
+
+            for notificacion in notificaciones:
+                error = errores[notificacion.id]
+                notificacion.reservado_por = None
+                notificacion.reservado_hasta = None
+
+                if error is None:
+                    notificacion.estado = EstadoNotificacion.ENVIADO
+                    notificacion.fecha_envio = ahora
+                    notificacion.error = None
+                    continue
+
+                notificacion.intentos = (notificacion.intentos or 0) + 1
+                notificacion.error = error[:1000]
+                if notificacion.intentos >= cls.MAX_INTENTOS:
+                    notificacion.estado = EstadoNotificacion.FALLIDO
+                    notificacion.proximo_intento = None
+                    print(f"☠️ Notificación {notificacion.id} descartada tras "
+                          f"{notificacion.intentos} intentos: {error}")
+                else:
+                    notificacion.estado = EstadoNotificacion.PENDIENTE
+                    notificacion.proximo_intento = ahora + timedelta(
+                        seconds=cls.calcular_espera(notificacion.intentos)
+                    )
+
+            db.commit()
+        finally:
+            db.close()
+
+    # ============ ENVÍO ============
+
+    @classmethod
+    def remitente(cls, tipo):
+        tipo = getattr(tipo, "value", tipo)
+        return cls.remitentes.get(tipo) or cls._enviar_simulado
+
+    @staticmethod
+    async def _enviar_simulado(notificacion: Notificacion):
+        """Sin servidor configurado: se muestra el envío en consola"""
+        tipo = getattr(notificacion.tipo, "value", notificacion.tipo)
+        if tipo == "sms":
+            print(f"\n📱 SMS SIMULADO")
+            print(f"   Teléfono: {notificacion.destinatario}")
+            print(f"   Mensaje: {notificacion.mensaje}\n")
+            return
+
+        print(f"\n{'='*60}")
+        print(f"📧 NOTIFICACIÓN SIMULADA")
+        print(f"{'='*60}")
+        print(f"   Para: {notificacion.destinatario}")
+        print(f"   Asunto: {notificacion.asunto}")
+        print(f"   Mensaje: [HTML omitido - {len(notificacion.mensaje)} caracteres]")
+        print(f"{'='*60}\n")
+
+    @classmethod
+    async def procesar_lote(cls, trabajador: str) -> int:
+        """Reserva, envía y registra un lote. Retorna cuántas notificaciones tomó"""
+        lote = await asyncio.to_thread(cls.reservar_lote, trabajador)
+        if not lote:
+            return 0
+
+        limite = asyncio.Semaphore(cls.ENVIOS_SIMULTANEOS)
+
+        async def enviar(notificacion):
+            async with limite:
+                try:
+                    await cls.remitente(notificacion.tipo)(notificacion)
+                    return notificacion.id, None
+                except Exception as e:
+                    return notificacion.id, f"{type(e).__name__}: {e}"
+
+        resultados = await asyncio.gather(*[enviar(n) for n in lote])
+        await asyncio.to_thread(cls.registrar_resultados, trabajador, resultados)
+
+        enviadas = sum(1 for _, error in resultados if error is None)
+        print(f"📤 Outbox [{trabajador}]: {enviadas}/{len(lote)} enviada(s)")
+        return len(lote)
+
+    # ============ WORKERS ============
+
+    @classmethod
+    async def ejecutar(cls, trabajador: str):
+        """Bucle de un worker: procesa lotes mientras haya, si no espera aviso o INTERVALO"""
+        while True:
+            cls._despertar.clear()
+            try:
+                procesadas = await cls.procesar_lote(trabajador)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error en worker de notificaciones {trabajador}: {e}")
+                procesadas = 0
+
+            if procesadas:
+                continue
+            try:
+                await asyncio.wait_for(cls._despertar.wait(), timeout=cls.INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    async def drenar(cls) -> dict:
+        """
+        Procesa lotes hasta vaciar lo que ya toca enviar (tarea periódica del planificador).
+        Cubre los procesos sin workers propios (OUTBOX_WORKERS=0) y lo que quedó
+        esperando un reintento mientras los workers dormían.
+        """
+        trabajador = f"{socket.gethostname()}-{os.getpid()}-drenar"
+        total = 0
+        while True:
+            procesadas = await cls.procesar_lote(trabajador)
+            if not procesadas:
+                return {"procesadas": total}
+            total += procesadas
+
+    @classmethod
+    def iniciar(cls, trabajadores: int = None):
+        """Arranca los workers en el event loop actual (uno o más por proceso)"""
+        if cls._tareas:
+            return
+        cls._loop = asyncio.get_running_loop()
+        cls._despertar = asyncio.Event()
+
+        prefijo = f"{socket.gethostname()}-{os.getpid()}"
+        cantidad = trabajadores or settings.OUTBOX_WORKERS
+        cls._tareas = [
+            asyncio.create_task(cls.ejecutar(f"{prefijo}-{i}"))
+            for i in range(cantidad)
+        ]
+        if cantidad:
+            print(f"✅ Outbox de notificaciones: {cantidad} worker(s)")
+
+    @classmethod
+    async def detener(cls):
+        for tarea in cls._tareas:
+            tarea.cancel()
+        await asyncio.gather(*cls._tareas, return_exceptions=True)
+        cls._tareas = []
+        cls._loop = None
+        cls._despertar = None
+
+    # ============ ADMINISTRACIÓN ============
+
+    @staticmethod
+    def estadisticas(db: Session) -> dict:
+        por_estado = {
+            getattr(estado, "value", estado): total
+            for estado, total in db.query(Notificacion.estado, func.count(Notificacion.id))
+            .group_by(Notificacion.estado).all()
+        }
+        mas_antigua = db.query(func.min(Notificacion.created_at)).filter(
+            Notificacion.estado == EstadoNotificacion.PENDIENTE
+        ).scalar()
+        # Emails retenidos esperando agruparse con otros eventos de la misma solicitud
+        retenidas = db.query(func.count(Notificacion.id)).filter(
+            Notificacion.estado == EstadoNotificacion.PENDIENTE,
+            Notificacion.eventos.isnot(None),
+            Notificacion.proximo_intento > datetime.now()
+        ).scalar()
+
+        return {
+            "por_estado": por_estado,
+            "pendientes": por_estado.get("pendiente", 0),
+            "descartadas": por_estado.get("fallido", 0),
+            "pendiente_mas_antigua": mas_antigua,
+            "retenidas_para_agrupar": retenidas,
+            "workers": len(OutboxService._tareas)
+        }
+
+    @staticmethod
+    def purgar_enviadas(dias: int = None) -> dict:
+        """Borra las notificaciones enviadas hace más de NOTIFICACIONES_RETENCION_DIAS (0 = no borra nada)"""
+        dias = dias or settings.NOTIFICACIONES_RETENCION_DIAS
+        if dias <= 0:
+            return {"borradas": 0}
+        limite = datetime.now() - timedelta(days=dias)
+        db = SessionLocal()
+        try:
+            borradas = db.query(Notificacion).filter(
+                Notificacion.estado.in_([EstadoNotificacion.ENVIADO, EstadoNotificacion.LEIDO]),
+                Notificacion.fecha_envio < limite
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        print(f"🧹 Notificaciones purgadas: {borradas}")
+        return {"borradas": borradas}
+
+    @classmethod
+    def reintentar(cls, db: Session, notificacion_id: int) -> bool:
+        """Vuelve a encolar una notificación descartada (dead letter)"""
+        notificacion = db.query(Notificacion).filter(
+            Notificacion.id == notificacion_id,
+            Notificacion.estado == EstadoNotificacion.FALLIDO
+        ).first()
+        if not notificacion:
+            return False
+
+        notificacion.estado = EstadoNotificacion.PENDIENTE
+        notificacion.intentos = 0
+        notificacion.proximo_intento = None
+        cls.avisar_al_confirmar(db)
+        db.commit()
+        return True
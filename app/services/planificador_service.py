@@ -0,0 +1,436 @@
+from sqlalchemy import inspect as inspeccionar, or_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database.connection import SessionLocal
+from app.models.tarea import TareaProgramada
+from datetime import datetime, timedelta
+import asyncio
+import inspect
+import json
+import os
+import socket
+import time
+
+
+class Intervalo:
+    """Disparador cada N segundos"""
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+
+    def siguiente(self, desde: datetime) -> datetime:
+        return desde + timedelta(seconds=self.segundos)
+
+    def __str__(self):
+        return f"cada {self.segundos:g} s"
+
+
+class Cron:
+    """
+    Disparador con expresión cron de 5 campos: minuto hora día mes día_semana.
+    Acepta *, listas (1,15), rangos (1-5) y pasos (*/10); día_semana 0 o 7 = domingo.
+    Como en cron, si se restringen día y día_semana basta con que coincida uno.
+    """
+
+    RANGOS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expresión cron inválida (se esperaban 5 campos): {expresion}")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, self.dias_semana = [
+            self._parsear(campo, minimo, maximo)
+            for campo, (minimo, maximo) in zip(campos, self.RANGOS)
+        ]
+        if 7 in self.dias_semana:
+            self.dias_semana = (self.dias_semana - {7}) | {0}
+        self._cualquier_dia = campos[2] == "*"
+        self._cualquier_dia_semana = campos[4] == "*"
+
+    @staticmethod
+    def _parsear(campo: str, minimo: int, maximo: int) -> set:
+        valores = set()
+        for parte in campo.split(","):
+            rango, _, paso = parte.partition("/")
+            paso = int(paso) if paso else 1
+            if rango == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in rango:
+                inicio, fin = (int(v) for v in rango.split("-", 1))
+            else:
+                inicio = int(rango)
+                fin = maximo if paso > 1 else inicio
+            if inicio < minimo or fin > maximo or inicio > fin or paso < 1:
+                raise ValueError(f"Campo cron fuera de rango: {campo}")
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def _coincide_dia(self, fecha: datetime) -> bool:
+        dia_semana = (fecha.weekday() + 1) % 7  # Python: lunes=0 / cron: domingo=0
+        if self._cualquier_dia and self._cualquier_dia_semana:
+            return True
+        if self._cualquier_dia:
+            return dia_semana in self.dias_semana
+        if self._cualquier_dia_semana:
+            return fecha.day in self.dias
+        return fecha.day in self.dias or dia_semana in self.dias_semana
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """Primer minuto posterior a 'desde' que cumple la expresión"""
+        momento = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = momento + timedelta(days=366 * 5)
+        while momento < limite:
+            if momento.month not in self.meses:
+                momento = (momento.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._coincide_dia(momento):
+                momento = (momento + timedelta(days=1)).replace(hour=0, minute=0)
+            elif momento.hour not in self.horas:
+                momento = (momento + timedelta(hours=1)).replace(minute=0)
+            elif momento.minute not in self.minutos:
+                momento += timedelta(minutes=1)
+            else:
+                return momento
+        raise ValueError(f"La expresión cron nunca se cumple: {self.expresion}")
+
+    def __str__(self):
+        return f"cron '{self.expresion}'"
+
+
+class _Tarea:
+    """Tarea registrada en este proceso"""
+
+    def __init__(self, nombre: str, funcion, disparador, descripcion: str,
+                 por_proceso: bool, lease_segundos: int):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.disparador = disparador
+        self.descripcion = descripcion
+        self.por_proceso = por_proceso
+        self.lease_segundos = lease_segundos
+        self.proxima = None
+        self.en_curso = None
+
+        # Métricas locales (las compartidas están en tareas_programadas)
+        self.ejecuciones = 0
+        self.fallos = 0
+        self.ultima_ejecucion = None
+        self.ultima_duracion = None
+        self.ultimo_error = None
+
+
+class PlanificadorService:
+    """
+    Planificador de tareas periódicas dentro del proceso de la aplicación.
+    Con varios workers (gunicorn/uvicorn) cada uno corre este planificador, pero
+    una tarea compartida solo la ejecuta quien gana el lease de su fila en
+    tareas_programadas; la próxima ejecución también vive en esa fila, así una
+    tarea de cada 60 s corre una vez por minuto en total y no una por worker.
+    Las tareas por_proceso (p. ej. reconstruir índices en memoria) corren en todos.
+    """
+
+    TICK = 5                 # segundos entre revisiones
+    LEASE_SEGUNDOS = 600     # si el proceso muere a mitad, otro la retoma tras esto
+    RELECTURA = 60           # cada cuánto se vuelve a leer la fila (ve lo que cambie otro worker)
+
+    _tareas = {}
+    _bucle_tarea = None
+    _activo = True           # False si la base no tiene tareas_programadas
+    identificador = f"{socket.gethostname()}-{os.getpid()}"
+
+    # ============ REGISTRO ============
+
+    @classmethod
+    def registrar(cls, nombre: str, funcion, disparador, descripcion: str = "",
+                  por_proceso: bool = False, lease_segundos: int = None):
+        """funcion: sin argumentos, síncrona (corre en un hilo) o async"""
+        cls._tareas[nombre] = _Tarea(
+            nombre, funcion, disparador, descripcion, por_proceso,
+            lease_segundos or cls.LEASE_SEGUNDOS
+        )
+
+    @classmethod
+    def registrar_predeterminadas(cls):
+        """Tareas de mantenimiento del sistema"""
+        from app.services.outbox_service import OutboxService
+        from app.services.recordatorio_service import RecordatorioService
+        from app.services.documento_service import DocumentoService
+        from app.services.almacenamiento_service import AlmacenamientoService
+        from app.services.busqueda_service import BusquedaService
+        from app.services.autocompletado_service import AutocompletadoService
+        from app.services.consulta_service import ConsultaService
+        from app.routers.solicitud import barrer_sesiones
+        from app.database.connection import engine
+
+        def recolectar_blobs():
+            db = SessionLocal()
+            try:
+                return AlmacenamientoService.recolectar_huerfanos(db)
+            finally:
+                db.close()
+
+        cls.registrar("outbox_drenar", OutboxService.drenar, Intervalo(60),
+                      "Envía lo que haya quedado pendiente en el outbox")
+        if settings.NOTIFICACIONES_RETENCION_DIAS > 0:
+            # Opcional: sin retención configurada se conserva todo el historial de envíos
+            cls.registrar("notificaciones_purgar", OutboxService.purgar_enviadas, Cron("30 3 * * *"),
+                          f"Borra notificaciones enviadas hace más de {settings.NOTIFICACIONES_RETENCION_DIAS} días")
+        cls.registrar("recordatorios_vencimiento", RecordatorioService.ejecutar,
+                      Cron(settings.RECORDATORIO_CRON),
+                      "Campaña de recordatorios de vencimiento de licencias e ITSE")
+        cls.registrar("temporales_barrido", DocumentoService.limpiar_temporales, Intervalo(900),
+                      "Elimina archivos .part de subidas interrumpidas")
+        cls.registrar("sesiones_formulario_barrido", barrer_sesiones, Intervalo(900),
+                      f"Descarta sesiones del formulario sin actividad hace más de "
+                      f"{settings.FORMULARIO_SESION_HORAS:g} horas", por_proceso=True)
+        cls.registrar("almacenamiento_gc", recolectar_blobs, Cron("0 3 * * *"),
+                      "Elimina blobs de documentos sin referencias")
+        cls.registrar("busqueda_verificar", lambda: BusquedaService.verificar(engine), Cron("15 3 * * *"),
+                      "Indexa las solicitudes que falten en el índice de búsqueda")
+        cls.registrar("autocompletado_refrescar", AutocompletadoService.refrescar, Cron("45 3 * * *"),
+                      "Reconstruye el índice de sugerencias (altas confirmadas fuera de orden)", por_proceso=True)
+        cls.registrar("consulta_filtro_reconstruir", ConsultaService.reconstruir, Cron("50 3 * * *"),
+                      "Reconstruye el filtro de claves de la consulta por expediente/licencia/código "
+                      "(altas confirmadas fuera de orden)", por_proceso=True)
+
+    # ============ ESQUEMA ============
+
+    @classmethod
+    def preparar(cls, engine: Engine):
+        """
+        Crea tareas_programadas en las bases anteriores (create_all no corre al
+        arrancar). Si no se puede, el planificador queda desactivado en vez de
+        impedir que arranque el worker.
+        """
+        try:
+            TareaProgramada.__table__.create(engine, checkfirst=True)
+        except Exception as e:
+            print(f"⚠️ No se pudo crear la tabla tareas_programadas: {e}")
+        cls._activo = inspeccionar(engine).has_table(TareaProgramada.__tablename__)
+        if not cls._activo:
+            print("⚠️ Planificador de tareas desactivado: falta la tabla tareas_programadas")
+
+    # ============ LEASE Y ESTADO COMPARTIDO ============
+
+    @classmethod
+    def _asegurar_filas(cls):
+        """Crea la fila de cada tarea compartida que todavía no exista"""
+        ahora = datetime.now()
+        db = SessionLocal()
+        try:
+            existentes = {
+                nombre for (nombre,) in db.query(TareaProgramada.nombre)
+                .filter(TareaProgramada.nombre.in_(list(cls._tareas)))
+            }
+            for tarea in cls._tareas.values():
+                if tarea.por_proceso or tarea.nombre in existentes:
+                    continue
+                db.add(TareaProgramada(
+                    nombre=tarea.nombre,
+                    proxima_ejecucion=tarea.disparador.siguiente(ahora)
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Otro worker la creó al mismo tiempo
+                    db.rollback()
+        finally:
+            db.close()
+
+    @classmethod
+    def _reclamar(cls, tarea: _Tarea) -> bool:
+        """Toma el lease si la tarea ya toca y nadie la está ejecutando (UPDATE condicional)"""
+        ahora = datetime.now()
+        db = SessionLocal()
+        try:
+            resultado = db.execute(
+                update(TareaProgramada)
+                .where(
+                    TareaProgramada.nombre == tarea.nombre,
+                    or_(TareaProgramada.bloqueado_hasta.is_(None), TareaProgramada.bloqueado_hasta < ahora),
+                    or_(TareaProgramada.proxima_ejecucion.is_(None), TareaProgramada.proxima_ejecucion <= ahora)
+                )
+                .values(
+                    bloqueado_por=cls.identificador,
+                    bloqueado_hasta=ahora + timedelta(seconds=tarea.lease_segundos)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return resultado.rowcount == 1
+        finally:
+            db.close()
+
+    @classmethod
+    def _finalizar(cls, tarea: _Tarea, duracion: float, error: str, resultado):
+        """Registra métricas, calcula la próxima ejecución y libera el lease"""
+        ahora = datetime.now()
+        db = SessionLocal()
+        try:
+            fila = db.query(TareaProgramada).filter(TareaProgramada.nombre == tarea.nombre).first()
+            if fila is None:
+                return
+            fila.ejecuciones = (fila.ejecuciones or 0) + 1
+            fila.fallos = (fila.fallos or 0) + (1 if error else 0)
+            fila.ultima_ejecucion = ahora
+            fila.ultima_duracion = round(duracion, 3)
+            fila.duracion_total = (fila.duracion_total or 0) + duracion
+            fila.ultimo_error = error
+            if resultado is not None:
+                fila.ultimo_resultado = json.dumps(resultado, default=str)[:2000]
+            fila.proxima_ejecucion = tarea.disparador.siguiente(ahora)
+            if fila.bloqueado_por == cls.identificador:
+                fila.bloqueado_por = None
+                fila.bloqueado_hasta = None
+            db.commit()
+        finally:
+            db.close()
+
+    @classmethod
+    def _leer_proxima(cls, tarea: _Tarea) -> datetime:
+        db = SessionLocal()
+        try:
+            fila = db.query(TareaProgramada).filter(TareaProgramada.nombre == tarea.nombre).first()
+            proxima = fila.proxima_ejecucion if fila else None
+            # Si la tiene otro proceso en curso, se vuelve a mirar al vencer su lease
+            if fila and fila.bloqueado_hasta and fila.bloqueado_hasta > datetime.now():
+                proxima = max(proxima or fila.bloqueado_hasta, fila.bloqueado_hasta)
+            proxima = proxima or tarea.disparador.siguiente(datetime.now())
+            return min(proxima, datetime.now() + timedelta(seconds=cls.RELECTURA))
+        finally:
+            db.close()
+
+    # ============ EJECUCIÓN ============
+
+    @classmethod
+    async def _correr(cls, tarea: _Tarea):
+        inicio = time.perf_counter()
+        error = None
+        resultado = None
+        try:
+            if inspect.iscoroutinefunction(tarea.funcion):
+                resultado = await tarea.funcion()
+            else:
+                resultado = await asyncio.to_thread(tarea.funcion)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"❌ Tarea '{tarea.nombre}' falló: {error}")
+        duracion = time.perf_counter() - inicio
+
+        tarea.ejecuciones += 1
+        tarea.fallos += 1 if error else 0
+        tarea.ultima_ejecucion = datetime.now()
+        tarea.ultima_duracion = round(duracion, 3)
+        tarea.ultimo_error = error
+
+        if tarea.por_proceso:
+            tarea.proxima = tarea.disparador.siguiente(datetime.now())
+        else:
+            await asyncio.to_thread(cls._finalizar, tarea, duracion, error, resultado)
+            tarea.proxima = await asyncio.to_thread(cls._leer_proxima, tarea)
+
+    @classmethod
+    async def _revisar(cls, tarea: _Tarea):
+        if tarea.por_proceso:
+            await cls._correr(tarea)
+        elif await asyncio.to_thread(cls._reclamar, tarea):
+            await cls._correr(tarea)
+        else:
+            tarea.proxima = await asyncio.to_thread(cls._leer_proxima, tarea)
+
+    @classmethod
+    async def _bucle(cls):
+        while True:
+            ahora = datetime.now()
+            for tarea in cls._tareas.values():
+                if tarea.en_curso is not None and not tarea.en_curso.done():
+                    continue
+                if tarea.proxima is None or tarea.proxima <= ahora:
+                    # Cada tarea en su propio task: una larga no atrasa a las demás
+                    tarea.en_curso = asyncio.create_task(cls._revisar(tarea))
+            await asyncio.sleep(cls.TICK)
+
+    @classmethod
+    def iniciar(cls):
+        if cls._bucle_tarea is not None or not settings.PLANIFICADOR_ACTIVO or not cls._activo:
+            return
+        cls._asegurar_filas()
+        ahora = datetime.now()
+        for tarea in cls._tareas.values():
+            # Las por_proceso esperan su primer intervalo; las compartidas leen la fila al primer tick
+            tarea.proxima = tarea.disparador.siguiente(ahora) if tarea.por_proceso else None
+        cls._bucle_tarea = asyncio.create_task(cls._bucle())
+        print(f"✅ Planificador de tareas: {len(cls._tareas)} tarea(s) [{cls.identificador}]")
+
+    @classmethod
+    async def detener(cls):
+        tareas = [t.en_curso for t in cls._tareas.values() if t.en_curso is not None]
+        if cls._bucle_tarea is not None:
+            tareas.append(cls._bucle_tarea)
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        cls._bucle_tarea = None
+
+    # ============ ADMINISTRACIÓN ============
+
+    @classmethod
+    def forzar(cls, db: Session, nombre: str) -> bool:
+        """Adelanta la próxima ejecución a ahora (la corre el primer proceso que la vea)"""
+        tarea = cls._tareas.get(nombre)
+        if tarea is None or not cls._activo:
+            return False
+        ahora = datetime.now()
+        tarea.proxima = ahora
+        if not tarea.por_proceso:
+            db.query(TareaProgramada).filter(TareaProgramada.nombre == nombre).update(
+                {TareaProgramada.proxima_ejecucion: ahora}, synchronize_session=False
+            )
+            db.commit()
+        return True
+
+    @classmethod
+    def estado(cls, db: Session) -> list:
+        """Métricas de cada tarea: compartidas desde la BD, por_proceso de este proceso"""
+        filas = {
+            fila.nombre: fila
+            for fila in db.query(TareaProgramada).filter(TareaProgramada.nombre.in_(list(cls._tareas)))
+        } if cls._activo else {}
+        resultado = []
+        for tarea in cls._tareas.values():
+            fila = filas.get(tarea.nombre)
+            if tarea.por_proceso or fila is None:
+                ejecuciones, fallos = tarea.ejecuciones, tarea.fallos
+                metricas = {
+                    "ultima_ejecucion": tarea.ultima_ejecucion,
+                    "ultima_duracion": tarea.ultima_duracion,
+                    "duracion_promedio": None,
+                    "ultimo_error": tarea.ultimo_error,
+                    "proxima_ejecucion": tarea.proxima,
+                    "ejecutando_en": cls.identificador if tarea.en_curso and not tarea.en_curso.done() else None
+                }
+            else:
+                ejecuciones, fallos = fila.ejecuciones, fila.fallos
+                metricas = {
+                    "ultima_ejecucion": fila.ultima_ejecucion,
+                    "ultima_duracion": fila.ultima_duracion,
+                    "duracion_promedio": round(fila.duracion_total / fila.ejecuciones, 3) if fila.ejecuciones else None,
+                    "ultimo_error": fila.ultimo_error,
+                    "ultimo_resultado": json.loads(fila.ultimo_resultado) if fila.ultimo_resultado else None,
+                    "proxima_ejecucion": fila.proxima_ejecucion,
+                    "ejecutando_en": fila.bloqueado_por
+                }
+            resultado.append({
+                "nombre": tarea.nombre,
+                "descripcion": tarea.descripcion,
+                "disparador": str(tarea.disparador),
+                "por_proceso": tarea.por_proceso,
+                "ejecuciones": ejecuciones,
+                "fallos": fallos,
+                **metricas
+            })
+        return resultado
@@ -0,0 +1,136 @@
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+from app.config import settings
+import threading
+
+
+def _fecha(valor, formato: str = "%d/%m/%Y") -> str:
+    return valor.strftime(formato) if valor else ""
+
+
+def _fecha_hora(valor) -> str:
+    return _fecha(valor, "%d/%m/%Y %H:%M")
+
+
+def _soles(valor) -> str:
+    return f"S/ {valor:,.2f}" if valor is not None else ""
+
+
+class PlantillaService:
+    """
+    Registro de plantillas de notificación (app/templates/emails).
+    Cada tipo tiene asunto, parte HTML y parte de texto; las tres se compilan
+    una sola vez al primer uso y después solo se renderizan.
+    """
+
+    CARPETA = "app/templates/emails"
+
+    # tipo -> asunto (también es una plantilla Jinja)
+    PLANTILLAS = {
+        "bienvenida": "Bienvenido al Sistema de Licencias - Ica",
+        "cambio_estado": "Actualización de solicitud - {{ solicitud.numero_expediente }}",
+        "pago_confirmado": "Pago confirmado - {{ solicitud.numero_expediente }}",
+        "licencia_emitida": "Licencia de funcionamiento emitida - {{ solicitud.numero_licencia }}",
+        "recordatorio_vencimiento": "Su {{ 'licencia' if tipo == 'licencia' else 'certificado ITSE' }} "
+                                    "vence en {{ dias_restantes }} día(s) - {{ solicitud.numero_expediente }}",
+        # Varias notificaciones de la misma solicitud agrupadas en un solo email
+        "resumen": "Novedades de su solicitud - {{ solicitud.numero_expediente }} "
+                   "({{ eventos|length }} actualizaciones)",
+    }
+
+    _entorno = None
+    _compiladas = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def entorno(cls) -> Environment:
+        if cls._entorno is None:
+            entorno = Environment(
+                loader=FileSystemLoader(cls.CARPETA),
+                # Solo el HTML se escapa: el motivo o los comentarios los escribe un funcionario
+                autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+                trim_blocks=True,
+                lstrip_blocks=True,
+                undefined=StrictUndefined,
+                auto_reload=False
+            )
+            entorno.filters["fecha"] = _fecha
+            entorno.filters["fecha_hora"] = _fecha_hora
+            entorno.filters["soles"] = _soles
+            entorno.globals["app_url"] = settings.APP_URL
+            cls._entorno = entorno
+        return cls._entorno
+
+    @classmethod
+    def compilar(cls):
+        """Compila todas las plantillas registradas (falla al arrancar si alguna tiene errores)"""
+        with cls._lock:
+            entorno = cls.entorno()
+            cls._compiladas = {
+                tipo: (
+                    entorno.from_string(asunto),
+                    entorno.get_template(f"{tipo}.html"),
+                    entorno.get_template(f"{tipo}.txt"),
+                )
+                for tipo, asunto in cls.PLANTILLAS.items()
+            }
+        print(f"✅ Plantillas de notificación compiladas: {len(cls._compiladas)}")
+
+    @classmethod
+    def obtener(cls, tipo: str):
+        if not cls._compiladas:
+            cls.compilar()
+        try:
+            return cls._compiladas[tipo]
+        except KeyError:
+            raise ValueError(f"Plantilla de notificación no registrada: {tipo}")
+
+    @classmethod
+    def renderizar(cls, tipo: str, contexto: dict) -> tuple:
+        """Retorna: (asunto, html, texto)"""
+        asunto, html, texto = cls.obtener(tipo)
+        return (
+            asunto.render(contexto).strip(),
+            html.render(contexto),
+            texto.render(contexto).strip() + "\n"
+        )
+
+    @classmethod
+    def renderizar_bloque(cls, tipo: str, contexto: dict) -> tuple:
+        """
+        Como renderizar, pero sin el marco de base.html/base.txt (solo el bloque
+        'contenido'): es lo que se inserta en un email de resumen.
+        """
+        asunto, html, texto = cls.obtener(tipo)
+        return (
+            asunto.render(contexto).strip(),
+            "".join(html.blocks["contenido"](html.new_context(contexto))).strip("\n"),
+            "".join(texto.blocks["contenido"](texto.new_context(contexto))).strip()
+        )
+
+    @classmethod
+    def renderizar_lote(cls, tipo: str, contextos: list, comun: dict = None) -> list:
+        """
+        Renderiza la misma plantilla para muchos destinatarios.
+        comun: valores iguales para todos; cada contexto solo trae lo propio del destinatario
+        """
+        asunto, html, texto = cls.obtener(tipo)
+        comun = comun or {}
+        resultados = []
+        for contexto in contextos:
+            completo = {**comun, **contexto}
+            resultados.append((
+                asunto.render(completo).strip(),
+                html.render(completo),
+                texto.render(completo).strip() + "\n"
+            ))
+        return resultados
+
+    @staticmethod
+    def nombre_destinatario(user) -> str:
+        """Nombre para el saludo; si el perfil está incompleto usa la parte local del email"""
+        nombre = ""
+        if user.tipo_persona == "natural":
+            nombre = " ".join(p for p in [user.nombres, user.apellido_paterno, user.apellido_materno] if p)
+        elif user.tipo_persona == "juridica":
+            nombre = user.razon_social or user.nombre_comercial or ""
+        return nombre or user.email.split("@")[0]
@@ -0,0 +1,203 @@
+from app.services.riesgo_service import RiesgoService
+from app.services.zonificacion_service import ZonificacionService
+from app.services.exportacion_service import ExportacionService
+from app.utils.texto import normalizar_texto
+import codecs
+import csv
+import io
+import json
+
+
+class PreevaluacionService:
+    """
+    Pre-evaluación por lote de riesgo y zonificación (planillas de gremios y de la
+    Cámara de Comercio). Los resultados se evalúan y devuelven en streaming; cada
+    rubro distinto se clasifica una sola vez por lote y cada combinación
+    rubro/dirección se evalúa una sola vez, así que el costo crece con los valores
+    distintos de la planilla y no con su cantidad de filas.
+    """
+
+    MAX_FILAS = 50000
+
+    # Filas evaluadas antes de entregar un bloque JSON al cliente
+    TAMAÑO_LOTE = 2000
+
+    # Nombres de columna aceptados en la planilla (normalizados) -> campo
+    ALIAS = {
+        "rubro": "rubro", "giro": "rubro", "actividad": "rubro", "giro de negocio": "rubro",
+        "distrito": "distrito",
+        "direccion": "direccion", "direccion del negocio": "direccion", "direccion negocio": "direccion",
+        "domicilio": "direccion",
+        "nombre negocio": "nombre_negocio", "nombre del negocio": "nombre_negocio", "negocio": "nombre_negocio",
+        "razon social": "nombre_negocio", "nombre comercial": "nombre_negocio",
+        "ruc": "ruc",
+        "latitud": "latitud", "lat": "latitud", "longitud": "longitud", "lon": "longitud", "lng": "longitud",
+    }
+
+    COLUMNAS = [
+        "fila", "nombre_negocio", "ruc", "rubro", "distrito", "direccion", "latitud", "longitud",
+        "nivel_riesgo", "requiere_itse_previa", "monto",
+        "zona", "origen_zona", "compatible", "zonas_permitidas", "nivel_advertencia", "error"
+    ]
+
+    # ============ LECTURA ============
+
+    @classmethod
+    def _campo(cls, encabezado: str) -> str:
+        return cls.ALIAS.get(normalizar_texto(encabezado or "").strip(), None)
+
+    @classmethod
+    def leer_csv(cls, contenido: bytes) -> list:
+        """
+        Filas de un CSV como dicts con los campos conocidos. Acepta el BOM y el
+        separador ';' que usa Excel en español.
+        """
+        texto = codecs.decode(contenido, "utf-8-sig", errors="replace")
+        muestra = texto[:4096]
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+        except csv.Error:
+            dialecto = csv.excel
+
+        lector = csv.reader(io.StringIO(texto), dialecto)
+        encabezados = next(lector, None)
+        if not encabezados:
+            raise ValueError("El CSV está vacío")
+
+        campos = [cls._campo(e) for e in encabezados]
+        if "rubro" not in campos:
+            raise ValueError("El CSV debe tener una columna 'rubro' (o 'giro' / 'actividad')")
+
+        return [
+            {campo: valor.strip() for campo, valor in zip(campos, valores) if campo}
+            for valores in lector
+            if any(v.strip() for v in valores)
+        ]
+
+    @classmethod
+    def leer_json(cls, datos) -> list:
+        """Lista de negocios: [{...}, ...] o {"negocios": [{...}, ...]}"""
+        if isinstance(datos, dict):
+            datos = datos.get("negocios")
+        if not isinstance(datos, list):
+            raise ValueError("Se espera una lista de negocios o {\"negocios\": [...]}")
+
+        filas = []
+        for item in datos:
+            if not isinstance(item, dict):
+                raise ValueError("Cada negocio debe ser un objeto JSON")
+            fila = {}
+            for clave, valor in item.items():
+                campo = clave if clave in cls.COLUMNAS else cls._campo(clave)
+                if campo and valor is not None:
+                    fila[campo] = str(valor).strip()
+            filas.append(fila)
+        return filas
+
+    # ============ EVALUACIÓN ============
+
+    @classmethod
+    def evaluar(cls, filas):
+        """Generador de resultados (un dict por fila, en el mismo orden)"""
+        riesgos = {}
+        zonificaciones = {}
+        for numero, fila in enumerate(filas, start=1):
+            rubro = fila.get("rubro", "")
+            distrito = fila.get("distrito") or "Ica"
+            direccion = fila.get("direccion", "")
+            latitud = fila.get("latitud") or None
+            longitud = fila.get("longitud") or None
+            resultado = {
+                "fila": numero,
+                "nombre_negocio": fila.get("nombre_negocio", ""),
+                "ruc": fila.get("ruc", ""),
+                "rubro": rubro,
+                "distrito": distrito,
+                "direccion": direccion,
+                "latitud": latitud,
+                "longitud": longitud,
+            }
+            if not rubro:
+                resultado["error"] = "Falta el rubro"
+                yield resultado
+                continue
+
+            riesgo = riesgos.get(rubro)
+            if riesgo is None:
+                riesgo = riesgos[rubro] = RiesgoService.clasificar_riesgo(rubro)
+
+            clave = (rubro, distrito, direccion, latitud, longitud)
+            zonificacion = zonificaciones.get(clave)
+            if zonificacion is None:
+                zonificacion = zonificaciones[clave] = ZonificacionService.evaluar_compatibilidad(
+                    rubro, distrito, direccion, latitud, longitud
+                )
+
+            resultado.update({
+                "nivel_riesgo": riesgo["nivel_riesgo"],
+                "requiere_itse_previa": riesgo["requiere_itse_previa"],
+                "monto": riesgo["monto"],
+                "zona": zonificacion["zona"],
+                "origen_zona": zonificacion["origen_zona"],
+                "compatible": zonificacion["compatible"],
+                "zonas_permitidas": zonificacion["zonas_permitidas"],
+                "nivel_advertencia": zonificacion["nivel_advertencia"],
+            })
+            yield resultado
+
+    # ============ SALIDA EN STREAMING ============
+
+    @classmethod
+    def generar_json(cls, resultados):
+        """{"resultados": [...], "resumen": {...}} entregado por bloques"""
+        resumen = {"total": 0, "requieren_itse_previa": 0, "incompatibles": 0, "errores": 0, "por_riesgo": {}}
+        yield b'{"resultados": ['
+        bloque = []
+        separador = ""
+        for resultado in resultados:
+            resumen["total"] += 1
+            if resultado.get("error"):
+                resumen["errores"] += 1
+            else:
+                nivel = resultado["nivel_riesgo"]
+                resumen["por_riesgo"][nivel] = resumen["por_riesgo"].get(nivel, 0) + 1
+                resumen["requieren_itse_previa"] += resultado["requiere_itse_previa"]
+                resumen["incompatibles"] += not resultado["compatible"]
+
+            bloque.append(json.dumps(resultado, ensure_ascii=False))
+            if len(bloque) >= cls.TAMAÑO_LOTE:
+                yield (separador + ",".join(bloque)).encode("utf-8")
+                bloque = []
+                separador = ","
+        if bloque:
+            yield (separador + ",".join(bloque)).encode("utf-8")
+        yield ('], "resumen": ' + json.dumps(resumen) + "}").encode("utf-8")
+
+    @staticmethod
+    def _valor_csv(valor):
+        if isinstance(valor, bool):
+            return "sí" if valor else "no"
+        if isinstance(valor, list):
+            return " ".join(valor)
+        return valor
+
+    @classmethod
+    def generar_csv(cls, resultados):
+        filas = ([cls._valor_csv(r.get(c)) for c in cls.COLUMNAS] for r in resultados)
+        return ExportacionService.generar_csv(filas, cls.COLUMNAS)
+
+    @classmethod
+    def preevaluar(cls, filas: list, formato: str = "json"):
+        """
+        Prepara la respuesta completa
+        Retorna: (generador de bytes, media_type, extensión)
+        """
+        if formato not in ("json", "csv"):
+            raise ValueError(f"Formato no válido: {formato}")
+        if len(filas) > cls.MAX_FILAS:
+            raise ValueError(f"El lote supera el máximo de {cls.MAX_FILAS} filas")
+
+        resultados = cls.evaluar(filas)
+        if formato == "csv":
+            return cls.generar_csv(resultados), "text/csv; charset=utf-8", "csv"
+        return cls.generar_json(resultados), "application/json", "json"
@@ -0,0 +1,188 @@
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, contains_eager
+from app.config import settings
+from app.database.connection import SessionLocal
+from app.models.notificacion import RecordatorioVencimiento
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.services.notificacion_service import NotificacionService
+from datetime import datetime, timedelta
+import time
+
+
+class RecordatorioService:
+    """
+    Campañas de recordatorio de vencimiento (licencia e ITSE).
+    Cada corrida recorre por rangos de fecha (índices (fecha, id) de solicitudes)
+    las que vencen dentro de cada ventana, de a TAMAÑO_LOTE filas, y encola los
+    emails por lotes junto con el registro en recordatorios_vencimiento, que
+    evita repetir el mismo recordatorio en corridas siguientes.
+    """
+
+    TAMAÑO_LOTE = 500
+
+    # tipo -> (columna de vencimiento, texto para la plantilla)
+    TIPOS = {
+        "licencia": (Solicitud.fecha_vencimiento, "la licencia de funcionamiento"),
+        "itse": (Solicitud.vencimiento_itse, "el certificado ITSE"),
+    }
+
+    @staticmethod
+    def ventanas() -> list:
+        """Días de anticipación configurados, de menor a mayor (p. ej. [7, 30, 90])"""
+        return sorted({int(v) for v in settings.RECORDATORIO_VENTANAS.split(",") if v.strip()})
+
+    @classmethod
+    def rangos(cls, ahora: datetime = None) -> list:
+        """
+        (ventana, desde, hasta) sin solaparse: la de 30 días cubre lo que vence
+        entre 7 y 30 días, la de 90 entre 30 y 90. Así cada licencia recibe un
+        solo recordatorio por ventana aunque el job corra todos los días.
+        """
+        ahora = ahora or datetime.now()
+        resultado = []
+        anterior = 0
+        for ventana in cls.ventanas():
+            resultado.append((ventana, ahora + timedelta(days=anterior), ahora + timedelta(days=ventana)))
+            anterior = ventana
+        return resultado
+
+    @classmethod
+    def _filtros(cls, tipo: str, ventana: int, desde: datetime, hasta: datetime) -> list:
+        columna = cls.TIPOS[tipo][0]
+        filtros = [
+            columna > desde,
+            columna <= hasta,
+            User.is_active.isnot(False),
+            ~exists().where(
+                RecordatorioVencimiento.solicitud_id == Solicitud.id,
+                RecordatorioVencimiento.tipo == tipo,
+                RecordatorioVencimiento.ventana_dias == ventana,
+                RecordatorioVencimiento.fecha_vencimiento == columna
+            )
+        ]
+        if tipo == "licencia":
+            filtros += [Solicitud.numero_licencia.isnot(None), Solicitud.estado != "cancelado"]
+        else:
+            filtros.append(Solicitud.itse_aprobado.is_(True))
+        return filtros
+
+    # ============ CAMPAÑA ============
+
+    @classmethod
+    def procesar_ventana(cls, db: Session, tipo: str, ventana: int, desde: datetime, hasta: datetime,
+                         ahora: datetime) -> dict:
+        """Encola los recordatorios de una ventana, lote por lote (paginación por clave (fecha, id))"""
+        columna, documento = cls.TIPOS[tipo]
+        filtros = cls._filtros(tipo, ventana, desde, hasta)
+        encolados = 0
+        duplicados = 0
+        ultimo = None
+
+        while True:
+            consulta = (
+                db.query(Solicitud)
+                .join(Solicitud.usuario)
+                .options(contains_eager(Solicitud.usuario))
+                .filter(*filtros)
+            )
+            if ultimo is not None:
+                consulta = consulta.filter(or_(
+                    columna > ultimo[0],
+                    and_(columna == ultimo[0], Solicitud.id > ultimo[1])
+                ))
+            lote = consulta.order_by(columna, Solicitud.id).limit(cls.TAMAÑO_LOTE).all()
+            if not lote:
+                break
+
+            destinatarios = []
+            registros = []
+            for solicitud in lote:
+                vencimiento = getattr(solicitud, columna.key)
+                destinatarios.append((solicitud.usuario, solicitud, {
+                    "fecha_vencimiento": vencimiento,
+                    "dias_restantes": max(0, (vencimiento.date() - ahora.date()).days)
+                }))
+                registros.append(RecordatorioVencimiento(
+                    solicitud_id=solicitud.id,
+                    tipo=tipo,
+                    ventana_dias=ventana,
+                    fecha_vencimiento=vencimiento
+                ))
+            ultimo = (getattr(lote[-1], columna.key), lote[-1].id)
+
+            NotificacionService.encolar_plantilla_lote(
+                db, "recordatorio_vencimiento", destinatarios,
+                comun={"tipo": tipo, "ventana": ventana, "documento": documento}
+            )
+            db.add_all(registros)
+            try:
+                db.commit()
+                encolados += len(lote)
+            except IntegrityError:
+                # Otra corrida en paralelo ya registró alguno: este lote se descarta
+                # y lo que falte se retoma en la próxima corrida
+                db.rollback()
+                duplicados += len(lote)
+
+            # Solo se mantiene en memoria el lote actual
+            db.expunge_all()
+
+        return {"encolados": encolados, "duplicados": duplicados}
+
+    @classmethod
+    def ejecutar(cls, ahora: datetime = None) -> dict:
+        """Una corrida completa de la campaña (todas las ventanas y tipos)"""
+        ahora = ahora or datetime.now()
+        inicio = time.perf_counter()
+        detalle = {}
+
+        db = SessionLocal()
+        try:
+            for tipo in cls.TIPOS:
+                for ventana, desde, hasta in cls.rangos(ahora):
+                    detalle[f"{tipo}_{ventana}d"] = cls.procesar_ventana(db, tipo, ventana, desde, hasta, ahora)
+        finally:
+            db.close()
+
+        resumen = {
+            "encolados": sum(d["encolados"] for d in detalle.values()),
+            "duplicados": sum(d["duplicados"] for d in detalle.values()),
+            "por_ventana": detalle,
+            "segundos": round(time.perf_counter() - inicio, 2)
+        }
+        print(f"⏰ Recordatorios de vencimiento: {resumen['encolados']} encolado(s) en {resumen['segundos']} s")
+        return resumen
+
+    # ============ ADMINISTRACIÓN ============
+
+    @classmethod
+    def estadisticas(cls, db: Session) -> dict:
+        """Pendientes por ventana (lo que encolaría la próxima corrida) y recordatorios ya enviados"""
+        ahora = datetime.now()
+        pendientes = {}
+        for tipo in cls.TIPOS:
+            for ventana, desde, hasta in cls.rangos(ahora):
+                pendientes[f"{tipo}_{ventana}d"] = (
+                    db.query(func.count(Solicitud.id))
+                    .join(Solicitud.usuario)
+                    .filter(*cls._filtros(tipo, ventana, desde, hasta))
+                    .scalar()
+                )
+
+        enviados = {
+            f"{tipo}_{ventana}d": total
+            for tipo, ventana, total in db.query(
+                RecordatorioVencimiento.tipo,
+                RecordatorioVencimiento.ventana_dias,
+                func.count(RecordatorioVencimiento.id)
+            ).group_by(RecordatorioVencimiento.tipo, RecordatorioVencimiento.ventana_dias).all()
+        }
+
+        return {
+            "ventanas": cls.ventanas(),
+            "pendientes": pendientes,
+            "enviados": enviados,
+            "ultimo_envio": db.query(func.max(RecordatorioVencimiento.created_at)).scalar()
+        }
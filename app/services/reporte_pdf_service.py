@@ -0,0 +1,382 @@
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.legends import Legend
+from cachetools import TTLCache
+from io import BytesIO
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+import asyncio
+import threading
+import time
+
+from app.database.connection import SessionLocal
+from app.models.config import VersionCatalogo
+from app.models.solicitud import Solicitud
+from app.services.reporte_service import ReporteService
+
+
+class ReportePDFService:
+    """
+    Servicio para exportar los reportes del back-office a PDF.
+    Los PDFs quedan en caché en memoria. Guardar una solicitud (alta, cambio de
+    estado, emisión, resultado de inspección) incrementa la versión "reportes"
+    de versiones_catalogo en la misma transacción: al confirmar, este proceso
+    vacía su caché y los demás workers lo hacen al ver la versión nueva
+    (como mucho VERIFICAR_CADA segundos después).
+    """
+
+    VERSION = "reportes"
+    VERIFICAR_CADA = 2.0
+
+    # PDFs ya generados por (desde, hasta, periodo) - 5 minutos de vigencia
+    _cache = TTLCache(maxsize=32, ttl=300)
+    _cache_lock = threading.Lock()
+
+    # Se incrementa al vaciar la caché: un render que empezó antes no guarda su resultado
+    _generacion = 0
+    _version = None
+    _verificado = 0.0
+
+    # Renders en curso por (clave, generación): las peticiones concurrentes del mismo reporte esperan el mismo resultado
+    _en_curso = {}
+
+    COLOR_PRINCIPAL = colors.HexColor('#0B3B5C')
+    COLORES_RIESGO = [
+        colors.HexColor('#34D399'),  # bajo
+        colors.HexColor('#FBBF24'),  # medio
+        colors.HexColor('#F87171'),  # alto
+        colors.HexColor('#C084FC'),  # muy alto
+    ]
+
+    @staticmethod
+    def clave_cache(fecha_desde: datetime = None, fecha_hasta: datetime = None, periodo: str = "mensual"):
+        """Clave del reporte: rango de fechas (por día) y período"""
+        desde = fecha_desde.strftime("%Y-%m-%d") if fecha_desde else None
+        hasta = fecha_hasta.strftime("%Y-%m-%d") if fecha_hasta else None
+        return (desde, hasta, periodo or "mensual")
+
+    @classmethod
+    async def obtener_reporte(cls, fecha_desde: datetime = None, fecha_hasta: datetime = None,
+                              periodo: str = "mensual") -> bytes:
+        """
+        Devuelve el PDF del reporte desde caché o lo genera una sola vez
+        aunque lleguen varias peticiones a la vez
+        """
+        clave = cls.clave_cache(fecha_desde, fecha_hasta, periodo)
+        if time.monotonic() - cls._verificado >= cls.VERIFICAR_CADA:
+            await asyncio.to_thread(cls._verificar_version)
+
+        with cls._cache_lock:
+            pdf = cls._cache.get(clave)
+            generacion = cls._generacion
+        if pdf is not None:
+            return pdf
+
+        futuro = cls._en_curso.get((clave, generacion))
+        if futuro is None:
+            loop = asyncio.get_running_loop()
+            futuro = loop.run_in_executor(
+                None, cls._generar_y_guardar, clave, generacion, fecha_desde, fecha_hasta, periodo
+            )
+            cls._en_curso[(clave, generacion)] = futuro
+            futuro.add_done_callback(lambda _: cls._en_curso.pop((clave, generacion), None))
+
+        # shield: si un cliente se desconecta, el render sigue para los demás
+        return await asyncio.shield(futuro)
+
+    @classmethod
+    def invalidar_cache(cls):
+        """Descarta todos los reportes en caché (y los renders en curso no se guardan)"""
+        with cls._cache_lock:
+            cls._cache.clear()
+            cls._generacion += 1
+
+    @classmethod
+    def _generar_y_guardar(cls, clave, generacion, fecha_desde, fecha_hasta, periodo) -> bytes:
+        """Genera el PDF con su propia sesión (corre en un hilo del executor)"""
+        db = SessionLocal()
+        try:
+            pdf = cls.generar_reporte(db, fecha_desde, fecha_hasta, periodo).getvalue()
+        finally:
+            db.close()
+
+        with cls._cache_lock:
+            # Si la caché se vació durante el render, el resultado puede estar viejo
+            if cls._generacion == generacion:
+                cls._cache[clave] = pdf
+        return pdf
+
+    # ============ SINCRONIZACIÓN ============
+
+    @classmethod
+    def _verificar_version(cls):
+        """Vacía la caché si otro proceso guardó solicitudes desde la última lectura"""
+        db = SessionLocal()
+        try:
+            version = db.query(VersionCatalogo.version).filter(VersionCatalogo.nombre == cls.VERSION).scalar() or 0
+        finally:
+            db.close()
+        if cls._version is not None and version != cls._version:
+            cls.invalidar_cache()
+        cls._version = version
+        cls._verificado = time.monotonic()
+
+    @classmethod
+    def registrar(cls):
+        """Incrementa la versión al guardar solicitudes (una vez por proceso)"""
+        if not event.contains(Session, "after_flush", cls._al_guardar):
+            event.listen(Session, "after_flush", cls._al_guardar)
+
+    @classmethod
+    def _al_guardar(cls, session: Session, contexto):
+        if not any(isinstance(o, Solicitud) for o in (*session.new, *session.dirty, *session.deleted)):
+            return
+
+        conexion = session.connection()
+        resultado = conexion.execute(
+            update(VersionCatalogo)
+            .where(VersionCatalogo.nombre == cls.VERSION)
+            .values(version=VersionCatalogo.version + 1)
+        )
+        if resultado.rowcount == 0:
+            conexion.execute(VersionCatalogo.__table__.insert().values(nombre=cls.VERSION, version=1))
+        nueva = conexion.execute(
+            select(VersionCatalogo.version).where(VersionCatalogo.nombre == cls.VERSION)
+        ).scalar()
+
+        def al_confirmar(_):
+            cls.invalidar_cache()
+            # Si nadie más la cambió, la versión nueva ya está reflejada (no se vuelve a vaciar al leerla)
+            if cls._version == nueva - 1:
+                cls._version = nueva
+
+        event.listen(session, "after_commit", al_confirmar, once=True)
+
+    @staticmethod
+    def agrupar_por_periodo(detalle_mensual: list, periodo: str) -> list:
+        """Agrupa el detalle mensual en trimestres o en un total anual"""
+        if periodo == "trimestral":
+            tamaño = 3
+        elif periodo == "anual":
+            tamaño = 12
+        else:
+            return detalle_mensual
+
+        grupos = []
+        for inicio in range(0, len(detalle_mensual), tamaño):
+            meses = detalle_mensual[inicio:inicio + tamaño]
+            emitidas_tiempo = [m["tiempo_promedio"] for m in meses if m["tiempo_promedio"]]
+            grupos.append({
+                "mes": f"T{inicio // 3 + 1}" if tamaño == 3 else "AÑO",
+                "total": sum(m["total"] for m in meses),
+                "pagadas": sum(m["pagadas"] for m in meses),
+                "aprobadas": sum(m["aprobadas"] for m in meses),
+                "rechazadas": sum(m["rechazadas"] for m in meses),
+                "ingresos": sum(m["ingresos"] for m in meses),
+                "tiempo_promedio": round(sum(emitidas_tiempo) / len(emitidas_tiempo), 1) if emitidas_tiempo else 0
+            })
+        return grupos
+
+    @staticmethod
+    def generar_reporte(db, fecha_desde: datetime = None, fecha_hasta: datetime = None,
+                        periodo: str = "mensual"):
+        """
+        Genera el PDF con KPIs, gráficos y detalle por período
+        Retorna: BytesIO con el PDF generado
+        """
+        # Mismos agregados que la página /municipal/reportes
+        anio = fecha_hasta.year if fecha_hasta else None
+        stats = ReporteService.get_estadisticas_generales(db, fecha_desde, fecha_hasta)
+        datos_mensuales = ReporteService.get_solicitudes_por_mes(db, anio)
+        detalle = ReportePDFService.agrupar_por_periodo(
+            ReporteService.get_detalle_mensual(db, anio), periodo
+        )
+
+        desde_str = (fecha_desde or datetime.now() - timedelta(days=365)).strftime('%d/%m/%Y')
+        hasta_str = (fecha_hasta or datetime.now()).strftime('%d/%m/%Y')
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=50,
+            leftMargin=50,
+            topMargin=50,
+            bottomMargin=50,
+        )
+
+        story = []
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(
+            name='TituloReporte',
+            parent=styles['Heading1'],
+            fontSize=18,
+            alignment=1,
+            spaceAfter=10,
+            textColor=ReportePDFService.COLOR_PRINCIPAL
+        ))
+
+        # ========== ENCABEZADO ==========
+        story.append(Paragraph("MUNICIPALIDAD PROVINCIAL DE ICA", styles['TituloReporte']))
+        story.append(Paragraph("Reporte de Licencias de Funcionamiento", styles['Heading2']))
+        story.append(Paragraph(
+            f"Período: {desde_str} - {hasta_str} ({(periodo or 'mensual').capitalize()})",
+            styles['Normal']
+        ))
+        story.append(Paragraph(f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+        story.append(Spacer(1, 20))
+
+        # ========== KPIs ==========
+        story.append(Paragraph("INDICADORES GENERALES", styles['Heading2']))
+        data_kpi = [
+            ["Total solicitudes:", str(stats["total"])],
+            ["Pendientes de pago:", str(stats["pendientes_pago"])],
+            ["Pagadas:", str(stats["pagadas"])],
+            ["Aprobadas:", str(stats["aprobadas"])],
+            ["Rechazadas:", str(stats["rechazadas"])],
+            ["Licencias emitidas:", str(stats["emitidas"])],
+            ["Ingresos totales:", f"S/ {float(stats['ingresos']):.2f}"],
+            ["Tiempo promedio:", f"{stats['tiempo_promedio']} días"],
+            ["Tasa de aprobación:", f"{stats['tasa_aprobacion']}%"],
+        ]
+        t_kpi = Table(data_kpi, colWidths=[180, 250])
+        t_kpi.setStyle(TableStyle([
+            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+            ('FONTSIZE', (0,0), (-1,-1), 10),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('BACKGROUND', (0,0), (0,-1), colors.lightgrey),
+            ('PADDING', (0,0), (-1,-1), 6),
+        ]))
+        story.append(t_kpi)
+        story.append(Spacer(1, 20))
+
+        # ========== GRÁFICOS ==========
+        story.append(Paragraph("SOLICITUDES POR MES", styles['Heading2']))
+        story.append(ReportePDFService._grafico_barras(datos_mensuales["meses"], datos_mensuales["solicitudes"]))
+        story.append(Spacer(1, 10))
+
+        story.append(Paragraph("INGRESOS POR MES (S/)", styles['Heading2']))
+        story.append(ReportePDFService._grafico_lineas(datos_mensuales["meses"], datos_mensuales["ingresos"]))
+        story.append(Spacer(1, 10))
+
+        story.append(Paragraph("DISTRIBUCIÓN POR RIESGO", styles['Heading2']))
+        story.append(ReportePDFService._grafico_riesgo([
+            stats["riesgo_bajo"],
+            stats["riesgo_medio"],
+            stats["riesgo_alto"],
+            stats["riesgo_muy_alto"],
+        ]))
+        story.append(Spacer(1, 20))
+
+        # ========== DETALLE ==========
+        story.append(Paragraph("DETALLE DE SOLICITUDES", styles['Heading2']))
+        data_detalle = [["Período", "Solicitudes", "Pagadas", "Aprobadas", "Rechazadas", "Ingresos", "T. prom."]]
+        for item in detalle:
+            data_detalle.append([
+                item["mes"],
+                str(item["total"]),
+                str(item["pagadas"]),
+                str(item["aprobadas"]),
+                str(item["rechazadas"]),
+                f"S/ {float(item['ingresos']):.2f}",
+                f"{item['tiempo_promedio']} días",
+            ])
+        t_detalle = Table(data_detalle, repeatRows=1)
+        t_detalle.setStyle(TableStyle([
+            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,-1), 9),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('BACKGROUND', (0,0), (-1,0), ReportePDFService.COLOR_PRINCIPAL),
+            ('ALIGN', (1,0), (-1,-1), 'CENTER'),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor('#F5F5F5')]),
+            ('PADDING', (0,0), (-1,-1), 5),
+        ]))
+        story.append(t_detalle)
+
+        doc.build(story)
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def _grafico_barras(etiquetas: list, valores: list) -> Drawing:
+        """Gráfico de barras nativo de ReportLab"""
+        dibujo = Drawing(480, 180)
+        grafico = VerticalBarChart()
+        grafico.x = 40
+        grafico.y = 30
+        grafico.width = 420
+        grafico.height = 130
+        grafico.data = [valores]
+        grafico.categoryAxis.categoryNames = etiquetas
+        grafico.categoryAxis.labels.fontSize = 8
+        grafico.valueAxis.valueMin = 0
+        grafico.valueAxis.valueMax = max(max(valores, default=0), 1) * 1.2
+        grafico.valueAxis.labels.fontSize = 8
+        grafico.bars[0].fillColor = ReportePDFService.COLOR_PRINCIPAL
+        grafico.barLabelFormat = '%d'
+        grafico.barLabels.fontSize = 7
+        grafico.barLabels.nudge = 6
+        dibujo.add(grafico)
+        return dibujo
+
+    @staticmethod
+    def _grafico_lineas(etiquetas: list, valores: list) -> Drawing:
+        """Gráfico de líneas nativo de ReportLab"""
+        dibujo = Drawing(480, 180)
+        grafico = HorizontalLineChart()
+        grafico.x = 50
+        grafico.y = 30
+        grafico.width = 410
+        grafico.height = 130
+        grafico.data = [valores]
+        grafico.categoryAxis.categoryNames = etiquetas
+        grafico.categoryAxis.labels.fontSize = 8
+        grafico.valueAxis.valueMin = 0
+        grafico.valueAxis.valueMax = max(max(valores, default=0), 1) * 1.2
+        grafico.valueAxis.labels.fontSize = 8
+        grafico.lines[0].strokeColor = colors.HexColor('#34D399')
+        grafico.lines[0].strokeWidth = 2
+        dibujo.add(grafico)
+        return dibujo
+
+    @staticmethod
+    def _grafico_riesgo(valores: list) -> Drawing:
+        """Gráfico circular de distribución por riesgo"""
+        etiquetas = ["Bajo", "Medio", "Alto", "Muy alto"]
+        dibujo = Drawing(480, 170)
+
+        if sum(valores) == 0:
+            dibujo.add(String(240, 80, "Sin solicitudes en el período", textAnchor='middle', fontSize=10))
+            return dibujo
+
+        grafico = Pie()
+        grafico.x = 60
+        grafico.y = 10
+        grafico.width = 150
+        grafico.height = 150
+        grafico.data = valores
+        grafico.slices.strokeColor = colors.white
+        for i, color in enumerate(ReportePDFService.COLORES_RIESGO):
+            grafico.slices[i].fillColor = color
+        dibujo.add(grafico)
+
+        leyenda = Legend()
+        leyenda.x = 260
+        leyenda.y = 120
+        leyenda.fontSize = 9
+        leyenda.colorNamePairs = [
+            (color, f"{etiqueta}: {valor}")
+            for color, etiqueta, valor in zip(ReportePDFService.COLORES_RIESGO, etiquetas, valores)
+        ]
+        dibujo.add(leyenda)
+        return dibujo
@@ -1,4 +1,7 @@
-from app.models.config import Rubro
+from app.services.catalogo_service import CatalogoService
+from app.utils.texto import tokens
+from datetime import date, datetime
+import threading
 
 class RiesgoService:
     """Servicio para clasificar el nivel de riesgo del negocio"""
@@ -54,40 +57,166 @@ class RiesgoService:
         ]
     }
     
-    @staticmethod
-    def clasificar_riesgo(nombre_rubro: str) -> dict:
+    # Tarifas si la tabla Tarifa no tiene una vigente para el nivel
+    TARIFAS_POR_DEFECTO = {
+        "bajo": 140.00,
+        "medio": 150.00,
+        "alto": 170.00,
+        "muy_alto": 192.00
+    }
+    
+    ORDEN_RIESGO = {"bajo": 0, "medio": 1, "alto": 2, "muy_alto": 3}
+    
+    # Índice y tarifas se reconstruyen cuando cambia la versión de rubros/tarifas en
+    # CatalogoService (CRUD de /municipal/configuracion) o cambia el día (vigencia de tarifas)
+    _indice = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _mas_riesgoso(cls, a: tuple, b: tuple) -> tuple:
+        """Entre dos (nivel, requiere_itse) gana el de mayor riesgo; la ITSE previa se acumula"""
+        mayor = a if cls.ORDEN_RIESGO.get(a[0], 1) >= cls.ORDEN_RIESGO.get(b[0], 1) else b
+        return (mayor[0], a[1] or b[1])
+    
+    @classmethod
+    def construir_indice(cls, rubros: list, tarifas_catalogo: list) -> dict:
         """
-        Clasifica el nivel de riesgo según el rubro del negocio
-        Retorna: dict con nivel_riesgo, requiere_itse_previa, monto
+        Precompila la clasificación: frases normalizadas (sin tildes, por palabras)
+        de RIESGOS y de la tabla Rubro -> (nivel, requiere_itse_previa), más la
+        foto de las tarifas vigentes.
         """
-        nombre_rubro = nombre_rubro.lower().strip()
+        # tokens -> (nivel, requiere_itse, fuente); la tabla Rubro (fuente 1) manda sobre RIESGOS
+        entradas = {}
+        
+        def agregar(nombre: str, nivel: str, requiere_itse: bool, fuente: int):
+            # "Bodega / Minimarket" también se reconoce como "bodega" y "minimarket"
+            for variante in [nombre] + nombre.split("/"):
+                clave = tokens(variante)
+                if not clave:
+                    continue
+                valor = (nivel, requiere_itse)
+                anterior = entradas.get(clave)
+                if anterior is None or fuente > anterior[2]:
+                    entradas[clave] = (*valor, fuente)
+                elif fuente == anterior[2]:
+                    entradas[clave] = (*cls._mas_riesgoso(anterior[:2], valor), fuente)
+        
+        for nivel, nombres in cls.RIESGOS.items():
+            for nombre in nombres:
+                agregar(nombre, nivel, nivel in ["alto", "muy_alto"], 0)
         
-        for nivel, rubros in RiesgoService.RIESGOS.items():
-            for rubro in rubros:
-                if rubro.lower() in nombre_rubro or nombre_rubro in rubro.lower():
-                    # Tarifas según nivel de riesgo
-                    tarifas = {
-                        "bajo": 140.00,
-                        "medio": 150.00,
-                        "alto": 170.00,
-                        "muy_alto": 192.00
-                    }
-                    
-                    return {
-                        "nivel_riesgo": nivel,
-                        "requiere_itse_previa": nivel in ["alto", "muy_alto"],
-                        "monto": tarifas[nivel],
-                        "descripcion": f"Licencia para negocio de {nivel} riesgo"
-                    }
+        for rubro in rubros:
+            if rubro.is_active is not False and rubro.nivel_riesgo in cls.ORDEN_RIESGO:
+                agregar(rubro.nombre, rubro.nivel_riesgo,
+                        bool(rubro.requiere_itse_previa) or rubro.nivel_riesgo in ["alto", "muy_alto"], 1)
+        
+        # Largos de frase posibles según la primera palabra, de mayor a menor
+        longitudes = {}
+        # Fragmentos (palabras seguidas) de cada frase: para entradas cortas como "farmacia"
+        fragmentos = {}
+        for clave, (nivel, requiere_itse, _) in entradas.items():
+            longitudes.setdefault(clave[0], set()).add(len(clave))
+            for inicio in range(len(clave)):
+                for fin in range(inicio + 1, len(clave) + 1):
+                    fragmento = clave[inicio:fin]
+                    valor = (nivel, requiere_itse)
+                    fragmentos[fragmento] = (
+                        cls._mas_riesgoso(fragmentos[fragmento], valor) if fragmento in fragmentos else valor
+                    )
+        
+        # Tarifas vigentes hoy (si hay varias para un nivel, la más reciente)
+        ahora = datetime.now()
+        tarifas = dict(cls.TARIFAS_POR_DEFECTO)
+        for tarifa in sorted(tarifas_catalogo, key=lambda t: t.vigente_desde or datetime.min):
+            if (tarifa.is_active is not False
+                    and (tarifa.vigente_desde is None or tarifa.vigente_desde <= ahora)
+                    and (tarifa.vigente_hasta is None or tarifa.vigente_hasta > ahora)):
+                tarifas[tarifa.nivel_riesgo] = tarifa.monto
         
-        # Por defecto: riesgo medio
         return {
-            "nivel_riesgo": "medio",
-            "requiere_itse_previa": False,
-            "monto": 150.00,
-            "descripcion": "Licencia para negocio de riesgo medio"
+            "exactas": {clave: valor[:2] for clave, valor in entradas.items()},
+            "longitudes": {token: sorted(largos, reverse=True) for token, largos in longitudes.items()},
+            "fragmentos": fragmentos,
+            "tarifas": tarifas,
+            "resultados": {}
         }
     
+    @classmethod
+    def indice(cls) -> dict:
+        versiones = CatalogoService.versiones()
+        clave = (versiones["rubros"], versiones["tarifas"], date.today())
+        indice = cls._indice
+        if indice is not None and indice["clave"] == clave:
+            return indice
+        with cls._lock:
+            if cls._indice is None or cls._indice["clave"] != clave:
+                nuevo = cls.construir_indice(CatalogoService.rubros(activos=False), CatalogoService.tarifas(activas=False))
+                nuevo["clave"] = clave
+                cls._indice = nuevo
+            return cls._indice
+    
+    @classmethod
+    def invalidar(cls):
+        """Fuerza la reconstrucción en la próxima clasificación"""
+        cls._indice = None
+    
+    @classmethod
+    def tarifas(cls) -> dict:
+        """Monto vigente por nivel de riesgo"""
+        return dict(cls.indice()["tarifas"])
+    
+    @classmethod
+    def _buscar_nivel(cls, indice: dict, clave: tuple):
+        """(nivel, requiere_itse) del rubro más específico que coincide, o None"""
+        exacta = indice["exactas"].get(clave)
+        if exacta:
+            return exacta
+        
+        # Un rubro conocido dentro del texto ("venta de repuestos para autos"): gana el más largo
+        exactas = indice["exactas"]
+        mejor = None
+        mejor_largo = 0
+        for posicion, token in enumerate(clave):
+            for largo in indice["longitudes"].get(token, ()):
+                if largo < mejor_largo:
+                    break
+                valor = exactas.get(clave[posicion:posicion + largo])
+                if valor:
+                    if largo > mejor_largo:
+                        mejor, mejor_largo = valor, largo
+                    else:
+                        mejor = cls._mas_riesgoso(mejor, valor)
+                    break
+        if mejor:
+            return mejor
+        
+        # El texto es parte de un rubro conocido ("farmacia" -> "Farmacia / Botica")
+        return indice["fragmentos"].get(clave)
+    
+    @classmethod
+    def clasificar_riesgo(cls, nombre_rubro: str) -> dict:
+        """
+        Clasifica el nivel de riesgo según el rubro del negocio
+        Retorna: dict con nivel_riesgo, requiere_itse_previa, monto
+        """
+        indice = cls.indice()
+        
+        # Memoria por texto tal cual llega: los rubros del formulario se repiten mucho
+        resultado = indice["resultados"].get(nombre_rubro)
+        if resultado is None:
+            clave = tokens(nombre_rubro)
+            nivel, requiere_itse = cls._buscar_nivel(indice, clave) or ("medio", False)  # Por defecto: riesgo medio
+            resultado = {
+                "nivel_riesgo": nivel,
+                "requiere_itse_previa": requiere_itse,
+                "monto": indice["tarifas"].get(nivel, cls.TARIFAS_POR_DEFECTO["medio"]),
+                "descripcion": f"Licencia para negocio de {nivel} riesgo"
+            }
+            if len(indice["resultados"]) < 10000:
+                indice["resultados"][nombre_rubro] = resultado
+        
+        return dict(resultado)
+    
     @staticmethod
     def get_anexos_requeridos(nivel_riesgo: str) -> list:
         """
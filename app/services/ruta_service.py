@@ -0,0 +1,370 @@
+from sqlalchemy.orm import Session, joinedload
+from app.config import settings
+from app.models.inspeccion import Inspeccion, EstadoInspeccion
+from app.models.solicitud import Solicitud
+from app.models.user import User
+from app.services.geocodificacion_service import GeocodificacionService
+from datetime import date, datetime, timedelta
+import heapq
+import math
+import time
+
+
+class RutaService:
+    """
+    Rutas diarias de los inspectores ITSE. Cada día se arma con vecino más
+    cercano en paralelo (el inspector que queda libre primero toma la visita
+    factible más cercana, con preferencia por las de ITSE previa), después se
+    mejora cada ruta con 2-opt y se intenta insertar lo que quedó afuera.
+    Se respetan la jornada de cada inspector y la ventana horaria de cada
+    local; lo que no entra en el día pasa al siguiente.
+    Los tiempos se manejan en minutos desde las 00:00 del día.
+    """
+
+    # Municipalidad Provincial de Ica: salida y regreso de las rutas
+    SEDE = (-14.0639, -75.7292)
+
+    # Traslado urbano: distancia en línea recta x factor de recorrido a velocidad media
+    VELOCIDAD_KMH = 25
+    FACTOR_RECORRIDO = 1.3
+
+    DURACION_POR_RIESGO = {"bajo": 30, "medio": 45, "alto": 60, "muy_alto": 90}
+
+    # Minutos de ventaja que tiene una visita de ITSE previa al elegir la siguiente parada
+    BONO_PRIORIDAD = 60
+
+    MAX_PASADAS_2OPT = 20
+
+    # ============ TIEMPOS ============
+
+    @staticmethod
+    def distancia_km(a: tuple, b: tuple) -> float:
+        """Distancia haversine entre dos puntos (latitud, longitud)"""
+        lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+        lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+    @classmethod
+    def matriz_minutos(cls, puntos: list) -> list:
+        """Minutos de traslado entre cada par de puntos (el 0 es la sede)"""
+        minutos_por_km = 60 * cls.FACTOR_RECORRIDO / cls.VELOCIDAD_KMH
+        matriz = [[0.0] * len(puntos) for _ in puntos]
+        for i, a in enumerate(puntos):
+            fila = matriz[i]
+            for j in range(i + 1, len(puntos)):
+                fila[j] = matriz[j][i] = cls.distancia_km(a, puntos[j]) * minutos_por_km
+        return matriz
+
+    @staticmethod
+    def _minutos(hora: str) -> int:
+        horas, minutos = hora.strip().split(":")
+        return int(horas) * 60 + int(minutos)
+
+    @classmethod
+    def jornada(cls) -> tuple:
+        desde, hasta = settings.INSPECCION_JORNADA.split("-")
+        return cls._minutos(desde), cls._minutos(hasta)
+
+    # ============ OPTIMIZACIÓN DE UN DÍA ============
+
+    @staticmethod
+    def _horarios(ruta: list, T: list, desde: list, hasta: list, duracion: list, inicio: float, fin: float):
+        """Hora de inicio de cada visita de la ruta, o None si no respeta ventanas o jornada"""
+        t = inicio
+        anterior = 0
+        horarios = []
+        for v in ruta:
+            t = max(t + T[anterior][v], desde[v])
+            if t > hasta[v]:
+                return None
+            horarios.append(t)
+            t += duracion[v]
+            anterior = v
+        if t + T[anterior][0] > fin:
+            return None
+        return horarios
+
+    @staticmethod
+    def _traslado(ruta: list, T: list) -> float:
+        total = 0.0
+        anterior = 0
+        for v in ruta:
+            total += T[anterior][v]
+            anterior = v
+        return total + T[anterior][0]
+
+    @classmethod
+    def _construir(cls, visitas: list, T, desde, hasta, duracion, prioridad, jornadas: list) -> dict:
+        """Vecino más cercano en paralelo: el inspector que se libera primero elige su siguiente visita"""
+        rutas = {k: [] for k in range(len(jornadas))}
+        pendientes = set(visitas)
+        libres = [(inicio, k, 0) for k, (inicio, _) in enumerate(jornadas)]
+        heapq.heapify(libres)
+
+        while libres and pendientes:
+            t, k, posicion = heapq.heappop(libres)
+            fin_jornada = jornadas[k][1]
+            fila = T[posicion]
+            mejor = None
+            mejor_costo = None
+            for v in pendientes:
+                inicio = t + fila[v]
+                if inicio < desde[v]:
+                    inicio = desde[v]
+                if inicio > hasta[v] or inicio + duracion[v] + T[v][0] > fin_jornada:
+                    continue
+                costo = inicio - t - (cls.BONO_PRIORIDAD if prioridad[v] else 0)
+                if mejor_costo is None or costo < mejor_costo or (costo == mejor_costo and v < mejor):
+                    mejor, mejor_costo = v, costo
+            if mejor is None:
+                continue  # Este inspector ya no puede tomar más visitas hoy
+            pendientes.discard(mejor)
+            rutas[k].append(mejor)
+            heapq.heappush(libres, (max(t + fila[mejor], desde[mejor]) + duracion[mejor], k, mejor))
+
+        return rutas
+
+    @classmethod
+    def _dos_opt(cls, ruta: list, T, desde, hasta, duracion, inicio: float, fin: float) -> list:
+        """Invierte tramos de la ruta mientras baje el traslado sin romper ventanas ni jornada"""
+        for _ in range(cls.MAX_PASADAS_2OPT):
+            mejoro = False
+            for i in range(len(ruta) - 1):
+                antes = ruta[i - 1] if i > 0 else 0
+                for j in range(i + 1, len(ruta)):
+                    despues = ruta[j + 1] if j + 1 < len(ruta) else 0
+                    delta = T[antes][ruta[j]] + T[ruta[i]][despues] - T[antes][ruta[i]] - T[ruta[j]][despues]
+                    if delta < -1e-9:
+                        candidata = ruta[:i] + ruta[i:j + 1][::-1] + ruta[j + 1:]
+                        if cls._horarios(candidata, T, desde, hasta, duracion, inicio, fin) is not None:
+                            ruta = candidata
+                            mejoro = True
+                            antes = ruta[i - 1] if i > 0 else 0
+            if not mejoro:
+                break
+        return ruta
+
+    @classmethod
+    def _insertar(cls, v: int, rutas: dict, T, desde, hasta, duracion, jornadas: list) -> bool:
+        """Inserción más barata de v en alguna ruta (posiciones ordenadas por costo)"""
+        opciones = []
+        for k, ruta in rutas.items():
+            for posicion in range(len(ruta) + 1):
+                antes = ruta[posicion - 1] if posicion > 0 else 0
+                despues = ruta[posicion] if posicion < len(ruta) else 0
+                opciones.append((T[antes][v] + T[v][despues] - T[antes][despues], k, posicion))
+        opciones.sort()
+        for _, k, posicion in opciones:
+            candidata = rutas[k][:posicion] + [v] + rutas[k][posicion:]
+            if cls._horarios(candidata, T, desde, hasta, duracion, *jornadas[k]) is not None:
+                rutas[k] = candidata
+                return True
+        return False
+
+    @classmethod
+    def _reemplazar(cls, v: int, rutas: dict, T, desde, hasta, duracion, prioridad, jornadas: list):
+        """Visita de ITSE previa que no entra: ocupa el lugar de una sin prioridad (la que menos traslado agregue)"""
+        mejor = None
+        for k, ruta in rutas.items():
+            for posicion, u in enumerate(ruta):
+                if prioridad[u]:
+                    continue
+                candidata = ruta[:posicion] + [v] + ruta[posicion + 1:]
+                if cls._horarios(candidata, T, desde, hasta, duracion, *jornadas[k]) is None:
+                    continue
+                costo = cls._traslado(candidata, T)
+                if mejor is None or costo < mejor[0]:
+                    mejor = (costo, k, posicion, u, candidata)
+        if mejor is None:
+            return None
+        _, k, _, desplazada, candidata = mejor
+        rutas[k] = candidata
+        return desplazada
+
+    @classmethod
+    def optimizar_dia(cls, visitas: list, T, desde, hasta, duracion, prioridad, jornadas: list) -> tuple:
+        """
+        visitas: índices en T (el 0 es la sede); jornadas: [(inicio, fin)] por inspector
+        Retorna: (rutas {posición del inspector: [visitas en orden]}, visitas que no entraron)
+        """
+        rutas = cls._construir(visitas, T, desde, hasta, duracion, prioridad, jornadas)
+        for k in rutas:
+            rutas[k] = cls._dos_opt(rutas[k], T, desde, hasta, duracion, *jornadas[k])
+
+        asignadas = {v for ruta in rutas.values() for v in ruta}
+        sin_asignar = [v for v in visitas if v not in asignadas]
+        sin_asignar.sort(key=lambda v: (not prioridad[v], v))
+
+        quedan = []
+        for v in sin_asignar:
+            if cls._insertar(v, rutas, T, desde, hasta, duracion, jornadas):
+                continue
+            if prioridad[v]:
+                desplazada = cls._reemplazar(v, rutas, T, desde, hasta, duracion, prioridad, jornadas)
+                if desplazada is not None:
+                    quedan.append(desplazada)
+                    continue
+            quedan.append(v)
+
+        return rutas, sorted(quedan)
+
+    # ============ PLANIFICACIÓN ============
+
+    @classmethod
+    def _ventana(cls, inspeccion: Inspeccion, jornada: tuple) -> tuple:
+        """Ventana horaria del local (minutos) dentro de la jornada"""
+        desde, hasta = jornada
+        if inspeccion.ventana_desde:
+            desde = max(desde, inspeccion.ventana_desde.hour * 60 + inspeccion.ventana_desde.minute)
+        if inspeccion.ventana_hasta:
+            hasta = min(hasta, inspeccion.ventana_hasta.hour * 60 + inspeccion.ventana_hasta.minute)
+        return desde, hasta
+
+    @classmethod
+    def _ubicacion(cls, solicitud: Solicitud):
+        if solicitud.latitud is not None and solicitud.longitud is not None:
+            return (solicitud.latitud, solicitud.longitud)
+        ubicacion = GeocodificacionService.geocodificar(solicitud.direccion_negocio, solicitud.distrito)
+        return (ubicacion["latitud"], ubicacion["longitud"]) if ubicacion else None
+
+    @staticmethod
+    def dias_habiles(desde: date, dias: int) -> list:
+        resultado = []
+        dia = desde
+        while len(resultado) < dias:
+            if dia.weekday() < 5:
+                resultado.append(dia)
+            dia += timedelta(days=1)
+        return resultado
+
+    @classmethod
+    def planificar(cls, db: Session, desde: date, dias: int = 1, inspectores: list = None,
+                   aplicar: bool = False) -> dict:
+        """
+        Rutas para las inspecciones programadas pendientes hasta el último día del plan
+        (incluidas las atrasadas y las sin inspector).
+        inspectores: [{"id": 5, "desde": "09:00", "hasta": "13:00"}]; por defecto todos los
+        inspectores activos en la jornada completa.
+        Con aplicar=True guarda inspector y hora de cada inspección.
+        """
+        inicio_calculo = time.perf_counter()
+        jornada = cls.jornada()
+        dias_plan = cls.dias_habiles(desde, dias)
+
+        if inspectores is None:
+            inspectores = [
+                {"id": i.id}
+                for i in db.query(User).filter(User.tipo_usuario == "inspector", User.is_active.isnot(False))
+                .order_by(User.id)
+            ]
+        nombres = {
+            u.id: u.nombre_completo() or u.email
+            for u in db.query(User).filter(User.id.in_([i["id"] for i in inspectores]))
+        }
+        inspectores = [i for i in inspectores if i["id"] in nombres]
+        if not inspectores:
+            raise ValueError("No hay inspectores disponibles")
+        jornadas = [
+            (cls._minutos(i["desde"]) if i.get("desde") else jornada[0],
+             cls._minutos(i["hasta"]) if i.get("hasta") else jornada[1])
+            for i in inspectores
+        ]
+
+        inspecciones = (
+            db.query(Inspeccion)
+            .options(joinedload(Inspeccion.solicitud))
+            .filter(
+                Inspeccion.estado == EstadoInspeccion.PROGRAMADA.value,
+                Inspeccion.fecha_programada < datetime.combine(dias_plan[-1] + timedelta(days=1), datetime.min.time())
+            )
+            .order_by(Inspeccion.id)
+            .all()
+        )
+
+        puntos = [cls.SEDE]
+        desde_min, hasta_min, duracion, prioridad = [0], [0], [0], [False]
+        indice = {}
+        sin_asignar = []
+        for inspeccion in inspecciones:
+            ubicacion = cls._ubicacion(inspeccion.solicitud)
+            if ubicacion is None:
+                sin_asignar.append({"inspeccion_id": inspeccion.id, "motivo": "Sin ubicación del local"})
+                continue
+            ventana = cls._ventana(inspeccion, jornada)
+            if ventana[0] > ventana[1]:
+                sin_asignar.append({"inspeccion_id": inspeccion.id, "motivo": "Ventana horaria fuera de la jornada"})
+                continue
+            indice[len(puntos)] = inspeccion
+            puntos.append(ubicacion)
+            desde_min.append(ventana[0])
+            hasta_min.append(ventana[1])
+            duracion.append(cls.DURACION_POR_RIESGO.get(inspeccion.solicitud.nivel_riesgo, 45))
+            prioridad.append(bool(inspeccion.solicitud.requiere_itse_previa))
+
+        T = cls.matriz_minutos(puntos)
+        km_por_minuto = cls.VELOCIDAD_KMH / 60 / cls.FACTOR_RECORRIDO
+
+        rutas = []
+        pendientes = sorted(indice)
+        for dia in dias_plan:
+            if not pendientes:
+                break
+            rutas_dia, pendientes = cls.optimizar_dia(pendientes, T, desde_min, hasta_min, duracion, prioridad, jornadas)
+            for k, ruta in rutas_dia.items():
+                if not ruta:
+                    continue
+                horarios = cls._horarios(ruta, T, desde_min, hasta_min, duracion, *jornadas[k])
+                paradas = []
+                anterior = 0
+                for v, hora in zip(ruta, horarios):
+                    inspeccion = indice[v]
+                    inicio = datetime.combine(dia, datetime.min.time()) + timedelta(minutes=round(hora))
+                    paradas.append({
+                        "inspeccion_id": inspeccion.id,
+                        "solicitud_id": inspeccion.solicitud_id,
+                        "expediente": inspeccion.solicitud.numero_expediente,
+                        "negocio": inspeccion.solicitud.nombre_negocio,
+                        "direccion": inspeccion.solicitud.direccion_negocio,
+                        "distrito": inspeccion.solicitud.distrito,
+                        "itse_previa": prioridad[v],
+                        "hora": inicio.strftime("%H:%M"),
+                        "fin": (inicio + timedelta(minutes=duracion[v])).strftime("%H:%M"),
+                        "traslado_min": round(T[anterior][v])
+                    })
+                    anterior = v
+                    if aplicar:
+                        inspeccion.inspector_id = inspectores[k]["id"]
+                        inspeccion.fecha_programada = inicio
+                traslado = cls._traslado(ruta, T)
+                rutas.append({
+                    "fecha": dia.isoformat(),
+                    "inspector_id": inspectores[k]["id"],
+                    "inspector": nombres[inspectores[k]["id"]],
+                    "paradas": paradas,
+                    "traslado_min": round(traslado),
+                    "km": round(traslado * km_por_minuto, 1),
+                    "ocupacion": round(100 * (traslado + sum(duracion[v] for v in ruta)) / (jornadas[k][1] - jornadas[k][0]))
+                })
+
+        sin_asignar += [
+            {"inspeccion_id": indice[v].id, "motivo": "No entra en los días planificados"}
+            for v in pendientes
+        ]
+
+        if aplicar:
+            from app.services.calendario_service import CalendarioService
+            CalendarioService.invalidar(db, *indice.values())
+            db.commit()
+
+        resumen = {
+            "inspecciones": len(inspecciones),
+            "asignadas": sum(len(r["paradas"]) for r in rutas),
+            "sin_asignar": len(sin_asignar),
+            "km_total": round(sum(r["km"] for r in rutas), 1),
+            "segundos": round(time.perf_counter() - inicio_calculo, 2),
+            "aplicado": aplicar
+        }
+        print(f"🗺️ Rutas de inspección: {resumen['asignadas']}/{resumen['inspecciones']} en "
+              f"{len(dias_plan)} día(s), {resumen['km_total']} km ({resumen['segundos']} s)")
+        return {"rutas": rutas, "sin_asignar": sin_asignar, "resumen": resumen}
@@ -0,0 +1,211 @@
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from app.config import settings
+import aiosmtplib
+import asyncio
+import re
+import time
+
+
+class _ConexionSMTP:
+    """Conexión abierta del pool con su contador de mensajes"""
+
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.enviados = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class PoolSMTP:
+    """
+    Pool de conexiones persistentes a un servidor SMTP.
+    Cada conexión hace el handshake (TCP, STARTTLS, EHLO, AUTH) una sola vez y
+    después encadena mensajes uno tras otro; el semáforo limita cuántas
+    conexiones simultáneas se abren contra el servidor.
+    """
+
+    def __init__(self, host: str, port: int, usuario: str = "", clave: str = "",
+                 max_conexiones: int = 5, mensajes_por_conexion: int = 100,
+                 inactividad: float = 60, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.clave = clave
+        self.max_conexiones = max_conexiones
+        self.mensajes_por_conexion = mensajes_por_conexion
+        self.inactividad = inactividad
+        self.timeout = timeout
+
+        self._limite = asyncio.Semaphore(max_conexiones)
+        self._libres = []
+        self.conexiones_abiertas = 0
+        self.enviados = 0
+
+    async def _abrir(self) -> _ConexionSMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            timeout=self.timeout,
+            use_tls=self.port == 465,
+            # None: STARTTLS si el servidor lo ofrece
+            start_tls=None if self.port != 465 else False
+        )
+        await smtp.connect()
+        if self.usuario:
+            await smtp.login(self.usuario, self.clave)
+        self.conexiones_abiertas += 1
+        return _ConexionSMTP(smtp)
+
+    def _descartar(self, conexion: _ConexionSMTP):
+        self.conexiones_abiertas -= 1
+        conexion.smtp.close()
+
+    async def _adquirir(self) -> _ConexionSMTP:
+        await self._limite.acquire()
+        try:
+            while self._libres:
+                conexion = self._libres.pop()
+                if not conexion.smtp.is_connected:
+                    self._descartar(conexion)
+                    continue
+                # Conexión quieta mucho tiempo: el servidor pudo cerrarla
+                if time.monotonic() - conexion.ultimo_uso > self.inactividad:
+                    try:
+                        await conexion.smtp.noop()
+                    except aiosmtplib.SMTPException:
+                        self._descartar(conexion)
+                        continue
+                return conexion
+            return await self._abrir()
+        except BaseException:
+            self._limite.release()
+            raise
+
+    async def _liberar(self, conexion: _ConexionSMTP, reutilizable: bool):
+        conexion.ultimo_uso = time.monotonic()
+        try:
+            if (reutilizable and conexion.smtp.is_connected
+                    and conexion.enviados < self.mensajes_por_conexion):
+                self._libres.append(conexion)
+                return
+            # Algunos servidores limitan los mensajes por sesión: se cierra y se abre otra
+            if conexion.smtp.is_connected:
+                try:
+                    await conexion.smtp.quit()
+                except aiosmtplib.SMTPException:
+                    pass
+            self._descartar(conexion)
+        finally:
+            self._limite.release()
+
+    async def enviar(self, mensaje: EmailMessage):
+        """Envía un mensaje; si la conexión del pool estaba caída reintenta una vez con otra"""
+        for intento in range(2):
+            conexion = await self._adquirir()
+            try:
+                await conexion.smtp.send_message(mensaje)
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError):
+                await self._liberar(conexion, False)
+                if intento == 1:
+                    raise
+                continue
+            except aiosmtplib.SMTPException:
+                # Error de la transacción (p. ej. destinatario rechazado): la conexión sirve tras RSET
+                try:
+                    await conexion.smtp.rset()
+                    reutilizable = True
+                except aiosmtplib.SMTPException:
+                    reutilizable = False
+                await self._liberar(conexion, reutilizable)
+                raise
+
+            conexion.enviados += 1
+            self.enviados += 1
+            await self._liberar(conexion, True)
+            return
+
+    async def cerrar(self):
+        while self._libres:
+            conexion = self._libres.pop()
+            try:
+                await conexion.smtp.quit()
+            except aiosmtplib.SMTPException:
+                pass
+            self._descartar(conexion)
+
+
+class SMTPService:
+    """Envío real de emails: arma el mensaje MIME y lo entrega por el pool del servidor"""
+
+    # Un pool por servidor (host, puerto, usuario)
+    _pools = {}
+
+    @classmethod
+    def pool(cls, host: str = None, port: int = None, usuario: str = None, clave: str = None) -> PoolSMTP:
+        host = host or settings.SMTP_SERVER
+        port = port or settings.SMTP_PORT
+        usuario = settings.SMTP_USERNAME if usuario is None else usuario
+        clave = settings.SMTP_PASSWORD if clave is None else clave
+
+        clave_pool = (host, port, usuario)
+        if clave_pool not in cls._pools:
+            cls._pools[clave_pool] = PoolSMTP(
+                host, port, usuario, clave,
+                max_conexiones=settings.SMTP_MAX_CONEXIONES,
+                mensajes_por_conexion=settings.SMTP_MENSAJES_POR_CONEXION
+            )
+        return cls._pools[clave_pool]
+
+    @staticmethod
+    def construir_mensaje(destinatario: str, asunto: str, html: str = None, texto: str = None,
+                          remitente: str = None) -> EmailMessage:
+        """Mensaje multipart/alternative: parte de texto y, si hay, parte HTML"""
+        mensaje = EmailMessage()
+        mensaje["From"] = remitente or settings.EMAIL_FROM
+        mensaje["To"] = destinatario
+        mensaje["Subject"] = asunto or ""
+        mensaje["Date"] = formatdate(localtime=True)
+        mensaje["Message-ID"] = make_msgid(domain=(remitente or settings.EMAIL_FROM).split("@")[-1])
+
+        if texto is None and html is not None:
+            texto = SMTPService.html_a_texto(html)
+        mensaje.set_content(texto or "")
+        if html is not None:
+            mensaje.add_alternative(html, subtype="html")
+        return mensaje
+
+    @staticmethod
+    def html_a_texto(html: str) -> str:
+        texto = re.sub(r"<(br|/p|/div|/h\d)\s*/?>", "\n", html, flags=re.I)
+        texto = re.sub(r"<[^>]+>", "", texto)
+        return re.sub(r"\n\s*\n+", "\n\n", texto).strip()
+
+    @classmethod
+    async def enviar_notificacion(cls, notificacion):
+        """Remitente del outbox para tipo email"""
+        es_html = notificacion.mensaje.lstrip().startswith("<")
+        mensaje = cls.construir_mensaje(
+            notificacion.destinatario,
+            notificacion.asunto,
+            html=notificacion.mensaje if es_html else None,
+            texto=notificacion.mensaje_texto or (None if es_html else notificacion.mensaje)
+        )
+        await cls.pool().enviar(mensaje)
+
+    @classmethod
+    def registrar(cls):
+        """Usa SMTP real en el outbox salvo que el envío esté en modo simulación"""
+        from app.services.outbox_service import OutboxService
+
+        if settings.SMTP_SIMULADO:
+            print("📧 Emails en modo simulación (SMTP_SIMULADO=true)")
+            return
+        OutboxService.remitentes["email"] = cls.enviar_notificacion
+        print(f"📧 Emails por SMTP: {settings.SMTP_SERVER}:{settings.SMTP_PORT} "
+              f"(hasta {settings.SMTP_MAX_CONEXIONES} conexiones)")
+
+    @classmethod
+    async def cerrar(cls):
+        for pool in cls._pools.values():
+            await pool.cerrar()
+        cls._pools = {}
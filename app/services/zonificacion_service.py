@@ -1,3 +1,12 @@
+from app.config import settings
+from app.services.catalogo_service import CatalogoService
+from app.utils.geo import IndiceEspacial
+from app.utils.texto import AutomataFrases
+import json
+import os
+import threading
+
+
 class ZonificacionService:
     """Servicio para evaluar compatibilidad de zonificación"""
     
@@ -38,33 +47,153 @@ class ZonificacionService:
         "Ocucaje": "ZR"
     }
     
+    # Reglas rubro -> zonas compiladas; se reconstruyen cuando cambia la tabla de zonas
+    _reglas = None
+    _lock_reglas = threading.Lock()
+    
+    # Índice espacial de los polígonos de ZONIFICACION_GEOJSON (se carga al primer uso)
+    _indice_espacial = None
+    _geojson_cargado = False
+    _lock = threading.Lock()
+    
+    @classmethod
+    def indice_espacial(cls):
+        """Índice de polígonos de zonas, o None si no hay archivo de zonificación"""
+        if cls._geojson_cargado:
+            return cls._indice_espacial
+        with cls._lock:
+            if not cls._geojson_cargado:
+                cls._indice_espacial = cls._cargar_geojson(settings.ZONIFICACION_GEOJSON)
+                cls._geojson_cargado = True
+            return cls._indice_espacial
+    
+    @staticmethod
+    def _cargar_geojson(ruta: str):
+        if not ruta:
+            return None
+        if not os.path.exists(ruta):
+            print(f"⚠️ Sin polígonos de zonificación ({ruta}): se usa la dirección para deducir la zona")
+            return None
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                indice = IndiceEspacial.desde_geojson(json.load(f))
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"❌ Error al cargar la zonificación {ruta}: {e}")
+            return None
+        print(f"🗺️ Zonificación: {len(indice.poligonos)} polígono(s), {len(indice.celdas)} celda(s) "
+              f"({indice.celdas_resueltas} resueltas sin cálculo)")
+        return indice
+    
+    @classmethod
+    def recargar(cls):
+        """Vuelve a leer el GeoJSON en la próxima consulta"""
+        cls._geojson_cargado = False
+    
+    @classmethod
+    def zona_por_coordenadas(cls, latitud, longitud):
+        """Propiedades (codigo, nombre, distrito) de la zona que contiene el punto, o None"""
+        if latitud is None or longitud is None or latitud == "" or longitud == "":
+            return None
+        indice = cls.indice_espacial()
+        if indice is None:
+            return None
+        try:
+            poligono = indice.buscar(float(latitud), float(longitud))
+        except (TypeError, ValueError, OverflowError):
+            return None
+        return poligono.propiedades if poligono is not None else None
+    
     @staticmethod
-    def evaluar_compatibilidad(rubro: str, distrito: str, direccion: str = "") -> dict:
+    def zona_probable(direccion: str = "") -> str:
+        """Zona deducida del texto de la dirección (por defecto zona comercial)"""
+        direccion_lower = (direccion or "").lower()
+        if "residencial" in direccion_lower or "casa" in direccion_lower:
+            return "ZR"
+        if "industrial" in direccion_lower or "parque industrial" in direccion_lower:
+            return "ZI"
+        if "huacachina" in direccion_lower or "turístico" in direccion_lower:
+            return "ZT"
+        return "ZC"
+    
+    @classmethod
+    def construir_reglas(cls, zonas: list) -> dict:
+        """
+        Autómata de frases de rubro -> zonas permitidas: ZONAS_PERMITIDAS más los
+        rubros_permitidos de la tabla Zona (una frase que aparece en la tabla
+        reemplaza a la del código). Las zonas desactivadas se quitan de todas las reglas.
+        """
+        inactivas = {zona.codigo for zona in zonas if zona.is_active is False}
+        
+        desde_tabla = {}
+        for zona in zonas:
+            if zona.is_active is False:
+                continue
+            for frase in (zona.rubros_permitidos or "").split(","):
+                if frase.strip():
+                    desde_tabla.setdefault(frase.strip(), []).append(zona.codigo)
+        
+        reglas = dict(cls.ZONAS_PERMITIDAS)
+        reglas.update(desde_tabla)
+        return {
+            "automata": AutomataFrases({
+                frase: [codigo for codigo in codigos if codigo not in inactivas]
+                for frase, codigos in reglas.items()
+            }),
+            "por_defecto": [codigo for codigo in ["ZC", "ZI"] if codigo not in inactivas],
+            "resultados": {}
+        }
+    
+    @classmethod
+    def reglas(cls) -> dict:
+        version = CatalogoService.versiones()["zonas"]
+        reglas = cls._reglas
+        if reglas is not None and reglas["version"] == version:
+            return reglas
+        with cls._lock_reglas:
+            if cls._reglas is None or cls._reglas["version"] != version:
+                nuevas = cls.construir_reglas(CatalogoService.zonas(activas=False))
+                nuevas["version"] = version
+                cls._reglas = nuevas
+            return cls._reglas
+    
+    @classmethod
+    def zonas_para_rubro(cls, rubro: str) -> list:
+        """
+        Zonas permitidas para el rubro según la frase de regla más larga que contiene
+        (por defecto comercial e industrial)
+        """
+        reglas = cls.reglas()
+        
+        # Memoria por texto tal cual llega: los rubros se repiten mucho en las evaluaciones por lote
+        zonas_permitidas = reglas["resultados"].get(rubro)
+        if zonas_permitidas is None:
+            zonas_permitidas = reglas["automata"].mas_larga(rubro or "")
+            if zonas_permitidas is None:
+                zonas_permitidas = reglas["por_defecto"]
+            if len(reglas["resultados"]) < 10000:
+                reglas["resultados"][rubro] = zonas_permitidas
+        return zonas_permitidas
+    
+    @staticmethod
+    def evaluar_compatibilidad(rubro: str, distrito: str, direccion: str = "",
+                               latitud: float = None, longitud: float = None) -> dict:
         """
         Evalúa si el rubro es compatible con la zona
+        Con coordenadas, la zona sale del polígono que contiene el local; sin
+        ellas (o fuera de los polígonos), se deduce del texto de la dirección.
         Retorna: dict con compatible, mensaje, nivel_advertencia
         """
-        rubro_lower = rubro.lower()
-        distrito_lower = distrito.lower()
-        
-        # Determinar zona probable
-        zona = "ZC"  # Por defecto zona comercial
-        if "residencial" in direccion.lower() or "casa" in direccion.lower():
-            zona = "ZR"
-        elif "industrial" in direccion.lower() or "parque industrial" in direccion.lower():
-            zona = "ZI"
-        elif "huacachina" in direccion.lower() or "turístico" in direccion.lower():
-            zona = "ZT"
+        # Determinar zona del local
+        zona_geo = ZonificacionService.zona_por_coordenadas(latitud, longitud)
+        if zona_geo and zona_geo.get("codigo"):
+            zona = zona_geo["codigo"]
+            origen = "coordenadas"
+        else:
+            zona = ZonificacionService.zona_probable(direccion)
+            origen = "direccion"
         
         # Buscar zonas permitidas para este rubro
-        zonas_permitidas = []
-        for key, zonas in ZonificacionService.ZONAS_PERMITIDAS.items():
-            if key in rubro_lower:
-                zonas_permitidas = zonas
-                break
-        
-        if not zonas_permitidas:
-            zonas_permitidas = ["ZC", "ZI"]  # Por defecto
+        zonas_permitidas = ZonificacionService.zonas_para_rubro(rubro)
         
         # Evaluar compatibilidad
         compatible = zona in zonas_permitidas
@@ -75,7 +204,9 @@ class ZonificacionService:
                 "mensaje": "✅ El rubro es compatible con la zona seleccionada",
                 "nivel_advertencia": "bajo",
                 "zona": zona,
-                "zonas_permitidas": zonas_permitidas
+                "zona_nombre": zona_geo.get("nombre") if origen == "coordenadas" else None,
+                "origen_zona": origen,
+                "zonas_permitidas": list(zonas_permitidas)
             }
         else:
             return {
@@ -83,6 +214,8 @@ class ZonificacionService:
                 "mensaje": "⚠️ El rubro podría no ser compatible con esta zona. Se evaluará en la inspección técnica.",
                 "nivel_advertencia": "medio",
                 "zona": zona,
-                "zonas_permitidas": zonas_permitidas,
+                "zona_nombre": zona_geo.get("nombre") if origen == "coordenadas" else None,
+                "origen_zona": origen,
+                "zonas_permitidas": list(zonas_permitidas),
                 "recomendacion": "Verifica que tu local esté en zona comercial o industrial"
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,44 @@
+"""
+Filtro de Bloom: responde "seguro que no está" sin ir a la base de datos.
+"""
+import hashlib
+import math
+
+
+class FiltroBloom:
+    """
+    Conjunto aproximado de claves en un arreglo de bits. Nunca da falsos
+    negativos; los falsos positivos ocurren con probabilidad ~tasa_error
+    mientras no se supere la capacidad.
+    Posiciones por doble hash (a + i·b) sobre un blake2b de 128 bits.
+    """
+
+    def __init__(self, capacidad: int, tasa_error: float = 0.001):
+        self.capacidad = max(capacidad, 1)
+        self.bits = max(64, int(-self.capacidad * math.log(tasa_error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacidad * math.log(2)))
+        self.cantidad = 0
+        self._arreglo = bytearray((self.bits + 7) // 8)
+
+    def _posiciones(self, clave: str) -> list:
+        resumen = hashlib.blake2b(clave.encode("utf-8"), digest_size=16).digest()
+        a = int.from_bytes(resumen[:8], "little")
+        b = int.from_bytes(resumen[8:], "little") | 1
+        return [(a + i * b) % self.bits for i in range(self.hashes)]
+
+    def agregar(self, clave: str):
+        arreglo = self._arreglo
+        for posicion in self._posiciones(clave):
+            arreglo[posicion >> 3] |= 1 << (posicion & 7)
+        self.cantidad += 1
+
+    def __contains__(self, clave: str) -> bool:
+        arreglo = self._arreglo
+        return all(arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+    def saturado(self) -> bool:
+        """Con más claves que la capacidad la tasa de falsos positivos sube: conviene reconstruirlo"""
+        return self.cantidad > self.capacidad
+
+    def tamaño_bytes(self) -> int:
+        return len(self._arreglo)
@@ -36,4 +36,13 @@ async def get_current_funcionario(current_user: User = Depends(get_current_user)
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Se requieren permisos de funcionario"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def get_current_inspector(current_user: User = Depends(get_current_user)):
+    """Verifica que el usuario sea inspector, funcionario o administrador (modo de campo)"""
+    if current_user.tipo_usuario not in ["inspector", "funcionario", "administrador"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de inspector"
+        )
+    return current_user
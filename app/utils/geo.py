@@ -0,0 +1,137 @@
+"""
+Índice espacial en memoria para polígonos GeoJSON (coordenadas lon/lat).
+Grilla uniforme: cada celda guarda los polígonos cuya caja la toca, del más
+chico al más grande; si el primero cubre la celda entera la respuesta sale
+directo de la celda sin probar ningún polígono.
+"""
+import math
+
+
+def punto_en_anillo(x: float, y: float, anillo: list) -> bool:
+    """Ray casting: cantidad impar de cruces = el punto está dentro"""
+    dentro = False
+    x1, y1 = anillo[-1]
+    for x2, y2 in anillo:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            dentro = not dentro
+        x1, y1 = x2, y2
+    return dentro
+
+
+def _area_anillo(anillo: list) -> float:
+    area = 0.0
+    x1, y1 = anillo[-1]
+    for x2, y2 in anillo:
+        area += x1 * y2 - x2 * y1
+        x1, y1 = x2, y2
+    return abs(area) / 2
+
+
+class Poligono:
+    """Polygon o MultiPolygon de GeoJSON con su caja y sus propiedades"""
+
+    __slots__ = ("partes", "propiedades", "caja", "area")
+
+    def __init__(self, geometria: dict, propiedades: dict):
+        if geometria.get("type") == "Polygon":
+            partes = [geometria["coordinates"]]
+        elif geometria.get("type") == "MultiPolygon":
+            partes = geometria["coordinates"]
+        else:
+            raise ValueError(f"Geometría no soportada: {geometria.get('type')}")
+
+        # Cada parte: [exterior, agujero, ...] como listas de tuplas (lon, lat)
+        self.partes = [[[(float(p[0]), float(p[1])) for p in anillo] for anillo in parte] for parte in partes]
+        self.propiedades = propiedades
+        xs = [x for parte in self.partes for x, _ in parte[0]]
+        ys = [y for parte in self.partes for _, y in parte[0]]
+        self.caja = (min(xs), min(ys), max(xs), max(ys))
+        self.area = sum(
+            _area_anillo(parte[0]) - sum(_area_anillo(agujero) for agujero in parte[1:])
+            for parte in self.partes
+        )
+
+    def contiene(self, x: float, y: float) -> bool:
+        minx, miny, maxx, maxy = self.caja
+        if x < minx or x > maxx or y < miny or y > maxy:
+            return False
+        for exterior, *agujeros in self.partes:
+            if punto_en_anillo(x, y, exterior) and not any(punto_en_anillo(x, y, a) for a in agujeros):
+                return True
+        return False
+
+    def borde_toca(self, minx: float, miny: float, maxx: float, maxy: float) -> bool:
+        """Si algún lado del polígono puede cruzar la caja (prueba conservadora por cajas de segmentos)"""
+        for parte in self.partes:
+            for anillo in parte:
+                x1, y1 = anillo[-1]
+                for x2, y2 in anillo:
+                    if (min(x1, x2) <= maxx and max(x1, x2) >= minx
+                            and min(y1, y2) <= maxy and max(y1, y2) >= miny):
+                        return True
+                    x1, y1 = x2, y2
+        return False
+
+
+class IndiceEspacial:
+    """Consulta punto -> polígono más chico que lo contiene (el más específico)"""
+
+    def __init__(self, poligonos: list, tamaño_celda: float = 0.005):
+        # Más chico primero: una zona turística dentro de la residencial del distrito gana
+        self.poligonos = sorted(poligonos, key=lambda p: p.area)
+        self.tamaño_celda = tamaño_celda
+        self.celdas = {}
+        self.celdas_resueltas = 0
+
+        for poligono in self.poligonos:
+            minx, miny, maxx, maxy = poligono.caja
+            for i in range(self._indice(minx), self._indice(maxx) + 1):
+                for j in range(self._indice(miny), self._indice(maxy) + 1):
+                    self.celdas.setdefault((i, j), []).append(poligono)
+
+        for clave, candidatos in self.celdas.items():
+            self.celdas[clave] = self._resolver_celda(clave, candidatos)
+
+    def _indice(self, valor: float) -> int:
+        return math.floor(valor / self.tamaño_celda)
+
+    def _resolver_celda(self, clave: tuple, candidatos: list):
+        """
+        Recorta los candidatos de la celda en el primero que la cubre entera (los
+        siguientes son más grandes y nunca ganarían). Si ese es el primero, la
+        celda queda resuelta: se guarda el polígono en vez de la lista.
+        """
+        i, j = clave
+        minx, miny = i * self.tamaño_celda, j * self.tamaño_celda
+        maxx, maxy = minx + self.tamaño_celda, miny + self.tamaño_celda
+        centro = (minx + self.tamaño_celda / 2, miny + self.tamaño_celda / 2)
+        for posicion, poligono in enumerate(candidatos):
+            if poligono.contiene(*centro) and not poligono.borde_toca(minx, miny, maxx, maxy):
+                if posicion == 0:
+                    self.celdas_resueltas += 1
+                    return poligono
+                return candidatos[:posicion + 1]
+        return candidatos
+
+    def buscar(self, latitud: float, longitud: float):
+        """Polígono que contiene el punto, o None"""
+        celda = self.celdas.get((math.floor(longitud / self.tamaño_celda), math.floor(latitud / self.tamaño_celda)))
+        if celda is None:
+            return None
+        if isinstance(celda, Poligono):
+            return celda
+        for poligono in celda:
+            if poligono.contiene(longitud, latitud):
+                return poligono
+        return None
+
+    @classmethod
+    def desde_geojson(cls, datos: dict, tamaño_celda: float = 0.005) -> "IndiceEspacial":
+        if datos.get("type") != "FeatureCollection":
+            raise ValueError("Se espera un FeatureCollection de GeoJSON")
+        poligonos = [
+            Poligono(feature["geometry"], feature.get("properties") or {})
+            for feature in datos.get("features", [])
+            if feature.get("geometry")
+        ]
+        return cls(poligonos, tamaño_celda)
@@ -0,0 +1,50 @@
+"""
+Procesamiento de fotos con Pillow.
+Este módulo corre dentro de los procesos del pool de ImagenService,
+por eso solo importa Pillow y la librería estándar.
+"""
+from PIL import Image, ImageOps
+import os
+import time
+
+
+def generar_derivados(ruta_original: str, destinos: dict, calidad: int = 80) -> dict:
+    """
+    Genera las miniaturas de una foto
+    destinos: {lado mayor en px: ruta de salida}, cada una un JPEG sin EXIF
+    Retorna: bytes del original, bytes de cada derivado y segundos de CPU
+    """
+    inicio = time.process_time()
+
+    with Image.open(ruta_original) as imagen:
+        # En JPEG, draft decodifica directamente a 1/2, 1/4 u 1/8 de la resolución
+        lado_maximo = max(destinos)
+        imagen.draft("RGB", (lado_maximo, lado_maximo))
+
+        # Aplicar la orientación del EXIF antes de descartarlo
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode in ("RGBA", "LA", "P"):
+            imagen = imagen.convert("RGBA")
+            fondo = Image.new("RGB", imagen.size, (255, 255, 255))
+            fondo.paste(imagen, mask=imagen.getchannel("A"))
+            imagen = fondo
+        elif imagen.mode != "RGB":
+            imagen = imagen.convert("RGB")
+
+        tamaños = {}
+        # De mayor a menor: cada miniatura se reduce desde la anterior
+        for lado in sorted(destinos, reverse=True):
+            imagen.thumbnail((lado, lado), Image.LANCZOS, reducing_gap=3.0)
+            ruta = destinos[lado]
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            # Sin exif= ni comentarios: el archivo sale sin metadatos
+            imagen.save(temporal, "JPEG", quality=calidad, optimize=True, progressive=True)
+            os.replace(temporal, ruta)
+            tamaños[lado] = os.path.getsize(ruta)
+
+    return {
+        "bytes_original": os.path.getsize(ruta_original),
+        "bytes_derivados": tamaños,
+        "segundos_cpu": time.process_time() - inicio
+    }
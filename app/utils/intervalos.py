@@ -0,0 +1,111 @@
+"""
+Agenda de intervalos [inicio, fin) ordenada por inicio, para detectar cruces
+de horario y medir la carga de un rango sin recorrer toda la agenda.
+Junto a los inicios se guardan el máximo fin acumulado y la suma acumulada de
+duraciones: un cruce es "algún intervalo que empieza antes de `fin` termina
+después de `inicio`", o sea max_fin[i - 1] > inicio con i = bisect(fin).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+class AgendaIntervalos:
+    """Intervalos de una persona (pueden solaparse entre sí si ya había dobles reservas)"""
+
+    __slots__ = ("inicios", "fines", "ids", "max_fin", "acumulado", "por_id")
+
+    def __init__(self):
+        self.inicios = []
+        self.fines = []
+        self.ids = []
+        self.max_fin = []       # max_fin[i] = mayor fin entre los intervalos 0..i
+        self.acumulado = [0.0]  # acumulado[i] = minutos de los intervalos 0..i-1
+        self.por_id = {}
+
+    @classmethod
+    def desde(cls, intervalos) -> "AgendaIntervalos":
+        """Carga de una vez [(inicio, fin, id)]: ordena y calcula los acumulados en una pasada"""
+        agenda = cls()
+        for inicio, fin, identificador in sorted(intervalos, key=lambda i: i[0]):
+            agenda.inicios.append(inicio)
+            agenda.fines.append(fin)
+            agenda.ids.append(identificador)
+            agenda.por_id[identificador] = inicio
+        agenda._recalcular(0)
+        return agenda
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _recalcular(self, desde: int):
+        """Rehace los acumulados desde una posición (las altas suelen ir al final de la agenda)"""
+        del self.max_fin[desde:]
+        del self.acumulado[desde + 1:]
+        maximo = self.max_fin[desde - 1] if desde > 0 else None
+        total = self.acumulado[desde]
+        for i in range(desde, len(self.inicios)):
+            fin = self.fines[i]
+            if maximo is None or fin > maximo:
+                maximo = fin
+            self.max_fin.append(maximo)
+            total += (fin - self.inicios[i]).total_seconds() / 60
+            self.acumulado.append(total)
+
+    def agregar(self, inicio: datetime, fin: datetime, identificador):
+        if identificador in self.por_id:
+            self.quitar(identificador)
+        posicion = bisect_right(self.inicios, inicio)
+        self.inicios.insert(posicion, inicio)
+        self.fines.insert(posicion, fin)
+        self.ids.insert(posicion, identificador)
+        self.por_id[identificador] = inicio
+        self._recalcular(posicion)
+
+    def quitar(self, identificador) -> bool:
+        inicio = self.por_id.pop(identificador, None)
+        if inicio is None:
+            return False
+        posicion = bisect_left(self.inicios, inicio)
+        while self.ids[posicion] != identificador:
+            posicion += 1
+        del self.inicios[posicion], self.fines[posicion], self.ids[posicion]
+        self._recalcular(posicion)
+        return True
+
+    def hay_cruce(self, inicio: datetime, fin: datetime) -> bool:
+        """O(log n)"""
+        i = bisect_left(self.inicios, fin)
+        return i > 0 and self.max_fin[i - 1] > inicio
+
+    def cruces(self, inicio: datetime, fin: datetime) -> list:
+        """
+        Ids de los intervalos que se cruzan con [inicio, fin). Recorre hacia atrás
+        desde el último que empieza antes de `fin` y corta cuando ningún intervalo
+        anterior puede terminar después de `inicio`.
+        """
+        resultado = []
+        i = bisect_left(self.inicios, fin) - 1
+        while i >= 0 and self.max_fin[i] > inicio:
+            if self.fines[i] > inicio:
+                resultado.append(self.ids[i])
+            i -= 1
+        resultado.reverse()
+        return resultado
+
+    def primer_hueco(self, inicio: datetime, duracion) -> datetime:
+        """
+        Primer inicio >= `inicio` en que un intervalo de `duracion` no se cruza con
+        ninguno: si hay cruce, salta al máximo fin de los que empiezan antes.
+        """
+        while True:
+            i = bisect_left(self.inicios, inicio + duracion)
+            if i == 0 or self.max_fin[i - 1] <= inicio:
+                return inicio
+            inicio = self.max_fin[i - 1]
+
+    def minutos(self, desde: datetime, hasta: datetime) -> float:
+        """Minutos de los intervalos que empiezan en [desde, hasta), O(log n)"""
+        return self.acumulado[bisect_left(self.inicios, hasta)] - self.acumulado[bisect_left(self.inicios, desde)]
+
+    def cantidad(self, desde: datetime, hasta: datetime) -> int:
+        return bisect_left(self.inicios, hasta) - bisect_left(self.inicios, desde)
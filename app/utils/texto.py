@@ -0,0 +1,98 @@
+"""
+Normalización de texto para búsquedas y comparaciones
+(sin tildes, en minúsculas y solo letras/números separados por un espacio).
+"""
+import re
+import unicodedata
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9ñ]+")
+
+# Las tildes del castellano se quitan con una tabla; unicodedata solo para lo raro
+_SIN_TILDES = str.maketrans("áéíóúüàèìòùâêîôûäëïö", "aeiouuaeiouaeiouaeio")
+
+
+def normalizar_texto(texto: str) -> str:
+    """'Peluquería / Barbería' -> 'peluqueria barberia' (la ñ se conserva)"""
+    if not texto:
+        return ""
+    texto = texto.lower().translate(_SIN_TILDES)
+    if not texto.replace("ñ", "").isascii():
+        texto = unicodedata.normalize("NFKD", texto.replace("ñ", "\0"))
+        texto = "".join(c for c in texto if not unicodedata.combining(c)).replace("\0", "ñ")
+    return _NO_ALFANUMERICO.sub(" ", texto).strip()
+
+
+def tokens(texto: str) -> tuple:
+    return tuple(normalizar_texto(texto).split())
+
+
+class AutomataFrases:
+    """
+    Aho-Corasick sobre texto normalizado: encuentra en una sola pasada todas las
+    frases del diccionario que aparecen en el texto, empezando al inicio de una
+    palabra ("taller" reconoce "talleres", "industrial" no reconoce "agroindustrial").
+    """
+
+    def __init__(self, frases: dict):
+        # frase normalizada -> valor
+        self.valores = {}
+        self._transiciones = [{}]
+        self._fallo = [0]
+        self._salidas = [()]
+
+        for frase, valor in frases.items():
+            clave = normalizar_texto(frase)
+            if not clave:
+                continue
+            self.valores[clave] = valor
+            estado = 0
+            for caracter in clave:
+                siguiente = self._transiciones[estado].get(caracter)
+                if siguiente is None:
+                    siguiente = len(self._transiciones)
+                    self._transiciones.append({})
+                    self._fallo.append(0)
+                    self._salidas.append(())
+                    self._transiciones[estado][caracter] = siguiente
+                estado = siguiente
+            self._salidas[estado] = (clave,)
+
+        # Enlaces de fallo por niveles (BFS); cada estado hereda las salidas de su enlace
+        pendientes = list(self._transiciones[0].values())
+        while pendientes:
+            siguientes = []
+            for estado in pendientes:
+                for caracter, hijo in self._transiciones[estado].items():
+                    fallo = self._fallo[estado]
+                    while fallo and caracter not in self._transiciones[fallo]:
+                        fallo = self._fallo[fallo]
+                    destino = self._transiciones[fallo].get(caracter, 0)
+                    self._fallo[hijo] = destino if destino != hijo else 0
+                    self._salidas[hijo] = self._salidas[hijo] + self._salidas[self._fallo[hijo]]
+                    siguientes.append(hijo)
+            pendientes = siguientes
+
+    def buscar(self, texto: str) -> list:
+        """[(posición, frase)] de cada aparición en el texto ya normalizado"""
+        encontradas = []
+        estado = 0
+        for posicion, caracter in enumerate(texto):
+            while estado and caracter not in self._transiciones[estado]:
+                estado = self._fallo[estado]
+            estado = self._transiciones[estado].get(caracter, 0)
+            for frase in self._salidas[estado]:
+                inicio = posicion - len(frase) + 1
+                if inicio == 0 or texto[inicio - 1] == " ":
+                    encontradas.append((inicio, frase))
+        return encontradas
+
+    def mas_larga(self, texto: str):
+        """
+        Valor de la frase más larga que aparece en el texto (a igual largo, la que
+        aparece primero), o None. No depende del orden del diccionario.
+        """
+        mejor = None
+        for inicio, frase in self.buscar(normalizar_texto(texto)):
+            if mejor is None or (len(frase), -inicio) > (len(mejor[1]), -mejor[0]):
+                mejor = (inicio, frase)
+        return self.valores[mejor[1]] if mejor else None
@@ -0,0 +1,206 @@
+"""
+Índice de trigramas para buscar nombres con errores de tipeo
+("cebicheria" encuentra "Cevichería", "poyeria" encuentra "Pollería").
+"""
+from array import array
+from collections import Counter
+from itertools import chain
+import heapq
+import time
+from app.utils.texto import tokens
+
+
+def trigramas(palabra: str, cerrada: bool = True) -> set:
+    """Trigramas con el relleno de pg_trgm: 'sol' -> '  s', ' so', 'sol', 'ol ' (este último solo si cerrada)"""
+    relleno = f"  {palabra} " if cerrada else f"  {palabra}"
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Frases (nombres) con una clave cada una, normalizadas con texto.tokens.
+    Los trigramas se indexan por palabra del vocabulario y no por frase: una
+    palabra de la consulta se compara con las pocas miles de palabras distintas
+    y recién después se buscan las frases que las contienen.
+    Similitud de una palabra: Jaccard de trigramas (como pg_trgm); para la última
+    palabra de un autocompletado también cuenta como prefijo ("cevich").
+    Solo altas: las bajas y renombres se resuelven reconstruyendo el índice.
+    """
+
+    # Similitud mínima de una palabra o frase para aparecer
+    UMBRAL = 0.3
+
+    # Palabras parecidas que se consideran por cada palabra de la consulta
+    MAX_VARIANTES = 20
+    MAX_PALABRAS = 6
+
+    # La segunda palabra solo ordena las candidatas si sus variantes suman menos frases que esto
+    MAX_CANDIDATAS = 20000
+
+    # Un prefijo completo vale un poco menos que la palabra exacta
+    PESO_PREFIJO = 0.95
+
+    def __init__(self):
+        self._palabras = {}          # palabra -> id
+        self._tamaños = array("H")   # id de palabra -> cantidad de trigramas
+        self._por_trigrama = {}      # trigrama -> array de ids de palabra
+        self._por_palabra = []       # id de palabra -> array de ids de frase
+        self._frases = {}            # frase normalizada -> id
+        self._textos = []            # id de frase -> texto tal como llegó (el primero)
+        self._palabras_frase = []    # id de frase -> tupla de ids de palabra
+        self._claves = []            # id de frase -> clave, o lista si son varias
+
+    def __len__(self):
+        return len(self._textos)
+
+    def claves(self, frase_id: int) -> list:
+        claves = self._claves[frase_id]
+        return claves if isinstance(claves, list) else [claves]
+
+    def _palabra(self, palabra: str) -> int:
+        id_ = self._palabras.get(palabra)
+        if id_ is None:
+            id_ = len(self._por_palabra)
+            self._palabras[palabra] = id_
+            self._por_palabra.append(array("I"))
+            grupo = trigramas(palabra)
+            self._tamaños.append(min(len(grupo), 65535))
+            for trigrama in grupo:
+                lista = self._por_trigrama.get(trigrama)
+                if lista is None:
+                    lista = self._por_trigrama[trigrama] = array("I")
+                lista.append(id_)
+        return id_
+
+    def agregar(self, texto: str, clave):
+        palabras = tokens(texto)[:16]
+        if not palabras:
+            return
+        frase = " ".join(palabras)
+        id_ = self._frases.get(frase)
+        if id_ is not None:
+            claves = self._claves[id_]
+            if isinstance(claves, list):
+                claves.append(clave)
+            else:
+                self._claves[id_] = [claves, clave]
+            return
+        id_ = len(self._textos)
+        self._frases[frase] = id_
+        self._textos.append(" ".join(texto.split()))
+        self._claves.append(clave)
+        ids = tuple(self._palabra(p) for p in palabras)
+        self._palabras_frase.append(ids)
+        for palabra_id in set(ids):
+            self._por_palabra[palabra_id].append(id_)
+
+    def _variantes(self, palabra: str, prefijo: bool) -> dict:
+        """{id de palabra: similitud} de las palabras del vocabulario parecidas a esta"""
+        abiertos = trigramas(palabra, cerrada=False)
+        cierre = f"  {palabra} "[-3:]
+        comunes = Counter(chain.from_iterable(self._por_trigrama.get(t, ()) for t in abiertos))
+        cierran = set(self._por_trigrama.get(cierre, ()))
+        total = len(abiertos) + 1
+
+        # De más a menos trigramas en común; se corta cuando ni el mejor caso con
+        # esa cantidad entra entre las MAX_VARIANTES (entre iguales, la más usada)
+        mejores = []
+        for palabra_id, n in comunes.most_common():
+            cota = (n + 1) / total
+            if prefijo:
+                cota = max(cota, self.PESO_PREFIJO * n / len(abiertos))
+            if cota < self.UMBRAL or (len(mejores) == self.MAX_VARIANTES and cota < mejores[0][0]):
+                break
+            compartidos = n + (palabra_id in cierran)
+            similitud = compartidos / (total + self._tamaños[palabra_id] - compartidos)
+            if prefijo:
+                similitud = max(similitud, self.PESO_PREFIJO * n / len(abiertos))
+            if similitud < self.UMBRAL:
+                continue
+            elemento = (similitud, len(self._por_palabra[palabra_id]), palabra_id)
+            if len(mejores) < self.MAX_VARIANTES:
+                heapq.heappush(mejores, elemento)
+            elif elemento > mejores[0]:
+                heapq.heapreplace(mejores, elemento)
+        return {palabra_id: similitud for similitud, _, palabra_id in mejores}
+
+    def buscar(self, consulta: str, limite: int = 10, prefijo: bool = True, presupuesto_ms: float = None) -> tuple:
+        """
+        Frases más parecidas a la consulta.
+        La puntuación es el promedio, por palabra de la consulta, de la mejor
+        similitud entre las palabras de la frase (una palabra que falta suma 0),
+        con un descuento pequeño por palabras de más.
+        Con presupuesto_ms se deja de evaluar candidatas al agotarlo, contando
+        desde el inicio de la consulta (se evalúan primero las de las variantes
+        más parecidas).
+        Retorna: ([(puntuación, texto, claves)], completo)
+        """
+        limite_tiempo = time.perf_counter() + presupuesto_ms / 1000 if presupuesto_ms else None
+        palabras = tokens(consulta)[:self.MAX_PALABRAS]
+        if not palabras:
+            return [], True
+        variantes = [self._variantes(p, prefijo and n == len(palabras) - 1) for n, p in enumerate(palabras)]
+        con_variantes = [v for v in variantes if v]
+        if not con_variantes:
+            return [], True
+
+        # Guía la palabra con menos frases: sus frases son las candidatas. Primero
+        # las que además tienen alguna variante de la segunda palabra menos común
+        # (ahí está casi siempre la buscada) y después el resto.
+        def frases(v):
+            return sum(len(self._por_palabra[p]) for p in v)
+
+        n_palabras = len(variantes)
+        guia = min(con_variantes, key=frases)
+        orden = sorted(guia.items(), key=lambda p: -p[1])
+        otras = [v for v in con_variantes if v is not guia]
+        segunda = min(otras, key=frases) if otras else None
+        if segunda is not None and frases(segunda) <= self.MAX_CANDIDATAS:
+            con_segunda = set(chain.from_iterable(self._por_palabra[p] for p in segunda))
+            # (filtro, palabras que como mucho suman 1 además de la guía)
+            pasadas = [(con_segunda, n_palabras - 1), (None, n_palabras - 2)]
+        else:
+            pasadas = [(None, n_palabras - 1)]
+
+        mejores = []
+        vistas = set()
+        evaluadas = 0
+        completo = True
+        for filtro, resto in pasadas:
+            for palabra_id, similitud_guia in orden:
+                # Ninguna frase de esta variante (ni de las siguientes) puede superar a las ya elegidas
+                if len(mejores) == limite and (similitud_guia + resto) / n_palabras <= mejores[0][0]:
+                    break
+                for frase_id in self._por_palabra[palabra_id]:
+                    if frase_id in vistas or (filtro is not None and frase_id not in filtro):
+                        continue
+                    vistas.add(frase_id)
+                    ids = self._palabras_frase[frase_id]
+                    puntuacion = 0.0
+                    for v in variantes:
+                        mejor = 0.0
+                        for p in ids:
+                            similitud = v.get(p)
+                            if similitud is not None and similitud > mejor:
+                                mejor = similitud
+                        puntuacion += mejor
+                    puntuacion = puntuacion / n_palabras - 0.01 * max(0, len(ids) - n_palabras)
+                    if puntuacion >= self.UMBRAL:
+                        elemento = (puntuacion, -len(ids), -frase_id)
+                        if len(mejores) < limite:
+                            heapq.heappush(mejores, elemento)
+                        elif elemento > mejores[0]:
+                            heapq.heapreplace(mejores, elemento)
+                    evaluadas += 1
+                    if limite_tiempo and evaluadas % 256 == 0 and time.perf_counter() > limite_tiempo:
+                        completo = False
+                        break
+                if not completo:
+                    break
+            if not completo:
+                break
+
+        return [
+            (round(puntuacion, 3), self._textos[-frase_id], self.claves(-frase_id))
+            for puntuacion, _, frase_id in sorted(mejores, reverse=True)
+        ], completo
@@ -0,0 +1,155 @@
+"""
+Benchmark de las sugerencias tolerantes a errores de tipeo (AutocompletadoService)
+
+Uso:
+    python benchmarks/bench_autocompletado.py [--solicitudes 1000000] [--consultas 2000] [--db /tmp/bench_autocompletado.db]
+
+Arma una base SQLite con N solicitudes (nombres de negocio con vocabulario
+variado) y N/5 titulares, construye los índices de trigramas y mide la latencia
+(p50 / p95 / máximo) de consultas con errores de tipeo y de autocompletado,
+cuántas encuentran el nombre buscado entre las 8 sugerencias, y la compara con
+recorrer los nombres distintos calculando la similitud uno por uno.
+"""
+import sys
+import os
+import argparse
+import random
+import resource
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TIPOS = ["Cevichería", "Pollería", "Bodega", "Ferretería", "Botica", "Restaurante", "Librería", "Peluquería",
+         "Panadería", "Taller", "Chifa", "Juguería", "Vidriería", "Lavandería", "Minimarket", "Picantería"]
+SILABAS = ["ca", "ma", "ro", "sa", "lu", "pe", "qui", "hua", "ta", "chi", "ri", "na", "go", "be", "lla", "ya",
+           "mon", "tin", "sur", "pa", "ño", "rí", "dú", "cha"]
+NOMBRES = ["José", "María", "Luis", "Rosa", "Carlos", "Ana", "Jorge", "Lucía", "Pedro", "Carmen", "Víctor", "Elena"]
+
+
+def palabra(aleatorio) -> str:
+    return "".join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 4))).capitalize()
+
+
+def con_error(texto: str, aleatorio) -> str:
+    """Un error de tipeo: cambia, quita o duplica una letra, o quita las tildes"""
+    texto = texto.lower()
+    posicion = aleatorio.randrange(1, len(texto) - 1)
+    error = aleatorio.randrange(4)
+    if error == 0:
+        return texto[:posicion] + aleatorio.choice("bvsczyll") + texto[posicion + 1:]
+    if error == 1:
+        return texto[:posicion] + texto[posicion + 1:]
+    if error == 2:
+        return texto[:posicion] + texto[posicion] + texto[posicion:]
+    return texto.translate(str.maketrans("áéíóú", "aeiou"))
+
+
+def preparar_base(ruta_db: str, solicitudes: int):
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.user import User
+    from app.models.solicitud import Solicitud
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    aleatorio = random.Random(13)
+    apellidos = [palabra(aleatorio) for _ in range(3000)]
+    titulares = max(solicitudes // 5, 1)
+    for inicio in range(0, titulares, 20000):
+        db.execute(User.__table__.insert(), [
+            {"email": f"titular{i}@correo.pe", "password_hash": "x", "tipo_usuario": "ciudadano",
+             "tipo_persona": "natural", "nombres": aleatorio.choice(NOMBRES),
+             "apellido_paterno": aleatorio.choice(apellidos), "apellido_materno": aleatorio.choice(apellidos),
+             "is_active": True}
+            for i in range(inicio, min(inicio + 20000, titulares))
+        ])
+    primer_titular = db.query(User.id).order_by(User.id).limit(1).scalar()
+
+    vocabulario = [palabra(aleatorio) for _ in range(20000)]
+    nombres = []
+    for inicio in range(0, solicitudes, 20000):
+        filas = []
+        for i in range(inicio, min(inicio + 20000, solicitudes)):
+            nombre = f"{aleatorio.choice(TIPOS)} {aleatorio.choice(vocabulario)} {aleatorio.choice(vocabulario)}"
+            nombres.append(nombre)
+            filas.append({"numero_expediente": f"EXP-A-{i:07d}", "usuario_id": primer_titular + i % titulares,
+                          "rubro_id": 1, "nombre_negocio": nombre, "direccion_negocio": "Av. Grau 100",
+                          "distrito": "Ica", "nivel_riesgo": "bajo"})
+        db.execute(Solicitud.__table__.insert(), filas)
+    db.commit()
+    db.close()
+    return nombres
+
+
+def percentiles(tiempos: list) -> str:
+    tiempos = sorted(tiempos)
+    return (f"p50 {tiempos[len(tiempos) // 2]:.2f} ms | p95 {tiempos[int(len(tiempos) * 0.95)]:.2f} ms | "
+            f"máx {tiempos[-1]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--solicitudes", type=int, default=1000000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--db", default="/tmp/bench_autocompletado.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔤 BENCHMARK DE AUTOCOMPLETADO CON ERRORES DE TIPEO")
+    print("=" * 60)
+
+    nombres = preparar_base(args.db, args.solicitudes)
+
+    from app.services.autocompletado_service import AutocompletadoService
+    from app.utils.texto import tokens
+    from app.utils.trigramas import trigramas
+
+    memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    negocios, titulares = AutocompletadoService.indices()
+    construccion = time.perf_counter() - inicio
+    memoria = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoria) / 1024
+    print(f"Solicitudes: {args.solicitudes:,} | Nombres de negocio distintos: {len(negocios):,} | "
+          f"Titulares: {len(titulares):,}")
+    print(f"Construcción: {construccion:.1f} s | Memoria adicional: ~{memoria:,.0f} MB")
+
+    aleatorio = random.Random(21)
+    muestra = [aleatorio.choice(nombres) for _ in range(args.consultas)]
+    casos = {
+        "Con un error de tipeo": [con_error(n, aleatorio) for n in muestra],
+        "Autocompletado (parcial)": [n[:max(4, int(len(n) * 0.6))] for n in muestra],
+        "Parcial con error": [con_error(n[:max(6, int(len(n) * 0.7))], aleatorio) for n in muestra],
+    }
+    for nombre_caso, consultas in casos.items():
+        tiempos = []
+        aciertos = 0
+        incompletas = 0
+        for esperado, consulta in zip(muestra, consultas):
+            inicio = time.perf_counter()
+            resultado = AutocompletadoService.sugerir(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            aciertos += any(tokens(s["texto"]) == tokens(esperado) for s in resultado["sugerencias"])
+            incompletas += not resultado["completo"]
+        print(f"\n{nombre_caso} ({len(consultas):,} consultas):")
+        print(f"   Latencia:   {percentiles(tiempos)}")
+        print(f"   Encontrado entre las 8 sugerencias: {aciertos / len(consultas):.1%} "
+              f"| cortadas por presupuesto: {incompletas:,}")
+
+    # Referencia: similitud de trigramas contra cada nombre distinto (sin índice)
+    distintos = list({" ".join(tokens(n)): None for n in nombres})
+    conjuntos = [set().union(*(trigramas(p) for p in n.split())) for n in distintos[:200000]]
+    consultas = casos["Con un error de tipeo"][:20]
+    inicio = time.perf_counter()
+    for consulta in consultas:
+        buscado = set().union(*(trigramas(p) for p in tokens(consulta)))
+        sorted(((len(buscado & c) / len(buscado | c), i) for i, c in enumerate(conjuntos)), reverse=True)[:8]
+    recorrido = (time.perf_counter() - inicio) * 1000 / len(consultas) * len(distintos) / len(conjuntos)
+    print(f"\nSin índice (similitud contra {len(distintos):,} nombres distintos): ~{recorrido:,.0f} ms por consulta")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
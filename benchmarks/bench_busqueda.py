@@ -0,0 +1,175 @@
+"""
+Benchmark de la búsqueda de solicitudes (BusquedaService)
+
+Uso:
+    python benchmarks/bench_busqueda.py [--solicitudes 1000000] [--repeticiones 5] [--db /tmp/bench_busqueda.db]
+
+Arma una base SQLite con N solicitudes (titulares con DNI, rubros, direcciones
+de Ica), construye el índice FTS5 y compara, para varias búsquedas típicas de
+la lista de solicitudes (total + primera página):
+- el filtro anterior: LIKE '%texto%' sobre expediente y negocio;
+- el índice de texto completo, ordenado por relevancia.
+También mide el costo de mantener el índice al guardar una solicitud.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOMBRES = ["José", "María", "Luis", "Rosa", "Carlos", "Ana", "Jorge", "Lucía", "Pedro", "Carmen", "Víctor", "Elena"]
+APELLIDOS = ["Pérez", "Quispe", "Huamán", "García", "Rojas", "Mendoza", "Flores", "Cárdenas", "Ramírez", "Torres",
+             "Chávez", "Vargas", "Castillo", "Muñoz", "Hernández", "Salazar"]
+NEGOCIOS = ["Bodega", "Ferretería", "Botica", "Restaurante", "Librería", "Peluquería", "Panadería", "Taller",
+            "Minimarket", "Lavandería", "Vidriería", "Juguería"]
+ADJETIVOS = ["Doña Rosa", "El Sol", "San Martín", "La Esperanza", "El Chinito", "Santa Ana", "Los Andes",
+             "Don Lucho", "El Carmen", "La Huacachina", "Señor de Luren", "Virgen de Guadalupe"]
+VIAS = ["Av. San Martín", "Jr. Lima", "Av. Grau", "Calle Bolívar", "Av. Cutervo", "Jr. Ayacucho", "Av. Municipalidad",
+        "Calle Callao", "Av. Matías Manzanilla", "Jr. Tacna", "Prol. Ayabaca", "Av. Los Maestros"]
+DISTRITOS = ["Ica", "Parcona", "La Tinguiña", "Subtanjalla", "Los Aquijes", "Salas", "Pueblo Nuevo"]
+RUBROS = ["Bodega", "Ferretería", "Farmacia y botica", "Restaurante", "Librería", "Peluquería y barbería",
+          "Panadería", "Taller mecánico", "Minimarket", "Lavandería"]
+
+
+def preparar_base(ruta_db: str, solicitudes: int):
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.user import User
+    from app.models.solicitud import Solicitud
+    from app.models.config import Rubro
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(Rubro.__table__.insert(), [
+        {"codigo": f"R{i:02d}", "nombre": nombre, "nivel_riesgo": "bajo"} for i, nombre in enumerate(RUBROS)
+    ])
+
+    aleatorio = random.Random(11)
+    titulares = max(solicitudes // 5, 1)
+    for inicio in range(0, titulares, 20000):
+        db.execute(User.__table__.insert(), [
+            {"email": f"titular{i}@correo.pe", "password_hash": "x", "tipo_usuario": "ciudadano",
+             "tipo_persona": "natural", "dni": f"{40000000 + i * 7:08d}",
+             "nombres": aleatorio.choice(NOMBRES), "apellido_paterno": aleatorio.choice(APELLIDOS),
+             "apellido_materno": aleatorio.choice(APELLIDOS), "is_active": True}
+            for i in range(inicio, min(inicio + 20000, titulares))
+        ])
+    primer_titular = db.query(User.id).order_by(User.id).limit(1).scalar()
+
+    for inicio in range(0, solicitudes, 20000):
+        db.execute(Solicitud.__table__.insert(), [
+            {"numero_expediente": f"EXP-{2020 + i % 7}-{i:07d}", "usuario_id": primer_titular + i % titulares,
+             "rubro_id": 1 + i % len(RUBROS),
+             "nombre_negocio": f"{aleatorio.choice(NEGOCIOS)} {aleatorio.choice(ADJETIVOS)} {i % 997}",
+             "direccion_negocio": f"{aleatorio.choice(VIAS)} {aleatorio.randrange(100, 1500)}",
+             "distrito": aleatorio.choice(DISTRITOS), "nivel_riesgo": "bajo", "estado": "en_revision"}
+            for i in range(inicio, min(inicio + 20000, solicitudes))
+        ])
+    db.commit()
+    db.close()
+    return engine
+
+
+def medir(funcion, repeticiones: int) -> tuple:
+    """(mejor tiempo en ms, último resultado)"""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        duracion = (time.perf_counter() - inicio) * 1000
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--solicitudes", type=int, default=1000000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--db", default="/tmp/bench_busqueda.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔎 BENCHMARK DE BÚSQUEDA DE SOLICITUDES")
+    print("=" * 60)
+
+    inicio = time.perf_counter()
+    engine = preparar_base(args.db, args.solicitudes)
+    print(f"Base: {args.solicitudes:,} solicitudes en {time.perf_counter() - inicio:.1f} s")
+
+    from app.database.connection import SessionLocal
+    from app.models.solicitud import Solicitud
+    from app.services.busqueda_service import BusquedaService
+
+    inicio = time.perf_counter()
+    BusquedaService.preparar(engine)
+    construccion = time.perf_counter() - inicio
+    print(f"Índice FTS5: {construccion:.1f} s ({args.solicitudes / construccion:,.0f} solicitudes/s), "
+          f"base de {os.path.getsize(args.db) / 1024 / 1024:,.0f} MB")
+
+    db = SessionLocal()
+
+    def con_like(texto):
+        def ejecutar():
+            consulta = db.query(Solicitud).filter(
+                Solicitud.numero_expediente.contains(texto) | Solicitud.nombre_negocio.contains(texto)
+            )
+            return consulta.count(), consulta.order_by(Solicitud.created_at.desc()).limit(20).all()
+        return ejecutar
+
+    def con_indice(texto):
+        def ejecutar():
+            coincidencias = BusquedaService.coincidencias(texto)
+            consulta = db.query(Solicitud).join(coincidencias, coincidencias.c.id == Solicitud.id)
+            return consulta.count(), consulta.order_by(coincidencias.c.rango, Solicitud.id.desc()).limit(20).all()
+        return ejecutar
+
+    busquedas = [
+        ("Expediente exacto", "EXP-2024-0456789"),
+        ("Expediente por prefijo", "EXP-2024-04567"),
+        ("Negocio", "Doña Rosa 42"),
+        ("Negocio por prefijo", "ferret huacach"),
+        ("Titular", "Quispe Huamán"),
+        ("DNI por prefijo", "40123"),
+        ("Rubro + distrito", "botica parcona"),
+        ("Dirección", "san martin 455"),
+    ]
+    print(f"\n{'Búsqueda':<24}{'LIKE (ms)':>12}{'total':>9}{'Índice (ms)':>13}{'total':>9}")
+    for nombre, texto in busquedas:
+        ms_like, (total_like, _) = medir(con_like(texto), args.repeticiones)
+        ms_indice, (total_indice, _) = medir(con_indice(texto), args.repeticiones)
+        print(f"{nombre:<24}{ms_like:>12,.1f}{total_like:>9,}{ms_indice:>13,.1f}{total_indice:>9,}")
+
+    # Mantenimiento del índice al guardar (after_flush en la misma transacción)
+    aleatorio = random.Random(5)
+    ids = [aleatorio.randrange(1, args.solicitudes + 1) for _ in range(500)]
+    inicio = time.perf_counter()
+    for n, solicitud_id in enumerate(ids):
+        solicitud = db.get(Solicitud, solicitud_id)
+        solicitud.nombre_negocio = f"Negocio renombrado {n}"
+        db.commit()
+    con_indice_ms = (time.perf_counter() - inicio) * 1000 / len(ids)
+
+    inicio = time.perf_counter()
+    for solicitud_id in ids:
+        solicitud = db.get(Solicitud, solicitud_id)
+        solicitud.estado = "pagado" if solicitud.estado != "pagado" else "en_revision"
+        db.commit()
+    sin_cambio_ms = (time.perf_counter() - inicio) * 1000 / len(ids)
+
+    encontrados = BusquedaService.buscar(db, "renombrado 499")
+    db.close()
+
+    print(f"\nGuardar una solicitud (promedio de {len(ids)} commits):")
+    print(f"   Cambio de negocio (reindexa):   {con_indice_ms:.2f} ms")
+    print(f"   Cambio de estado (no reindexa): {sin_cambio_ms:.2f} ms")
+    print(f"   'renombrado 499' -> {[s.nombre_negocio for s in encontrados[:1]]}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark de la agenda de inspectores (cruces de horario y carga por día)
+
+Uso:
+    python benchmarks/bench_calendario.py [--inspecciones 20000] [--inspectores 30] [--consultas 20000]
+
+Arma agendas futuras al azar (hasta 6 meses, horario de oficina) y compara la
+AgendaIntervalos contra recorrer todas las inspecciones del inspector, que es lo
+que haría una consulta sin índice. Para cada horario consultado se buscan los
+cruces de todos los inspectores y su carga del día, como al sugerir inspector.
+Verifica que ambos métodos den lo mismo.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.intervalos import AgendaIntervalos
+
+DURACIONES = [45, 60, 75, 105]  # riesgo bajo..muy alto + margen de traslado
+
+
+def horario_al_azar(aleatorio: random.Random, base: datetime) -> datetime:
+    dia = base + timedelta(days=aleatorio.randrange(180))
+    return dia.replace(hour=aleatorio.randint(8, 16), minute=aleatorio.choice([0, 15, 30, 45]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inspecciones", type=int, default=20000)
+    parser.add_argument("--inspectores", type=int, default=30)
+    parser.add_argument("--consultas", type=int, default=20000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📅 BENCHMARK DE AGENDA DE INSPECTORES")
+    print("=" * 60)
+
+    aleatorio = random.Random(5)
+    base = datetime(2026, 1, 5)
+    listas = {k: [] for k in range(args.inspectores)}
+    for i in range(args.inspecciones):
+        inicio = horario_al_azar(aleatorio, base)
+        listas[aleatorio.randrange(args.inspectores)].append(
+            (inicio, inicio + timedelta(minutes=aleatorio.choice(DURACIONES)), i)
+        )
+
+    inicio_calculo = time.perf_counter()
+    agendas = {k: AgendaIntervalos.desde(intervalos) for k, intervalos in listas.items()}
+    construccion = time.perf_counter() - inicio_calculo
+    print(f"Agendas: {args.inspecciones:,} inspecciones de {args.inspectores} inspectores, "
+          f"construidas en {construccion * 1000:.0f} ms")
+
+    consultas = []
+    for _ in range(args.consultas):
+        inicio = horario_al_azar(aleatorio, base)
+        consultas.append((inicio, inicio + timedelta(minutes=60)))
+
+    def recorrido(desde, hasta):
+        dia = desde.replace(hour=0, minute=0)
+        resultado = []
+        for k, intervalos in listas.items():
+            cruces = sorted(i for a, b, i in intervalos if a < hasta and b > desde)
+            carga = sum((b - a).total_seconds() / 60 for a, b, _ in intervalos if dia <= a < dia + timedelta(days=1))
+            resultado.append((k, cruces, round(carga)))
+        return resultado
+
+    def indice(desde, hasta):
+        dia = desde.replace(hour=0, minute=0)
+        return [
+            (k, sorted(agenda.cruces(desde, hasta)), round(agenda.minutos(dia, dia + timedelta(days=1))))
+            for k, agenda in agendas.items()
+        ]
+
+    # El recorrido completo es lento: se mide sobre una muestra
+    muestra = consultas[:max(1, args.consultas // 20)]
+    inicio_calculo = time.perf_counter()
+    esperado = [recorrido(*c) for c in muestra]
+    lineal = (time.perf_counter() - inicio_calculo) / len(muestra)
+
+    inicio_calculo = time.perf_counter()
+    obtenido = [indice(*c) for c in consultas]
+    indexado = (time.perf_counter() - inicio_calculo) / len(consultas)
+
+    diferencias = sum(1 for a, b in zip(esperado, obtenido) if a != b)
+    con_cruce = sum(1 for r in obtenido for _, cruces, _ in r if cruces)
+
+    inicio_calculo = time.perf_counter()
+    for _ in range(1000):
+        k = aleatorio.randrange(args.inspectores)
+        desde = horario_al_azar(aleatorio, base)
+        agendas[k].agregar(desde, desde + timedelta(minutes=60), ("nueva", k, desde))
+    alta = (time.perf_counter() - inicio_calculo) / 1000
+
+    for nombre, duracion in [("Recorrer todas las inspecciones", lineal), ("AgendaIntervalos", indexado)]:
+        print(f"\n{nombre}:")
+        print(f"   ms por horario consultado:  {duracion * 1000:.3f}")
+        print(f"   Horarios/s:                 {1 / duracion:,.0f}")
+
+    print(f"\nAlta de una inspección en la agenda: {alta * 1e6:.1f} µs")
+    print(f"Inspector-horario con cruce: {con_cruce:,} de {len(obtenido) * args.inspectores:,}")
+    print(f"Resultados distintos entre ambos métodos (muestra de {len(muestra):,}): {diferencias}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark del modo de campo de los inspectores (CampoService)
+
+Uso:
+    python benchmarks/bench_campo.py [--inspecciones 2000] [--lote 200] [--db /tmp/bench_campo.db]
+
+Arma N inspecciones asignadas a un inspector y compara:
+- el tamaño del paquete (filas compactas, con y sin gzip) contra la misma
+  información como objetos JSON;
+- guardar los resultados uno por uno (InspeccionService.finalizar_inspeccion,
+  lo que hace hoy cada envío del formulario) contra la sincronización por
+  lotes, y el reenvío del mismo lote (todo duplicado).
+"""
+import sys
+import os
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar_base(ruta_db: str, inspecciones: int):
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.user import User
+    from app.models.solicitud import Solicitud
+    from app.models.inspeccion import Inspeccion
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    inspector = User(email="inspector@munica.gob.pe", password_hash="x", tipo_usuario="inspector", nombres="Inspector")
+    ciudadano = User(email="ciudadano@correo.pe", password_hash="x", tipo_usuario="ciudadano", nombres="Ciudadano")
+    db.add_all([inspector, ciudadano])
+    db.commit()
+
+    aleatorio = random.Random(4)
+    ahora = datetime.now()
+    db.execute(Solicitud.__table__.insert(), [
+        {"numero_expediente": f"EXP-C-{i:06d}", "usuario_id": ciudadano.id, "rubro_id": 1,
+         "nombre_negocio": f"Negocio {i}", "direccion_negocio": f"Av. San Martín {i % 900 + 100}",
+         "distrito": "Ica", "nivel_riesgo": aleatorio.choice(["medio", "alto", "muy_alto"]),
+         "latitud": -14.06 + aleatorio.uniform(-0.02, 0.02), "longitud": -75.73 + aleatorio.uniform(-0.02, 0.02)}
+        for i in range(inspecciones)
+    ])
+    ids = [i for i, in db.query(Solicitud.id).order_by(Solicitud.id)]
+    db.execute(Inspeccion.__table__.insert(), [
+        {"solicitud_id": s, "inspector_id": inspector.id, "estado": "programada", "version": 1,
+         "fecha_programada": ahora + timedelta(minutes=5 * n)}
+        for n, s in enumerate(ids)
+    ])
+    db.commit()
+    inspector_id = inspector.id
+    db.close()
+    return inspector_id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inspecciones", type=int, default=2000)
+    parser.add_argument("--lote", type=int, default=200)
+    parser.add_argument("--db", default="/tmp/bench_campo.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📲 BENCHMARK DEL MODO DE CAMPO")
+    print("=" * 60)
+
+    inspector_id = preparar_base(args.db, args.inspecciones)
+
+    from app.database.connection import SessionLocal
+    from app.models.user import User
+    from app.models.inspeccion import Inspeccion
+    from app.services.campo_service import CampoService
+    from app.services.inspeccion_service import InspeccionService
+
+    db = SessionLocal()
+    inspector = db.get(User, inspector_id)
+
+    paquete = CampoService.paquete(db, inspector, dias=60)
+    compacto = json.dumps(paquete, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    objetos = json.dumps(
+        [dict(zip(paquete["campos"], fila)) for fila in paquete["inspecciones"]], ensure_ascii=False
+    ).encode("utf-8")
+    print(f"Paquete: {len(paquete['inspecciones']):,} inspecciones")
+    print(f"   Objetos JSON:        {len(objetos) / 1024:,.0f} KB")
+    print(f"   Filas compactas:     {len(compacto) / 1024:,.0f} KB")
+    print(f"   Filas + gzip:        {len(gzip.compress(compacto)) / 1024:,.0f} KB")
+
+    aleatorio = random.Random(8)
+    ids = [fila[0] for fila in paquete["inspecciones"]]
+    mitad = len(ids) // 2
+
+    def resultado(inspeccion_id: int, n: int) -> dict:
+        return {
+            "clave": f"disp-1-{n}",
+            "inspeccion_id": inspeccion_id,
+            "version": 1,
+            "realizada": datetime.now().isoformat(timespec="minutes"),
+            "checklist": {item: aleatorio.random() < 0.8 for item in InspeccionService.CHECKLIST},
+            "observaciones": "Sin observaciones"
+        }
+
+    # Uno por uno: un commit (y un viaje) por inspección
+    inicio = time.perf_counter()
+    for n, inspeccion_id in enumerate(ids[:mitad]):
+        r = resultado(inspeccion_id, n)
+        InspeccionService.finalizar_inspeccion(db, inspeccion_id, {**r["checklist"], "observaciones": r["observaciones"]})
+    uno_por_uno = time.perf_counter() - inicio
+
+    resultados = [resultado(i, n) for n, i in enumerate(ids[mitad:], start=mitad)]
+    lotes = [resultados[i:i + args.lote] for i in range(0, len(resultados), args.lote)]
+
+    inicio = time.perf_counter()
+    aplicados = sum(CampoService.sincronizar(db, inspector, lote)["resumen"]["aplicado"] for lote in lotes)
+    por_lotes = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    duplicados = sum(CampoService.sincronizar(db, inspector, lote)["resumen"]["duplicado"] for lote in lotes)
+    reenvio = time.perf_counter() - inicio
+
+    realizadas = db.query(Inspeccion).filter(Inspeccion.estado == "realizada").count()
+    db.close()
+
+    for nombre, cantidad, duracion, viajes in [
+        ("Uno por uno (finalizar_inspeccion)", mitad, uno_por_uno, mitad),
+        (f"Sincronización por lotes de {args.lote}", aplicados, por_lotes, len(lotes)),
+        ("Reenvío del mismo lote (duplicados)", duplicados, reenvio, len(lotes)),
+    ]:
+        print(f"\n{nombre}:")
+        print(f"   Resultados:  {cantidad:,} en {viajes:,} envío(s)")
+        print(f"   Tiempo:      {duracion:.2f} s")
+        print(f"   Por segundo: {cantidad / duracion:,.0f}")
+
+    print(f"\nInspecciones realizadas en la base: {realizadas:,}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
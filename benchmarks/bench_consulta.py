@@ -0,0 +1,119 @@
+"""
+Benchmark de la consulta por expediente / licencia / código verificador (ConsultaService)
+
+Uso:
+    python benchmarks/bench_consulta.py [--solicitudes 1000000] [--consultas 20000] [--db /tmp/bench_consulta.db]
+
+Arma una base SQLite con N solicitudes con licencia emitida, construye el filtro
+de claves y mide la latencia (p50 / p95) de:
+- la consulta directa a la base por la columna indexada;
+- ConsultaService con claves existentes (primera vez y repetidas, desde la caché);
+- ConsultaService con códigos inventados (como un escaneo), que el filtro
+  descarta sin ir a la base, y la tasa de falsos positivos observada.
+"""
+import sys
+import os
+import argparse
+import random
+import secrets
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar_base(ruta_db: str, solicitudes: int) -> list:
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.solicitud import Solicitud
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    codigos = set()
+    while len(codigos) < solicitudes:
+        codigos.add(secrets.token_hex(4).upper())
+    codigos = list(codigos)
+    for inicio in range(0, solicitudes, 20000):
+        filas = []
+        for i in range(inicio, min(inicio + 20000, solicitudes)):
+            filas.append({"numero_expediente": f"EXP-20240101-{i:08d}", "numero_licencia": f"LIC-20240101-{i:08d}",
+                          "codigo_verificador": codigos[i], "usuario_id": 1, "rubro_id": 1,
+                          "nombre_negocio": f"Bodega {i}", "direccion_negocio": "Av. Grau 100", "distrito": "Ica",
+                          "nivel_riesgo": "bajo", "estado": "licencia_emitida"})
+        db.execute(Solicitud.__table__.insert(), filas)
+    db.commit()
+    db.close()
+    return codigos
+
+
+def percentiles(tiempos: list) -> str:
+    tiempos = sorted(tiempos)
+    return f"p50 {tiempos[len(tiempos) // 2] * 1000:.1f} µs | p95 {tiempos[int(len(tiempos) * 0.95)] * 1000:.1f} µs"
+
+
+def medir(funcion, claves: list) -> list:
+    tiempos = []
+    for clave in claves:
+        inicio = time.perf_counter()
+        funcion(clave)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--solicitudes", type=int, default=1000000)
+    parser.add_argument("--consultas", type=int, default=20000)
+    parser.add_argument("--db", default="/tmp/bench_consulta.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔑 BENCHMARK DE CONSULTA POR CLAVE EXACTA")
+    print("=" * 60)
+
+    codigos = preparar_base(args.db, args.solicitudes)
+
+    from app.database.connection import SessionLocal
+    from app.models.solicitud import Solicitud
+    from app.services.consulta_service import ConsultaService
+
+    ConsultaService.VERIFICAR_CADA = 3600
+    inicio = time.perf_counter()
+    filtro = ConsultaService.filtro()
+    construccion = time.perf_counter() - inicio
+    print(f"Solicitudes: {args.solicitudes:,} | Claves en el filtro: {filtro.cantidad:,} | "
+          f"Tamaño: {filtro.tamaño_bytes() / 1024 / 1024:.1f} MB | Construcción: {construccion:.1f} s")
+
+    aleatorio = random.Random(5)
+    existentes = [aleatorio.choice(codigos) for _ in range(args.consultas)]
+    inventados = [secrets.token_hex(4).upper() for _ in range(args.consultas)]
+    conjunto = set(codigos)
+    inventados = [c for c in inventados if c not in conjunto]
+
+    db = SessionLocal()
+    directa = medir(lambda c: db.query(Solicitud).filter(Solicitud.codigo_verificador == c).first(), existentes)
+    db.expunge_all()
+    escaneo_bd = medir(lambda c: db.query(Solicitud).filter(Solicitud.codigo_verificador == c).first(), inventados)
+    print(f"\nBase de datos (índice único), código existente:  {percentiles(directa)}")
+    print(f"Base de datos (índice único), código inventado:  {percentiles(escaneo_bd)}")
+
+    db.expunge_all()
+    ConsultaService.consultas_bd = 0
+    primera = medir(lambda c: ConsultaService.buscar(db, c), existentes)
+    repetida = medir(lambda c: ConsultaService.buscar(db, c), existentes)
+    print(f"ConsultaService, primera consulta:               {percentiles(primera)}")
+    print(f"ConsultaService, repetida (caché):               {percentiles(repetida)}")
+
+    ConsultaService.consultas_bd = ConsultaService.falsos_positivos = 0
+    escaneo = medir(lambda c: ConsultaService.buscar(db, c), inventados)
+    print(f"ConsultaService, código inventado (filtro):      {percentiles(escaneo)}")
+    print(f"   Llegaron a la base: {ConsultaService.consultas_bd:,} de {len(inventados):,} "
+          f"({ConsultaService.falsos_positivos / len(inventados):.3%} falsos positivos)")
+    db.close()
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
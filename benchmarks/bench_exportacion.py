@@ -0,0 +1,133 @@
+"""
+Benchmark de exportación masiva (CSV / XLSX en streaming)
+
+Uso:
+    python benchmarks/bench_exportacion.py [--filas 1000000] [--db /tmp/bench_exportacion.db]
+
+Crea (una sola vez) una base SQLite con N solicitudes y mide, en un proceso
+aparte por formato, filas por segundo y memoria pico (RSS) de la exportación.
+"""
+import sys
+import os
+import argparse
+import resource
+import subprocess
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar_base(ruta_db: str, filas: int):
+    """Inserta las solicitudes de prueba en lotes con INSERT masivo"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.user import User
+    from app.models.config import Rubro
+    from app.models.solicitud import Solicitud
+    from datetime import datetime, timedelta
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    existentes = db.query(Solicitud).count()
+    if existentes >= filas:
+        print(f"ℹ️  La base ya tiene {existentes} solicitudes")
+        db.close()
+        return
+
+    print(f"📝 Insertando {filas - existentes} solicitudes...")
+    usuario = db.query(User).first()
+    if not usuario:
+        usuario = User(email="bench@muniica.gob.pe", password_hash="x", dni="00000000")
+        db.add(usuario)
+    rubro = db.query(Rubro).first()
+    if not rubro:
+        rubro = Rubro(codigo="C101", nombre="Bodega / Minimarket", nivel_riesgo="bajo")
+        db.add(rubro)
+    db.commit()
+
+    riesgos = ["bajo", "medio", "alto", "muy_alto"]
+    estados = ["pendiente_pago", "pagado", "aprobado", "licencia_emitida"]
+    base = datetime(2024, 1, 1)
+    lote = 20000
+
+    inicio = time.perf_counter()
+    for desde in range(existentes, filas, lote):
+        hasta = min(desde + lote, filas)
+        db.execute(Solicitud.__table__.insert(), [
+            {
+                "numero_expediente": f"EXP-BENCH-{i:08d}",
+                "usuario_id": usuario.id,
+                "rubro_id": rubro.id,
+                "nombre_negocio": f"Negocio de prueba {i}",
+                "direccion_negocio": f"Av. San Martín {i % 2000}",
+                "distrito": "Ica",
+                "nivel_riesgo": riesgos[i % 4],
+                "estado": estados[i % 4],
+                "monto_pago": 140.0 + (i % 4) * 10,
+                "created_at": base + timedelta(minutes=i),
+            }
+            for i in range(desde, hasta)
+        ])
+        db.commit()
+    db.close()
+    print(f"✅ Base lista en {time.perf_counter() - inicio:.1f} s")
+
+
+def medir_exportacion(ruta_db: str, formato: str):
+    """Corre una exportación completa descartando los bytes (proceso hijo)"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.services.exportacion_service import ExportacionService
+
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    contenido, _, _ = ExportacionService.exportar("solicitudes", formato)
+
+    inicio = time.perf_counter()
+    total_bytes = 0
+    for bloque in contenido:
+        total_bytes += len(bloque)
+    duracion = time.perf_counter() - inicio
+
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{duracion:.3f} {total_bytes} {rss_inicial} {rss_pico}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/bench_exportacion.db")
+    parser.add_argument("--medir", choices=["csv", "xlsx"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir_exportacion(args.db, args.medir)
+        return
+
+    print("=" * 60)
+    print("📊 BENCHMARK DE EXPORTACIÓN EN STREAMING")
+    print("=" * 60)
+    preparar_base(args.db, args.filas)
+
+    for formato in ["csv", "xlsx"]:
+        salida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--db", args.db, "--medir", formato],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        duracion, total_bytes, rss_inicial, rss_pico = salida.split()
+        duracion = float(duracion)
+
+        print(f"\n{formato.upper()}:")
+        print(f"   Filas:            {args.filas:,}")
+        print(f"   Tiempo:           {duracion:.1f} s")
+        print(f"   Filas/segundo:    {args.filas / duracion:,.0f}")
+        print(f"   Tamaño generado:  {int(total_bytes) / 1024 / 1024:.1f} MB")
+        print(f"   RSS tras imports: {int(rss_inicial) / 1024:.1f} MB")
+        print(f"   RSS pico:         {int(rss_pico) / 1024:.1f} MB")
+
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
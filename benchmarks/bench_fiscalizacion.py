@@ -0,0 +1,126 @@
+"""
+Benchmark de la campaña de re-inspección ITSE (FiscalizacionService)
+
+Uso:
+    python benchmarks/bench_fiscalizacion.py [--negocios 20000] [--inspectores 40] [--dias 60] [--muestra 500] [--db /tmp/bench_fiscalizacion.db]
+
+Arma una base con N negocios con licencia de riesgo alto / muy alto y la
+próxima inspección vencida, y compara programar uno por uno con
+InspeccionService.programar_inspeccion (sobre una muestra) contra la campaña
+por lotes. Muestra filas por segundo de cada uno.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar_base(ruta_db: str, negocios: int, inspectores: int):
+    """Base nueva: inspectores, un ciudadano y N solicitudes con licencia vencidas para re-inspección"""
+    if os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.user import User
+    from app.models.solicitud import Solicitud
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(User.__table__.insert(), [
+        {"email": f"inspector{i}@munica.gob.pe", "password_hash": "x", "tipo_usuario": "inspector",
+         "nombres": f"Inspector {i}", "is_active": True}
+        for i in range(inspectores)
+    ] + [{"email": "ciudadano@correo.pe", "password_hash": "x", "tipo_usuario": "ciudadano",
+           "nombres": "Ciudadano", "is_active": True}])
+    ciudadano = db.query(User.id).filter(User.tipo_usuario == "ciudadano").scalar()
+
+    aleatorio = random.Random(9)
+    hoy = datetime.now()
+    filas = []
+    for i in range(negocios):
+        filas.append({
+            "numero_expediente": f"EXP-B-{i:07d}",
+            "usuario_id": ciudadano,
+            "rubro_id": 1,
+            "nombre_negocio": f"Negocio {i}",
+            "direccion_negocio": f"Av. San Martín {i % 900 + 100}",
+            "distrito": "Ica",
+            "nivel_riesgo": aleatorio.choice(["alto", "muy_alto"]),
+            "estado": "licencia_emitida",
+            "numero_licencia": f"LIC-B-{i:07d}",
+            "proxima_inspeccion": hoy - timedelta(days=aleatorio.randrange(120))
+        })
+        if len(filas) == 5000:
+            db.execute(Solicitud.__table__.insert(), filas)
+            filas = []
+    if filas:
+        db.execute(Solicitud.__table__.insert(), filas)
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--negocios", type=int, default=20000)
+    parser.add_argument("--inspectores", type=int, default=40)
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--muestra", type=int, default=500)
+    parser.add_argument("--db", default="/tmp/bench_fiscalizacion.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🏷️  BENCHMARK DE CAMPAÑA DE RE-INSPECCIÓN ITSE")
+    print("=" * 60)
+
+    preparar_base(args.db, args.negocios, args.inspectores)
+
+    from app.database.connection import SessionLocal
+    from app.models.inspeccion import Inspeccion
+    from app.models.solicitud import Solicitud
+    from app.services.inspeccion_service import InspeccionService
+    from app.services.fiscalizacion_service import FiscalizacionService
+
+    desde = date.today() + timedelta(days=1)
+    db = SessionLocal()
+
+    # Uno por uno: como hoy desde el formulario (la muestra queda fuera de la campaña)
+    muestra = [i for i, in db.query(Solicitud.id).order_by(Solicitud.proxima_inspeccion, Solicitud.id).limit(args.muestra)]
+    inicio = time.perf_counter()
+    for n, solicitud_id in enumerate(muestra):
+        fecha = datetime.combine(desde, datetime.min.time()) + timedelta(hours=8, minutes=n)
+        InspeccionService.programar_inspeccion(db, solicitud_id, fecha)
+    uno_por_uno = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    plan = FiscalizacionService.programar_campania(db, desde, args.dias, aplicar=False)
+    simulacion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado = FiscalizacionService.programar_campania(db, desde, args.dias, aplicar=True)
+    campania = time.perf_counter() - inicio
+    total = db.query(Inspeccion).count()
+    db.close()
+
+    resumen = resultado["resumen"]
+    print(f"Negocios: {args.negocios:,} | Inspectores: {args.inspectores} | Días hábiles: {resumen['dias']}")
+    print(f"\nUno por uno (programar_inspeccion, muestra de {len(muestra):,}):")
+    print(f"   Tiempo:      {uno_por_uno:.2f} s")
+    print(f"   Filas/s:     {len(muestra) / uno_por_uno:,.0f}")
+    for nombre, duracion, datos in [("Campaña sin aplicar (solo asignación)", simulacion, plan["resumen"]),
+                                    ("Campaña por lotes (un INSERT por lote)", campania, resumen)]:
+        print(f"\n{nombre}:")
+        print(f"   Seleccionadas: {datos['seleccionadas']:,} | Programadas: {datos['programadas']:,} | "
+              f"Sin cupo: {datos['sin_cupo']:,}")
+        print(f"   Tiempo:      {duracion:.2f} s")
+        print(f"   Filas/s:     {datos['seleccionadas'] / duracion:,.0f}")
+    print(f"\nInspecciones en la base: {total:,}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark de pre-evaluación por lote (PreevaluacionService)
+
+Uso:
+    python benchmarks/bench_preevaluacion.py [--filas 100000] [--rubros 500] [--db /tmp/bench_riesgo.db]
+
+Arma una planilla sintética como las de los gremios (rubros y direcciones que se
+repiten) y compara evaluar fila por fila con los algoritmos anteriores contra
+el lote completo del servicio (lectura del CSV, evaluación y salida JSON / CSV
+en streaming). Muestra filas por segundo.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_riesgo import preparar_base, clasificar_original
+
+
+def zonificacion_original(rubro: str, distrito: str, direccion: str = "") -> dict:
+    """Copia del algoritmo anterior de ZonificacionService (sin memoria)"""
+    from app.services.zonificacion_service import ZonificacionService
+
+    rubro_lower = rubro.lower()
+    zona = "ZC"
+    if "residencial" in direccion.lower() or "casa" in direccion.lower():
+        zona = "ZR"
+    elif "industrial" in direccion.lower() or "parque industrial" in direccion.lower():
+        zona = "ZI"
+    elif "huacachina" in direccion.lower() or "turístico" in direccion.lower():
+        zona = "ZT"
+    zonas_permitidas = []
+    for key, zonas in ZonificacionService.ZONAS_PERMITIDAS.items():
+        if key in rubro_lower:
+            zonas_permitidas = zonas
+            break
+    if not zonas_permitidas:
+        zonas_permitidas = ["ZC", "ZI"]
+    return {"compatible": zona in zonas_permitidas, "zona": zona, "zonas_permitidas": zonas_permitidas}
+
+
+def planilla_csv(filas: int) -> bytes:
+    """CSV con separador ';' (Excel en español) y valores repetidos como en una planilla real"""
+    from app.services.riesgo_service import RiesgoService
+
+    aleatorio = random.Random(7)
+    rubros = [n for nombres in RiesgoService.RIESGOS.values() for n in nombres]
+    rubros += ["Venta de abarrotes y bodega", "Restaurante turístico", "Taller de motos", "Consultorio dental"]
+    calles = ["Av. San Martín", "Calle Lima", "Jr. Huancavelica", "Parque industrial Mz. B",
+              "Av. Angostura (zona residencial)", "Balneario Huacachina", "Calle Grau"]
+    distritos = ["Ica", "Parcona", "La Tinguiña", "Subtanjalla", "Los Aquijes"]
+
+    lineas = ["Razón social;Giro;Dirección del negocio;Distrito;RUC"]
+    for i in range(filas):
+        lineas.append(
+            f"Negocio {i};{aleatorio.choice(rubros)};"
+            f"{aleatorio.choice(calles)} {aleatorio.randint(1, 40)};"
+            f"{aleatorio.choice(distritos)};20{i:09d}"
+        )
+    return ("﻿" + "\n".join(lineas)).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--rubros", type=int, default=500)
+    parser.add_argument("--db", default="/tmp/bench_riesgo.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📋 BENCHMARK DE PRE-EVALUACIÓN POR LOTE")
+    print("=" * 60)
+
+    preparar_base(args.db, args.rubros)
+
+    from app.services.preevaluacion_service import PreevaluacionService
+    import json
+
+    PreevaluacionService.MAX_FILAS = max(PreevaluacionService.MAX_FILAS, args.filas)
+    contenido = planilla_csv(args.filas)
+    print(f"Planilla: {args.filas:,} filas, {len(contenido) / 1024 / 1024:.1f} MB")
+
+    resultados = []
+
+    # Fila por fila con los algoritmos anteriores y la respuesta armada en memoria
+    inicio = time.perf_counter()
+    filas = PreevaluacionService.leer_csv(contenido)
+    salida = []
+    for fila in filas:
+        riesgo = clasificar_original(fila["rubro"])
+        zonificacion = zonificacion_original(fila["rubro"], fila["distrito"], fila["direccion"])
+        salida.append({**fila, **riesgo, **zonificacion})
+    json.dumps(salida, ensure_ascii=False)
+    resultados.append(("Fila por fila (algoritmos anteriores)", time.perf_counter() - inicio, None))
+    del salida
+
+    for formato in ("json", "csv"):
+        inicio = time.perf_counter()
+        filas = PreevaluacionService.leer_csv(contenido)
+        generador, _, _ = PreevaluacionService.preevaluar(filas, formato)
+        tamaño = 0
+        bloques = 0
+        for bloque in generador:
+            tamaño += len(bloque)
+            bloques += 1
+        resultados.append((f"Lote en streaming ({formato.upper()})", time.perf_counter() - inicio,
+                           f"{tamaño / 1024 / 1024:.1f} MB en {bloques} bloques"))
+
+    for nombre, duracion, detalle in resultados:
+        print(f"\n{nombre}:")
+        print(f"   Tiempo:      {duracion:.2f} s")
+        print(f"   Filas/s:     {args.filas / duracion:,.0f}")
+        if detalle:
+            print(f"   Respuesta:   {detalle}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark de clasificación de riesgo por rubro (RiesgoService.clasificar_riesgo)
+
+Uso:
+    python benchmarks/bench_riesgo.py [--clasificaciones 200000] [--rubros 500] [--db /tmp/bench_riesgo.db]
+
+Compara el recorrido original de RIESGOS (subcadenas en ambos sentidos en cada
+llamada) con el índice precompilado, con y sin la memoria de resultados, y
+muestra clasificaciones por segundo.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar_base(ruta_db: str, rubros: int):
+    """Tabla Rubro con los rubros de RIESGOS más N rubros sintéticos"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta_db}"
+
+    from app.database.connection import engine, Base, SessionLocal
+    from app.models.config import Rubro, Tarifa
+    from app.services.riesgo_service import RiesgoService
+    from datetime import datetime
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    if db.query(Rubro).count() >= rubros:
+        db.close()
+        return
+
+    db.query(Rubro).delete()
+    db.query(Tarifa).delete()
+    niveles = list(RiesgoService.ORDEN_RIESGO)
+    filas = []
+    for nivel, nombres in RiesgoService.RIESGOS.items():
+        for nombre in nombres:
+            filas.append({"codigo": f"R{len(filas):05d}", "nombre": nombre, "nivel_riesgo": nivel})
+    while len(filas) < rubros:
+        i = len(filas)
+        filas.append({
+            "codigo": f"R{i:05d}",
+            "nombre": f"Comercio de artículos tipo {i} / Servicio especializado {i}",
+            "nivel_riesgo": niveles[i % len(niveles)]
+        })
+    db.execute(Rubro.__table__.insert(), filas)
+    db.add_all([
+        Tarifa(nivel_riesgo=nivel, monto=monto, vigente_desde=datetime(2024, 1, 1))
+        for nivel, monto in RiesgoService.TARIFAS_POR_DEFECTO.items()
+    ])
+    db.commit()
+    db.close()
+
+
+def clasificar_original(nombre_rubro: str) -> dict:
+    """Copia del algoritmo anterior (recorrido de RIESGOS con subcadenas)"""
+    from app.services.riesgo_service import RiesgoService
+
+    nombre_rubro = nombre_rubro.lower().strip()
+    for nivel, rubros in RiesgoService.RIESGOS.items():
+        for rubro in rubros:
+            if rubro.lower() in nombre_rubro or nombre_rubro in rubro.lower():
+                tarifas = {"bajo": 140.00, "medio": 150.00, "alto": 170.00, "muy_alto": 192.00}
+                return {
+                    "nivel_riesgo": nivel,
+                    "requiere_itse_previa": nivel in ["alto", "muy_alto"],
+                    "monto": tarifas[nivel],
+                    "descripcion": f"Licencia para negocio de {nivel} riesgo"
+                }
+    return {"nivel_riesgo": "medio", "requiere_itse_previa": False, "monto": 150.00,
+            "descripcion": "Licencia para negocio de riesgo medio"}
+
+
+def entradas_de_prueba(cantidad: int, rubros: int) -> list:
+    from app.services.riesgo_service import RiesgoService
+
+    conocidos = [n for nombres in RiesgoService.RIESGOS.values() for n in nombres]
+    variantes = []
+    for nombre in conocidos:
+        variantes += [
+            nombre,
+            nombre.upper(),
+            nombre.split("/")[0].strip(),
+            f"Venta de {nombre.lower()} y afines en el centro de Ica",
+            nombre.replace("í", "i").replace("é", "e").replace("á", "a"),
+        ]
+    variantes += [f"Comercio de artículos tipo {i}" for i in range(0, rubros, 7)]
+    variantes += ["Consultorio odontológico", "Agencia de viajes", "Lavandería", "Hostal"]
+
+    aleatorio = random.Random(42)
+    return [aleatorio.choice(variantes) for _ in range(cantidad)]
+
+
+def medir(nombre: str, funcion, entradas: list) -> tuple:
+    inicio = time.perf_counter()
+    for entrada in entradas:
+        funcion(entrada)
+    duracion = time.perf_counter() - inicio
+    return nombre, len(entradas), duracion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clasificaciones", type=int, default=200000)
+    parser.add_argument("--rubros", type=int, default=500)
+    parser.add_argument("--db", default="/tmp/bench_riesgo.db")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⚖️  BENCHMARK DE CLASIFICACIÓN DE RIESGO")
+    print("=" * 60)
+
+    preparar_base(args.db, args.rubros)
+
+    from app.services.riesgo_service import RiesgoService
+
+    entradas = entradas_de_prueba(args.clasificaciones, args.rubros)
+
+    inicio = time.perf_counter()
+    RiesgoService.invalidar()
+    RiesgoService.indice()
+    construccion = time.perf_counter() - inicio
+    print(f"Índice: {args.rubros} rubros en BD, construido en {construccion * 1000:.1f} ms")
+
+    def sin_memoria(entrada):
+        RiesgoService._indice["resultados"].clear()
+        return RiesgoService.clasificar_riesgo(entrada)
+
+    resultados = [
+        medir("Original (recorrido de RIESGOS)", clasificar_original, entradas),
+        medir("Índice precompilado", sin_memoria, entradas),
+        medir("Índice + memoria de resultados", RiesgoService.clasificar_riesgo, entradas),
+    ]
+
+    for nombre, cantidad, duracion in resultados:
+        print(f"\n{nombre}:")
+        print(f"   Clasificaciones:     {cantidad:,}")
+        print(f"   Tiempo:              {duracion:.2f} s")
+        print(f"   Clasificaciones/s:   {cantidad / duracion:,.0f}")
+
+    # Dónde difieren: el original compara subcadenas ("bar" coincide con "Barbería")
+    distintas = sorted({
+        e for e in set(entradas)
+        if clasificar_original(e)["nivel_riesgo"] != RiesgoService.clasificar_riesgo(e)["nivel_riesgo"]
+    })
+    print(f"\nEntradas clasificadas distinto que el original: {len(distintas)}")
+    for entrada in distintas[:10]:
+        print(f"   {entrada!r}: {clasificar_original(entrada)['nivel_riesgo']} -> "
+              f"{RiesgoService.clasificar_riesgo(entrada)['nivel_riesgo']}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
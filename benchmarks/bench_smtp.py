@@ -0,0 +1,112 @@
+"""
+Benchmark de envío de emails por SMTP (pool de conexiones vs. una conexión por mensaje)
+
+Uso:
+    python benchmarks/bench_smtp.py [--mensajes 2000] [--latencia-ms 2] [--latencia-conexion-ms 50]
+                                    [--conexiones 1,5,10]
+
+Levanta el servidor SMTP local de prueba (benchmarks/smtp_local.py) en el mismo
+proceso, con demoras que simulan la red (por respuesta y al abrir cada conexión),
+y mide mensajes por segundo.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_local import ServidorSMTPLocal
+
+
+async def sin_pool(port: int, mensajes: list, concurrencia: int) -> float:
+    """Lo que haría un envío ingenuo: abrir, enviar y cerrar por cada email"""
+    import aiosmtplib
+
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def enviar(mensaje):
+        async with limite:
+            await aiosmtplib.send(mensaje, hostname="127.0.0.1", port=port, start_tls=False)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[enviar(m) for m in mensajes])
+    return time.perf_counter() - inicio
+
+
+async def con_pool(port: int, mensajes: list, conexiones: int) -> float:
+    from app.services.smtp_service import PoolSMTP
+
+    pool = PoolSMTP("127.0.0.1", port, max_conexiones=conexiones, mensajes_por_conexion=1000)
+    inicio = time.perf_counter()
+    await asyncio.gather(*[pool.enviar(m) for m in mensajes])
+    duracion = time.perf_counter() - inicio
+    await pool.cerrar()
+    return duracion
+
+
+async def medir(args):
+    from app.services.smtp_service import SMTPService
+
+    servidor = ServidorSMTPLocal(
+        latencia=args.latencia_ms / 1000,
+        latencia_conexion=args.latencia_conexion_ms / 1000
+    )
+    port = await servidor.iniciar()
+
+    mensajes = [
+        SMTPService.construir_mensaje(
+            f"vecino{i}@example.com",
+            f"Recordatorio de vencimiento - EXP-{i:06d}",
+            html=f"<p>Estimado/a vecino {i},</p><p>Su licencia vence pronto.</p>"
+        )
+        for i in range(args.mensajes)
+    ]
+
+    resultados = []
+    conexiones = [int(c) for c in args.conexiones.split(",")]
+
+    # Una conexión por mensaje solo con una parte: es lento a propósito
+    muestra = mensajes[:max(1, args.mensajes // 10)]
+    duracion = await sin_pool(port, muestra, max(conexiones))
+    resultados.append((f"Conexión por mensaje ({max(conexiones)} en paralelo)", len(muestra), duracion))
+
+    for n in conexiones:
+        antes = servidor.conexiones
+        duracion = await con_pool(port, mensajes, n)
+        resultados.append((f"Pool de {n} conexión(es) [{servidor.conexiones - antes} abiertas]",
+                           len(mensajes), duracion))
+
+    await servidor.detener()
+    return resultados, servidor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensajes", type=int, default=2000)
+    parser.add_argument("--latencia-ms", type=float, default=2)
+    parser.add_argument("--latencia-conexion-ms", type=float, default=50)
+    parser.add_argument("--conexiones", default="1,5,10")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📧 BENCHMARK DE ENVÍO SMTP")
+    print("=" * 60)
+    print(f"Latencia simulada: {args.latencia_ms} ms por respuesta, "
+          f"{args.latencia_conexion_ms} ms por conexión nueva")
+
+    resultados, servidor = asyncio.run(medir(args))
+
+    for nombre, cantidad, duracion in resultados:
+        print(f"\n{nombre}:")
+        print(f"   Mensajes:          {cantidad:,}")
+        print(f"   Tiempo:            {duracion:.2f} s")
+        print(f"   Mensajes/segundo:  {cantidad / duracion:,.0f}")
+
+    print(f"\nServidor: {servidor.recibidos:,} mensajes recibidos en {servidor.conexiones} conexiones")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
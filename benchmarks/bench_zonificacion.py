@@ -0,0 +1,94 @@
+"""
+Benchmark de zonificación por coordenadas (índice espacial de polígonos)
+
+Uso:
+    python benchmarks/bench_zonificacion.py [--puntos 100000] [--celda 0.005] [--geojson benchmarks/datos/zonificacion_ejemplo.geojson]
+
+Genera N puntos al azar (la mayoría en el casco urbano de Ica) y compara la
+grilla del índice con probar todos los polígonos uno por uno. Verifica que
+ambos den la misma zona y muestra microsegundos por consulta.
+"""
+import sys
+import os
+import argparse
+import json
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.geo import IndiceEspacial
+
+
+def puntos_de_prueba(indice: IndiceEspacial, cantidad: int) -> list:
+    minx = min(p.caja[0] for p in indice.poligonos)
+    miny = min(p.caja[1] for p in indice.poligonos)
+    maxx = max(p.caja[2] for p in indice.poligonos)
+    maxy = max(p.caja[3] for p in indice.poligonos)
+
+    aleatorio = random.Random(11)
+    puntos = []
+    for i in range(cantidad):
+        if i % 5:
+            # Casco urbano de Ica (centro, Huacachina, parque industrial)
+            puntos.append((aleatorio.uniform(-14.10, -14.03), aleatorio.uniform(-75.78, -75.70)))
+        else:
+            puntos.append((aleatorio.uniform(miny - 0.02, maxy + 0.02), aleatorio.uniform(minx - 0.02, maxx + 0.02)))
+    return puntos
+
+
+def fuerza_bruta(indice: IndiceEspacial, latitud: float, longitud: float):
+    """Todos los polígonos (del más chico al más grande) sin la grilla"""
+    for poligono in indice.poligonos:
+        if poligono.contiene(longitud, latitud):
+            return poligono
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puntos", type=int, default=100000)
+    parser.add_argument("--celda", type=float, default=0.005)
+    parser.add_argument("--geojson", default="benchmarks/datos/zonificacion_ejemplo.geojson")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🗺️  BENCHMARK DE ZONIFICACIÓN POR COORDENADAS")
+    print("=" * 60)
+
+    with open(args.geojson, encoding="utf-8") as f:
+        datos = json.load(f)
+
+    inicio = time.perf_counter()
+    indice = IndiceEspacial.desde_geojson(datos, args.celda)
+    construccion = time.perf_counter() - inicio
+    print(f"Índice: {len(indice.poligonos)} polígonos, {len(indice.celdas)} celdas "
+          f"({indice.celdas_resueltas} resueltas sin cálculo), construido en {construccion * 1000:.1f} ms")
+
+    puntos = puntos_de_prueba(indice, args.puntos)
+
+    inicio = time.perf_counter()
+    esperado = [fuerza_bruta(indice, lat, lon) for lat, lon in puntos]
+    bruta = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    obtenido = [indice.buscar(lat, lon) for lat, lon in puntos]
+    grilla = time.perf_counter() - inicio
+
+    diferencias = sum(1 for a, b in zip(esperado, obtenido) if a is not b)
+    fuera = sum(1 for p in obtenido if p is None)
+
+    for nombre, duracion in [("Todos los polígonos", bruta), ("Grilla", grilla)]:
+        print(f"\n{nombre}:")
+        print(f"   Consultas:           {args.puntos:,}")
+        print(f"   Tiempo:              {duracion:.3f} s")
+        print(f"   µs por consulta:     {duracion / args.puntos * 1e6:.2f}")
+        print(f"   Consultas/s:         {args.puntos / duracion:,.0f}")
+
+    print(f"\nPuntos fuera de toda zona (usan la dirección): {fuera:,}")
+    print(f"Resultados distintos entre ambos métodos: {diferencias}")
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Servidor SMTP local de prueba (no entrega nada, solo cuenta los mensajes)
+
+Uso:
+    python benchmarks/smtp_local.py [--port 1025] [--latencia-ms 0] [--latencia-conexion-ms 0]
+
+Para probar el envío real de la aplicación contra este servidor:
+    SMTP_SIMULADO=false SMTP_SERVER=localhost SMTP_PORT=1025 uvicorn app.main:app
+
+--latencia-ms agrega una demora a cada respuesta para simular la ida y vuelta
+de red con un servidor remoto; --latencia-conexion-ms, una demora al abrir cada
+conexión (lo que cuestan TCP + TLS + AUTH contra un relay real).
+"""
+import argparse
+import asyncio
+
+
+class ServidorSMTPLocal:
+    """Implementa lo justo del protocolo: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def __init__(self, latencia: float = 0.0, latencia_conexion: float = 0.0, mensajes_por_sesion: int = 0):
+        self.latencia = latencia
+        self.latencia_conexion = latencia_conexion
+        self.mensajes_por_sesion = mensajes_por_sesion
+        self.recibidos = 0
+        self.bytes_recibidos = 0
+        self.conexiones = 0
+        self.mensajes = []
+        self.guardar_mensajes = False
+        self._servidor = None
+
+    async def iniciar(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._servidor = await asyncio.start_server(self._atender, host, port)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    async def _responder(self, writer, linea: str):
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        writer.write(linea.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _atender(self, reader, writer):
+        self.conexiones += 1
+        en_sesion = 0
+        try:
+            if self.latencia_conexion:
+                await asyncio.sleep(self.latencia_conexion)
+            await self._responder(writer, "220 localhost SMTP de prueba")
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                comando = linea.decode("utf-8", "replace").strip()
+                verbo = comando[:4].upper()
+
+                if verbo in ("EHLO", "HELO"):
+                    if self.latencia:
+                        await asyncio.sleep(self.latencia)
+                    writer.write(b"250-localhost\r\n250-8BITMIME\r\n250-SMTPUTF8\r\n250 SIZE 52428800\r\n")
+                    await writer.drain()
+                elif verbo in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    await self._responder(writer, "250 OK")
+                elif verbo == "DATA":
+                    await self._responder(writer, "354 Termine con <CRLF>.<CRLF>")
+                    contenido = bytearray()
+                    while True:
+                        parte = await reader.readline()
+                        if not parte or parte == b".\r\n":
+                            break
+                        contenido += parte
+                    self.recibidos += 1
+                    self.bytes_recibidos += len(contenido)
+                    if self.guardar_mensajes:
+                        self.mensajes.append(bytes(contenido))
+                    en_sesion += 1
+                    await self._responder(writer, "250 OK en cola")
+                    if self.mensajes_por_sesion and en_sesion >= self.mensajes_por_sesion:
+                        # Simula servidores que cortan la sesión tras N mensajes
+                        break
+                elif verbo == "QUIT":
+                    await self._responder(writer, "221 Adiós")
+                    break
+                else:
+                    await self._responder(writer, "502 Comando no implementado")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--latencia-conexion-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    servidor = ServidorSMTPLocal(
+        latencia=args.latencia_ms / 1000,
+        latencia_conexion=args.latencia_conexion_ms / 1000
+    )
+    port = await servidor.iniciar(args.host, args.port)
+    print(f"📮 SMTP de prueba escuchando en {args.host}:{port} (Ctrl+C para salir)")
+
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"   {servidor.recibidos} mensajes recibidos en {servidor.conexiones} conexiones")
+    finally:
+        await servidor.detener()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
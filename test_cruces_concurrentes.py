@@ -0,0 +1,105 @@
+"""
+Prueba de programación simultánea de inspecciones (SQLite)
+
+Uso:
+    python test_cruces_concurrentes.py
+
+Dos hilos programan a la vez una inspección para el mismo inspector y la misma
+hora sobre una base SQLite temporal. Entre la verificación de cruces y el
+INSERT se agrega una espera, así sin serialización las dos pasarían la
+verificación. Debe guardarse una sola y la otra terminar en ConflictoHorario.
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+RUTA_DB = os.path.join(tempfile.mkdtemp(), "cruces.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{RUTA_DB}"
+
+from app.database.connection import engine, Base, SessionLocal
+from app.models.user import User
+from app.models.solicitud import Solicitud
+from app.models.inspeccion import Inspeccion
+from app.services.calendario_service import CalendarioService, ConflictoHorario
+from app.services.inspeccion_service import InspeccionService
+
+
+def preparar_base() -> tuple:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    inspector = User(email="inspector@muniica.gob.pe", password_hash="x", tipo_usuario="inspector")
+    db.add(inspector)
+    db.flush()
+    solicitudes = [
+        Solicitud(numero_expediente=f"EXP-PRUEBA-{i}", usuario_id=inspector.id, rubro_id=1,
+                  nombre_negocio=f"Bodega {i}", direccion_negocio="Av. Grau 100", distrito="Ica",
+                  nivel_riesgo="bajo", estado="pendiente_itse")
+        for i in range(2)
+    ]
+    db.add_all(solicitudes)
+    db.commit()
+    ids = (inspector.id, [s.id for s in solicitudes])
+    db.close()
+    return ids
+
+
+def test_segunda_programacion_rechazada():
+    inspector_id, solicitudes = preparar_base()
+    fecha = (datetime.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    # Ventana amplia entre la verificación y el INSERT
+    verificar = CalendarioService.verificar_cruces
+
+    def verificar_lento(*args, **kwargs):
+        verificar(*args, **kwargs)
+        time.sleep(0.5)
+
+    CalendarioService.verificar_cruces = verificar_lento
+    largada = threading.Barrier(len(solicitudes))
+    resultados = []
+
+    def programar(solicitud_id):
+        db = SessionLocal()
+        try:
+            largada.wait()
+            InspeccionService.programar_inspeccion(db, solicitud_id, fecha, inspector_id)
+            resultados.append("programada")
+        except ConflictoHorario:
+            db.rollback()
+            resultados.append("conflicto")
+        finally:
+            db.close()
+
+    try:
+        hilos = [threading.Thread(target=programar, args=(s,)) for s in solicitudes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+    finally:
+        CalendarioService.verificar_cruces = verificar
+
+    db = SessionLocal()
+    guardadas = db.query(Inspeccion).filter(Inspeccion.inspector_id == inspector_id).count()
+    db.close()
+
+    print(f"Resultados: {sorted(resultados)} | Inspecciones guardadas: {guardadas}")
+    assert sorted(resultados) == ["conflicto", "programada"], resultados
+    assert guardadas == 1, guardadas
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("📅 PROGRAMACIÓN SIMULTÁNEA DEL MISMO INSPECTOR")
+    print("=" * 60)
+    try:
+        test_segunda_programacion_rechazada()
+    except AssertionError:
+        print("❌ Se guardaron inspecciones que se cruzan")
+        sys.exit(1)
+    print("✅ La segunda programación se rechazó")